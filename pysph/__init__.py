@@ -64,6 +64,7 @@ def in_parallel():
 _has_h5py = None
 _has_pyvisfile = None
 _has_tvtk = None
+_has_shared_memory = None
 
 
 def has_h5py():
@@ -103,3 +104,17 @@ def has_pyvisfile():
         except ImportError:
             _has_pyvisfile = False
     return _has_pyvisfile
+
+
+def has_shared_memory():
+    """Return True if multiprocessing.shared_memory is available, this needs
+    Python 3.8 or above.
+    """
+    global _has_shared_memory
+    if _has_shared_memory is None:
+        _has_shared_memory = True
+        try:
+            from multiprocessing import shared_memory  # noqa: 401
+        except ImportError:
+            _has_shared_memory = False
+    return _has_shared_memory
@@ -148,6 +148,63 @@ cdef class CubicSpline:
     cpdef double py_kernel(self, double[:] xij, double rij, double h):
         return self.kernel(&xij[0], rij, h)
 
+    cdef inline double kernel_and_gradient(self, double* xij, double rij, double h, double* grad, double* deriv):
+        cdef double dw
+        cdef double fac
+        cdef double h1
+        cdef double q
+        cdef double tmp
+        cdef double tmp2
+        cdef double w
+        """Fused evaluation of the kernel and its derivatives, this computes
+        the normalizing factor and the terms of the polynomial only once.
+
+        Returns the kernel, sets `grad` to the gradient, `deriv[0]` to the
+        value of `dwdq` and `deriv[1]` to the value of `gradient_h`.
+        """
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # kernel and gradient evaluated at q
+        tmp2 = 2. - q
+        if (q > 2.0):
+            w = 0.0
+            dw = 0.0
+
+        elif (q > 1.0):
+            w = 0.25 * tmp2 * tmp2 * tmp2
+            dw = -0.75 * tmp2 * tmp2
+        else:
+            w = 1 - 1.5 * q * q * (1 - 0.5 * q)
+            dw = -3.0 * q * (1 - 0.75 * q)
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
+    cpdef double py_kernel_and_gradient(self, double[:] xij, double rij, double h, double[:] grad, double[:] deriv):
+        return self.kernel_and_gradient(&xij[0], rij, h, &grad[0], &deriv[0])
+
 
 
 cdef class CubicSplineWrapper:
@@ -306,6 +363,51 @@ cdef class WendlandQuintic:
     cpdef double py_kernel(self, double[:] xij, double rij, double h):
         return self.kernel(&xij[0], rij, h)
 
+    cdef inline double kernel_and_gradient(self, double* xij, double rij, double h, double* grad, double* deriv):
+        cdef double dw
+        cdef double fac
+        cdef double h1
+        cdef double q
+        cdef double tmp
+        cdef double w
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # compute the kernel and gradient at q
+        w = 0.0
+        dw = 0.0
+        tmp = 1.0 - 0.5 * q
+        if (q < 2.0):
+            w = tmp * tmp * tmp * tmp * (2.0 * q + 1.0)
+            dw = -5.0 * q * tmp * tmp * tmp
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
+    cpdef double py_kernel_and_gradient(self, double[:] xij, double rij, double h, double[:] grad, double[:] deriv):
+        return self.kernel_and_gradient(&xij[0], rij, h, &grad[0], &deriv[0])
+
 
 
 cdef class WendlandQuinticWrapper:
@@ -461,6 +563,50 @@ cdef class Gaussian:
     cpdef double py_kernel(self, double[:] xij, double rij, double h):
         return self.kernel(&xij[0], rij, h)
 
+    cdef inline double kernel_and_gradient(self, double* xij, double rij, double h, double* grad, double* deriv):
+        cdef double dw
+        cdef double fac
+        cdef double h1
+        cdef double q
+        cdef double tmp
+        cdef double w
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # kernel and gradient evaluated at q
+        w = 0.0
+        dw = 0.0
+        if (q < 3.0):
+            w = exp(-q * q)
+            dw = -2.0 * q * w
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
+    cpdef double py_kernel_and_gradient(self, double[:] xij, double rij, double h, double[:] grad, double[:] deriv):
+        return self.kernel_and_gradient(&xij[0], rij, h, &grad[0], &deriv[0])
+
 
 
 cdef class GaussianWrapper:
@@ -675,6 +821,74 @@ cdef class QuinticSpline:
     cpdef double py_kernel(self, double[:] xij, double rij, double h):
         return self.kernel(&xij[0], rij, h)
 
+    cdef inline double kernel_and_gradient(self, double* xij, double rij, double h, double* grad, double* deriv):
+        cdef double dw
+        cdef double fac
+        cdef double h1
+        cdef double q
+        cdef double tmp
+        cdef double tmp1
+        cdef double tmp2
+        cdef double tmp3
+        cdef double w
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        tmp3 = 3. - q
+        tmp2 = 2. - q
+        tmp1 = 1. - q
+
+        # compute the kernel & gradient at q
+        if (q > 3.0):
+            w = 0.0
+            dw = 0.0
+
+        elif (q > 2.0):
+            w = tmp3 * tmp3 * tmp3 * tmp3 * tmp3
+            dw = -5.0 * tmp3 * tmp3 * tmp3 * tmp3
+
+        elif (q > 1.0):
+            w = tmp3 * tmp3 * tmp3 * tmp3 * tmp3
+            w -= 6.0 * tmp2 * tmp2 * tmp2 * tmp2 * tmp2
+
+            dw = -5.0 * tmp3 * tmp3 * tmp3 * tmp3
+            dw += 30.0 * tmp2 * tmp2 * tmp2 * tmp2
+        else:
+            w = tmp3 * tmp3 * tmp3 * tmp3 * tmp3
+            w -= 6.0 * tmp2 * tmp2 * tmp2 * tmp2 * tmp2
+            w += 15. * tmp1 * tmp1 * tmp1 * tmp1 * tmp1
+
+            dw = -5.0 * tmp3 * tmp3 * tmp3 * tmp3
+            dw += 30.0 * tmp2 * tmp2 * tmp2 * tmp2
+            dw -= 75.0 * tmp1 * tmp1 * tmp1 * tmp1
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
+    cpdef double py_kernel_and_gradient(self, double[:] xij, double rij, double h, double[:] grad, double[:] deriv):
+        return self.kernel_and_gradient(&xij[0], rij, h, &grad[0], &deriv[0])
+
 
 
 cdef class QuinticSplineWrapper:
@@ -802,8 +1016,8 @@ cdef class SuperGaussian:
         val = 0.0
         if (q < 3.0):
             q2 = q * q
-            val = (-d * d * 0.5 + 2.0 * d * q2 - d -
-                   2.0 * q2 * q2 + 4 * q2) * exp(-q2)
+            val = (d * d * 0.5 - 2.0 * d * q2 + d +
+                   2.0 * q2 * q2 - 4 * q2) * exp(-q2)
 
         return -fac * h1 * val
 
@@ -837,6 +1051,56 @@ cdef class SuperGaussian:
     cpdef double py_kernel(self, double[:] xij, double rij, double h):
         return self.kernel(&xij[0], rij, h)
 
+    cdef inline double kernel_and_gradient(self, double* xij, double rij, double h, double* grad, double* deriv):
+        cdef double d
+        cdef double dw
+        cdef double e
+        cdef double fac
+        cdef double h1
+        cdef double q
+        cdef double q2
+        cdef double tmp
+        cdef double w
+        h1 = 1. / h
+        q = rij * h1
+        d = self.dim
+
+        # get the kernel normalizing factor
+        if d == 1:
+            fac = self.fac * h1
+        elif d == 2:
+            fac = self.fac * h1 * h1
+        elif d == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # kernel and gradient evaluated at q
+        w = 0.0
+        dw = 0.0
+        if (q < 3.0):
+            q2 = q * q
+            e = exp(-q2)
+            w = e * (1.0 + d * 0.5 - q2)
+            dw = q * (2.0 * q2 - d - 4) * e
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
+    cpdef double py_kernel_and_gradient(self, double[:] xij, double rij, double h, double[:] grad, double[:] deriv):
+        return self.kernel_and_gradient(&xij[0], rij, h, &grad[0], &deriv[0])
+
 
 
 cdef class SuperGaussianWrapper:
@@ -999,6 +1263,53 @@ cdef class WendlandQuinticC4:
     cpdef double py_kernel(self, double[:] xij, double rij, double h):
         return self.kernel(&xij[0], rij, h)
 
+    cdef inline double kernel_and_gradient(self, double* xij, double rij, double h, double* grad, double* deriv):
+        cdef double dw
+        cdef double fac
+        cdef double h1
+        cdef double q
+        cdef double tmp
+        cdef double w
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # compute the kernel and gradient at q
+        w = 0.0
+        dw = 0.0
+        tmp = 1.0 - 0.5 * q
+        if (q < 2.0):
+            w = tmp * tmp * tmp * tmp * tmp * tmp * \
+                ((35.0 / 12.0) * q * q + 3.0 * q + 1.0)
+            dw = (-14.0 / 3.0) * q * (1 + 2.5 * q) * \
+                tmp * tmp * tmp * tmp * tmp
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
+    cpdef double py_kernel_and_gradient(self, double[:] xij, double rij, double h, double[:] grad, double[:] deriv):
+        return self.kernel_and_gradient(&xij[0], rij, h, &grad[0], &deriv[0])
+
 
 
 cdef class WendlandQuinticC4Wrapper:
@@ -1160,8 +1471,55 @@ cdef class WendlandQuinticC6:
     cpdef double py_kernel(self, double[:] xij, double rij, double h):
         return self.kernel(&xij[0], rij, h)
 
+    cdef inline double kernel_and_gradient(self, double* xij, double rij, double h, double* grad, double* deriv):
+        cdef double dw
+        cdef double fac
+        cdef double h1
+        cdef double q
+        cdef double tmp
+        cdef double w
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # compute the kernel and gradient at q
+        w = 0.0
+        dw = 0.0
+        tmp = 1.0 - 0.5 * q
+        if (q < 2.0):
+            w = tmp * tmp * tmp * tmp * tmp * tmp * tmp * tmp * \
+                (4.0 * q * q * q + 6.25 * q * q + 4.0 * q + 1.0)
+            dw = -5.50 * q * tmp * tmp * tmp * tmp * tmp * \
+                tmp * tmp * (1.0 + 3.5 * q + 4 * q * q)
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
+    cpdef double py_kernel_and_gradient(self, double[:] xij, double rij, double h, double[:] grad, double[:] deriv):
+        return self.kernel_and_gradient(&xij[0], rij, h, &grad[0], &deriv[0])
+
+
 
-
 cdef class WendlandQuinticC6Wrapper:
     """Reasonably high-performance convenience wrapper for Kernels.
     """
@@ -1318,6 +1676,51 @@ cdef class WendlandQuinticC2_1D:
     cpdef double py_kernel(self, double[:] xij, double rij, double h):
         return self.kernel(&xij[0], rij, h)
 
+    cdef inline double kernel_and_gradient(self, double* xij, double rij, double h, double* grad, double* deriv):
+        cdef double dw
+        cdef double fac
+        cdef double h1
+        cdef double q
+        cdef double tmp
+        cdef double w
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # compute the kernel and gradient at q
+        w = 0.0
+        dw = 0.0
+        tmp = 1.0 - 0.5 * q
+        if (q < 2.0):
+            w = tmp * tmp * tmp * (1.5 * q + 1.0)
+            dw = -3.0 * q * tmp * tmp
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
+    cpdef double py_kernel_and_gradient(self, double[:] xij, double rij, double h, double[:] grad, double[:] deriv):
+        return self.kernel_and_gradient(&xij[0], rij, h, &grad[0], &deriv[0])
+
 
 
 cdef class WendlandQuinticC2_1DWrapper:
@@ -1476,6 +1879,51 @@ cdef class WendlandQuinticC4_1D:
     cpdef double py_kernel(self, double[:] xij, double rij, double h):
         return self.kernel(&xij[0], rij, h)
 
+    cdef inline double kernel_and_gradient(self, double* xij, double rij, double h, double* grad, double* deriv):
+        cdef double dw
+        cdef double fac
+        cdef double h1
+        cdef double q
+        cdef double tmp
+        cdef double w
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # compute the kernel and gradient at q
+        w = 0.0
+        dw = 0.0
+        tmp = 1.0 - 0.5 * q
+        if (q < 2.0):
+            w = tmp * tmp * tmp * tmp * tmp * (2 * q * q + 2.5 * q + 1.0)
+            dw = -3.5 * q * (2 * q + 1) * tmp * tmp * tmp * tmp
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
+    cpdef double py_kernel_and_gradient(self, double[:] xij, double rij, double h, double[:] grad, double[:] deriv):
+        return self.kernel_and_gradient(&xij[0], rij, h, &grad[0], &deriv[0])
+
 
 
 cdef class WendlandQuinticC4_1DWrapper:
@@ -1637,6 +2085,53 @@ cdef class WendlandQuinticC6_1D:
     cpdef double py_kernel(self, double[:] xij, double rij, double h):
         return self.kernel(&xij[0], rij, h)
 
+    cdef inline double kernel_and_gradient(self, double* xij, double rij, double h, double* grad, double* deriv):
+        cdef double dw
+        cdef double fac
+        cdef double h1
+        cdef double q
+        cdef double tmp
+        cdef double w
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # compute the kernel and gradient at q
+        w = 0.0
+        dw = 0.0
+        tmp = 1.0 - 0.5 * q
+        if (q < 2.0):
+            w = tmp * tmp * tmp * tmp * tmp * tmp * tmp * \
+                (2.625 * q * q * q + 4.75 * q * q + 3.5 * q + 1.0)
+            dw = -0.5 * q * (26.25 * q * q + 27 * q + 9.0) * \
+                tmp * tmp * tmp * tmp * tmp * tmp
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
+    cpdef double py_kernel_and_gradient(self, double[:] xij, double rij, double h, double[:] grad, double[:] deriv):
+        return self.kernel_and_gradient(&xij[0], rij, h, &grad[0], &deriv[0])
+
 
 
 cdef class WendlandQuinticC6_1DWrapper:
@@ -1671,3 +2166,206 @@ cdef class WendlandQuinticC6_1DWrapper:
         self.kern.gradient(xij, rij, h, grad)
         return grad[0], grad[1], grad[2]
 
+
+
+cdef class TabulatedKernel:
+    cdef public int cubic
+    cdef public double[:] d2w_table
+    cdef public double deltap
+    cdef public long dim
+    cdef public double dq
+    cdef public double[:] dw_table
+    cdef public double fac
+    cdef public double h_power
+    cdef public double inv_dq
+    cdef public long n_points
+    cdef public double radius_scale
+    cdef public double[:] w_table
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    cdef inline double dwdq(self, double rij, double h):
+        cdef double fac
+        cdef double h1
+        cdef double val
+        h1 = 1. / h
+
+        # get the kernel normalizing factor
+        fac = pow(h1, self.h_power)
+
+        if (rij > 1e-12):
+            val = self.interpolate(rij * h1, 1)
+        else:
+            val = 0.0
+
+        return val * fac
+
+    cpdef double py_dwdq(self, double rij, double h):
+        return self.dwdq(rij, h)
+
+    cdef inline double get_deltap(self):
+        return self.deltap
+
+    cpdef double py_get_deltap(self):
+        return self.get_deltap()
+
+    cdef inline void gradient(self, double* xij, double rij, double h, double* grad):
+        cdef double h1
+        cdef double tmp
+        cdef double wdash
+        h1 = 1. / h
+        # compute the gradient.
+        if (rij > 1e-12):
+            wdash = self.dwdq(rij, h)
+            tmp = wdash * h1 / rij
+        else:
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+    cpdef py_gradient(self, double[:] xij, double rij, double h, double[:] grad):
+        self.gradient(&xij[0], rij, h, &grad[0])
+
+    cdef inline double gradient_h(self, double* xij, double rij, double h):
+        cdef double dw
+        cdef double fac
+        cdef double h1
+        cdef double q
+        cdef double w
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        fac = pow(h1, self.h_power)
+
+        # kernel and gradient evaluated at q
+        w = self.interpolate(q, 0)
+        dw = self.interpolate(q, 1)
+
+        return -fac * h1 * (dw * q + w * self.dim)
+
+    cpdef double py_gradient_h(self, double[:] xij, double rij, double h):
+        return self.gradient_h(&xij[0], rij, h)
+
+    cdef inline double interpolate(self, double q, long deriv):
+        cdef double f0
+        cdef double f1
+        cdef double m0
+        cdef double m1
+        cdef double t
+        cdef double t2
+        cdef double t3
+        cdef double x
+        """Interpolate W (deriv=0) or dW/dq (deriv=1) at q from the tables.
+        """
+        cdef int i
+        x = q * self.inv_dq
+        i = <int> (x)
+        if i >= self.n_points:
+            return 0.0
+        t = x - i
+        if deriv == 0:
+            f0 = self.w_table[i]
+            f1 = self.w_table[i + 1]
+            m0 = self.dw_table[i]
+            m1 = self.dw_table[i + 1]
+        else:
+            f0 = self.dw_table[i]
+            f1 = self.dw_table[i + 1]
+            m0 = self.d2w_table[i]
+            m1 = self.d2w_table[i + 1]
+
+        if self.cubic:
+            t2 = t * t
+            t3 = t2 * t
+            return ((2.0 * t3 - 3.0 * t2 + 1.0) * f0 +
+                    (t3 - 2.0 * t2 + t) * self.dq * m0 +
+                    (3.0 * t2 - 2.0 * t3) * f1 +
+                    (t3 - t2) * self.dq * m1)
+        else:
+            return f0 + t * (f1 - f0)
+
+    cpdef double py_interpolate(self, double q, long deriv):
+        return self.interpolate(q, deriv)
+
+    cdef inline double kernel(self, double* xij, double rij, double h):
+        cdef double h1
+        h1 = 1. / h
+        return self.interpolate(rij * h1, 0) * pow(h1, self.h_power)
+
+    cpdef double py_kernel(self, double[:] xij, double rij, double h):
+        return self.kernel(&xij[0], rij, h)
+
+    cdef inline double kernel_and_gradient(self, double* xij, double rij, double h, double* grad, double* deriv):
+        cdef double dw
+        cdef double fac
+        cdef double h1
+        cdef double q
+        cdef double tmp
+        cdef double w
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        fac = pow(h1, self.h_power)
+
+        # kernel and gradient evaluated at q
+        w = self.interpolate(q, 0)
+        dw = self.interpolate(q, 1)
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
+    cpdef double py_kernel_and_gradient(self, double[:] xij, double rij, double h, double[:] grad, double[:] deriv):
+        return self.kernel_and_gradient(&xij[0], rij, h, &grad[0], &deriv[0])
+
+
+
+cdef class TabulatedKernelWrapper:
+    """Reasonably high-performance convenience wrapper for Kernels.
+    """
+
+    cdef public TabulatedKernel kern
+    cdef double[3] xij, grad
+    cdef public double radius_scale
+    cdef public double fac
+
+    def __init__(self, kern):
+        self.kern = kern
+        self.radius_scale = kern.radius_scale
+        self.fac = kern.fac
+
+    cpdef double kernel(self, double xi, double yi, double zi, double xj, double yj, double zj, double h):
+        cdef double* xij = self.xij
+        xij[0] = xi-xj
+        xij[1] = yi-yj
+        xij[2] = zi-zj
+        cdef double rij = sqrt(xij[0]*xij[0] + xij[1]*xij[1] +xij[2]*xij[2])
+        return self.kern.kernel(xij, rij, h)
+
+    cpdef gradient(self, double xi, double yi, double zi, double xj, double yj, double zj, double h):
+        cdef double* xij = self.xij
+        xij[0] = xi-xj
+        xij[1] = yi-yj
+        xij[2] = zi-zj
+        cdef double rij = sqrt(xij[0]*xij[0] + xij[1]*xij[1] +xij[2]*xij[2])
+        cdef double* grad = self.grad
+        self.kern.gradient(xij, rij, h, grad)
+        return grad[0], grad[1], grad[2]
+
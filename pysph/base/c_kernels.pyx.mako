@@ -5,12 +5,12 @@ from compyle.api import CythonGenerator
 from kernels import (
     CubicSpline, WendlandQuintic, Gaussian, QuinticSpline, SuperGaussian,
     WendlandQuinticC4, WendlandQuinticC6, WendlandQuinticC2_1D,
-    WendlandQuinticC4_1D, WendlandQuinticC6_1D
+    WendlandQuinticC4_1D, WendlandQuinticC6_1D, TabulatedKernel
 )
 CLASSES = (
     CubicSpline, WendlandQuintic, Gaussian, QuinticSpline, SuperGaussian,
     WendlandQuinticC4, WendlandQuinticC6, WendlandQuinticC2_1D,
-    WendlandQuinticC4_1D, WendlandQuinticC6_1D
+    WendlandQuinticC4_1D, WendlandQuinticC6_1D, TabulatedKernel
 )
 generator = CythonGenerator(python_methods=True)
 %>
@@ -140,9 +140,7 @@ cdef class CellIndexingNNPS(NNPS):
                 &c_x, &c_y, &c_z
                 )
 
-        cdef double xij2 = 0
         cdef double hi2 = self.radius_scale2*h*h
-        cdef double hj2 = 0
 
         cdef map[u_int, pair[u_int, u_int]].iterator it
 
@@ -166,17 +164,12 @@ cdef class CellIndexingNNPS(NNPS):
 
             for j from 0<=j<candidate_length:
                 idx = self._get_id(self.current_keys[n+j], self.src_index)
+                nbrs.c_append(idx)
 
-                hj2 = self.radius_scale2*src_h_ptr[idx]*src_h_ptr[idx]
-
-                xij2 = norm2(
-                    src_x_ptr[idx] - x,
-                    src_y_ptr[idx] - y,
-                    src_z_ptr[idx] - z
-                    )
-
-                if (xij2 < hi2) or (xij2 < hj2):
-                    nbrs.c_append(idx)
+        filter_neighbors(
+            nbrs, orig_length, src_x_ptr, src_y_ptr, src_z_ptr, src_h_ptr,
+            x, y, z, hi2, self.radius_scale2
+        )
 
         if self.sort_gids:
             self._sort_neighbors(
@@ -3,6 +3,10 @@
 
 from math import pi, sqrt, exp
 
+import numpy as np
+from compyle.api import cast, declare
+from compyle.types import KnownType
+
 M_1_PI = 1.0 / pi
 M_2_SQRTPI = 2.0 / sqrt(pi)
 
@@ -162,6 +166,54 @@ class CubicSpline(object):
 
         return -fac * h1 * (dw * q + w * self.dim)
 
+    def kernel_and_gradient(self, xij=[0., 0, 0], rij=1.0, h=1.0,
+                            grad=[0, 0, 0], deriv=[0, 0]):
+        """Fused evaluation of the kernel and its derivatives, this computes
+        the normalizing factor and the terms of the polynomial only once.
+
+        Returns the kernel, sets `grad` to the gradient, `deriv[0]` to the
+        value of `dwdq` and `deriv[1]` to the value of `gradient_h`.
+        """
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # kernel and gradient evaluated at q
+        tmp2 = 2. - q
+        if (q > 2.0):
+            w = 0.0
+            dw = 0.0
+
+        elif (q > 1.0):
+            w = 0.25 * tmp2 * tmp2 * tmp2
+            dw = -0.75 * tmp2 * tmp2
+        else:
+            w = 1 - 1.5 * q * q * (1 - 0.5 * q)
+            dw = -3.0 * q * (1 - 0.75 * q)
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
 
 class WendlandQuinticC2_1D(object):
     r"""The following is the WendlandQuintic kernel (Wendland C2) kernel for 1D.
@@ -270,6 +322,43 @@ class WendlandQuinticC2_1D(object):
 
         return -fac * h1 * (dw * q + w * self.dim)
 
+    def kernel_and_gradient(self, xij=[0., 0, 0], rij=1.0, h=1.0,
+                            grad=[0, 0, 0], deriv=[0, 0]):
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # compute the kernel and gradient at q
+        w = 0.0
+        dw = 0.0
+        tmp = 1.0 - 0.5 * q
+        if (q < 2.0):
+            w = tmp * tmp * tmp * (1.5 * q + 1.0)
+            dw = -3.0 * q * tmp * tmp
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
 
 class WendlandQuintic(object):
     r"""The following is the WendlandQuintic kernel(C2) kernel for 2D and 3D.
@@ -379,6 +468,43 @@ class WendlandQuintic(object):
 
         return -fac * h1 * (dw * q + w * self.dim)
 
+    def kernel_and_gradient(self, xij=[0., 0, 0], rij=1.0, h=1.0,
+                            grad=[0, 0, 0], deriv=[0, 0]):
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # compute the kernel and gradient at q
+        w = 0.0
+        dw = 0.0
+        tmp = 1.0 - 0.5 * q
+        if (q < 2.0):
+            w = tmp * tmp * tmp * tmp * (2.0 * q + 1.0)
+            dw = -5.0 * q * tmp * tmp * tmp
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
 
 class WendlandQuinticC4_1D(object):
     r"""The following is the WendlandQuintic kernel (Wendland C4) kernel for 1D.
@@ -489,6 +615,43 @@ class WendlandQuinticC4_1D(object):
 
         return -fac * h1 * (dw * q + w * self.dim)
 
+    def kernel_and_gradient(self, xij=[0., 0, 0], rij=1.0, h=1.0,
+                            grad=[0, 0, 0], deriv=[0, 0]):
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # compute the kernel and gradient at q
+        w = 0.0
+        dw = 0.0
+        tmp = 1.0 - 0.5 * q
+        if (q < 2.0):
+            w = tmp * tmp * tmp * tmp * tmp * (2 * q * q + 2.5 * q + 1.0)
+            dw = -3.5 * q * (2 * q + 1) * tmp * tmp * tmp * tmp
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
 
 class WendlandQuinticC4(object):
     r"""The following is the WendlandQuintic kernel (Wendland C4) kernel for
@@ -602,6 +765,45 @@ class WendlandQuinticC4(object):
 
         return -fac * h1 * (dw * q + w * self.dim)
 
+    def kernel_and_gradient(self, xij=[0., 0, 0], rij=1.0, h=1.0,
+                            grad=[0, 0, 0], deriv=[0, 0]):
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # compute the kernel and gradient at q
+        w = 0.0
+        dw = 0.0
+        tmp = 1.0 - 0.5 * q
+        if (q < 2.0):
+            w = tmp * tmp * tmp * tmp * tmp * tmp * \
+                ((35.0 / 12.0) * q * q + 3.0 * q + 1.0)
+            dw = (-14.0 / 3.0) * q * (1 + 2.5 * q) * \
+                tmp * tmp * tmp * tmp * tmp
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
 
 class WendlandQuinticC6_1D(object):
     r"""The following is the WendlandQuintic kernel (Wendland C6) kernel for 1D.
@@ -715,6 +917,45 @@ class WendlandQuinticC6_1D(object):
 
         return -fac * h1 * (dw * q + w * self.dim)
 
+    def kernel_and_gradient(self, xij=[0., 0, 0], rij=1.0, h=1.0,
+                            grad=[0, 0, 0], deriv=[0, 0]):
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # compute the kernel and gradient at q
+        w = 0.0
+        dw = 0.0
+        tmp = 1.0 - 0.5 * q
+        if (q < 2.0):
+            w = tmp * tmp * tmp * tmp * tmp * tmp * tmp * \
+                (2.625 * q * q * q + 4.75 * q * q + 3.5 * q + 1.0)
+            dw = -0.5 * q * (26.25 * q * q + 27 * q + 9.0) * \
+                tmp * tmp * tmp * tmp * tmp * tmp
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
 
 class WendlandQuinticC6(object):
     r"""The following is the WendlandQuintic kernel(C6) kernel for 2D and 3D.
@@ -826,6 +1067,45 @@ class WendlandQuinticC6(object):
 
         return -fac * h1 * (dw * q + w * self.dim)
 
+    def kernel_and_gradient(self, xij=[0., 0, 0], rij=1.0, h=1.0,
+                            grad=[0, 0, 0], deriv=[0, 0]):
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # compute the kernel and gradient at q
+        w = 0.0
+        dw = 0.0
+        tmp = 1.0 - 0.5 * q
+        if (q < 2.0):
+            w = tmp * tmp * tmp * tmp * tmp * tmp * tmp * tmp * \
+                (4.0 * q * q * q + 6.25 * q * q + 4.0 * q + 1.0)
+            dw = -5.50 * q * tmp * tmp * tmp * tmp * tmp * \
+                tmp * tmp * (1.0 + 3.5 * q + 4 * q * q)
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
 
 class Gaussian(object):
     r"""Gaussian Kernel: [Liu2010]_
@@ -940,6 +1220,42 @@ class Gaussian(object):
 
         return -fac * h1 * (dw * q + w * self.dim)
 
+    def kernel_and_gradient(self, xij=[0., 0, 0], rij=1.0, h=1.0,
+                            grad=[0, 0, 0], deriv=[0, 0]):
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # kernel and gradient evaluated at q
+        w = 0.0
+        dw = 0.0
+        if (q < 3.0):
+            w = exp(-q * q)
+            dw = -2.0 * q * w
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
 
 class SuperGaussian(object):
     r"""Super Gaussian Kernel: [Monaghan1992]_
@@ -1041,11 +1357,50 @@ class SuperGaussian(object):
         val = 0.0
         if (q < 3.0):
             q2 = q * q
-            val = (-d * d * 0.5 + 2.0 * d * q2 - d -
-                   2.0 * q2 * q2 + 4 * q2) * exp(-q2)
+            val = (d * d * 0.5 - 2.0 * d * q2 + d +
+                   2.0 * q2 * q2 - 4 * q2) * exp(-q2)
 
         return -fac * h1 * val
 
+    def kernel_and_gradient(self, xij=[0., 0, 0], rij=1.0, h=1.0,
+                            grad=[0, 0, 0], deriv=[0, 0]):
+        h1 = 1. / h
+        q = rij * h1
+        d = self.dim
+
+        # get the kernel normalizing factor
+        if d == 1:
+            fac = self.fac * h1
+        elif d == 2:
+            fac = self.fac * h1 * h1
+        elif d == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        # kernel and gradient evaluated at q
+        w = 0.0
+        dw = 0.0
+        if (q < 3.0):
+            q2 = q * q
+            e = exp(-q2)
+            w = e * (1.0 + d * 0.5 - q2)
+            dw = q * (2.0 * q2 - d - 4) * e
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
 
 class QuinticSpline(object):
     r"""Quintic Spline SPH kernel: [Liu2010]_
@@ -1208,3 +1563,243 @@ class QuinticSpline(object):
             dw -= 75.0 * tmp1 * tmp1 * tmp1 * tmp1
 
         return -fac * h1 * (dw * q + w * self.dim)
+
+    def kernel_and_gradient(self, xij=[0., 0, 0], rij=1.0, h=1.0,
+                            grad=[0, 0, 0], deriv=[0, 0]):
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        if self.dim == 1:
+            fac = self.fac * h1
+        elif self.dim == 2:
+            fac = self.fac * h1 * h1
+        elif self.dim == 3:
+            fac = self.fac * h1 * h1 * h1
+
+        tmp3 = 3. - q
+        tmp2 = 2. - q
+        tmp1 = 1. - q
+
+        # compute the kernel & gradient at q
+        if (q > 3.0):
+            w = 0.0
+            dw = 0.0
+
+        elif (q > 2.0):
+            w = tmp3 * tmp3 * tmp3 * tmp3 * tmp3
+            dw = -5.0 * tmp3 * tmp3 * tmp3 * tmp3
+
+        elif (q > 1.0):
+            w = tmp3 * tmp3 * tmp3 * tmp3 * tmp3
+            w -= 6.0 * tmp2 * tmp2 * tmp2 * tmp2 * tmp2
+
+            dw = -5.0 * tmp3 * tmp3 * tmp3 * tmp3
+            dw += 30.0 * tmp2 * tmp2 * tmp2 * tmp2
+        else:
+            w = tmp3 * tmp3 * tmp3 * tmp3 * tmp3
+            w -= 6.0 * tmp2 * tmp2 * tmp2 * tmp2 * tmp2
+            w += 15. * tmp1 * tmp1 * tmp1 * tmp1 * tmp1
+
+            dw = -5.0 * tmp3 * tmp3 * tmp3 * tmp3
+            dw += 30.0 * tmp2 * tmp2 * tmp2 * tmp2
+            dw -= 75.0 * tmp1 * tmp1 * tmp1 * tmp1
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
+
+
+class KernelTable(np.ndarray, KnownType):
+    """A table of kernel values used by the :py:class:`TabulatedKernel`.
+
+    This is a plain numpy array which the code generators declare as a typed
+    memoryview so that the lookups are fast in the generated code.
+    """
+    type = 'double[:]'
+    base_type = 'double'
+
+
+class TabulatedKernel(object):
+    r"""Tabulated version of any of the kernels defined here.
+
+    The values of :math:`W(q)` and :math:`\frac{dW}{dq}` of the given kernel
+    with the dimensional normalizing factor folded in are computed at
+    construction on `n_points` uniformly spaced values of :math:`q` in
+    :math:`[0, R]` where :math:`R` is the radius scale of the kernel.  The
+    kernel and its gradient are then evaluated with a table lookup and a linear
+    or a cubic Hermite interpolation which avoids the branches and powers of
+    the analytic kernels.
+
+    For example::
+
+        >>> kernel = TabulatedKernel(QuinticSpline(dim=2), n_points=2000,
+        ...                          interpolation='cubic')
+
+    Note that this kernel is only supported with the Cython backend.
+    """
+
+    def __init__(self, kernel=None, n_points=1000, interpolation='linear'):
+        """
+        Parameters
+        ----------
+
+        kernel: object
+            The kernel to tabulate, defaults to a 1D `CubicSpline`.
+        n_points: int
+            Number of intervals of the table.
+        interpolation: str
+            One of 'linear' or 'cubic'.
+        """
+        if interpolation not in ('linear', 'cubic'):
+            raise ValueError(
+                'Unknown interpolation %s, use linear or cubic.' %
+                interpolation
+            )
+        if kernel is None:
+            kernel = CubicSpline()
+        self.radius_scale = kernel.radius_scale
+        self.dim = kernel.dim
+        self.fac = kernel.fac
+        # The tables are for h = 1, the normalizing factor is 1/h**h_power.
+        self.h_power = float(self.dim)
+        self.deltap = kernel.get_deltap()
+        self.n_points = int(n_points)
+        self.cubic = interpolation == 'cubic'
+        self.dq = self.radius_scale / self.n_points
+        self.inv_dq = 1.0 / self.dq
+        self.w_table, self.dw_table, self.d2w_table = self._make_tables(kernel)
+
+    def _make_tables(self, kernel):
+        q = np.linspace(0.0, self.radius_scale, self.n_points + 1)
+        # Use the value just inside the support at the last point as some
+        # kernels, like the Gaussian, are truncated.
+        q[-1] = np.nextafter(self.radius_scale, 0.0)
+        w = np.array([kernel.kernel(rij=x, h=1.0) for x in q])
+        dw = np.array([kernel.dwdq(rij=x, h=1.0) for x in q])
+        # The second derivative is only needed for the cubic interpolation
+        # of dW/dq, central differences are accurate enough for this.
+        eps = 1e-6
+        d2w = np.zeros_like(q)
+        for i, x in enumerate(q):
+            lo = max(x - eps, 0.0)
+            hi = min(x + eps, q[-1])
+            d2w[i] = (kernel.dwdq(rij=hi, h=1.0) -
+                      kernel.dwdq(rij=lo, h=1.0)) / (hi - lo)
+        return [x.view(KernelTable) for x in (w, dw, d2w)]
+
+    def get_deltap(self):
+        return self.deltap
+
+    def interpolate(self, q=0.0, deriv=0):
+        """Interpolate W (deriv=0) or dW/dq (deriv=1) at q from the tables.
+        """
+        i = declare('int')
+        x = q * self.inv_dq
+        i = cast(x, "int")
+        if i >= self.n_points:
+            return 0.0
+        t = x - i
+        if deriv == 0:
+            f0 = self.w_table[i]
+            f1 = self.w_table[i + 1]
+            m0 = self.dw_table[i]
+            m1 = self.dw_table[i + 1]
+        else:
+            f0 = self.dw_table[i]
+            f1 = self.dw_table[i + 1]
+            m0 = self.d2w_table[i]
+            m1 = self.d2w_table[i + 1]
+
+        if self.cubic:
+            t2 = t * t
+            t3 = t2 * t
+            return ((2.0 * t3 - 3.0 * t2 + 1.0) * f0 +
+                    (t3 - 2.0 * t2 + t) * self.dq * m0 +
+                    (3.0 * t2 - 2.0 * t3) * f1 +
+                    (t3 - t2) * self.dq * m1)
+        else:
+            return f0 + t * (f1 - f0)
+
+    def kernel(self, xij=[0., 0, 0], rij=1.0, h=1.0):
+        h1 = 1. / h
+        return self.interpolate(rij * h1, 0) * pow(h1, self.h_power)
+
+    def dwdq(self, rij=1.0, h=1.0):
+        h1 = 1. / h
+
+        # get the kernel normalizing factor
+        fac = pow(h1, self.h_power)
+
+        if (rij > 1e-12):
+            val = self.interpolate(rij * h1, 1)
+        else:
+            val = 0.0
+
+        return val * fac
+
+    def gradient(self, xij=[0., 0, 0], rij=1.0, h=1.0, grad=[0, 0, 0]):
+        h1 = 1. / h
+        # compute the gradient.
+        if (rij > 1e-12):
+            wdash = self.dwdq(rij, h)
+            tmp = wdash * h1 / rij
+        else:
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+    def gradient_h(self, xij=[0., 0, 0], rij=1.0, h=1.0):
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        fac = pow(h1, self.h_power)
+
+        # kernel and gradient evaluated at q
+        w = self.interpolate(q, 0)
+        dw = self.interpolate(q, 1)
+
+        return -fac * h1 * (dw * q + w * self.dim)
+
+    def kernel_and_gradient(self, xij=[0., 0, 0], rij=1.0, h=1.0,
+                            grad=[0, 0, 0], deriv=[0, 0]):
+        h1 = 1. / h
+        q = rij * h1
+
+        # get the kernel normalizing factor
+        fac = pow(h1, self.h_power)
+
+        # kernel and gradient evaluated at q
+        w = self.interpolate(q, 0)
+        dw = self.interpolate(q, 1)
+
+        # compute the gradient and the derivatives with respect to q and h.
+        if (rij > 1e-12):
+            tmp = dw * fac * h1 / rij
+        else:
+            dw = 0.0
+            tmp = 0.0
+
+        grad[0] = tmp * xij[0]
+        grad[1] = tmp * xij[1]
+        grad[2] = tmp * xij[2]
+
+        deriv[0] = dw * fac
+        deriv[1] = -fac * h1 * (dw * q + w * self.dim)
+
+        return w * fac
@@ -127,8 +127,7 @@ cdef class LinkedListNNPS(NNPS):
 
         # locals
         cdef size_t indexj
-        cdef double xij2
-        cdef double hi2, hj2
+        cdef double hi2
         cdef int ierr, nnbrs
         cdef unsigned int _next
         cdef int ix, iy, iz
@@ -172,22 +171,20 @@ cdef class LinkedListNNPS(NNPS):
                     )
                     if cell_index > -1:
 
-                        # get the first particle and begin iteration
+                        # get the first particle and append all the
+                        # particles in this cell as candidates.
                         _next = head[ cell_index ]
                         while( _next != UINT_MAX ):
-                            hj2 = radius_scale * s_h[_next]
-                            hj2 *= hj2
-
-                            xij2 = norm2( s_x[_next]-x,
-                                          s_y[_next]-y,
-                                          s_z[_next]-z )
-
-                            # select neighbor
-                            if ( (xij2 < hi2) or (xij2 < hj2) ):
-                                nbrs.c_append(_next)
+                            nbrs.c_append(_next)
 
                             # get the 'next' particle in this cell
                             _next = next[_next]
+
+        # select the neighbors from the candidates
+        filter_neighbors(
+            nbrs, orig_length, s_x, s_y, s_z, s_h, x, y, z, hi2,
+            radius_scale*radius_scale
+        )
         if self.sort_gids:
             self._sort_neighbors(
                 &nbrs.data[orig_length], nbrs.length - orig_length, s_gid
@@ -1,5 +1,6 @@
 from pysph.base.nnps_base import get_number_of_threads, py_flatten, \
-        py_unflatten, py_get_valid_cell_index
+        py_unflatten, py_get_valid_cell_index, py_filter_candidates, \
+        find_neighbors_of_points
 
 from pysph.base.nnps_base import NNPSParticleArrayWrapper, CPUDomainManager, \
         DomainManager, Cell, NeighborCache, NNPSBase, NNPS
@@ -132,6 +132,93 @@ cdef inline long get_valid_cell_index(int cid_x, int cid_y, int cid_z,
 
     return cell_index
 
+# Number of candidates tested together by filter_candidates. The inner
+# loops have this fixed trip count so that the compiler can unroll and
+# vectorize them.
+cdef enum:
+    FILTER_WIDTH = 8
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline long filter_candidates(unsigned int* candidates, long n,
+        double* s_x, double* s_y, double* s_z, double* s_h,
+        double x, double y, double z, double hi2,
+        double radius_scale2) nogil:
+    """Compact the candidates in place, keeping only the neighbors.
+
+    A candidate ``j`` is retained if ``xij2 < hi2`` or ``xij2 < hj2`` where
+    ``hj2 = radius_scale2*h[j]*h[j]``. The candidates are tested in full
+    batches of ``FILTER_WIDTH`` without any branches and the survivors of
+    each batch are then written out with a branch-free compaction. The
+    relative order of the retained candidates is preserved. Returns the
+    number of retained candidates.
+
+    """
+    cdef int keep[FILTER_WIDTH]
+    cdef unsigned int ids[FILTER_WIDTH]
+    cdef double xij, yij, zij, xij2, hj2
+    cdef unsigned int idx
+    cdef long start = 0, count = 0
+    cdef int k
+
+    while start + FILTER_WIDTH <= n:
+        for k in range(FILTER_WIDTH):
+            idx = candidates[start + k]
+            ids[k] = idx
+            xij = s_x[idx] - x
+            yij = s_y[idx] - y
+            zij = s_z[idx] - z
+            xij2 = xij*xij + yij*yij + zij*zij
+            hj2 = radius_scale2*s_h[idx]*s_h[idx]
+            keep[k] = (xij2 < hi2) | (xij2 < hj2)
+
+        # count never exceeds start + k so this is safe to do in place.
+        for k in range(FILTER_WIDTH):
+            candidates[count] = ids[k]
+            count += keep[k]
+
+        start += FILTER_WIDTH
+
+    # The remaining partial batch.
+    while start < n:
+        idx = candidates[start]
+        xij = s_x[idx] - x
+        yij = s_y[idx] - y
+        zij = s_z[idx] - z
+        xij2 = xij*xij + yij*yij + zij*zij
+        hj2 = radius_scale2*s_h[idx]*s_h[idx]
+        candidates[count] = idx
+        count += (xij2 < hi2) | (xij2 < hj2)
+        start += 1
+
+    return count
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline void append_candidates(UIntArray nbrs, unsigned int* ids,
+                                   long n) nogil:
+    """Append a contiguous block of candidate indices to nbrs."""
+    cdef long i
+    for i in range(n):
+        nbrs.c_append(ids[i])
+
+cdef inline void filter_neighbors(UIntArray nbrs, long start,
+        double* s_x, double* s_y, double* s_z, double* s_h,
+        double x, double y, double z, double hi2,
+        double radius_scale2) nogil:
+    """Filter the candidates appended to nbrs after index `start`.
+
+    This is the common last step of the `find_nearest_neighbors` methods
+    of the cell based NNPS classes which first append all the particles in
+    the neighboring cells and then discard those that are not neighbors.
+
+    """
+    cdef long count = filter_candidates(
+        &nbrs.data[start], nbrs.length - start, s_x, s_y, s_z, s_h,
+        x, y, z, hi2, radius_scale2
+    )
+    nbrs.c_resize(start + count)
+
 cdef cIntPoint find_cell_id(cPoint pnt, double cell_size)
 
 cpdef UIntArray arange_uint(int start, int stop=*)
@@ -274,6 +361,31 @@ cdef class NeighborCache:
     cdef void _update_last_avg_nbr_size(self)
     cdef void _find_neighbors(self, long d_idx) nogil
 
+cdef class PairDataCache:
+    cdef int _n_threads
+    cdef UIntArray _pid_to_tid
+    cdef UIntArray _start_stop
+    cdef void **_nbrs
+    cdef void **_rij
+    cdef void **_wij
+    cdef void **_dwij
+    cdef public list _arrays
+    cdef public bint valid           # Is the cached data usable.
+    cdef public long start_idx       # Range of cached destination indices.
+    cdef public long stop_idx
+
+    cpdef reset(self, long start_idx, long stop_idx)
+    cpdef free(self)
+    cpdef long get_memory_usage(self)
+    cdef void begin(self, size_t d_idx, int thread_id) nogil
+    cdef void add(self, int thread_id, unsigned int s_idx, double rij,
+                  double wij, double* dwij) nogil
+    cdef void end(self, size_t d_idx, int thread_id) nogil
+    cdef unsigned int* get_pairs(self, size_t d_idx, int* n_pairs) nogil
+    cdef double* get_rij(self, size_t d_idx) nogil
+    cdef double* get_wij(self, size_t d_idx) nogil
+    cdef double* get_dwij(self, size_t d_idx) nogil
+
 cdef class NNPSBase:
     ##########################################################################
     # Data Attributes
@@ -317,6 +429,8 @@ cdef class NNPS(NNPSBase):
     cdef public DoubleArray xmin      # co-ordinate min values
     cdef public DoubleArray xmax      # co-ordinate max values
     cdef public NeighborCache current_cache  # The current cache
+    cdef public list pair_cache       # Cached pair data, see PairDataCache.
+    cdef public bint use_pair_cache   # Use the pair data cache or not.
     cdef public double _last_domain_size # last size of domain.
 
     cdef public bint sort_gids        # Sort neighbors by their gids.
@@ -329,6 +443,9 @@ cdef class NNPS(NNPSBase):
     # particles locally.
     cpdef update(self)
 
+    cpdef PairDataCache get_pair_cache(self, int src_index, int dst_index)
+    cpdef invalidate_pair_cache(self)
+
     # Index particles given by a list of indices. The indices are
     # assumed to be of type unsigned int and local to the NNPS object
     cpdef _bin(self, int pa_index, UIntArray indices)
@@ -116,6 +116,24 @@ def py_unflatten(long cell_index, IntArray ncells_per_dim, int dim):
     cdef IntPoint cid = IntPoint_from_cIntPoint(_cid)
     return cid
 
+def py_filter_candidates(UIntArray candidates, DoubleArray x, DoubleArray y,
+                         DoubleArray z, DoubleArray h, double xi, double yi,
+                         double zi, double hi, double radius_scale):
+    """Python wrapper for `filter_candidates`.
+
+    The candidates array is compacted in place to contain only the
+    neighbors of the point (xi, yi, zi) with smoothing length hi.
+    """
+    cdef double hi2 = radius_scale*hi*radius_scale*hi
+    cdef long count
+    with nogil:
+        count = filter_candidates(
+            candidates.data, candidates.length, x.data, y.data, z.data,
+            h.data, xi, yi, zi, hi2, radius_scale*radius_scale
+        )
+    candidates.resize(count)
+    return count
+
 cdef cIntPoint find_cell_id(cPoint pnt, double cell_size):
     """ Find the cell index for the corresponding point
 
@@ -215,6 +233,190 @@ cpdef UIntArray arange_uint(int start, int stop=-1):
 
     return arange
 
+cdef inline long _lower_bound(long long* keys, long n, long long key) nogil:
+    cdef long lo = 0, hi = n, mid
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        if keys[mid] < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+cdef long _find_point_neighbors(
+        double xi, double yi, double zi, double radius, double cell_size,
+        double* xmin, long long* ncells, long long* keys,
+        unsigned int* order, long n_src, double* sx, double* sy, double* sz,
+        unsigned int* out) nogil:
+    """Return the number of source points within `radius` of the point,
+    these are also written to `out` if it is not NULL.
+
+    The source coordinates are sorted by their cell keys and `order` maps
+    them back to the original indices.
+    """
+    cdef double[3] pnt
+    cdef long long[3] cid
+    cdef double c
+    cdef int d, i, j
+    cdef long long key, lo, hi
+    cdef long start, end, count = 0
+    cdef double r2 = radius*radius, xij, yij, zij
+    pnt[0] = xi; pnt[1] = yi; pnt[2] = zi
+    for d in range(3):
+        c = floor((pnt[d] - xmin[d])/cell_size) + 1
+        if c < -1 or c > ncells[d]:
+            return 0
+        cid[d] = <long long>c
+    # The cells along z are contiguous in the keys so they are searched
+    # together.
+    lo = cid[2] - 1 if cid[2] > 0 else 0
+    hi = cid[2] + 1 if cid[2] + 1 < ncells[2] else ncells[2] - 1
+    if lo > hi:
+        return 0
+    for i in range(-1, 2):
+        if cid[0] + i < 0 or cid[0] + i >= ncells[0]:
+            continue
+        for j in range(-1, 2):
+            if cid[1] + j < 0 or cid[1] + j >= ncells[1]:
+                continue
+            key = ((cid[0] + i)*ncells[1] + cid[1] + j)*ncells[2]
+            start = _lower_bound(keys, n_src, key + lo)
+            end = _lower_bound(keys, n_src, key + hi + 1)
+            while start < end:
+                xij = xi - sx[start]
+                yij = yi - sy[start]
+                zij = zi - sz[start]
+                if xij*xij + yij*yij + zij*zij < r2:
+                    if out != NULL:
+                        out[count] = order[start]
+                    count += 1
+                start += 1
+    return count
+
+
+cdef void _compute_distances(
+        np.int64_t* offsets, unsigned int* indices, double* dists, long n,
+        double* x, double* y, double* z, double* sx, double* sy, double* sz
+    ) nogil:
+    """Compute the distance of each neighbor in parallel, this starts its
+    own parallel region so it must not be called inside one.
+    """
+    cdef long i
+    cdef np.int64_t k
+    cdef unsigned int j
+    for i in prange(n):
+        for k in range(offsets[i], offsets[i + 1]):
+            j = indices[k]
+            dists[k] = sqrt(norm2(x[i] - sx[j], y[i] - sy[j], z[i] - sz[j]))
+
+
+def find_neighbors_of_points(src_x, src_y, src_z, x, y, z, radius,
+                             bint distances=False):
+    """Find the source points within a radius of each of the given points.
+
+    The source points are binned on a cell list and the points are searched
+    in parallel.
+
+    Parameters
+    ----------
+
+    src_x, src_y, src_z: array_like
+        Coordinates of the source points.
+    x, y, z: array_like
+        Coordinates of the query points.
+    radius: float or array_like
+        The search radius, either one for all the points or one per point.
+    distances: bool
+        Also return the distance of each neighbor.
+
+    Returns
+    -------
+
+    offsets, indices[, dists]: arrays in the compressed sparse row format,
+        the neighbors of point `i` are `indices[offsets[i]:offsets[i+1]]`
+        sorted by their index.
+    """
+    cdef np.ndarray sx = np.ascontiguousarray(src_x, dtype=np.float64)
+    cdef np.ndarray sy = np.ascontiguousarray(src_y, dtype=np.float64)
+    cdef np.ndarray sz = np.ascontiguousarray(src_z, dtype=np.float64)
+    cdef np.ndarray px = np.ascontiguousarray(x, dtype=np.float64).ravel()
+    cdef np.ndarray py = np.ascontiguousarray(y, dtype=np.float64).ravel()
+    cdef np.ndarray pz = np.ascontiguousarray(z, dtype=np.float64).ravel()
+    cdef long n = len(px), n_src = len(sx)
+    cdef np.ndarray rad = np.ascontiguousarray(
+        np.broadcast_to(np.asarray(radius, dtype=np.float64), (n,))
+    )
+    cdef np.ndarray offsets = np.zeros(n + 1, dtype=np.int64)
+    cdef np.ndarray indices, dists
+    if n == 0 or n_src == 0:
+        indices = np.zeros(0, dtype=np.uint32)
+        if distances:
+            return offsets, indices, np.zeros(0)
+        return offsets, indices
+
+    src = np.c_[sx, sy, sz]
+    cdef np.ndarray xmin = np.ascontiguousarray(src.min(axis=0))
+    cdef double extent = (src.max(axis=0) - xmin).max()
+    # Limit the number of cells so the cell keys fit in 64 bit integers.
+    cdef double cell_size = max(
+        rad.max(), extent*2.0**-20, np.finfo(float).tiny
+    )
+    # Cells are padded by one on each side.
+    cells = np.floor((src - xmin)/cell_size).astype(np.int64) + 1
+    cdef np.ndarray ncells = np.ascontiguousarray(cells.max(axis=0) + 2)
+    src_keys = (cells[:, 0]*ncells[1] + cells[:, 1])*ncells[2] + cells[:, 2]
+    cdef np.ndarray order = np.argsort(src_keys, kind='stable').astype(
+        np.uint32
+    )
+    cdef np.ndarray keys = np.ascontiguousarray(src_keys[order])
+    cdef np.ndarray ssx = sx[order], ssy = sy[order], ssz = sz[order]
+
+    cdef double* _x = <double*>px.data
+    cdef double* _y = <double*>py.data
+    cdef double* _z = <double*>pz.data
+    cdef double* _r = <double*>rad.data
+    cdef double* _sx = <double*>ssx.data
+    cdef double* _sy = <double*>ssy.data
+    cdef double* _sz = <double*>ssz.data
+    cdef double* _xmin = <double*>xmin.data
+    cdef long long* _ncells = <long long*>ncells.data
+    cdef long long* _keys = <long long*>keys.data
+    cdef unsigned int* _order = <unsigned int*>order.data
+    cdef np.int64_t* _offsets = <np.int64_t*>offsets.data
+    cdef unsigned int* _indices
+    cdef long i
+
+    with nogil, parallel():
+        for i in prange(n, schedule='dynamic', chunksize=64):
+            _offsets[i + 1] = _find_point_neighbors(
+                _x[i], _y[i], _z[i], _r[i], cell_size, _xmin, _ncells,
+                _keys, _order, n_src, _sx, _sy, _sz, NULL
+            )
+    np.cumsum(offsets, out=offsets)
+
+    indices = np.empty(offsets[n], dtype=np.uint32)
+    _indices = <unsigned int*>indices.data
+    with nogil, parallel():
+        for i in prange(n, schedule='dynamic', chunksize=64):
+            _find_point_neighbors(
+                _x[i], _y[i], _z[i], _r[i], cell_size, _xmin, _ncells,
+                _keys, _order, n_src, _sx, _sy, _sz,
+                &_indices[_offsets[i]]
+            )
+            sort(&_indices[_offsets[i]], &_indices[_offsets[i + 1]])
+
+    if distances:
+        dists = np.empty(offsets[n], dtype=np.float64)
+        with nogil:
+            _compute_distances(
+                _offsets, _indices, <double*>dists.data, n, _x, _y, _z,
+                <double*>sx.data, <double*>sy.data, <double*>sz.data
+            )
+        return offsets, indices, dists
+    return offsets, indices
+
+
 ##############################################################################
 cdef class NNPSParticleArrayWrapper:
     def __init__(self, ParticleArray pa):
@@ -1273,6 +1475,150 @@ cdef class NeighborCache:
         self._cached.data[d_idx] = 1
 
 
+###############################################################################
+
+cdef class PairDataCache:
+    """Cache of the distance, kernel and kernel gradient of the pairs of a
+    destination and source particle array.
+
+    Groups of equations that do not change the positions or the smoothing
+    lengths of the particles (see the ``cache_pair_data`` option of
+    :py:class:`pysph.sph.equation.Group`) store RIJ, WIJ and DWIJ of every
+    pair they visit here so that later groups can use them instead of
+    evaluating the kernel again.  The data is stored for each thread in the
+    order in which the neighbors were visited.  The cache is invalidated by
+    the NNPS when the particles are updated and by the acceleration evaluator
+    at the start of each evaluation and after groups that may move the
+    particles.  The cache is only used if it is enabled with the
+    ``set_use_pair_cache`` method of the NNPS.
+    """
+    def __init__(self):
+        self._n_threads = get_number_of_threads()
+        self._start_stop = UIntArray()
+        self._pid_to_tid = UIntArray()
+        self._nbrs = <void**>aligned_malloc(sizeof(void*)*self._n_threads)
+        self._rij = <void**>aligned_malloc(sizeof(void*)*self._n_threads)
+        self._wij = <void**>aligned_malloc(sizeof(void*)*self._n_threads)
+        self._dwij = <void**>aligned_malloc(sizeof(void*)*self._n_threads)
+        self.valid = False
+        self.start_idx = 0
+        self.stop_idx = 0
+        self.free()
+
+    def __dealloc__(self):
+        aligned_free(self._nbrs)
+        aligned_free(self._rij)
+        aligned_free(self._wij)
+        aligned_free(self._dwij)
+
+    #### Public protocol ################################################
+
+    cpdef reset(self, long start_idx, long stop_idx):
+        """Clear the cache before storing the pairs of the destination
+        particles in the range ``[start_idx, stop_idx)``.
+        """
+        cdef int i
+        self.valid = False
+        self.start_idx = start_idx
+        self.stop_idx = stop_idx
+        if self._pid_to_tid.length < stop_idx:
+            self._start_stop.resize(2*stop_idx)
+            self._pid_to_tid.resize(stop_idx)
+        for i in range(self._n_threads):
+            (<UIntArray>self._nbrs[i]).c_reset()
+            (<DoubleArray>self._rij[i]).c_reset()
+            (<DoubleArray>self._wij[i]).c_reset()
+            (<DoubleArray>self._dwij[i]).c_reset()
+
+    cpdef free(self):
+        """Invalidate the cache and release the memory used."""
+        cdef int i
+        cdef UIntArray nbrs
+        cdef DoubleArray rij, wij, dwij
+        self.valid = False
+        self._start_stop = UIntArray()
+        self._pid_to_tid = UIntArray()
+        self._arrays = []
+        for i in range(self._n_threads):
+            nbrs = UIntArray()
+            rij = DoubleArray()
+            wij = DoubleArray()
+            dwij = DoubleArray()
+            self._nbrs[i] = <void*>nbrs
+            self._rij[i] = <void*>rij
+            self._wij[i] = <void*>wij
+            self._dwij[i] = <void*>dwij
+            self._arrays.extend([nbrs, rij, wij, dwij])
+
+    cpdef long get_memory_usage(self):
+        """Return the number of bytes allocated by the cache."""
+        cdef long size = (self._start_stop.alloc +
+                          self._pid_to_tid.alloc)*sizeof(unsigned int)
+        cdef int i
+        for i in range(self._n_threads):
+            size += (<UIntArray>self._nbrs[i]).alloc*sizeof(unsigned int)
+            size += (<DoubleArray>self._rij[i]).alloc*sizeof(double)
+            size += (<DoubleArray>self._wij[i]).alloc*sizeof(double)
+            size += (<DoubleArray>self._dwij[i]).alloc*sizeof(double)
+        return size
+
+    cdef void begin(self, size_t d_idx, int thread_id) nogil:
+        self._pid_to_tid.data[d_idx] = thread_id
+        self._start_stop.data[2*d_idx] = \
+            (<UIntArray>self._nbrs[thread_id]).length
+
+    cdef void add(self, int thread_id, unsigned int s_idx, double rij,
+                  double wij, double* dwij) nogil:
+        (<UIntArray>self._nbrs[thread_id]).c_append(s_idx)
+        (<DoubleArray>self._rij[thread_id]).c_append(rij)
+        (<DoubleArray>self._wij[thread_id]).c_append(wij)
+        (<DoubleArray>self._dwij[thread_id]).c_append(dwij[0])
+        (<DoubleArray>self._dwij[thread_id]).c_append(dwij[1])
+        (<DoubleArray>self._dwij[thread_id]).c_append(dwij[2])
+
+    cdef void end(self, size_t d_idx, int thread_id) nogil:
+        self._start_stop.data[2*d_idx + 1] = \
+            (<UIntArray>self._nbrs[thread_id]).length
+
+    cdef unsigned int* get_pairs(self, size_t d_idx, int* n_pairs) nogil:
+        cdef size_t start = self._start_stop.data[2*d_idx]
+        cdef size_t tid = self._pid_to_tid.data[d_idx]
+        n_pairs[0] = self._start_stop.data[2*d_idx + 1] - start
+        return &(<UIntArray>self._nbrs[tid]).data[start]
+
+    cdef double* get_rij(self, size_t d_idx) nogil:
+        cdef size_t tid = self._pid_to_tid.data[d_idx]
+        return &(<DoubleArray>self._rij[tid]).data[
+            self._start_stop.data[2*d_idx]
+        ]
+
+    cdef double* get_wij(self, size_t d_idx) nogil:
+        cdef size_t tid = self._pid_to_tid.data[d_idx]
+        return &(<DoubleArray>self._wij[tid]).data[
+            self._start_stop.data[2*d_idx]
+        ]
+
+    cdef double* get_dwij(self, size_t d_idx) nogil:
+        cdef size_t tid = self._pid_to_tid.data[d_idx]
+        return &(<DoubleArray>self._dwij[tid]).data[
+            3*self._start_stop.data[2*d_idx]
+        ]
+
+    def get_pair_data(self, size_t d_idx):
+        """Return the source indices, distances, kernel values and kernel
+        gradients cached for the given destination particle.
+        """
+        cdef int n, i
+        cdef unsigned int* nbrs = self.get_pairs(d_idx, &n)
+        cdef double* rij = self.get_rij(d_idx)
+        cdef double* wij = self.get_wij(d_idx)
+        cdef double* dwij = self.get_dwij(d_idx)
+        return (np.array([nbrs[i] for i in range(n)], dtype=np.uint32),
+                np.array([rij[i] for i in range(n)]),
+                np.array([wij[i] for i in range(n)]),
+                np.array([dwij[i] for i in range(3*n)]).reshape(n, 3))
+
+
 ##############################################################################
 cdef class NNPSBase:
     def __init__(self, int dim, list particles, double radius_scale=2.0,
@@ -1470,6 +1816,9 @@ cdef class NNPS(NNPSBase):
                 _cache.append(NeighborCache(self, d_idx, s_idx))
         self.cache = _cache
 
+        self.use_pair_cache = False
+        self.pair_cache = [PairDataCache() for i in range(len(_cache))]
+
     #### Public protocol #################################################
 
     def set_in_parallel(self, bint in_parallel):
@@ -1481,9 +1830,112 @@ cdef class NNPS(NNPSBase):
             for cache in self.cache:
                 cache.update()
 
+    def set_use_pair_cache(self, bint use_pair_cache):
+        """Enable or disable the caching of pair data, it is disabled by
+        default.  The memory used by the cache is released when it is
+        disabled.
+        """
+        self.use_pair_cache = use_pair_cache
+        if not use_pair_cache:
+            for cache in self.pair_cache:
+                cache.free()
+
+    cpdef PairDataCache get_pair_cache(self, int src_index, int dst_index):
+        """Return the pair data cache for the given source and destination
+        particle arrays.
+        """
+        return self.pair_cache[dst_index*self.narrays + src_index]
+
+    cpdef invalidate_pair_cache(self):
+        """Mark the cached pair data of all the arrays as invalid."""
+        cdef PairDataCache cache
+        for cache in self.pair_cache:
+            cache.valid = False
+
     def update_domain(self):
         self.domain.update()
 
+    def get_all_neighbors(self, int src_index, int dst_index,
+                          bint distances=False):
+        """Find the neighbors of all the destination particles.
+
+        The neighbors are found in parallel and returned in the compressed
+        sparse row format.
+
+        Parameters
+        ----------
+
+        src_index: int
+            Index of the particle array to which the neighbors belong.
+        dst_index: int
+            Index of the particle array for whose particles the neighbors
+            are found.
+        distances: bool
+            Also return the distance of each neighbor.
+
+        Returns
+        -------
+
+        offsets, indices[, dists]: the neighbors of particle `i` are
+            `indices[offsets[i]:offsets[i+1]]`.
+        """
+        cdef NeighborCache cache
+        self.set_context(src_index, dst_index)
+        if self.use_cache:
+            cache = self.current_cache
+        else:
+            cache = NeighborCache(self, dst_index, src_index)
+            cache.update()
+        cache.find_all_neighbors()
+
+        cdef long n = self.particles[dst_index].get_number_of_particles()
+        cdef np.ndarray offsets = np.zeros(n + 1, dtype=np.int64)
+        cdef np.int64_t* _offsets = <np.int64_t*>offsets.data
+        cdef unsigned int* start_stop = cache._start_stop.data
+        cdef long i
+        for i in range(n):
+            _offsets[i + 1] = _offsets[i] + start_stop[2*i + 1] - \
+                start_stop[2*i]
+
+        cdef np.ndarray indices = np.empty(_offsets[n], dtype=np.uint32)
+        cdef unsigned int* _indices = <unsigned int*>indices.data
+        cdef unsigned int* pid_to_tid = cache._pid_to_tid.data
+        cdef unsigned int* nbrs
+        cdef np.int64_t k, start
+        with nogil, parallel():
+            for i in prange(n):
+                nbrs = (<UIntArray>cache._neighbors[pid_to_tid[i]]).data
+                start = start_stop[2*i]
+                for k in range(_offsets[i + 1] - _offsets[i]):
+                    _indices[_offsets[i] + k] = nbrs[start + k]
+
+        if not distances:
+            return offsets, indices
+
+        cdef NNPSParticleArrayWrapper src = self.pa_wrappers[src_index]
+        cdef NNPSParticleArrayWrapper dst = self.pa_wrappers[dst_index]
+        cdef np.ndarray dists = np.empty(_offsets[n], dtype=np.float64)
+        with nogil:
+            _compute_distances(
+                _offsets, _indices, <double*>dists.data, n, dst.x.data,
+                dst.y.data, dst.z.data, src.x.data, src.y.data, src.z.data
+            )
+        return offsets, indices, dists
+
+    def get_neighbors_of_points(self, x, y, z, radius, int src_index=0,
+                                bint distances=False):
+        """Find the particles of the given array within a radius of each of
+        the given points.
+
+        The points need not be in a particle array, see
+        :py:func:`find_neighbors_of_points` for the arguments and the return
+        value.
+        """
+        cdef ParticleArray src = self.particles[src_index]
+        return find_neighbors_of_points(
+            src.x, src.y, src.z, x, y, z, radius, distances
+        )
+
     cpdef update(self):
         """Update the local data after particles have moved.
 
@@ -1521,6 +1973,8 @@ cdef class NNPS(NNPSBase):
             # bin the particles
             self._bin( pa_index=i, indices=indices )
 
+        self.invalidate_pair_cache()
+
         if self.use_cache:
             for cache in self.cache:
                 cache.update()
@@ -0,0 +1,307 @@
+# cython: language_level=3, embedsignature=True
+# distutils: language=c++
+"""NUMA aware placement of the particle arrays.
+
+On a machine with several sockets the memory of a page is placed on the NUMA
+node of the thread that first writes to it.  The properties of a
+:py:class:`pysph.base.particle_array.ParticleArray` are created and filled by
+a single thread so all their pages end up on one node and the threads of the
+other sockets read them remotely in the parallel loops.
+
+:py:func:`first_touch` moves the data of a carray to a newly allocated
+buffer that is copied in parallel with the same static partition of the
+particles over the OpenMP threads as a ``prange`` with ``schedule='static'``
+so each page is placed on the node of the thread that later computes on
+those particles.  :py:class:`FirstTouch` does this for all the properties of
+a set of particle arrays and redoes it for the carrays that have been
+reallocated or have changed size significantly, for example after
+particles were added or removed and the arrays aligned.  Reordering the
+particles in place does not move the pages so these are not touched again.
+:py:func:`pin_threads` binds each OpenMP thread to a CPU so the threads do
+not migrate away from their memory.
+
+The carrays are given a new buffer so any numpy array obtained from them
+before must be fetched again, ``pa.x`` always returns a fresh view.
+
+This is enabled for a simulation with the ``--numa`` command line option
+which also uses the static OpenMP schedule for the compute loops.
+"""
+
+import os
+import sys
+
+from cython.parallel import parallel, prange, threadid
+from libc.string cimport memcpy
+
+from cyarray.carray cimport (BaseArray, IntArray, UIntArray, LongArray,
+    FloatArray, DoubleArray, aligned_malloc, aligned_free)
+
+from pysph.base.particle_array cimport ParticleArray
+from pysph.base.nnps_base import get_number_of_threads
+
+IF OPENMP:
+    cimport openmp
+
+
+cdef extern from *:
+    """
+    #if defined(__linux__)
+    #include <sched.h>
+    static int pysph_pin_to_cpu(int cpu) {
+        cpu_set_t cpus;
+        CPU_ZERO(&cpus);
+        CPU_SET(cpu, &cpus);
+        return sched_setaffinity(0, sizeof(cpus), &cpus);
+    }
+    #else
+    static int pysph_pin_to_cpu(int cpu) {
+        return -1;
+    }
+    #endif
+
+    #if defined(__GLIBC__)
+    #include <malloc.h>
+    static void pysph_fix_mmap_threshold() {
+        /* Large blocks are always mmapped so that they start untouched,
+           glibc otherwise raises the threshold when these are freed. */
+        mallopt(M_MMAP_THRESHOLD, 128*1024);
+    }
+    #else
+    static void pysph_fix_mmap_threshold() {}
+    #endif
+    """
+    int pysph_pin_to_cpu(int cpu) nogil
+    void pysph_fix_mmap_threshold()
+
+
+cdef bint _mmap_threshold_fixed = False
+
+
+cdef inline void _get_static_block(long n, int n_threads, int tid,
+                                   long* start, long* end) nogil:
+    """The iterations given to thread `tid` by a static schedule without a
+    chunksize: contiguous blocks differing by at most one iteration.
+    """
+    cdef long q = n//n_threads
+    cdef long r = n - q*n_threads
+    if tid < r:
+        start[0] = tid*(q + 1)
+        end[0] = start[0] + q + 1
+    else:
+        start[0] = tid*q + r
+        end[0] = start[0] + q
+
+
+cdef void _parallel_copy(char* dst, char* src, long n, long item_bytes,
+                         int n_threads) nogil:
+    cdef int tid, nt
+    cdef long start, end
+    with parallel(num_threads=n_threads):
+        tid = threadid()
+        IF OPENMP:
+            nt = openmp.omp_get_num_threads()
+        ELSE:
+            nt = 1
+        _get_static_block(n, nt, tid, &start, &end)
+        if end > start:
+            memcpy(dst + start*item_bytes, src + start*item_bytes,
+                   (end - start)*item_bytes)
+
+
+cdef void* _set_data(BaseArray arr, void* data):
+    """Set the data of the carray, update its numpy array and return the
+    old data.
+    """
+    cdef void* old
+    if isinstance(arr, DoubleArray):
+        old = (<DoubleArray>arr).data
+        (<DoubleArray>arr).data = <double*>data
+        (<DoubleArray>arr)._setup_npy_array()
+    elif isinstance(arr, FloatArray):
+        old = (<FloatArray>arr).data
+        (<FloatArray>arr).data = <float*>data
+        (<FloatArray>arr)._setup_npy_array()
+    elif isinstance(arr, LongArray):
+        old = (<LongArray>arr).data
+        (<LongArray>arr).data = <long*>data
+        (<LongArray>arr)._setup_npy_array()
+    elif isinstance(arr, IntArray):
+        old = (<IntArray>arr).data
+        (<IntArray>arr).data = <int*>data
+        (<IntArray>arr)._setup_npy_array()
+    else:
+        old = (<UIntArray>arr).data
+        (<UIntArray>arr).data = <unsigned int*>data
+        (<UIntArray>arr)._setup_npy_array()
+    return old
+
+
+cdef bint _is_view(BaseArray arr):
+    if isinstance(arr, DoubleArray):
+        return (<DoubleArray>arr)._parent is not None
+    elif isinstance(arr, FloatArray):
+        return (<FloatArray>arr)._parent is not None
+    elif isinstance(arr, LongArray):
+        return (<LongArray>arr)._parent is not None
+    elif isinstance(arr, IntArray):
+        return (<IntArray>arr)._parent is not None
+    else:
+        return (<UIntArray>arr)._parent is not None
+
+
+cpdef long get_data_address(BaseArray arr):
+    """Return the address of the data of the carray."""
+    return arr.get_npy_array().ctypes.data
+
+
+cpdef bint first_touch(BaseArray arr, int stride=1, int n_threads=0):
+    """Move the data of the carray to a new buffer copied in parallel.
+
+    The particles are split over the threads as done by a static schedule
+    so the pages are placed on the NUMA node of the thread that works on
+    them.  Returns False if the array is empty or a view of another array.
+
+    Parameters
+    ----------
+
+    arr: BaseArray: the carray.
+    stride: int: number of elements for each particle.
+    n_threads: int: number of threads, all the threads are used if this is
+        zero.
+    """
+    global _mmap_threshold_fixed
+    cdef long length = arr.length
+    cdef long item_bytes = arr.get_npy_array().itemsize
+    cdef char* src
+    cdef void* dst
+    if length == 0 or _is_view(arr):
+        return False
+    if not _mmap_threshold_fixed:
+        pysph_fix_mmap_threshold()
+        _mmap_threshold_fixed = True
+    if n_threads <= 0:
+        n_threads = get_number_of_threads()
+    src = <char*><long>get_data_address(arr)
+    dst = aligned_malloc(max(arr.alloc, length)*item_bytes)
+    with nogil:
+        _parallel_copy(<char*>dst, src, length//stride, stride*item_bytes,
+                       n_threads)
+    aligned_free(_set_data(arr, dst))
+    return True
+
+
+cpdef stream_triad(DoubleArray a, DoubleArray b, DoubleArray c,
+                   double scalar):
+    """Compute ``a = b + scalar*c`` in parallel with a static schedule.
+
+    This is the memory bound STREAM triad used to measure the bandwidth
+    with and without :py:func:`first_touch`.
+    """
+    cdef long i, n = min(a.length, b.length, c.length)
+    cdef double* pa = a.data
+    cdef double* pb = b.data
+    cdef double* pc = c.data
+    with nogil:
+        for i in prange(n, schedule='static'):
+            pa[i] = pb[i] + scalar*pc[i]
+
+
+def get_thread_cpus(cpus=None, n_threads=0):
+    """Return the CPU for each thread, consecutive threads are given
+    consecutive CPUs of those available to the process.
+    """
+    if cpus is None:
+        cpus = sorted(os.sched_getaffinity(0))
+    if n_threads <= 0:
+        n_threads = get_number_of_threads()
+    return [cpus[i % len(cpus)] for i in range(n_threads)]
+
+
+def pin_threads(cpus=None):
+    """Bind each OpenMP thread to a CPU.
+
+    This is only done on Linux and not when the OpenMP runtime already binds
+    the threads (``OMP_PROC_BIND`` or ``GOMP_CPU_AFFINITY`` are set).
+    Returns the CPU of each thread or None if the threads are not pinned.
+
+    Parameters
+    ----------
+
+    cpus: list: the CPUs to use, defaults to those available to the process.
+    """
+    cdef int i, tid, n_threads
+    cdef IntArray tcpus, status
+    cdef int* tcpus_data
+    cdef int* status_data
+    if not sys.platform.startswith('linux'):
+        return None
+    if 'OMP_PROC_BIND' in os.environ or 'GOMP_CPU_AFFINITY' in os.environ:
+        return None
+    thread_cpus = get_thread_cpus(cpus)
+    n_threads = len(thread_cpus)
+    tcpus = IntArray(n_threads)
+    status = IntArray(n_threads)
+    for i in range(n_threads):
+        tcpus.data[i] = thread_cpus[i]
+        status.data[i] = -1
+    tcpus_data = tcpus.data
+    status_data = status.data
+    with nogil, parallel(num_threads=n_threads):
+        tid = threadid()
+        status_data[tid] = pysph_pin_to_cpu(tcpus_data[tid])
+    if status.get_npy_array().any():
+        return None
+    return thread_cpus
+
+
+class FirstTouch(object):
+    """Place the properties of the particle arrays on the NUMA node of the
+    threads that compute on them, see :py:func:`first_touch`.
+    """
+    def __init__(self, particles, n_threads=0, tolerance=0.1):
+        """
+        Parameters
+        ----------
+
+        particles: list: the particle arrays.
+        n_threads: int: number of threads, all the threads are used if this
+            is zero.
+        tolerance: float: the carrays are touched again when their length
+            changes by more than this fraction.
+        """
+        self.particles = particles
+        self.n_threads = n_threads
+        self.tolerance = tolerance
+        self.n_touched = 0
+        # (address, length) of each carray when last touched.
+        self._state = {}
+
+    def _needs_touch(self, key, arr):
+        if key not in self._state:
+            return True
+        address, length = self._state[key]
+        if address != get_data_address(arr):
+            return True
+        return abs(arr.length - length) > self.tolerance*max(length, 1)
+
+    def _touch(self, force):
+        cdef ParticleArray pa
+        for pa in self.particles:
+            for name, arr in pa.properties.items():
+                key = (pa.name, name)
+                if not force and not self._needs_touch(key, arr):
+                    continue
+                stride = pa.stride.get(name, 1)
+                if first_touch(arr, stride, self.n_threads):
+                    self.n_touched += 1
+                self._state[key] = (get_data_address(arr), arr.length)
+
+    def touch(self):
+        """Touch all the properties of the particle arrays."""
+        self._touch(force=True)
+
+    def update(self):
+        """Touch the properties that have been reallocated or changed size
+        since they were last touched.
+        """
+        self._touch(force=False)
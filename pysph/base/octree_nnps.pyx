@@ -97,6 +97,11 @@ cdef class OctreeNNPS(NNPS):
         self._get_neighbors(x, y, z, h, src_x_ptr, src_y_ptr, src_z_ptr,
                 src_h_ptr, nbrs, self.current_tree)
 
+        filter_neighbors(
+            nbrs, orig_length, src_x_ptr, src_y_ptr, src_z_ptr, src_h_ptr,
+            x, y, z, self.radius_scale2*h*h, self.radius_scale2
+        )
+
         if self.sort_gids:
             self._sort_neighbors(
                 &nbrs.data[orig_length], nbrs.length - orig_length, s_gid
@@ -109,15 +114,12 @@ cdef class OctreeNNPS(NNPS):
     cdef void _get_neighbors(self, double q_x, double q_y, double q_z, double q_h,
             double* src_x_ptr, double* src_y_ptr, double* src_z_ptr, double* src_h_ptr,
             UIntArray nbrs, cOctreeNode* node) nogil:
-        """Find neighbors recursively"""
+        """Append the particles of the leaves in range recursively"""
         cdef double x_centre = node.xmin[0] + node.length/2
         cdef double y_centre = node.xmin[1] + node.length/2
         cdef double z_centre = node.xmin[2] + node.length/2
 
-        cdef u_int i, j, k
-        cdef double hi2 = self.radius_scale2*q_h*q_h
-        cdef double hj2 = 0
-        cdef double xij2 = 0
+        cdef u_int i
 
         cdef double eff_radius = 0.5*(node.length) + \
                 fmax(self.radius_scale*q_h, self.radius_scale*node.hmax)
@@ -128,16 +130,12 @@ cdef class OctreeNNPS(NNPS):
             return
 
         if node.is_leaf:
-            for i from 0<=i<node.num_particles:
-                k = self.current_pids[node.start_index + i]
-                hj2 = self.radius_scale2*src_h_ptr[k]*src_h_ptr[k]
-                xij2 = norm2(
-                        src_x_ptr[k] - q_x,
-                        src_y_ptr[k] - q_y,
-                        src_z_ptr[k] - q_z
-                        )
-                if (xij2 < hi2) or (xij2 < hj2):
-                    nbrs.c_append(k)
+            # The candidates are filtered by the caller.
+            if node.num_particles > 0:
+                append_candidates(
+                    nbrs, &self.current_pids[node.start_index],
+                    node.num_particles
+                )
             return
 
         for i from 0<=i<8:
@@ -63,6 +63,34 @@ cpdef int get_remote_tag():
 cpdef int get_ghost_tag():
     return Ghost
 
+cdef _reserve(BaseArray arr, long size):
+    """Grow the capacity of the array geometrically so that repeatedly
+    adding a few particles does not reallocate every property each time.
+    """
+    if size > arr.alloc:
+        arr.reserve(max(size, arr.alloc + arr.alloc//2))
+
+
+cdef _move_particles(dict properties, dict strides, LongArray dst,
+                     LongArray src):
+    """Copy the particles at the indices `src` to the indices `dst` for all
+    the properties.  Only the particles that move are touched.
+    """
+    cdef BaseArray arr
+    cdef numpy.ndarray nparr
+    cdef int stride
+    if dst.length == 0:
+        return
+    cdef numpy.ndarray d_idx = dst.get_npy_array()
+    cdef numpy.ndarray s_idx = src.get_npy_array()
+    for name, arr in properties.items():
+        stride = strides.get(name, 1)
+        nparr = arr.get_npy_array()
+        if stride != 1:
+            nparr = nparr.reshape(-1, stride)
+        nparr[d_idx] = nparr[s_idx]
+
+
 cdef class ParticleArray:
     """
     Class to represent a collection of particles.
@@ -438,8 +466,11 @@ cdef class ParticleArray:
         """ Remove particles whose indices are given in index_list.
 
         We repeatedly interchange the values of the last element and values from
-        the index_list and reduce the size of the array by one. This is done for
-        every property that is being maintained.
+        the index_list and reduce the size of the array by one. This is done
+        separately for the real and the non-real particles so an aligned
+        array remains aligned. The moves are computed once and applied to
+        every property that is being maintained, so the cost is proportional
+        to the number of particles removed and not the size of the array.
 
         Parameters
         ----------
@@ -456,10 +487,21 @@ cdef class ParticleArray:
             if index_list.length > number of particles
                 raise ValueError
 
-            sorted_indices <- index_list sorted in ascending order.
+            sorted_indices <- unique index_list sorted in ascending order.
+
+            for id in reversed(sorted_indices) with id >= num_real_particles:
+                record a move from the last particle to id
+                reduce the number of particles by one
 
-            for every every array in property_array
-                array.remove(sorted_indices)
+            for id in reversed(sorted_indices) with id < num_real_particles:
+                record a move from the last real particle to id
+                reduce the number of real particles by one
+
+            record moves of the last particles into the gap left after
+            the real particles
+
+            for every array in property_array
+                apply the moves and resize the array
 
         """
         if self.gpu is not None and self.backend is not 'cython':
@@ -481,24 +523,68 @@ cdef class ParticleArray:
             index_list.set_data(indices)
 
         cdef str msg
-        cdef numpy.ndarray sorted_indices
+        cdef LongArray sorted_indices
+        cdef LongArray dst, src
         cdef BaseArray prop_array
-        cdef int num_arrays, i
-        cdef list property_arrays
+        cdef long i, idx, last, n_remove, n_real, gap_start, n_move
+        cdef long num_particles = self.get_number_of_particles()
+        cdef dict origin = {}
 
-        if index_list.length > self.get_number_of_particles():
+        if index_list.length > num_particles:
             msg = 'Number of particles to be removed is greater than'
             msg += 'number of particles in array'
             raise ValueError(msg)
 
-        sorted_indices = numpy.sort(index_list.get_npy_array())
-        num_arrays = len(self.properties)
-
+        sorted_indices = LongArray()
+        sorted_indices.extend(
+            numpy.unique(index_list.get_npy_array()).astype(numpy.int64)
+        )
+        n_remove = sorted_indices.length
+        n_real = min(self.num_real_particles, num_particles)
+
+        # The real particles are at the start of an aligned array.  Holes
+        # are filled separately in the real and non-real parts so the array
+        # stays aligned and only O(n_remove) particles are moved.  `origin`
+        # maps a position to the original index of the particle now there.
+        last = num_particles - 1
+        for i in range(n_remove - 1, -1, -1):
+            idx = sorted_indices.data[i]
+            if idx < n_real:
+                break
+            if idx <= last:
+                if idx != last:
+                    origin[idx] = origin.get(last, last)
+                last -= 1
+
+        gap_start = n_real
+        for i in range(n_remove - 1, -1, -1):
+            idx = sorted_indices.data[i]
+            if idx < n_real:
+                gap_start -= 1
+                if idx != gap_start:
+                    origin[idx] = origin.get(gap_start, gap_start)
+
+        # Fill the gap left after the real particles with the last ones.
+        n_move = min(n_real - gap_start, last + 1 - n_real)
+        for i in range(n_move):
+            origin[gap_start + i] = origin.get(last - i, last - i)
+        num_particles = last + 1 - (n_real - gap_start)
+
+        dst = LongArray(len(origin))
+        src = LongArray(len(origin))
+        dst.c_reset()
+        src.c_reset()
+        for key, value in origin.items():
+            if key < num_particles and key != value:
+                dst.c_append(key)
+                src.c_append(value)
+
+        _move_particles(self.properties, self.stride, dst, src)
         for name, prop_array in self.properties.items():
             stride = self.stride.get(name, 1)
-            prop_array.remove(sorted_indices, 1, stride)
+            prop_array.resize(num_particles*stride)
 
-        if index_list.length > 0 and align:
+        if n_remove > 0 and align:
             self.align_particles()
 
     cpdef remove_tagged_particles(self, int tag, bint align=True):
@@ -583,6 +669,7 @@ cdef class ParticleArray:
             arr = <BaseArray>PyDict_GetItem(self.properties, prop)
             stride = self.stride.get(prop, 1)
 
+            _reserve(arr, new_num_particles*stride)
             if PyDict_Contains(particle_props, prop)== 1:
                 d_type = arr.get_npy_array().dtype
                 s_arr = numpy.asarray(particle_props[prop], dtype=d_type)
@@ -681,6 +768,7 @@ cdef class ParticleArray:
         for key in self.properties:
             stride = self.stride.get(key, 1)
             arr = self.properties[key]
+            _reserve(arr, new_size*stride)
             arr.resize(new_size*stride)
             nparr = arr.get_npy_array()
             nparr[old_size*stride:] = self.default_values[key]
@@ -762,6 +850,96 @@ cdef class ParticleArray:
         else:
             return tuple(result)
 
+    def get_views(self, props=None, only_real_particles=True,
+                  readonly=False):
+        """Return a dictionary of numpy views of the given properties.
+
+        No data is copied, the views share memory with the underlying
+        carrays.  Properties with a stride are reshaped to (n, stride).
+
+        Parameters
+        ----------
+
+        props : list
+            names of the properties/constants, all properties by default.
+        only_real_particles : bool
+            return views of only the real particles.
+        readonly : bool
+            if True, the views are marked as not writeable.
+
+        Notes
+        -----
+
+        Like the arrays returned by `get`, the views are invalidated when
+        particles are added or removed.
+
+        """
+        cdef dict result = {}
+        cdef str prop
+        cdef int stride
+        cdef long n
+        if props is None:
+            props = list(self.properties.keys())
+        n = self.get_number_of_particles()
+        if only_real_particles:
+            n = self.num_real_particles
+        for prop in props:
+            self._check_property(prop)
+            if prop in self.properties:
+                stride = self.stride.get(prop, 1)
+                view = self.properties[prop].get_npy_array()[:n*stride]
+                if stride != 1:
+                    view = view.reshape(n, stride)
+            else:
+                view = self.constants[prop].get_npy_array()[:]
+            if readonly:
+                view.flags.writeable = False
+            result[prop] = view
+        return result
+
+    def get_block(self, props, only_real_particles=True,
+                  dtype=numpy.float64):
+        """Return the given properties interleaved in one structured array
+        with a record for each particle.
+
+        Properties with a stride are stored as sub-arrays.  As all the fields
+        have the same type, the block can be viewed as a 2D array of shape
+        (n, ncols) without a copy, for example to export it using the buffer
+        protocol or DLPack::
+
+            >>> block = pa.get_block(['x', 'y', 'u', 'v'])
+            >>> data = block.view(numpy.float64).reshape(len(block), -1)
+            >>> data.__dlpack__()
+
+        Parameters
+        ----------
+
+        props : list
+            names of the properties.
+        only_real_particles : bool
+            use only the real particles.
+        dtype : numpy dtype
+            the type of all the fields in the block.
+
+        """
+        cdef dict views = self.get_views(props, only_real_particles)
+        cdef list fields = []
+        cdef str prop
+        for prop in props:
+            if prop not in self.properties:
+                raise ValueError('%s is not a property.' % prop)
+            stride = self.stride.get(prop, 1)
+            if stride == 1:
+                fields.append((prop, dtype))
+            else:
+                fields.append((prop, dtype, (stride,)))
+        n = self.num_real_particles if only_real_particles else \
+            self.get_number_of_particles()
+        block = numpy.empty(n, dtype=fields)
+        for prop in props:
+            block[prop] = views[prop]
+        return block
+
     def set_device_helper(self, gpu):
         """Set the device helper to push/pull from a hardware accelerator.
         """
@@ -1116,13 +1294,10 @@ cdef class ParticleArray:
                     index_arr[i] = i
 
              # we now have the new index assignment.
-             # swap the required values as needed.
+             # gather the moved values as needed.
+             moved = [i for i in range(n) if index_arr[i] != i]
              for every property array:
-                 for i from 0 to n:
-                     if index_arr[i] != i:
-                         tmp = prop[i]
-                         prop[i] = prop[index_arr[i]]
-                         prop[index_arr[i]] = tmp
+                 prop[moved] = prop[index_arr[moved]]
         """
         if self.gpu is not None and self.backend is not 'cython':
             self.gpu.align_particles()
@@ -1132,7 +1307,7 @@ cdef class ParticleArray:
         cdef size_t next_insert
         cdef int tmp
         cdef IntArray tag_arr
-        cdef LongArray index_array
+        cdef LongArray index_array, dst, src
         cdef BaseArray arr
         cdef long num_real_particles = 0
         cdef long num_moves = 0
@@ -1161,13 +1336,19 @@ cdef class ParticleArray:
                 index_array.data[i] = i
 
         self.num_real_particles = num_real_particles
-        # we now have the aligned indices. Rearrange the particles
-        # accordingly.
+        # we now have the aligned indices. Rearrange only the particles that
+        # move.
 
         if num_moves > 0:
-            for name, arr in self.properties.items():
-                stride = self.stride.get(name, 1)
-                arr.c_align_array(index_array, stride)
+            dst = LongArray(2*num_moves)
+            src = LongArray(2*num_moves)
+            dst.c_reset()
+            src.c_reset()
+            for i in range(num_particles):
+                if index_array.data[i] != <long>i:
+                    dst.c_append(i)
+                    src.c_append(index_array.data[i])
+            _move_particles(self.properties, self.stride, dst, src)
 
     cpdef ParticleArray empty_clone(self, props=None):
         """Creates an empty clone of the particle array
@@ -1219,14 +1400,19 @@ cdef class ParticleArray:
         Note that this does not check for any constants but only properties.
 
         If the optional props argument is passed it only checks for these.
+        Properties whose stride differs from that of the source are
+        recreated.
         """
         prop_names = props if props else src.properties.keys()
 
         for prop_name in prop_names:
+            stride = src.stride.get(prop_name, 1)
+            if (prop_name in self.properties and
+                    self.stride.get(prop_name, 1) != stride):
+                self.remove_property(prop_name)
             if prop_name not in self.properties:
                 prop_type = src.properties[prop_name].get_c_type()
                 prop_default = src.default_values[prop_name]
-                stride = src.stride.get(prop_name, 1)
                 self.add_property(
                     name=prop_name, type=prop_type,
                     default=prop_default, stride=stride
@@ -1413,11 +1599,44 @@ cdef class ParticleArray:
         if self.properties.has_key(prop_name):
             self.properties.pop(prop_name)
             self.default_values.pop(prop_name)
+            self.stride.pop(prop_name, None)
         if prop_name in self.output_property_arrays:
             self.output_property_arrays.remove(prop_name)
         if self.gpu is not None:
             return self.gpu.remove_prop(prop_name)
 
+    def set_property_type(self, str name, str type):
+        """Change the data type of the given property.
+
+        The existing data is converted to the new type and the stride and
+        default value of the property are retained.  This is useful to store
+        some properties with a lower precision to reduce the memory used.
+
+        Parameters
+        ----------
+
+        name : str
+            name of the property.
+        type : str
+            the new data type of the property ('double', 'float' etc.)
+
+        """
+        cdef BaseArray old, arr
+        if name not in self.properties:
+            msg = 'property %s not present' % name
+            raise AttributeError(msg)
+        old = self.properties[name]
+        if old.get_c_type() == type:
+            return
+        arr = self._create_carray(type, old.length, self.default_values[name])
+        if old.length > 0:
+            arr.get_npy_array()[:] = old.get_npy_array()
+        self.properties[name] = arr
+        if self.gpu is not None:
+            self.gpu.remove_prop(name)
+            self.gpu.add_prop(name, arr)
+            self.gpu.push(name)
+
     def update_min_max(self, props=None):
         """Update the min,max values of all properties """
         if self.gpu is not None and self.backend is not 'cython':
@@ -133,9 +133,7 @@ cdef class SpatialHashNNPS(NNPS):
         cdef int num_boxes = self._neighbor_boxes(c_x, c_y, c_z,
                 x_boxes, y_boxes, z_boxes)
 
-        cdef double xij2 = 0
         cdef double hi2 = self.radius_scale2*h*h
-        cdef double hj2 = 0
 
         for i from 0<=i<num_boxes:
             candidate_cell = self.current_hash.get(x_boxes[i], y_boxes[i], z_boxes[i])
@@ -143,16 +141,13 @@ cdef class SpatialHashNNPS(NNPS):
                 continue
             candidates = candidate_cell.get_indices()
             candidate_size = candidates.size()
-            for j from 0<=j<candidate_size:
-                k = (candidates[0])[j]
-                hj2 = self.radius_scale2*src_h_ptr[k]*src_h_ptr[k]
-                xij2 = norm2(
-                        src_x_ptr[k] - x,
-                        src_y_ptr[k] - y,
-                        src_z_ptr[k] - z
-                        )
-                if (xij2 < hi2) or (xij2 < hj2):
-                    nbrs.c_append(k)
+            if candidate_size > 0:
+                append_candidates(nbrs, candidates.data(), candidate_size)
+
+        filter_neighbors(
+            nbrs, orig_length, src_x_ptr, src_y_ptr, src_z_ptr, src_h_ptr,
+            x, y, z, hi2, self.radius_scale2
+        )
 
         if self.sort_gids:
             self._sort_neighbors(
@@ -342,9 +337,7 @@ cdef class ExtendedSpatialHashNNPS(NNPS):
         cdef int num_boxes = self._neighbor_boxes(c_x, c_y, c_z,
                 x_boxes, y_boxes, z_boxes, h)
 
-        cdef double xij2 = 0
         cdef double hi2 = self.radius_scale2*h*h
-        cdef double hj2 = 0
 
         for i from 0<=i<num_boxes:
             candidate_cell = self.current_hash.get(x_boxes[i], y_boxes[i], z_boxes[i])
@@ -352,16 +345,13 @@ cdef class ExtendedSpatialHashNNPS(NNPS):
                 continue
             candidates = candidate_cell.get_indices()
             candidate_size = candidates.size()
-            for j from 0<=j<candidate_size:
-                k = (candidates[0])[j]
-                hj2 = self.radius_scale2*src_h_ptr[k]*src_h_ptr[k]
-                xij2 = norm2(
-                        src_x_ptr[k] - x,
-                        src_y_ptr[k] - y,
-                        src_z_ptr[k] - z
-                        )
-                if (xij2 < hi2) or (xij2 < hj2):
-                    nbrs.c_append(k)
+            if candidate_size > 0:
+                append_candidates(nbrs, candidates.data(), candidate_size)
+
+        filter_neighbors(
+            nbrs, orig_length, src_x_ptr, src_y_ptr, src_z_ptr, src_h_ptr,
+            x, y, z, hi2, self.radius_scale2
+        )
 
         free(x_boxes)
         free(y_boxes)
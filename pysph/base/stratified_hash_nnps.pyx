@@ -148,9 +148,7 @@ cdef class StratifiedHashNNPS(NNPS):
         cdef vector[unsigned int] *candidates
         cdef int candidate_size = 0
 
-        cdef double xij2 = 0
         cdef double hi2 = self.radius_scale2*h*h
-        cdef double hj2 = 0
 
         cdef double h_max
         cdef int H, mask_len, num_boxes
@@ -191,21 +189,18 @@ cdef class StratifiedHashNNPS(NNPS):
                     continue
                 candidates = candidate_cell.get_indices()
                 candidate_size = candidates.size()
-                for k from 0<=k<candidate_size:
-                    n = (candidates[0])[k]
-                    hj2 = self.radius_scale2*src_h_ptr[n]*src_h_ptr[n]
-                    xij2 = norm2(
-                            src_x_ptr[n] - x,
-                            src_y_ptr[n] - y,
-                            src_z_ptr[n] - z
-                            )
-                    if (xij2 < hi2) or (xij2 < hj2):
-                        nbrs.c_append(n)
+                if candidate_size > 0:
+                    append_candidates(nbrs, candidates.data(), candidate_size)
 
             free(x_boxes)
             free(y_boxes)
             free(z_boxes)
 
+        filter_neighbors(
+            nbrs, orig_length, src_x_ptr, src_y_ptr, src_z_ptr, src_h_ptr,
+            x, y, z, hi2, self.radius_scale2
+        )
+
         if self.sort_gids:
             self._sort_neighbors(
                 &nbrs.data[orig_length], nbrs.length - orig_length, s_gid
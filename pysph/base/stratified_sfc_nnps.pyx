@@ -222,9 +222,7 @@ cdef class StratifiedSFCNNPS(NNPS):
         cdef unsigned int i, pid
         cdef int idx
 
-        cdef double xij2 = 0
         cdef double hi2 = self.radius_scale2 * h * h
-        cdef double hj2 = 0
 
         cdef uint64_t key
 
@@ -267,20 +265,14 @@ cdef class StratifiedSFCNNPS(NNPS):
 
             while idx < num_particles and self.current_keys[idx] == key:
                 pid = self.current_pids[idx]
-
-                hj2 = self.radius_scale2*src_h_ptr[pid]*src_h_ptr[pid]
-
-                xij2 = norm2(
-                    src_x_ptr[pid] - x,
-                    src_y_ptr[pid] - y,
-                    src_z_ptr[pid] - z
-                    )
-
-                if (xij2 < hi2) or (xij2 < hj2):
-                    nbrs.c_append(pid)
-
+                nbrs.c_append(pid)
                 idx += 1
 
+        filter_neighbors(
+            nbrs, orig_length, src_x_ptr, src_y_ptr, src_z_ptr, src_h_ptr,
+            x, y, z, hi2, self.radius_scale2
+        )
+
         if self.sort_gids:
             self._sort_neighbors(
                 &nbrs.data[orig_length], nbrs.length - orig_length, s_gid
@@ -9,7 +9,8 @@ from pysph.base.kernels import (CubicSpline, Gaussian, QuinticSpline,
                                 SuperGaussian, WendlandQuintic,
                                 WendlandQuinticC4, WendlandQuinticC6,
                                 WendlandQuinticC2_1D, WendlandQuinticC4_1D,
-                                WendlandQuinticC6_1D, get_compiled_kernel)
+                                WendlandQuinticC6_1D, TabulatedKernel,
+                                get_compiled_kernel)
 
 
 ###############################################################################
@@ -515,5 +516,142 @@ class TestWendlandQuinticC6_1D(TestCubicSpline1D):
         self.check_kernel_at_origin(55.0 / 64.0)
 
 
+class TestTabulatedQuinticSpline2D(TestCubicSpline2D):
+    kernel_factory = staticmethod(
+        lambda: TabulatedKernel(QuinticSpline(dim=2), interpolation='cubic')
+    )
+
+    def test_simple(self):
+        self.check_kernel_at_origin(7.0 * 66.0 / (478.0 * np.pi))
+
+
+class TestTabulatedCubicSpline3D(TestGaussian3D):
+    kernel_factory = staticmethod(
+        lambda: TabulatedKernel(CubicSpline(dim=3), interpolation='cubic')
+    )
+
+    def test_simple(self):
+        self.check_kernel_at_origin(1. / np.pi)
+
+
+###############################################################################
+# `TestKernelAndGradient` class.
+###############################################################################
+class TestKernelAndGradient(TestCase):
+    def _get_kernels(self):
+        classes = (CubicSpline, Gaussian, QuinticSpline, SuperGaussian,
+                   WendlandQuintic, WendlandQuinticC4, WendlandQuinticC6,
+                   WendlandQuinticC2_1D, WendlandQuinticC4_1D,
+                   WendlandQuinticC6_1D)
+        for cls in classes:
+            for dim in (1, 2, 3):
+                try:
+                    kernel = cls(dim=dim)
+                except ValueError:
+                    continue
+                yield kernel
+                yield TabulatedKernel(kernel)
+
+    def test_fused_method_matches_separate_methods(self):
+        for kernel in self._get_kernels():
+            h = 1.1
+            for rij in np.linspace(0.0, 1.1 * kernel.radius_scale * h, 41):
+                # Given
+                xij = [0.6 * rij, 0.8 * rij, 0.0]
+                expect = [0.0, 0.0, 0.0]
+                kernel.gradient(xij, rij, h, expect)
+
+                # When
+                grad = [0.0, 0.0, 0.0]
+                deriv = [0.0, 0.0]
+                w = kernel.kernel_and_gradient(xij, rij, h, grad, deriv)
+
+                # Then
+                msg = '%s %d %s' % (kernel.__class__.__name__, kernel.dim,
+                                    rij)
+                self.assertAlmostEqual(w, kernel.kernel(xij, rij, h), 14,
+                                       msg)
+                self.assertAlmostEqual(deriv[0], kernel.dwdq(rij, h), 14,
+                                       msg)
+                self.assertAlmostEqual(deriv[1],
+                                       kernel.gradient_h(xij, rij, h), 14,
+                                       msg)
+                np.testing.assert_allclose(grad, expect, atol=1e-14)
+
+    def test_gradient_h_is_derivative_wrt_h(self):
+        for kernel in self._get_kernels():
+            if isinstance(kernel, TabulatedKernel):
+                continue
+            h = 1.1
+            eps = 1e-6
+            for rij in np.linspace(0.05, 0.95 * kernel.radius_scale * h, 9):
+                xij = [rij, 0.0, 0.0]
+                expect = (kernel.kernel(xij, rij, h + eps) -
+                          kernel.kernel(xij, rij, h - eps)) / (2 * eps)
+                self.assertAlmostEqual(
+                    kernel.gradient_h(xij, rij, h), expect, 6,
+                    kernel.__class__.__name__
+                )
+
+
+###############################################################################
+# `TestTabulatedKernel` class.
+###############################################################################
+class TestTabulatedKernel(TestCase):
+    def _check_accuracy(self, kernel, interpolation, tol):
+        # Given
+        tab = TabulatedKernel(kernel, n_points=1000,
+                              interpolation=interpolation)
+        wrapper = get_compiled_kernel(tab)
+        h = 1.3
+        r = np.linspace(0.0, 1.1 * kernel.radius_scale * h, 501)
+        w0 = kernel.kernel(rij=0.0, h=h)
+
+        for rij in r:
+            # When
+            expect = kernel.kernel(rij=rij, h=h)
+            expect_dw = kernel.dwdq(rij=rij, h=h)
+            expect_grad = [0.0, 0.0, 0.0]
+            kernel.gradient([rij, 0.0, 0.0], rij, h, expect_grad)
+            expect_gh = kernel.gradient_h(rij=rij, h=h)
+
+            # Then
+            self.assertTrue(abs(tab.kernel(rij=rij, h=h) - expect) < tol*w0)
+            self.assertTrue(abs(wrapper.kernel(rij, 0, 0, 0, 0, 0, h) -
+                                expect) < tol*w0)
+            self.assertTrue(abs(tab.dwdq(rij=rij, h=h) - expect_dw) <
+                            tol*w0)
+            self.assertTrue(abs(tab.gradient_h(rij=rij, h=h) - expect_gh) <
+                            tol*w0)
+            grad = wrapper.gradient(rij, 0, 0, 0, 0, 0, h)
+            self.assertTrue(abs(grad[0] - expect_grad[0]) < tol*w0)
+
+    def test_linear_interpolation_is_accurate(self):
+        for kernel in (CubicSpline(dim=1), WendlandQuintic(dim=2),
+                       Gaussian(dim=3)):
+            self._check_accuracy(kernel, 'linear', 1e-5)
+
+    def test_cubic_interpolation_is_accurate(self):
+        for kernel in (CubicSpline(dim=1), QuinticSpline(dim=2),
+                       WendlandQuinticC4(dim=3), Gaussian(dim=2)):
+            self._check_accuracy(kernel, 'cubic', 1e-8)
+
+    def test_attributes_of_tabulated_kernel(self):
+        # Given
+        kernel = QuinticSpline(dim=3)
+
+        # When
+        tab = TabulatedKernel(kernel, n_points=100)
+
+        # Then
+        self.assertEqual(tab.radius_scale, kernel.radius_scale)
+        self.assertEqual(tab.dim, 3)
+        self.assertEqual(tab.h_power, 3.0)
+        self.assertEqual(tab.get_deltap(), kernel.get_deltap())
+        self.assertEqual(len(tab.w_table), 101)
+        self.assertEqual(tab.kernel(rij=3.0, h=1.0), 0.0)
+        self.assertRaises(ValueError, TabulatedKernel, kernel, 100, 'spline')
+
+
 if __name__ == '__main__':
     main()
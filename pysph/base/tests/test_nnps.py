@@ -473,6 +473,74 @@ class DictBoxSortNNPSTestCase(NNPSTestCase):
         self.test_neighbors_dd()
 
 
+class BulkNeighborQueryTestCase(NNPSTestCase):
+    """Test the bulk neighbor queries against the per particle ones."""
+
+    def _check_all_neighbors(self, nps, src_index, dst_index):
+        offsets, indices, dists = nps.get_all_neighbors(
+            src_index, dst_index, distances=True
+        )
+        dst = self.particles[dst_index]
+        src = self.particles[src_index]
+        n = dst.get_number_of_particles()
+        self.assertEqual(len(offsets), n + 1)
+        self.assertEqual(offsets[-1], len(indices))
+        nbrs = UIntArray()
+        for i in range(n):
+            nps.get_nearest_particles(src_index, dst_index, i, nbrs)
+            row = indices[offsets[i]:offsets[i + 1]]
+            self.assertEqual(sorted(row), sorted(nbrs.get_npy_array()))
+            expect = numpy.sqrt(
+                (src.x[row] - dst.x[i])**2 + (src.y[row] - dst.y[i])**2 +
+                (src.z[row] - dst.z[i])**2
+            )
+            numpy.testing.assert_allclose(
+                dists[offsets[i]:offsets[i + 1]], expect
+            )
+
+    def test_get_all_neighbors(self):
+        for cls in (nnps.LinkedListNNPS, nnps.SpatialHashNNPS,
+                    nnps.ZOrderNNPS):
+            for cache in (True, False):
+                nps = cls(dim=3, particles=self.particles, radius_scale=2.0,
+                          cache=cache)
+                self._check_all_neighbors(nps, 0, 0)
+                self._check_all_neighbors(nps, 0, 1)
+                self._check_all_neighbors(nps, 2, 2)
+
+    def test_get_neighbors_of_points(self):
+        # Given
+        nps = nnps.LinkedListNNPS(dim=3, particles=self.particles)
+        src = self.pa1
+        x, y, z = random.random((3, 100)) * 3.0 - 1.5
+        radius = random.random(100) * 0.3
+
+        # When
+        offsets, indices, dists = nps.get_neighbors_of_points(
+            x, y, z, radius, src_index=0, distances=True
+        )
+
+        # Then
+        for i in range(100):
+            dist = numpy.sqrt(
+                (src.x - x[i])**2 + (src.y - y[i])**2 + (src.z - z[i])**2
+            )
+            expect = numpy.flatnonzero(dist < radius[i])
+            numpy.testing.assert_array_equal(
+                indices[offsets[i]:offsets[i + 1]], expect
+            )
+            numpy.testing.assert_allclose(
+                dists[offsets[i]:offsets[i + 1]], dist[expect]
+            )
+
+    def test_find_neighbors_of_points_with_no_points(self):
+        offsets, indices = nnps.find_neighbors_of_points(
+            [0.0], [0.0], [0.0], [], [], [], 1.0
+        )
+        self.assertEqual(list(offsets), [0])
+        self.assertEqual(len(indices), 0)
+
+
 class BoxSortNNPSTestCase(DictBoxSortNNPSTestCase):
     """Test for the original box-sort algorithm"""
 
@@ -1321,6 +1389,33 @@ def test_1D_get_valid_cell_index():
         assert index == -1
 
 
+def test_filter_candidates():
+    # Given
+    n = 37
+    x, y, z = random.random((3, n))
+    h = random.random(n)*0.1
+    pa = get_particle_array(x=x, y=y, z=z, h=h)
+    xi, yi, zi, hi = 0.5, 0.5, 0.5, 0.15
+    radius_scale = 2.0
+    candidates = UIntArray(n)
+    candidates.set_data(numpy.arange(n, dtype=numpy.uint32)[::-1].copy())
+
+    # When
+    count = nnps.py_filter_candidates(
+        candidates, pa.get_carray('x'), pa.get_carray('y'),
+        pa.get_carray('z'), pa.get_carray('h'), xi, yi, zi, hi, radius_scale
+    )
+
+    # Then
+    xij2 = (x - xi)**2 + (y - yi)**2 + (z - zi)**2
+    expect = numpy.where(
+        (xij2 < (radius_scale*hi)**2) | (xij2 < (radius_scale*h)**2)
+    )[0][::-1]
+    assert count == len(expect)
+    assert candidates.length == count
+    numpy.testing.assert_array_equal(candidates.get_npy_array(), expect)
+
+
 def test_get_centroid():
     cell = nnps.Cell(IntPoint(0, 0, 0), cell_size=0.1, narrays=1)
     centroid = Point()
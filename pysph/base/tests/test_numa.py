@@ -0,0 +1,112 @@
+"""Tests for the NUMA placement of the particle arrays."""
+
+import unittest
+
+import numpy as np
+from cyarray.carray import DoubleArray, IntArray, UIntArray
+
+from pysph.base import numa
+from pysph.base.nnps_base import get_number_of_threads, set_number_of_threads
+from pysph.base.utils import get_particle_array
+
+
+class TestFirstTouch(unittest.TestCase):
+    def setUp(self):
+        self.orig_threads = get_number_of_threads()
+        set_number_of_threads(3)
+
+    def tearDown(self):
+        set_number_of_threads(self.orig_threads)
+
+    def _make_array(self, n=1001):
+        x = np.arange(n, dtype=float)
+        pa = get_particle_array(name='fluid', x=x, y=-x, m=1.0)
+        pa.add_property('A', stride=3, data=np.arange(3*n, dtype=float))
+        pa.add_property('cid', type='int', data=np.arange(n) % 7)
+        return pa
+
+    def test_first_touch_keeps_the_data(self):
+        for cls, dtype in ((DoubleArray, float), (IntArray, np.int32),
+                           (UIntArray, np.uint32)):
+            # Given
+            arr = cls(1000)
+            data = np.arange(1000).astype(dtype)
+            arr.set_data(data)
+            address = numa.get_data_address(arr)
+
+            # When
+            touched = numa.first_touch(arr, stride=2)
+
+            # Then
+            self.assertTrue(touched)
+            self.assertNotEqual(numa.get_data_address(arr), address)
+            np.testing.assert_array_equal(arr.get_npy_array(), data)
+            # The array can still grow.
+            arr.append(1)
+            self.assertEqual(arr.length, 1001)
+            np.testing.assert_array_equal(arr.get_npy_array()[:-1], data)
+
+    def test_empty_arrays_and_views_are_not_touched(self):
+        # Given
+        arr = DoubleArray(10)
+        view = DoubleArray()
+        view.set_view(arr, 2, 8)
+
+        # When/Then
+        self.assertFalse(numa.first_touch(DoubleArray()))
+        self.assertFalse(numa.first_touch(view))
+
+    def test_first_touch_of_particle_arrays(self):
+        # Given
+        pa = self._make_array()
+        expect = dict((name, pa.get(name).copy()) for name in pa.properties)
+        first_touch = numa.FirstTouch([pa])
+
+        # When
+        first_touch.touch()
+
+        # Then
+        n_props = len(pa.properties)
+        self.assertEqual(first_touch.n_touched, n_props)
+        for name, value in expect.items():
+            np.testing.assert_array_equal(pa.get(name), value)
+
+        # When the arrays are only reordered they are not touched again.
+        pa.get_carray('tag').get_npy_array()[::2] = 2
+        pa.align_particles()
+        first_touch.update()
+
+        # Then
+        self.assertEqual(first_touch.n_touched, n_props)
+
+        # When particles are added the arrays are reallocated.
+        x = np.arange(1001, 2001, dtype=float)
+        pa.add_particles(x=x)
+        first_touch.update()
+
+        # Then
+        self.assertEqual(first_touch.n_touched, 2*n_props)
+        np.testing.assert_array_equal(pa.x[-1000:], x)
+        self.assertEqual(pa.get_carray('A').length,
+                         3*pa.get_number_of_particles())
+
+    def test_thread_cpus(self):
+        self.assertEqual(numa.get_thread_cpus([4, 5], 3), [4, 5, 4])
+        self.assertEqual(len(numa.get_thread_cpus()), 3)
+
+    def test_stream_triad(self):
+        # Given
+        a, b, c = DoubleArray(100), DoubleArray(100), DoubleArray(100)
+        b.set_data(np.ones(100))
+        c.set_data(np.arange(100.0))
+
+        # When
+        numa.stream_triad(a, b, c, 2.0)
+
+        # Then
+        np.testing.assert_array_equal(a.get_npy_array(),
+                                      1.0 + 2.0*np.arange(100.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
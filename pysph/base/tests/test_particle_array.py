@@ -336,6 +336,37 @@ class ParticleArrayTest(object):
         self.assertEqual(check_array(p.h, [.1, .1]), True)
         self.assertEqual(check_array(p.A, numpy.arange(6, 12)), True)
 
+    def test_remove_particles_keeps_array_aligned(self):
+        # Given
+        n = 50
+        p = particle_array.ParticleArray(
+            x={'data': numpy.arange(n, dtype=float)},
+            A={'data': numpy.repeat(numpy.arange(n, dtype=float), 2),
+               'stride': 2},
+            tag={'data': [0]*40 + [2]*10},
+            backend=self.backend
+        )
+        numpy.random.seed(1)
+        remove = numpy.random.choice(n, 15, replace=False)
+
+        # When
+        p.remove_particles(remove)
+        self.pull(p)
+
+        # Then
+        x = p.get('x', only_real_particles=False)
+        A = p.get('A', only_real_particles=False)
+        tag = p.get('tag', only_real_particles=False)
+        expect = numpy.setdiff1d(numpy.arange(n), remove)
+        numpy.testing.assert_array_equal(numpy.sort(x), expect)
+        numpy.testing.assert_array_equal(A[::2], x)
+        numpy.testing.assert_array_equal(A[1::2], x)
+        n_real = numpy.sum(expect < 40)
+        self.assertEqual(p.num_real_particles, n_real)
+        numpy.testing.assert_array_equal(tag[:n_real], 0)
+        numpy.testing.assert_array_equal(tag[n_real:], 2)
+        numpy.testing.assert_array_equal(x[:n_real] < 40, True)
+
     def test_add_particles(self):
         x = [1, 2, 3, 4.]
         y = [0., 1., 2., 3.]
@@ -990,6 +1021,111 @@ class ParticleArrayTest(object):
         # Then
         self.assertEqual(p.output_property_arrays, ['x', 'y'])
 
+    def test_ensure_properties_updates_stride(self):
+        # Given
+        p = particle_array.ParticleArray(name='f', x=[1, 2, 3],
+                                         backend=self.backend)
+        p.add_property('A', stride=2)
+        n = p.empty_clone()
+        p.remove_property('A')
+        p.add_property('A', stride=3)
+
+        # When
+        n.ensure_properties(p)
+
+        # Then
+        self.assertEqual(n.stride['A'], 3)
+
+        # When
+        p.remove_property('A')
+        p.add_property('A')
+        n.ensure_properties(p)
+
+        # Then
+        self.assertFalse('A' in p.stride)
+        self.assertFalse('A' in n.stride)
+
+    def test_set_property_type_converts_data(self):
+        # Given
+        p = particle_array.ParticleArray(name='f', x=[1, 2, 3],
+                                         backend=self.backend)
+        p.add_property('A', data=numpy.arange(6)*0.5, stride=2, default=2.0)
+
+        # When
+        p.set_property_type('A', 'float')
+
+        # Then
+        self.assertEqual(p.get_carray('A').get_c_type(), 'float')
+        self.assertEqual(p.A.dtype, numpy.float32)
+        numpy.testing.assert_array_equal(p.A, numpy.arange(6)*0.5)
+        self.assertEqual(p.stride['A'], 2)
+
+        # When
+        p.add_particles(x=[4.0])
+
+        # Then
+        self.assertEqual(list(p.A[-2:]), [2.0, 2.0])
+        self.assertRaises(AttributeError, p.set_property_type, 'B', 'float')
+
+
+class ParticleArrayViewsTest(unittest.TestCase):
+    def setUp(self):
+        get_config().use_opencl = False
+        self.pa = utils.get_particle_array(
+            name='f', x=[1.0, 2.0, 3.0], u=[0.1, 0.2, 0.3]
+        )
+        self.pa.add_property(
+            'A', data=numpy.arange(6, dtype=float), stride=2
+        )
+        self.pa.add_constant('c', [1.0, 2.0])
+        self.pa.tag[-1] = 2
+        self.pa.align_particles()
+
+    def test_get_views_does_not_copy(self):
+        # When
+        views = self.pa.get_views(['x', 'A', 'c'])
+
+        # Then
+        self.assertEqual(views['x'].shape, (2,))
+        self.assertEqual(views['A'].shape, (2, 2))
+        numpy.testing.assert_array_equal(views['A'], [[0, 1], [2, 3]])
+        numpy.testing.assert_array_equal(views['c'], [1.0, 2.0])
+
+        # When
+        views['x'][0] = 10.0
+        views['A'][1, 1] = 10.0
+
+        # Then
+        self.assertEqual(self.pa.x[0], 10.0)
+        self.assertEqual(self.pa.A[3], 10.0)
+
+    def test_get_views_readonly_and_all_particles(self):
+        # When
+        views = self.pa.get_views(
+            ['x', 'A'], only_real_particles=False, readonly=True
+        )
+
+        # Then
+        self.assertEqual(views['A'].shape, (3, 2))
+        self.assertFalse(views['x'].flags.writeable)
+        with self.assertRaises(ValueError):
+            views['x'][0] = 1.0
+        self.assertTrue(self.pa.x.flags.writeable)
+
+    def test_get_block_interleaves_properties(self):
+        # When
+        block = self.pa.get_block(['x', 'A', 'u'])
+
+        # Then
+        self.assertEqual(len(block), 2)
+        numpy.testing.assert_array_equal(block['x'], [1.0, 2.0])
+        numpy.testing.assert_array_equal(block['A'], [[0, 1], [2, 3]])
+        data = block.view(numpy.float64).reshape(len(block), -1)
+        numpy.testing.assert_array_equal(
+            data, [[1.0, 0, 1, 0.1], [2.0, 2, 3, 0.2]]
+        )
+        self.assertRaises(ValueError, self.pa.get_block, ['c'])
+
 
 class ParticleArrayUtils(unittest.TestCase):
     def setUp(self):
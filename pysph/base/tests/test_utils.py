@@ -1,6 +1,9 @@
 from unittest import TestCase, main
 
-from ..utils import is_overloaded_method
+import numpy as np
+
+from ..utils import (get_particle_array, is_overloaded_method,
+                     set_single_precision)
 
 
 class TestUtils(TestCase):
@@ -38,6 +41,25 @@ class TestUtils(TestCase):
         c = C()
         self.assertTrue(is_overloaded_method(c.f))
 
+    def test_set_single_precision(self):
+        # Given
+        pa = get_particle_array(name='f', x=[0.0, 1.0], au=[0.1, 0.2])
+        pa.add_property('u0')
+
+        # When
+        set_single_precision([pa], ['au', 'av', 'V'])
+
+        # Then
+        self.assertEqual(pa.au.dtype, np.float32)
+        self.assertEqual(pa.av.dtype, np.float32)
+        self.assertEqual(pa.x.dtype, np.float64)
+        self.assertTrue('V' not in pa.properties)
+        np.testing.assert_allclose(pa.au, [0.1, 0.2], rtol=1e-7)
+
+        # When/Then
+        self.assertRaises(ValueError, set_single_precision, [pa], ['h'])
+        self.assertRaises(ValueError, set_single_precision, [pa], ['u0'])
+
 
 if __name__ == '__main__':
     main()
@@ -463,6 +463,39 @@ def get_particle_array_swe(constants=None, **props):
     return pa
 
 
+# Properties that are always stored in double precision.
+DOUBLE_PRECISION_PROPS = set(('x', 'y', 'z', 'h'))
+
+
+def set_single_precision(particles, props):
+    """Store the given properties of the particle arrays in single precision.
+
+    This halves the memory used by these properties which is useful for
+    bandwidth bound simulations.  Typically accelerations and auxiliary
+    properties are good candidates.  The positions, smoothing length and the
+    saved integrator state (for example ``x0`` or ``u0``) must remain in
+    double precision and a ValueError is raised if these are requested.
+    Properties that are not present in an array are ignored.
+
+    Parameters
+    ----------
+
+    particles : list
+        List of particle arrays.
+    props : sequence
+        Names of the properties to store in single precision.
+
+    """
+    for pa in particles:
+        for prop in props:
+            state = prop.endswith('0') and prop[:-1] in pa.properties
+            if prop in DOUBLE_PRECISION_PROPS or state:
+                msg = 'Property %s must be stored in double precision.' % prop
+                raise ValueError(msg)
+            if prop in pa.properties:
+                pa.set_property_type(prop, 'float')
+
+
 def get_particles_info(particles):
     """Return the array information for a list of particles.
 
@@ -170,9 +170,7 @@ cdef class ZOrderNNPS(NNPS):
                 &c_x, &c_y, &c_z
                 )
 
-        cdef double xij2 = 0
         cdef double hi2 = self.radius_scale2*h*h
-        cdef double hj2 = 0
 
         cdef int start_idx, curr_idx
         cdef uint32_t n, idx
@@ -190,19 +188,13 @@ cdef class ZOrderNNPS(NNPS):
             cid_nbr = self.current_cids_src[idx]
             length = self.current_lengths[cid_nbr]
 
-            for j from 0<=j<length:
-                idx = self.current_pids[start_idx + j]
+            # particles in a cell are contiguous in the sorted pids.
+            append_candidates(nbrs, &self.current_pids[start_idx], length)
 
-                hj2 = self.radius_scale2*src_h_ptr[idx]*src_h_ptr[idx]
-
-                xij2 = norm2(
-                    src_x_ptr[idx] - x,
-                    src_y_ptr[idx] - y,
-                    src_z_ptr[idx] - z
-                    )
-
-                if (xij2 < hi2) or (xij2 < hj2):
-                    nbrs.c_append(idx)
+        filter_neighbors(
+            nbrs, orig_length, src_x_ptr, src_y_ptr, src_z_ptr, src_h_ptr,
+            x, y, z, hi2, self.radius_scale2
+        )
 
         if self.sort_gids:
             self._sort_neighbors(
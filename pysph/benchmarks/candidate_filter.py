@@ -0,0 +1,115 @@
+"""Microbenchmark for the candidate filtering used by the CPU NNPS.
+
+This reports the number of candidate neighbors tested per second by the
+batched filter in `nnps_base` and the time taken to find all the neighbors
+with the different cell based NNPS classes.
+
+Run it as::
+
+    $ python -m pysph.benchmarks.candidate_filter -n 100000
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+import time
+
+import numpy as np
+from cyarray.carray import UIntArray
+
+from pysph.base import nnps
+from pysph.base.utils import get_particle_array
+
+
+NNPS_CLASSES = [
+    nnps.LinkedListNNPS, nnps.SpatialHashNNPS, nnps.ZOrderNNPS,
+    nnps.CellIndexingNNPS, nnps.StratifiedHashNNPS, nnps.OctreeNNPS
+]
+
+
+def make_particles(n, dim=3, seed=123):
+    """Create a randomly perturbed lattice of roughly `n` particles."""
+    np.random.seed(seed)
+    nx = int(round(n**(1.0/dim)))
+    dx = 1.0/nx
+    pts = np.mgrid[[slice(0.5*dx, 1.0, dx)]*dim].reshape(dim, -1)
+    pts += (np.random.random(pts.shape) - 0.5)*0.2*dx
+    coords = dict(zip('xyz', pts))
+    return get_particle_array(name='fluid', h=1.2*dx, **coords)
+
+
+def _best_time(func, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def bench_filter(n_candidates, repeat=5):
+    """Return the number of candidates tested per second by the filter."""
+    pa = make_particles(n_candidates)
+    n = pa.get_number_of_particles()
+    x, y, z, h = [pa.get_carray(prop) for prop in 'xyzh']
+    candidates = UIntArray(n)
+    ids = np.random.permutation(n).astype(np.uint32)
+    hi = 0.2
+
+    def _run():
+        candidates.resize(n)
+        candidates.set_data(ids)
+        nnps.py_filter_candidates(
+            candidates, x, y, z, h, 0.5, 0.5, 0.5, hi, 2.0
+        )
+
+    return n/_best_time(_run, repeat)
+
+
+def bench_nnps(cls, pa, dim, repeat=3):
+    """Return the best time taken to find all the neighbors."""
+    nps = cls(dim=dim, particles=[pa], radius_scale=2.0, cache=True)
+
+    def _run():
+        nps.update()
+        nps.set_context(0, 0)
+        nps.cache[0].find_all_neighbors()
+
+    return _best_time(_run, repeat)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(
+        prog='candidate_filter', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '-n', action='store', type=int, dest='n', default=50000,
+        help='Number of particles to use.'
+    )
+    parser.add_argument(
+        '-d', '--dim', action='store', type=int, dest='dim', default=3,
+        help='Dimension of the problem.'
+    )
+    parser.add_argument(
+        '-r', '--repeat', action='store', type=int, dest='repeat',
+        default=3, help='Number of repetitions, the best time is reported.'
+    )
+    options = parser.parse_args(argv)
+
+    rate = bench_filter(options.n, options.repeat)
+    print("Candidate filter: %.3g candidates/s" % rate)
+
+    pa = make_particles(options.n, options.dim)
+    print("NNPS find all neighbors for %d particles in %dD:" % (
+        pa.get_number_of_particles(), options.dim))
+    for cls in NNPS_CLASSES:
+        t = bench_nnps(cls, pa, options.dim, options.repeat)
+        print("  %-20s %.4f s" % (cls.__name__, t))
+
+
+if __name__ == '__main__':
+    main()
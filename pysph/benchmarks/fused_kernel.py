@@ -0,0 +1,129 @@
+"""Cost of the kernel evaluations with and without the fused kernel calls.
+
+When the equations of a group need more than one of the kernel, its gradient,
+`dwdq` or `gradient_h` for the same smoothing length, a single call to the
+`kernel_and_gradient` method of the kernel is used instead (see
+`pysph.sph.equation.fuse_kernel_symbols`).  This benchmark compiles the
+equations of the WCSPH scheme (with the tensile correction) and of the gas
+dynamics scheme (with the MPM density iterations) with and without the fusion
+and reports the number of kernel method calls per pair and the time taken by
+the acceleration evaluator.
+
+Run it as::
+
+    $ python -m pysph.benchmarks.fused_kernel -n 40000
+"""
+
+from __future__ import print_function
+
+import argparse
+import re
+import sys
+
+import numpy as np
+
+from pysph.base.kernels import CubicSpline
+from pysph.base.nnps import LinkedListNNPS
+from pysph.base.utils import get_particle_array
+from pysph.sph.acceleration_eval import AccelerationEval
+from pysph.sph.equation import Group
+from pysph.sph.scheme import GasDScheme, WCSPHScheme
+from pysph.sph.sph_compiler import SPHCompiler
+from pysph.benchmarks.candidate_filter import _best_time
+
+KERNEL_CALLS = re.compile(
+    r'\b(KERNEL_AND_GRADIENT|KERNEL|GRADIENT|GRADH|DWDQ)\('
+)
+
+
+def make_fluid(n):
+    nx = int(round(np.sqrt(n)))
+    dx = 1.0/nx
+    x, y = np.mgrid[dx*0.5:1.0:dx, dx*0.5:1.0:dx]
+    np.random.seed(123)
+    x = x.ravel() + (np.random.random(x.size) - 0.5)*0.1*dx
+    y = y.ravel() + (np.random.random(y.size) - 0.5)*0.1*dx
+    rho = 1.0 + 0.1*np.sin(2*np.pi*x)
+    return get_particle_array(
+        name='fluid', x=x, y=y, m=dx*dx*rho, rho=rho, h=1.3*dx, e=2.5,
+        p=1.0, u=np.sin(2*np.pi*y), v=np.cos(2*np.pi*x)
+    ), dx
+
+
+def get_schemes(dx):
+    return [
+        ('wcsph', WCSPHScheme(
+            ['fluid'], [], dim=2, rho0=1.0, c0=10.0, h0=1.3*dx, hdx=1.3,
+            tensile_correction=True
+        )),
+        ('gasd', GasDScheme(
+            ['fluid'], [], dim=2, gamma=1.4, kernel_factor=1.3,
+            adaptive_h_scheme='mpm', update_alpha1=True, update_alpha2=True,
+            max_density_iterations=1
+        )),
+    ]
+
+
+def count_kernel_calls(a_eval):
+    """Return the number of calls to the kernel methods per pair summed over
+    all the groups.
+    """
+    count = 0
+    groups = list(a_eval.mega_groups)
+    while groups:
+        mg = groups.pop()
+        if isinstance(mg.data, list):
+            groups.extend(mg.data)
+            continue
+        for dest, (eqs_with_no_source, sources, all_eqs) in mg.data.items():
+            for group in sources.values():
+                for cb in group.precomputed.values():
+                    count += len(KERNEL_CALLS.findall(cb.code))
+    return count
+
+
+def bench(scheme, n, repeat, fuse):
+    Group.fuse_kernel_calls = fuse
+    pa, dx = make_fluid(n)
+    scheme.setup_properties([pa])
+    kernel = CubicSpline(dim=2)
+    a_eval = AccelerationEval([pa], scheme.get_equations(), kernel)
+    SPHCompiler(a_eval, integrator=None).compile()
+    nnps = LinkedListNNPS(dim=2, particles=[pa])
+    a_eval.set_nnps(nnps)
+    a_eval.compute(0.0, 1e-4)
+    t = _best_time(lambda: a_eval.compute(0.0, 1e-4), repeat)
+    return count_kernel_calls(a_eval), t
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(
+        prog='fused_kernel', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '-n', action='store', type=int, dest='n', default=40000,
+        help='Number of particles to use.'
+    )
+    parser.add_argument(
+        '--repeat', action='store', type=int, dest='repeat', default=5,
+        help='Number of times each benchmark is repeated.'
+    )
+    options = parser.parse_args(argv)
+
+    try:
+        for name, scheme in get_schemes(1.0/np.sqrt(options.n)):
+            results = [bench(scheme, options.n, options.repeat, fuse)
+                       for fuse in (False, True)]
+            (calls, t), (f_calls, f_t) = results
+            print("%-6s separate: %2d calls/pair %.4f s, fused: %2d "
+                  "calls/pair %.4f s, speedup %.2f" % (
+                      name, calls, t, f_calls, f_t, t/f_t))
+    finally:
+        Group.fuse_kernel_calls = True
+
+
+if __name__ == '__main__':
+    main()
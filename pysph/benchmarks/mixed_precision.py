@@ -0,0 +1,132 @@
+"""Accuracy versus speed of storing some properties in single precision.
+
+The accelerations of the WCSPH and TVF schemes are computed for a block of
+fluid with all properties in double precision and with the accelerations
+and auxiliary properties in single precision (see
+`pysph.base.utils.set_single_precision`).  The time taken by the
+acceleration evaluator and the relative error of the accelerations are
+reported.
+
+Run it as::
+
+    $ python -m pysph.benchmarks.mixed_precision -n 50000
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+
+import numpy as np
+
+from pysph.base.kernels import QuinticSpline
+from pysph.base.nnps import LinkedListNNPS
+from pysph.sph.acceleration_eval import AccelerationEval
+from pysph.sph.scheme import TVFScheme, WCSPHScheme
+from pysph.sph.sph_compiler import SPHCompiler
+from pysph.benchmarks.candidate_filter import _best_time, make_particles
+
+
+SINGLE_PRECISION_PROPS = {
+    'wcsph': ['arho', 'au', 'av', 'aw', 'ax', 'ay', 'az', 'dt_cfl',
+              'dt_force'],
+    'tvf': ['au', 'av', 'aw', 'auhat', 'avhat', 'awhat', 'V', 'wij'],
+}
+
+
+def make_scheme(name, dim, h0):
+    if name == 'wcsph':
+        return WCSPHScheme(
+            ['fluid'], [], dim=dim, rho0=1.0, c0=10.0, h0=h0, hdx=1.2,
+            alpha=0.1, beta=0.0
+        )
+    else:
+        return TVFScheme(
+            ['fluid'], [], dim=dim, rho0=1.0, c0=10.0, nu=0.01, p0=100.0,
+            pb=100.0, h0=h0
+        )
+
+
+def make_fluid(name, n, dim, scheme, single_precision):
+    pa = make_particles(n, dim)
+    np.random.seed(42)
+    n_real = pa.get_number_of_particles()
+    dx = pa.h[0]/1.2
+    pa.m[:] = dx**dim
+    pa.rho[:] = 1.0 + 0.01*np.random.random(n_real)
+    for prop in 'uvw'[:dim]:
+        getattr(pa, prop)[:] = np.random.random(n_real) - 0.5
+    if single_precision:
+        scheme.configure(single_precision_props=SINGLE_PRECISION_PROPS[name])
+    scheme.setup_properties([pa])
+    if 'V' in pa.properties:
+        pa.V[:] = 1.0/dx**dim
+    return pa
+
+
+def bench_scheme(name, n, dim, single_precision, repeat=3):
+    """Return the best time to compute the accelerations and the particle
+    array with the results.
+    """
+    scheme = make_scheme(name, dim, h0=1.0/n**(1.0/dim))
+    pa = make_fluid(name, n, dim, scheme, single_precision)
+    kernel = QuinticSpline(dim=dim)
+    a_eval = AccelerationEval([pa], scheme.get_equations(), kernel)
+    comp = SPHCompiler(a_eval, integrator=None)
+    comp.compile()
+    nps = LinkedListNNPS(dim=dim, particles=[pa], radius_scale=3.0,
+                         cache=True)
+    a_eval.set_nnps(nps)
+
+    def _run():
+        a_eval.compute(0.0, 1e-4)
+
+    _run()
+    return _best_time(_run, repeat), pa
+
+
+def relative_error(result, expect):
+    scale = max(np.abs(expect).max(), 1e-300)
+    return np.abs(result.astype(np.float64) - expect).max()/scale
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(
+        prog='mixed_precision', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '-n', action='store', type=int, dest='n', default=50000,
+        help='Number of particles to use.'
+    )
+    parser.add_argument(
+        '-d', '--dim', action='store', type=int, dest='dim', default=3,
+        help='Dimension of the problem.'
+    )
+    parser.add_argument(
+        '-r', '--repeat', action='store', type=int, dest='repeat',
+        default=3, help='Number of repetitions, the best time is reported.'
+    )
+    options = parser.parse_args(argv)
+
+    for name in ('wcsph', 'tvf'):
+        t_double, expect = bench_scheme(
+            name, options.n, options.dim, False, options.repeat
+        )
+        t_mixed, result = bench_scheme(
+            name, options.n, options.dim, True, options.repeat
+        )
+        print("%s: double %.4f s, mixed %.4f s, speedup %.2f" % (
+            name, t_double, t_mixed, t_double/t_mixed))
+        for prop in SINGLE_PRECISION_PROPS[name]:
+            if prop in result.properties and prop not in ('V', 'wij'):
+                err = relative_error(
+                    result.get(prop)[0], expect.get(prop)[0]
+                )
+                print("  %-10s relative error %.2e" % (prop, err))
+
+
+if __name__ == '__main__':
+    main()
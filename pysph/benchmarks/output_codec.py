@@ -0,0 +1,107 @@
+"""Size and write throughput of the output file formats.
+
+A sequence of snapshots of a block of moving particles is dumped with the
+plain and compressed numpy output and with the output codec (see
+`pysph.solver.output_codec`), without loss and with the positions and
+velocities quantized.  The total size, the write throughput and the time to
+load the files are reported.
+
+Run it as::
+
+    $ python -m pysph.benchmarks.output_codec -n 200000
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from pysph.solver.output import dump, load
+from pysph.solver.output_codec import OutputCodec
+from pysph.benchmarks.candidate_filter import make_particles
+
+
+def bench(pa, root, name, nfiles, **kw):
+    """Return the total size, write time and load time of the files.
+    """
+    dirname = os.path.join(root, name)
+    os.mkdir(dirname)
+    files = []
+    x0 = pa.x.copy()
+    write = 0.0
+    for i in range(nfiles):
+        pa.x[:] = x0 + 0.01*i*pa.u
+        fname = os.path.join(dirname, 'snap_%d.npz' % i)
+        start = time.time()
+        dump(fname, [pa], dict(t=0.1*i, dt=0.1, count=i), **kw)
+        write += time.time() - start
+        files.append(fname)
+    pa.x[:] = x0
+    start = time.time()
+    for fname in files:
+        load(fname)
+    read = time.time() - start
+    size = sum(os.path.getsize(f) for f in files)
+    return size, write, read
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(
+        prog='output_codec', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '-n', action='store', type=int, dest='n', default=200000,
+        help='Number of particles to use.'
+    )
+    parser.add_argument(
+        '-f', '--files', action='store', type=int, dest='nfiles',
+        default=10, help='Number of snapshots to write.'
+    )
+    parser.add_argument(
+        '-t', '--tolerance', action='store', type=float, dest='tolerance',
+        default=1e-6, help='Tolerance of the quantized properties.'
+    )
+    options = parser.parse_args(argv)
+
+    pa = make_particles(options.n, 3)
+    n = pa.get_number_of_particles()
+    np.random.seed(1)
+    for prop in ('u', 'v', 'w', 'p'):
+        pa.get(prop)[:] = np.random.random(n) - 0.5
+    pa.rho[:] = 1.0
+    pa.m[:] = 1.0/n
+    tol = options.tolerance
+    quantized = dict((x, tol) for x in ('x', 'y', 'z', 'u', 'v', 'w'))
+    cases = [
+        ('savez', {}),
+        ('savez_compressed', dict(compress=True)),
+        ('codec', dict(codec=OutputCodec())),
+        ('codec_quantized', dict(codec=OutputCodec(tolerances=quantized))),
+    ]
+    root = tempfile.mkdtemp()
+    try:
+        raw = None
+        for name, kw in cases:
+            size, write, read = bench(pa, root, name, options.nfiles, **kw)
+            if raw is None:
+                raw = size
+            print("%-18s %8.2f MB ratio %5.2f write %7.1f MB/s "
+                  "load %.3f s" % (name, size/1e6, raw/size,
+                                   raw/write/1e6, read))
+            if 'codec' in kw:
+                print("  " + kw['codec'].get_report())
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Benchmark for the removal of overlapping particles in `tools.geometry`.
+
+A block of fluid particles is created with a sphere of solid particles
+inside it and the time taken by
+`pysph.tools.geometry.find_overlap_particles` is reported.
+
+Run it as::
+
+    $ python -m pysph.benchmarks.overlap -n 1000000 10000000
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+
+import numpy as np
+
+from pysph.base.utils import get_particle_array
+from pysph.benchmarks.candidate_filter import _best_time, make_particles
+from pysph.tools.geometry import find_overlap_particles
+
+
+def make_solid(dx, radius=0.25):
+    """Create a sphere of particles with spacing `dx` centered in the unit
+    cube.
+    """
+    pts = np.mgrid[[slice(0.5 - radius, 0.5 + radius, dx)]*3].reshape(3, -1)
+    inside = ((pts - 0.5)**2).sum(axis=0) < radius*radius
+    x, y, z = pts[:, inside]
+    return get_particle_array(name='solid', x=x, y=y, z=z, h=1.2*dx)
+
+
+def bench_overlap(n, repeat=1):
+    """Return the best time and the number of overlapping particles."""
+    fluid = make_particles(n, dim=3)
+    dx = fluid.h[0]/1.2
+    solid = make_solid(dx)
+    result = []
+
+    def _run():
+        result[:] = find_overlap_particles(fluid, solid, dx, dim=3)
+
+    return _best_time(_run, repeat), len(result)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(
+        prog='overlap', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '-n', action='store', type=int, dest='n', nargs='+',
+        default=[1000000, 10000000],
+        help='Number of fluid particles to use.'
+    )
+    parser.add_argument(
+        '-r', '--repeat', action='store', type=int, dest='repeat',
+        default=1, help='Number of repetitions, the best time is reported.'
+    )
+    options = parser.parse_args(argv)
+
+    for n in options.n:
+        t, n_overlap = bench_overlap(n, options.repeat)
+        print("n=%d: %.3f s, %d overlapping particles" % (n, t, n_overlap))
+
+
+if __name__ == '__main__':
+    main()
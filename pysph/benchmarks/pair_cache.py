@@ -0,0 +1,101 @@
+"""Cost of the acceleration evaluation with and without the pair data cache.
+
+The groups of several schemes declare that they do not move the particles
+(see the `cache_pair_data` option of `pysph.sph.equation.Group`) so that the
+distance, kernel and kernel gradient of each pair are evaluated once and
+re-used by the later groups.  This benchmark evaluates the accelerations of
+these schemes on a 2D block of particles with and without the cache and
+reports the time taken and the memory used by the cache.
+
+Run it as::
+
+    $ python -m pysph.benchmarks.pair_cache -n 40000
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+
+import numpy as np
+
+from pysph.base.kernels import QuinticSpline
+from pysph.base.nnps import LinkedListNNPS
+from pysph.sph.acceleration_eval import AccelerationEval
+from pysph.sph.equation import MultiStageEquations
+from pysph.sph.scheme import AdamiHuAdamsScheme, TVFScheme
+from pysph.sph.sph_compiler import SPHCompiler
+from pysph.sph.wc.edac import EDACScheme
+from pysph.sph.wc.gtvf import GTVFScheme
+from pysph.benchmarks.fused_kernel import make_fluid
+from pysph.benchmarks.candidate_filter import _best_time
+
+
+def get_schemes(dx):
+    h0 = 1.3*dx
+    kw = dict(dim=2, rho0=1.0, c0=10.0, nu=0.01)
+    return [
+        ('tvf', TVFScheme(['fluid'], [], h0=h0, p0=100.0, pb=100.0,
+                          alpha=0.1, **kw)),
+        ('adami', AdamiHuAdamsScheme(['fluid'], [], h0=h0, gamma=7.0,
+                                     alpha=0.1, **kw)),
+        ('edac', EDACScheme(['fluid'], [], h=h0, pb=100.0, alpha=0.1,
+                            **kw)),
+        ('gtvf', GTVFScheme(['fluid'], [], h0=h0, pref=100.0, **kw)),
+    ]
+
+
+def bench(scheme, n, repeat, use_pair_cache):
+    pa, dx = make_fluid(n)
+    scheme.setup_properties([pa])
+    pa.rho[:] = 1.0
+    equations = scheme.get_equations()
+    if isinstance(equations, MultiStageEquations):
+        stages = equations.groups
+    else:
+        stages = [equations]
+    kernel = QuinticSpline(dim=2)
+    nnps = LinkedListNNPS(dim=2, particles=[pa])
+    nnps.set_use_pair_cache(use_pair_cache)
+    evals = []
+    for eqs in stages:
+        a_eval = AccelerationEval([pa], eqs, kernel)
+        SPHCompiler(a_eval, integrator=None).compile()
+        a_eval.set_nnps(nnps)
+        evals.append(a_eval)
+
+    def compute():
+        for a_eval in evals:
+            a_eval.compute(0.0, 1e-4)
+
+    compute()
+    t = _best_time(compute, repeat)
+    return t, nnps.get_pair_cache(0, 0).get_memory_usage()
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(
+        prog='pair_cache', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '-n', action='store', type=int, dest='n', default=40000,
+        help='Number of particles to use.'
+    )
+    parser.add_argument(
+        '--repeat', action='store', type=int, dest='repeat', default=5,
+        help='Number of times each benchmark is repeated.'
+    )
+    options = parser.parse_args(argv)
+
+    for name, scheme in get_schemes(1.0/np.sqrt(options.n)):
+        t, mem = bench(scheme, options.n, options.repeat, False)
+        c_t, c_mem = bench(scheme, options.n, options.repeat, True)
+        print("%-6s no cache: %.4f s, cache: %.4f s (%.1f MB), "
+              "speedup %.2f" % (name, t, c_t, c_mem/1e6, t/c_t))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Riemann solves per second of the GSPH Riemann solvers.
+
+The Cython code of the Riemann solvers in
+:py:mod:`pysph.sph.gas_dynamics.riemann_solver` is generated with the same
+code generator that is used for the acceleration evaluator and compiled
+along with two loops over a large number of Riemann problems: one calls
+the solver for each problem as done by
+:py:class:`pysph.sph.gas_dynamics.gsph.GSPHAcceleration` and the other
+solves them in batches as done by
+:py:class:`pysph.sph.gas_dynamics.gsph.GSPHAccelerationBatch`.  The problems
+are mostly those of smooth flow with a fraction of strong shocks and
+rarefactions.  The throughput of each solver, the fraction of the problems
+solved iteratively by the batched exact solver and the largest difference
+between the two loops, relative to the largest value, are reported.
+
+Run it as::
+
+    $ python -m pysph.benchmarks.riemann_solvers -n 1000000
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+from textwrap import dedent
+
+import numpy as np
+from compyle.api import CythonGenerator
+from compyle.ext_module import ExtModule
+
+from pysph.benchmarks.candidate_filter import _best_time
+from pysph.sph.gas_dynamics import gsph
+from pysph.sph.gas_dynamics.riemann_solver import BATCH_SIZE, HELPERS
+
+
+SOLVERS = [
+    'NonDiffusive', 'VanLeer', 'Exact', 'HLLC', 'Ducowicz', 'HLLE', 'Roe',
+    'LLXF', 'HLLCBall', 'HLLBall', 'HLLSY'
+]
+
+LOOPS = dedent('''
+def solve_pairs(int method, double[:] rhol, double[:] rhor, double[:] pl,
+                double[:] pr, double[:] ul, double[:] ur, double gamma,
+                int niter, double tol, double[:] pstar, double[:] ustar):
+    cdef long i
+    cdef double[2] result
+    for i in range(rhol.shape[0]):
+        riemann_solve(method, rhol[i], rhor[i], pl[i], pr[i], ul[i], ur[i],
+                      gamma, niter, tol, result)
+        pstar[i] = result[0]
+        ustar[i] = result[1]
+
+
+def solve_batches(int method, double[:] rhol, double[:] rhor, double[:] pl,
+                  double[:] pr, double[:] ul, double[:] ur, double gamma,
+                  int niter, double tol, double[:] pstar, double[:] ustar):
+    cdef long i, n, count = 0
+    cdef long size = rhol.shape[0]
+    for i in range(0, size, %(batch_size)d):
+        n = min(%(batch_size)d, size - i)
+        count += <long>riemann_solve_batch(
+            method, n, &rhol[i], &rhor[i], &pl[i], &pr[i], &ul[i], &ur[i],
+            gamma, niter, tol, &pstar[i], &ustar[i]
+        )
+    return count
+''')
+
+
+_MODULE = []
+
+
+def compile_solvers():
+    """Return the extension module with the `solve_pairs` and
+    `solve_batches` functions.
+    """
+    if not _MODULE:
+        cg = CythonGenerator()
+        code = [
+            '# cython: boundscheck=False, wraparound=False',
+            'from libc.math cimport *',
+            'from libc.stdio cimport printf',
+        ]
+        for func in HELPERS:
+            cg.parse(func)
+            code.append(cg.get_code())
+        code.append(LOOPS % dict(batch_size=BATCH_SIZE))
+        _MODULE.append(ExtModule('\n'.join(code), verbose=False).load())
+    return _MODULE[0]
+
+
+def make_states(n, shock_fraction=0.1, seed=123):
+    """Return the left and right states (rhol, rhor, pl, pr, ul, ur) of `n`
+    Riemann problems.  Most have jumps of a few percent as in smooth flow
+    and a fraction `shock_fraction` have the jumps of the Sod and the
+    strong blast wave problems.
+    """
+    np.random.seed(seed)
+    rho = 1.0 + 0.5*np.random.random(n)
+    p = 1.0 + 0.5*np.random.random(n)
+    u = 0.5*np.random.random(n) - 0.25
+
+    def _perturb(x, scale):
+        return x*(1.0 + scale*(np.random.random(n) - 0.5))
+
+    rhol, rhor = rho, _perturb(rho, 0.05)
+    pl, pr = p, _perturb(p, 0.05)
+    ul, ur = u, u + 0.05*(np.random.random(n) - 0.5)
+    strong = np.random.random(n) < shock_fraction
+    sod = strong & (np.random.random(n) < 0.5)
+    blast = strong & ~sod
+    rhor = np.where(sod, 0.125*rho, rhor)
+    pr = np.where(sod, 0.1*p, np.where(blast, 1e-2*p, pr))
+    pl = np.where(blast, 1e3*p, pl)
+    return rhol, rhor, pl, pr, ul, ur
+
+
+def bench_riemann(solver, states, batch, repeat, gamma=1.4, niter=20,
+                  tol=1e-6):
+    """Return the Riemann solves per second, the number of problems solved
+    with the exact solver in the batched loop and the solution (pstar,
+    ustar).
+    """
+    mod = compile_solvers()
+    method = getattr(gsph, solver)
+    n = len(states[0])
+    pstar = np.zeros(n)
+    ustar = np.zeros(n)
+    func = mod.solve_batches if batch else mod.solve_pairs
+    count = []
+
+    def _run():
+        count[:] = [func(method, *(states + (gamma, niter, tol, pstar,
+                                             ustar)))]
+
+    t = _best_time(_run, repeat)
+    return n/t, count[0] if batch else None, (pstar, ustar)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(
+        prog='riemann_solvers', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '-n', action='store', type=int, dest='n', default=1000000,
+        help='Number of Riemann problems.'
+    )
+    parser.add_argument(
+        '--shock-fraction', action='store', type=float,
+        dest='shock_fraction', default=0.1,
+        help='Fraction of the problems with strong shocks.'
+    )
+    parser.add_argument(
+        '--repeat', action='store', type=int, dest='repeat', default=5,
+        help='Number of times each benchmark is repeated.'
+    )
+    options = parser.parse_args(argv)
+
+    states = make_states(options.n, options.shock_fraction)
+    for solver in SOLVERS:
+        rate, count, result = bench_riemann(
+            solver, states, False, options.repeat
+        )
+        b_rate, count, b_result = bench_riemann(
+            solver, states, True, options.repeat
+        )
+        diff = max(
+            np.abs(b - a).max()/np.abs(a).max()
+            for a, b in zip(result, b_result)
+        )
+        line = ("%-12s pair %8.2f M solves/s batch %8.2f M solves/s "
+                "speedup %.2f rel. diff %.1e" % (
+                    solver, rate/1e6, b_rate/1e6, b_rate/rate, diff))
+        if solver == 'Exact':
+            line += ' iterated %.1f%%' % (100.0*count/options.n)
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
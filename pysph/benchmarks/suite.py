@@ -0,0 +1,539 @@
+"""Benchmark suite for the performance critical parts of PySPH.
+
+The suite has microbenchmarks of the NNPS, the neighbor cache, the particle
+array operations, the periodic domain, the output, the kernels, the Riemann
+solvers of GSPH and the memory bandwidth with and without the NUMA first touch
+and macrobenchmarks that run some of the examples and report the time steps per
+second.  Each benchmark is run for a set of parameters and the results are
+saved as JSON along with information on the machine and the git commit so that
+runs on two commits can be compared.
+
+Run it as::
+
+    $ pysph bench -o before.json
+    $ pysph bench -o after.json
+    $ pysph bench --compare before.json after.json
+
+Use ``--list`` to see the available benchmarks, ``-k`` to select the
+benchmarks whose name contains the given string and ``--quick`` to run
+smaller problems.
+"""
+
+from __future__ import print_function
+
+import argparse
+from datetime import datetime
+import glob
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from pysph.base import nnps
+from pysph.benchmarks.candidate_filter import NNPS_CLASSES, make_particles
+
+
+class Benchmark(object):
+    """A benchmark run for all the combinations of the given parameters.
+
+    The function is called as ``func(repeat=repeat, **params)`` and returns
+    the best time taken and the amount of work done, the reported value is
+    the work done per second in the given `unit`.
+    """
+    def __init__(self, name, func, unit, params, quick_params=None,
+                 kind='micro'):
+        self.name = name
+        self.func = func
+        self.unit = unit
+        self.params = params
+        self.quick_params = params if quick_params is None else quick_params
+        self.kind = kind
+
+    def get_cases(self, quick=False, **overrides):
+        """Return a list of the parameters of each case."""
+        params = dict(self.quick_params if quick else self.params)
+        for key, value in overrides.items():
+            if key in params and value is not None:
+                params[key] = value
+        keys = sorted(params)
+        return [dict(zip(keys, values))
+                for values in itertools.product(*[params[k] for k in keys])]
+
+    def get_case_name(self, params):
+        args = ','.join('%s=%s' % (k, params[k]) for k in sorted(params))
+        return '%s(%s)' % (self.name, args)
+
+    def run(self, params, repeat):
+        t, work = self.func(repeat=repeat, **params)
+        return dict(
+            name=self.get_case_name(params), benchmark=self.name,
+            kind=self.kind, params=params, time=t, value=work/t,
+            unit=self.unit
+        )
+
+
+def _best_time(func, repeat, setup=None):
+    """Return the smallest time taken by `func` over `repeat` runs, `setup`
+    is called before each run and is not timed.
+    """
+    times = []
+    for i in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+###############################################################################
+# Microbenchmarks.
+###############################################################################
+def _get_nnps_class(name):
+    return getattr(nnps, name)
+
+
+def bench_nnps_update(nnps, n, repeat):
+    pa = make_particles(n)
+    nps = _get_nnps_class(nnps)(dim=3, particles=[pa], radius_scale=2.0)
+    return _best_time(nps.update, repeat), pa.get_number_of_particles()
+
+
+def bench_nnps_query(nnps, n, repeat):
+    pa = make_particles(n)
+    nps = _get_nnps_class(nnps)(dim=3, particles=[pa], radius_scale=2.0)
+    result = []
+
+    def _run():
+        result[:] = nps.get_all_neighbors(0, 0)
+
+    t = _best_time(_run, repeat)
+    return t, len(result[1])
+
+
+def bench_neighbor_cache_update(n, repeat):
+    pa = make_particles(n)
+    nps = nnps.LinkedListNNPS(dim=3, particles=[pa], radius_scale=2.0,
+                              cache=True)
+    nps.set_context(0, 0)
+    cache = nps.current_cache
+
+    def _run():
+        cache.update()
+        cache.find_all_neighbors()
+
+    return _best_time(_run, repeat), pa.get_number_of_particles()
+
+
+def bench_align_particles(n, repeat):
+    pa = make_particles(n)
+    n = pa.get_number_of_particles()
+    np.random.seed(123)
+    tags = (np.random.random(n) < 0.1).astype(np.int32)
+
+    def _setup():
+        pa.get_carray('tag').get_npy_array()[:] = tags
+
+    return _best_time(pa.align_particles, repeat, _setup), n
+
+
+def bench_remove_particles(n, repeat):
+    src = make_particles(n)
+    n = src.get_number_of_particles()
+    np.random.seed(123)
+    indices = np.sort(np.random.choice(n, n//10, replace=False))
+    pa = []
+
+    def _setup():
+        pa[:] = [src.extract_particles(np.arange(n))]
+
+    def _run():
+        pa[0].remove_particles(indices)
+
+    return _best_time(_run, repeat, _setup), len(indices)
+
+
+def bench_domain_ghosts(n, repeat):
+    pa = make_particles(n, dim=2)
+    domain = nnps.DomainManager(
+        xmin=0.0, xmax=1.0, ymin=0.0, ymax=1.0, periodic_in_x=True,
+        periodic_in_y=True
+    )
+    nps = nnps.LinkedListNNPS(dim=2, particles=[pa], radius_scale=2.0,
+                              domain=domain)
+    return _best_time(nps.update_domain, repeat), pa.num_real_particles
+
+
+def _get_output_formats():
+    from pysph import has_h5py
+    return ['hdf5', 'npz'] if has_h5py() else ['npz']
+
+
+def _make_output_arrays(n):
+    pa = make_particles(n)
+    n = pa.get_number_of_particles()
+    for prop in ('u', 'v', 'w', 'rho', 'p', 'm'):
+        pa.get(prop, only_real_particles=False)[:] = np.random.random(n)
+    return [pa]
+
+
+def bench_dump(format, n, repeat):
+    from pysph.solver.output import dump
+    particles = _make_output_arrays(n)
+    dirname = tempfile.mkdtemp()
+    fname = os.path.join(dirname, 'bench.' + format)
+    try:
+        t = _best_time(
+            lambda: dump(fname, particles, dict(t=0.0, dt=0.1, count=0)),
+            repeat
+        )
+    finally:
+        shutil.rmtree(dirname)
+    return t, particles[0].get_number_of_particles()
+
+
+def bench_load(format, n, repeat):
+    from pysph.solver.output import dump, load
+    particles = _make_output_arrays(n)
+    dirname = tempfile.mkdtemp()
+    fname = os.path.join(dirname, 'bench.' + format)
+    try:
+        dump(fname, particles, dict(t=0.0, dt=0.1, count=0))
+        t = _best_time(lambda: load(fname), repeat)
+    finally:
+        shutil.rmtree(dirname)
+    return t, particles[0].get_number_of_particles()
+
+
+def bench_kernel(kernel, n, repeat):
+    from pysph.base import kernels
+    from pysph.benchmarks.tabulated_kernel import compile_kernel
+    kern = getattr(kernels, kernel)(dim=3)
+    func = compile_kernel(kern)
+    h = 0.1
+    np.random.seed(123)
+    r = np.random.random(n)*kern.radius_scale*h
+    w = np.zeros_like(r)
+    dw = np.zeros_like(r)
+    return _best_time(lambda: func(r, h, w, dw), repeat), n
+
+
+def bench_riemann(solver, batch, n, repeat):
+    from pysph.benchmarks.riemann_solvers import bench_riemann, make_states
+    rate, count, result = bench_riemann(solver, make_states(n), batch, repeat)
+    return n/rate, n
+
+
+def bench_stream_triad(first_touch, n, threads, repeat):
+    from cyarray.carray import DoubleArray
+    from pysph.base import numa
+    from pysph.base.nnps_base import (get_number_of_threads,
+                                      set_number_of_threads)
+    n_threads = get_number_of_threads()
+    set_number_of_threads(threads)
+    try:
+        arrays = []
+        for value in (0.0, 1.0, 2.0):
+            # Filled by a single thread as done for the particle arrays.
+            arr = DoubleArray(n)
+            arr.get_npy_array()[:] = value
+            if first_touch:
+                numa.first_touch(arr)
+            arrays.append(arr)
+        a, b, c = arrays
+        t = _best_time(lambda: numa.stream_triad(a, b, c, 3.0), repeat)
+    finally:
+        set_number_of_threads(n_threads)
+    return t, 3*8*n
+
+
+###############################################################################
+# Macrobenchmarks.
+###############################################################################
+def run_example(module, args, threads, max_steps=20):
+    """Run the given example module and return the time taken by the
+    solver as recorded in its ``.info`` file.
+    """
+    dirname = tempfile.mkdtemp()
+    cmd = [sys.executable, '-m', module, '-q', '--disable-output',
+           '--max-steps', str(max_steps), '-d', dirname] + list(args)
+    env = dict(os.environ)
+    env['OMP_NUM_THREADS'] = str(threads)
+    if threads > 1:
+        cmd.append('--openmp')
+    try:
+        subprocess.check_call(cmd, env=env, stdout=subprocess.DEVNULL)
+        info = glob.glob(os.path.join(dirname, '*.info'))[0]
+        with open(info) as f:
+            return json.load(f)['cpu_time']
+    finally:
+        shutil.rmtree(dirname)
+
+
+def _make_example_bench(module, option):
+    def _bench(size, threads, repeat, max_steps=20):
+        args = [option, str(size)]
+        t = min(run_example(module, args, threads, max_steps)
+                for i in range(repeat))
+        return t, max_steps
+    return _bench
+
+
+def _get_thread_counts():
+    n_cores = multiprocessing.cpu_count()
+    return [1, n_cores] if n_cores > 1 else [1]
+
+
+NNPS_NAMES = [cls.__name__ for cls in NNPS_CLASSES]
+
+BENCHMARKS = [
+    Benchmark(
+        'nnps_update', bench_nnps_update, 'particles/s',
+        dict(nnps=NNPS_NAMES, n=[10000, 100000]),
+        dict(nnps=NNPS_NAMES, n=[10000])
+    ),
+    Benchmark(
+        'nnps_query', bench_nnps_query, 'neighbors/s',
+        dict(nnps=NNPS_NAMES, n=[10000, 100000]),
+        dict(nnps=NNPS_NAMES, n=[10000])
+    ),
+    Benchmark(
+        'neighbor_cache_update', bench_neighbor_cache_update, 'particles/s',
+        dict(n=[10000, 100000]), dict(n=[10000])
+    ),
+    Benchmark(
+        'align_particles', bench_align_particles, 'particles/s',
+        dict(n=[100000, 1000000]), dict(n=[100000])
+    ),
+    Benchmark(
+        'remove_particles', bench_remove_particles, 'particles/s',
+        dict(n=[100000, 1000000]), dict(n=[100000])
+    ),
+    Benchmark(
+        'domain_ghosts', bench_domain_ghosts, 'particles/s',
+        dict(n=[10000, 100000]), dict(n=[10000])
+    ),
+    Benchmark(
+        'dump', bench_dump, 'particles/s',
+        dict(format=_get_output_formats(), n=[100000, 1000000]),
+        dict(format=_get_output_formats(), n=[100000])
+    ),
+    Benchmark(
+        'load', bench_load, 'particles/s',
+        dict(format=_get_output_formats(), n=[100000, 1000000]),
+        dict(format=_get_output_formats(), n=[100000])
+    ),
+    Benchmark(
+        'kernel', bench_kernel, 'evals/s',
+        dict(kernel=['CubicSpline', 'QuinticSpline', 'WendlandQuintic'],
+             n=[1000000]),
+        dict(kernel=['CubicSpline'], n=[1000000])
+    ),
+    Benchmark(
+        'riemann', bench_riemann, 'solves/s',
+        dict(solver=['Exact', 'HLLC', 'Roe', 'VanLeer'],
+             batch=[False, True], n=[1000000]),
+        dict(solver=['Exact', 'HLLC'], batch=[False, True], n=[100000])
+    ),
+    Benchmark(
+        'stream_triad', bench_stream_triad, 'bytes/s',
+        dict(first_touch=[False, True], n=[10000000],
+             threads=_get_thread_counts()),
+        dict(first_touch=[False, True], n=[1000000], threads=[1])
+    ),
+    Benchmark(
+        'dam_break_2d', _make_example_bench(
+            'pysph.examples.dam_break_2d', '--dx'
+        ), 'steps/s',
+        dict(size=[0.03, 0.015], threads=_get_thread_counts()),
+        dict(size=[0.03], threads=[1]), kind='macro'
+    ),
+    Benchmark(
+        'taylor_green', _make_example_bench(
+            'pysph.examples.taylor_green', '--nx'
+        ), 'steps/s',
+        dict(size=[50, 100], threads=_get_thread_counts()),
+        dict(size=[25], threads=[1]), kind='macro'
+    ),
+    Benchmark(
+        'cube', _make_example_bench('pysph.examples.cube', '--np'),
+        'steps/s',
+        dict(size=[10000, 100000], threads=_get_thread_counts()),
+        dict(size=[10000], threads=[1]), kind='macro'
+    ),
+]
+
+
+###############################################################################
+# Running and comparing.
+###############################################################################
+def get_git_commit():
+    """Return the git commit of the PySPH sources or None."""
+    dirname = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        out = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=dirname,
+            stderr=subprocess.DEVNULL
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.decode().strip()
+
+
+def get_metadata(quick):
+    from pysph import __version__
+    return dict(
+        date=datetime.now().isoformat(), commit=get_git_commit(),
+        pysph_version=__version__, python=platform.python_version(),
+        numpy=np.__version__, platform=platform.platform(),
+        machine=platform.machine(), processor=platform.processor(),
+        cpu_count=multiprocessing.cpu_count(),
+        omp_num_threads=os.environ.get('OMP_NUM_THREADS'), quick=quick
+    )
+
+
+def select_benchmarks(pattern=None, kind=None):
+    return [b for b in BENCHMARKS
+            if (pattern is None or pattern in b.name) and
+            (kind is None or b.kind == kind)]
+
+
+def run_benchmarks(benchmarks, repeat=3, quick=False, threads=None,
+                   callback=None):
+    """Run the given benchmarks and return the results as a dictionary that
+    can be saved as JSON.
+    """
+    results = []
+    for bench in benchmarks:
+        for params in bench.get_cases(quick, threads=threads):
+            result = bench.run(params, repeat)
+            results.append(result)
+            if callback is not None:
+                callback(result)
+    return dict(metadata=get_metadata(quick), results=results)
+
+
+def compare(old, new, threshold=0.1):
+    """Compare two sets of results and return a list of tuples of the
+    name, old value, new value, ratio of the new to the old value and a
+    status that is one of 'faster', 'slower' or '' when the ratio is within
+    the threshold.
+    """
+    old_values = dict((r['name'], r['value']) for r in old['results'])
+    rows = []
+    for r in new['results']:
+        if r['name'] not in old_values:
+            continue
+        ratio = r['value']/old_values[r['name']]
+        if ratio > 1.0 + threshold:
+            status = 'faster'
+        elif ratio < 1.0/(1.0 + threshold):
+            status = 'slower'
+        else:
+            status = ''
+        rows.append((r['name'], old_values[r['name']], r['value'], ratio,
+                     status))
+    return rows
+
+
+def _print_result(result):
+    print("%-55s %12.4g %-12s (%.4g s)" % (
+        result['name'], result['value'], result['unit'], result['time']))
+    sys.stdout.flush()
+
+
+def _print_comparison(old, new, threshold):
+    print("%-55s %12s %12s %7s" % ('benchmark', 'old', 'new', 'ratio'))
+    rows = compare(old, new, threshold)
+    for name, old_value, new_value, ratio, status in rows:
+        print("%-55s %12.4g %12.4g %7.2f %s" % (
+            name, old_value, new_value, ratio, status))
+    n_slower = sum(1 for row in rows if row[-1] == 'slower')
+    print("%d of %d benchmarks are slower by more than %d%%." % (
+        n_slower, len(rows), threshold*100))
+    return n_slower
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(
+        prog='pysph bench', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '-o', '--output', action='store', dest='output', default=None,
+        help='Save the results to this JSON file.'
+    )
+    parser.add_argument(
+        '-k', action='store', dest='pattern', default=None,
+        help='Only run the benchmarks whose name contains this string.'
+    )
+    parser.add_argument(
+        '--kind', action='store', dest='kind', default=None,
+        choices=['micro', 'macro'], help='Only run this kind of benchmarks.'
+    )
+    parser.add_argument(
+        '--quick', action='store_true', dest='quick', default=False,
+        help='Run the benchmarks with smaller problems.'
+    )
+    parser.add_argument(
+        '-r', '--repeat', action='store', type=int, dest='repeat',
+        default=3, help='Number of repetitions, the best time is reported.'
+    )
+    parser.add_argument(
+        '--threads', action='store', type=int, nargs='+', dest='threads',
+        default=None,
+        help='Number of threads used to run the examples, the default is '
+        'one and all the cores.'
+    )
+    parser.add_argument(
+        '--list', action='store_true', dest='list', default=False,
+        help='List the benchmarks and exit.'
+    )
+    parser.add_argument(
+        '--compare', action='store', nargs=2, dest='compare', default=None,
+        metavar=('OLD', 'NEW'),
+        help='Compare the results saved in two JSON files and exit.'
+    )
+    parser.add_argument(
+        '--threshold', action='store', type=float, dest='threshold',
+        default=0.1,
+        help='Relative change beyond which a benchmark is reported as '
+        'faster or slower when comparing.'
+    )
+    options = parser.parse_args(argv)
+
+    if options.compare is not None:
+        old, new = [json.load(open(fname)) for fname in options.compare]
+        n_slower = _print_comparison(old, new, options.threshold)
+        sys.exit(1 if n_slower > 0 else 0)
+
+    benchmarks = select_benchmarks(options.pattern, options.kind)
+    if options.list:
+        for bench in benchmarks:
+            for params in bench.get_cases(options.quick,
+                                          threads=options.threads):
+                print(bench.get_case_name(params))
+        return
+
+    results = run_benchmarks(
+        benchmarks, options.repeat, options.quick, options.threads,
+        callback=_print_result
+    )
+    if options.output is not None:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print("Results saved to %s" % options.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Kernel evaluations per second of the analytic and tabulated kernels.
+
+The Cython code of each kernel is generated with the same code generator
+that is used for the acceleration evaluator and compiled along with a loop
+that evaluates the kernel and its gradient for a large number of random
+distances.  The throughput and the maximum error of the
+:py:class:`pysph.base.kernels.TabulatedKernel` with respect to the analytic
+kernel are reported.
+
+Run it as::
+
+    $ python -m pysph.benchmarks.tabulated_kernel -n 10000000
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+from textwrap import dedent
+
+import numpy as np
+from compyle.api import CythonGenerator
+from compyle.ext_module import ExtModule
+
+from pysph.base import kernels
+from pysph.benchmarks.candidate_filter import _best_time
+
+
+KERNELS = ['CubicSpline', 'QuinticSpline', 'WendlandQuintic', 'Gaussian']
+
+LOOP = dedent('''
+def evaluate(%(name)s kern, double[:] r, double h, double[:] w,
+             double[:] dw):
+    cdef long i
+    cdef double[3] xij, grad
+    xij[1] = 0.0
+    xij[2] = 0.0
+    for i in range(r.shape[0]):
+        xij[0] = r[i]
+        w[i] = kern.kernel(xij, r[i], h)
+        kern.gradient(xij, r[i], h, grad)
+        dw[i] = grad[0]
+''')
+
+
+def compile_kernel(kernel):
+    """Return a function evaluating the given kernel and its gradient on an
+    array of distances using the generated Cython code.
+    """
+    cg = CythonGenerator()
+    cg.parse(kernel)
+    name = kernel.__class__.__name__
+    code = '\n'.join([
+        '# cython: boundscheck=False, wraparound=False',
+        'from libc.math cimport *',
+        cg.get_code(),
+        LOOP % dict(name=name)
+    ])
+    mod = ExtModule(code, verbose=False).load()
+    kern = getattr(mod, name)(**kernel.__dict__)
+
+    def _evaluate(r, h, w, dw):
+        mod.evaluate(kern, r, h, w, dw)
+    return _evaluate
+
+
+def bench_kernel(kernel, r, h, repeat):
+    """Return the evaluations per second and the values of the kernel and
+    gradient.
+    """
+    func = compile_kernel(kernel)
+    w = np.zeros_like(r)
+    dw = np.zeros_like(r)
+    t = _best_time(lambda: func(r, h, w, dw), repeat)
+    return len(r)/t, w, dw
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(
+        prog='tabulated_kernel', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '-n', action='store', type=int, dest='n', default=10000000,
+        help='Number of kernel evaluations.'
+    )
+    parser.add_argument(
+        '-d', '--dim', action='store', type=int, dest='dim', default=3,
+        help='Dimension of the kernels.'
+    )
+    parser.add_argument(
+        '--n-points', action='store', type=int, dest='n_points',
+        default=1000, help='Number of intervals of the tables.'
+    )
+    parser.add_argument(
+        '--repeat', action='store', type=int, dest='repeat', default=5,
+        help='Number of times each benchmark is repeated.'
+    )
+    options = parser.parse_args(argv)
+
+    np.random.seed(123)
+    h = 0.1
+    for name in KERNELS:
+        kernel = getattr(kernels, name)(dim=options.dim)
+        r = np.random.random(options.n)*kernel.radius_scale*h
+        rate, w, dw = bench_kernel(kernel, r, h, options.repeat)
+        print("%-16s %-8s %8.1f M evals/s" % (name, 'analytic', rate/1e6))
+        w_max = np.abs(w).max()
+        for interpolation in ('linear', 'cubic'):
+            tab = kernels.TabulatedKernel(
+                kernel, n_points=options.n_points,
+                interpolation=interpolation
+            )
+            t_rate, t_w, t_dw = bench_kernel(tab, r, h, options.repeat)
+            print("%-16s %-8s %8.1f M evals/s speedup %.2f "
+                  "rel. error W %.1e grad W %.1e" % (
+                      '', interpolation, t_rate/1e6, t_rate/rate,
+                      np.abs(t_w - w).max()/w_max,
+                      np.abs(t_dw - dw).max()/np.abs(dw).max()))
+
+
+if __name__ == '__main__':
+    main()
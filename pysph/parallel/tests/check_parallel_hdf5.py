@@ -0,0 +1,63 @@
+"""Test if all ranks writing to a single HDF5 file works correctly.
+"""
+
+import mpi4py.MPI as mpi
+import numpy as np
+from os.path import join
+import shutil
+from tempfile import mkdtemp
+
+from pysph.base.particle_array import ParticleArray
+from pysph.solver.output import ParallelHDFOutput
+from pysph.solver.utils import dump, load
+
+
+def check_file(filename, size):
+    data = load(filename)
+    pa = data["arrays"]["fluid"]
+    assert data["solver_data"]["t"] == 1.0
+    expect = np.concatenate([np.ones(i + 1)*i for i in range(size)])
+    assert np.allclose(pa.x, expect, atol=1e-14), \
+        "Expected %s, got %s" % (expect, pa.x)
+    expect_A = np.repeat(expect, 2)
+    assert np.allclose(pa.A, expect_A, atol=1e-14), \
+        "Expected %s, got %s" % (expect_A, pa.A)
+    assert pa.get_number_of_particles() == size*(size + 1)//2
+    assert np.allclose(pa.c, [1.0, 2.0])
+    assert data["arrays"]["empty"].get_number_of_particles() == 0
+
+
+def main():
+    comm = mpi.COMM_WORLD
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+
+    root = None
+    if rank == 0:
+        root = mkdtemp()
+    root = comm.bcast(root, root=0)
+
+    # Each rank has a different number of particles.
+    x = np.ones(rank + 1)*rank
+    pa = ParticleArray(name='fluid', constants={'c': [1.0, 2.0]}, x=x)
+    pa.add_property('A', data=np.repeat(x, 2), stride=2)
+    pa.set_output_arrays(['x', 'A'])
+    empty = ParticleArray(name='empty', x=[])
+
+    try:
+        for rpw in (16, 2, 1):
+            ParallelHDFOutput.ranks_per_writer = rpw
+            filename = join(root, 'test_%d.hdf5' % rpw)
+            dump(filename, [pa, empty], {'t': 1.0}, mpi_comm=comm,
+                 parallel_io=True)
+            if rank == 0:
+                check_file(filename, size)
+            comm.barrier()
+    finally:
+        comm.barrier()
+        if rank == 0:
+            shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
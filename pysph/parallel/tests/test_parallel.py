@@ -112,5 +112,20 @@ class DumpLoadTestCase(unittest.TestCase):
         )
 
 
+class ParallelHDF5TestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Importing mpi4py.MPI initializes MPI which can prevent mpiexec
+        # from being run in a sub-process.
+        importorskip("mpi4py")
+        importorskip("h5py")
+
+    @mark.parallel
+    def test_all_ranks_write_to_one_hdf5_file(self):
+        run_parallel_script.run(
+            filename='check_parallel_hdf5.py', nprocs=4, path=path
+        )
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -26,10 +26,14 @@ from pysph.base.nnps import LinkedListNNPS, BoxSortNNPS, SpatialHashNNPS, \
 from pysph.base import kernels
 from compyle.config import get_config
 from pysph.solver.controller import CommandManager
+from pysph.solver.output import get_hdf5_compression
+from pysph.solver.output_codec import OutputCodec
 from pysph.solver.utils import mkdir, load, get_files, get_free_port
 
 # conditional parallel imports
-from pysph import has_mpi, has_zoltan, in_parallel
+from pysph import (
+    has_h5py, has_mpi, has_shared_memory, has_zoltan, in_parallel
+)
 
 if in_parallel():
     from pysph.parallel.parallel_manager import ZoltanParallelManagerGeometric
@@ -137,6 +141,8 @@ class Application(object):
 
     3. :py:meth:`post_step`: Called after each time step.
 
+    4. :py:meth:`post_solve`: Called once after the run is finished.
+
     Finally, it is a good idea to overload the :py:meth:`post_process` method
     to perform any post processing for the generated data.
 
@@ -373,6 +379,16 @@ class Application(object):
             default=False,
             help="Do not dump any output files.")
 
+        # --profile-equations
+        parser.add_argument(
+            "--profile-equations",
+            action="store_true",
+            dest="profile_equations",
+            default=False,
+            help="Record the time taken by each group, loop and the NNPS " +
+            "updates and write a report to the output directory at the " +
+            "end of the simulation.")
+
         # -o/ --fname
         parser.add_argument(
             "-o",
@@ -405,6 +421,64 @@ class Application(object):
             default=None,
             help="Dump detailed output.")
 
+        # --output-codec
+        parser.add_argument(
+            "--output-codec",
+            action="store",
+            dest="output_codec",
+            default=None,
+            choices=['auto', 'zstd', 'lz4', 'zlib', 'none'],
+            help="Encode the output files with byte shuffling and the given "
+            "compressor, integer properties and constants are stored as "
+            "differences with the previous file (only for npz files).  HDF5 "
+            "files use the corresponding HDF5 filters, zstd and lz4 need "
+            "the hdf5plugin package.")
+
+        parser.add_argument(
+            "--output-tolerance",
+            action="store",
+            dest="output_tolerance",
+            default=None,
+            help="Comma separated prop=tolerance values, the properties are "
+            "quantized to the given absolute tolerance when --output-codec "
+            "is used, for example: x=1e-6,y=1e-6,u=1e-5")
+
+        parser.add_argument(
+            "--output-keyframe",
+            action="store",
+            dest="output_keyframe",
+            default=10,
+            type=int,
+            help="Number of output files after which the data is stored "
+            "without reference to previous files with --output-codec.")
+
+        # --lod-freq
+        parser.add_argument(
+            "--lod-freq",
+            action="store",
+            dest="lod_freq",
+            default=0,
+            type=int,
+            help="Frequency of the decimated, level of detail, output that "
+            "is saved in the lod sub-directory of the output directory.")
+
+        parser.add_argument(
+            "--lod-cell-size",
+            action="store",
+            dest="lod_cell_size",
+            default=None,
+            type=float,
+            help="Keep one particle in each cell of this size in the level "
+            "of detail output (defaults to twice the largest h).")
+
+        parser.add_argument(
+            "--lod-props",
+            action="store",
+            dest="lod_props",
+            default=None,
+            help="Comma separated properties to save in the level of detail "
+            "output (defaults to the output arrays).")
+
         # -z/--compress-output
         parser.add_argument(
             "-z",
@@ -444,9 +518,49 @@ class Application(object):
             "--omp-schedule",
             action="store",
             dest="omp_schedule",
-            default="dynamic,64",
+            default=None,
             help="""Schedule how loop iterations
-            are divided amongst multiple threads""")
+            are divided amongst multiple threads, defaults to dynamic,64
+            or to static with --numa.""")
+
+        # --openmp-tune
+        parser.add_argument(
+            "--openmp-tune",
+            action="store_true",
+            dest="openmp_tune",
+            default=False,
+            help="Time the first steps with different thread counts and " +
+            "OpenMP schedules and use the fastest for each loop and the " +
+            "NNPS update, the choice is saved in the info file.")
+
+        # --openmp-tune-threads
+        parser.add_argument(
+            "--openmp-tune-threads",
+            action="store",
+            dest="openmp_tune_threads",
+            default=None,
+            help="Comma separated thread counts to try with " +
+            "--openmp-tune, defaults to the powers of two up to the " +
+            "number of threads.")
+
+        # --numa
+        parser.add_argument(
+            "--numa",
+            action="store_true",
+            dest="numa",
+            default=False,
+            help="Place the particle properties on the NUMA node of the " +
+            "OpenMP threads using them, pin the threads to the CPUs and " +
+            "use the static OpenMP schedule.")
+
+        # --numa-cpus
+        parser.add_argument(
+            "--numa-cpus",
+            action="store",
+            dest="numa_cpus",
+            default=None,
+            help="Comma separated CPUs to pin the OpenMP threads to with " +
+            "--numa, defaults to the CPUs available to the process.")
 
         # --opencl
         parser.add_argument(
@@ -584,6 +698,14 @@ class Application(object):
             default=self.cache_nnps,
             help="Option to enable the use of neighbor caching.")
 
+        nnps_options.add_argument(
+            "--pair-cache",
+            dest="pair_cache",
+            action="store_true",
+            default=False,
+            help="Cache the kernel values of pairs between groups that " +
+            "declare they do not move the particles (uses more memory).")
+
         nnps_options.add_argument(
             "--sort-gids",
             dest="sort_gids",
@@ -696,9 +818,10 @@ class Application(object):
             action="store",
             dest="parallel_output_mode",
             default='collected',
-            choices=['collected', 'distributed'],
+            choices=['collected', 'distributed', 'parallel'],
             help="""Use 'collected' to dump one output at
-            root or 'distributed' for every processor. """)
+            root, 'distributed' for every processor or 'parallel' to
+            have all processors write to one HDF5 file. """)
 
         # solver interfaces
         interfaces = parser.add_argument_group("Interfaces",
@@ -731,6 +854,33 @@ class Application(object):
                   " given 'auto' (8800+ means first available port "
                   "number 8800 onwards);"))
 
+        interfaces.add_argument(
+            "--shared-memory",
+            action="store",
+            dest="shared_memory",
+            metavar="NAME",
+            default=None,
+            help=("Publish the particle data in shared memory blocks "
+                  "with the given name for live viewing, see "
+                  "pysph.solver.solver_interfaces.SharedMemoryReader."))
+
+        interfaces.add_argument(
+            "--shared-memory-props",
+            action="store",
+            dest="shared_memory_props",
+            metavar="PROPS",
+            default=None,
+            help=("Comma separated properties to publish in shared memory, "
+                  "defaults to the output properties."))
+
+        interfaces.add_argument(
+            "--shared-memory-freq",
+            action="store",
+            dest="shared_memory_freq",
+            type=int,
+            default=10,
+            help=("Iterations between publishing data in shared memory."))
+
         interfaces.add_argument(
             "--octree-leaf-size",
             dest="octree_leaf_size",
@@ -931,9 +1081,13 @@ class Application(object):
         if options.with_openmp is not None:
             config.use_openmp = options.with_openmp
             logger.info('Using OpenMP')
-        if options.omp_schedule is not None:
-            config.set_omp_schedule(options.omp_schedule)
-            logger.info('Using OpenMP schedule %s', options.omp_schedule)
+        omp_schedule = options.omp_schedule
+        if omp_schedule is None and options.numa:
+            # The first touch places the particles as a static schedule.
+            omp_schedule = 'static'
+        if omp_schedule is not None:
+            config.set_omp_schedule(omp_schedule)
+            logger.info('Using OpenMP schedule %s', omp_schedule)
 
         if options.with_opencl:
             config.use_opencl = True
@@ -1121,6 +1275,9 @@ class Application(object):
 
         nnps = self.nnps
 
+        if options.pair_cache and hasattr(nnps, 'set_use_pair_cache'):
+            nnps.set_use_pair_cache(True)
+
         # inform NNPS if it's working in parallel
         if self.num_procs > 1:
             nnps.set_in_parallel(True)
@@ -1169,6 +1326,30 @@ class Application(object):
         if options.freq is not None:
             solver.set_print_freq(options.freq)
 
+        if options.output_codec is not None:
+            tolerances = {}
+            if options.output_tolerance:
+                for item in options.output_tolerance.split(','):
+                    prop, tol = item.split('=')
+                    tolerances[prop.strip()] = float(tol)
+            codec = OutputCodec(
+                compressor=options.output_codec, tolerances=tolerances,
+                keyframe_interval=options.output_keyframe
+            )
+            if has_h5py():
+                # The output is written as HDF5 files, fail early if the
+                # compressor cannot be used with them.
+                get_hdf5_compression(codec.requested_compressor)
+            solver.set_output_codec(codec)
+
+        if options.lod_freq > 0:
+            lod_props = None
+            if options.lod_props is not None:
+                lod_props = [x.strip() for x in options.lod_props.split(',')]
+            solver.set_lod_output(
+                options.lod_freq, options.lod_cell_size, lod_props
+            )
+
         # output printing level (default is not detailed)
         if options.detailed_output is not None:
             solver.set_output_printing_level(options.detailed_output)
@@ -1194,6 +1375,20 @@ class Application(object):
         if options.n_damp is not None:
             solver.set_n_damp(options.n_damp)
 
+        solver.set_profile_equations(options.profile_equations)
+        if options.openmp_tune:
+            threads = None
+            if options.openmp_tune_threads is not None:
+                threads = [
+                    int(x) for x in options.openmp_tune_threads.split(',')
+                ]
+            solver.set_openmp_tuning(True, threads)
+        if options.numa:
+            cpus = None
+            if options.numa_cpus is not None:
+                cpus = [int(x) for x in options.numa_cpus.split(',')]
+            solver.set_numa(True, cpus)
+
         # setup the solver. This is where the code is compiled
         solver.setup(
             particles=self.particles,
@@ -1270,6 +1465,28 @@ class Application(object):
                 logger.info('Started multiprocessing interface on %s:%d' %
                             (host, port))
 
+        if options.shared_memory:
+            if not has_shared_memory():
+                raise RuntimeError(
+                    '--shared-memory needs Python 3.8 or above for '
+                    'multiprocessing.shared_memory.'
+                )
+            from pysph.solver.solver_interfaces import SharedMemoryPublisher
+            name = options.shared_memory
+            if self.num_procs > 1:
+                name = '%s_%d' % (name, self.rank)
+            props = options.shared_memory_props
+            if props is not None:
+                props = [x.strip() for x in props.split(',')]
+            interface = SharedMemoryPublisher(
+                self.particles, props=props, name=name
+            )
+            self._interfaces.append(interface)
+            self.command_manager.add_function(
+                interface.publish, options.shared_memory_freq
+            )
+            logger.info('Publishing particle data in shared memory %s' % name)
+
     def _configure(self):
         """Configures the application using the options from the
         command-line.
@@ -1363,7 +1580,7 @@ class Application(object):
 
     def _setup_solver_callbacks(self, obj):
         """Setup any solver callbacks given an object with any of `pre_step`,
-        `post_step' and `post_stage`
+        `post_step', `post_stage` and `post_solve`
         """
         if is_overloaded_method(obj.pre_step):
             self.solver.add_pre_step_callback(obj.pre_step)
@@ -1374,6 +1591,9 @@ class Application(object):
         if is_overloaded_method(obj.post_step):
             self.solver.add_post_step_callback(obj.post_step)
 
+        if is_overloaded_method(obj.post_solve):
+            self.solver.add_post_solve_callback(obj.post_solve)
+
     def _stop_interfaces(self):
         for interface in self._interfaces:
             interface.stop()
@@ -1440,8 +1660,12 @@ class Application(object):
             "Post-step callbacks:\n%s\n", repr(self.solver.post_step_callbacks)
         )
         logger.info(
-            "Post-stage callbacks:\n%s\n%s\n",
-            repr(self.solver.post_stage_callbacks), sep
+            "Post-stage callbacks:\n%s\n",
+            repr(self.solver.post_stage_callbacks)
+        )
+        logger.info(
+            "Post-solve callbacks:\n%s\n%s\n",
+            repr(self.solver.post_solve_callbacks), sep
         )
 
     def _mayavi_config(self, code):
@@ -1564,8 +1788,13 @@ class Application(object):
         end_time = time.time()
         run_duration = end_time - start_time
         self._message("Run took: %.5f secs" % (run_duration))
-        self._write_info(
-            self.info_filename, completed=True, cpu_time=run_duration)
+        if self.solver.output_codec is not None:
+            logger.info(self.solver.output_codec.get_report())
+        info = dict(completed=True, cpu_time=run_duration)
+        openmp_tuning = self.solver.get_openmp_tuning()
+        if openmp_tuning is not None:
+            info['openmp_tuning'] = openmp_tuning
+        self._write_info(self.info_filename, **info)
 
         self._stop_interfaces()
 
@@ -1775,6 +2004,13 @@ class Application(object):
         """
         pass
 
+    def post_solve(self, solver):
+        """If overloaded, this is called automatically once the run is
+        finished and the final output is dumped.  The method is passed the
+        solver instance.
+        """
+        pass
+
     def post_process(self, info_fname_or_directory):
         """Given an info filename or a directory containing the info file, read
         the information and do any post-processing of the results.  Please
@@ -8,6 +8,7 @@ import sys
 
 from pysph.base.particle_array import ParticleArray
 from pysph.base.utils import get_particles_info, get_particle_array
+from pysph.solver.output_codec import decode_particles
 from pysph import has_h5py
 
 output_formats = ('hdf5', 'npz')
@@ -53,8 +54,9 @@ def gather_array_data(all_array_data, comm):
 class Output(object):
     """ Class that handles output for simulation """
     def __init__(self, detailed_output=False, only_real=True, mpi_comm=None,
-                 compress=False):
+                 compress=False, codec=None):
         self.compress = compress
+        self.codec = codec
         self.detailed_output = detailed_output
         self.only_real = only_real
         self.mpi_comm = mpi_comm
@@ -76,15 +78,17 @@ class Output(object):
         if mpi_comm is None or mpi_comm.Get_rank() == 0:
             self._dump(fname)
 
-    def load(self, fname):
-        return self._load(fname)
+    def load(self, fname, props=None):
+        return self._load(fname, props)
 
     def _dump(self, fname):
         """ Implement the method for writing the output to a file here """
         raise NotImplementedError()
 
-    def _load(self, fname):
-        """ Implement the method for loading from file here """
+    def _load(self, fname, props=None):
+        """ Implement the method for loading from file here, only the
+        properties in `props` are to be loaded if it is not None.
+        """
         raise NotImplementedError()
 
 
@@ -105,6 +109,12 @@ def _dict_bytes_to_str(d):
     return res
 
 
+def _select(properties, props):
+    if props is None:
+        return properties
+    return dict((k, v) for k, v in properties.items() if k in props)
+
+
 def _get_dict_from_arrays(arrays):
     arrays.shape = (1,)
     res = arrays[0]
@@ -120,11 +130,18 @@ class NumpyOutput(Output):
         save_method = numpy.savez_compressed if self.compress else numpy.savez
         output_data = {"particles": self.particle_data,
                        "solver_data": self.solver_data}
+        if self.codec is not None:
+            # The data is already compressed by the codec.
+            output_data['codec'] = self.codec.encode_particles(
+                filename, self.particle_data, self.all_array_data
+            )
+            numpy.savez(filename, version=3, **output_data)
+            return
         for name, arrays in self.all_array_data.items():
             self.particle_data[name]["arrays"] = arrays
         save_method(filename, version=2, **output_data)
 
-    def _load(self, fname):
+    def _load(self, fname, props=None):
         data = numpy.load(fname, encoding='bytes', allow_pickle=True)
 
         if 'version' not in data.files:
@@ -139,21 +156,29 @@ class NumpyOutput(Output):
         if version == 1:
             arrays = _get_dict_from_arrays(data["arrays"])
             for array_name in arrays:
-                array = get_particle_array(name=array_name,
-                                           **arrays[array_name])
+                array_data = _select(arrays[array_name], props)
+                array = get_particle_array(name=array_name, **array_data)
                 ret["arrays"][array_name] = array
 
-        elif version == 2:
+        elif version in (2, 3):
             particles = _get_dict_from_arrays(data["particles"])
+            if version == 3:
+                decode_particles(
+                    fname, particles, _get_dict_from_arrays(data["codec"]),
+                    props
+                )
 
             for array_name, array_info in particles.items():
+                properties = _select(array_info['properties'], props)
                 for prop, data in array_info['arrays'].items():
-                    array_info['properties'][prop]['data'] = data
+                    if prop in properties:
+                        properties[prop]['data'] = data
                 array = ParticleArray(name=array_name,
                                       constants=array_info["constants"],
-                                      **array_info["properties"])
+                                      **properties)
                 array.set_output_arrays(
-                    array_info.get('output_property_arrays', [])
+                    [x for x in array_info.get('output_property_arrays', [])
+                     if x in properties]
                 )
                 ret["arrays"][array_name] = array
 
@@ -177,7 +202,7 @@ class HDFOutput(Output):
                 self._set_properties(pdata, arrays_grp, data)
             self._set_solver_data(solver_grp)
 
-    def _load(self, fname):
+    def _load(self, fname, props=None):
         if has_h5py():
             import h5py
         else:
@@ -189,10 +214,10 @@ class HDFOutput(Output):
             solver_grp = f['solver_data']
             particles_grp = f['particles']
             ret["solver_data"] = self._get_solver_data(solver_grp)
-            ret["arrays"] = self._get_particles(particles_grp)
+            ret["arrays"] = self._get_particles(particles_grp, props)
         return ret
 
-    def _get_particles(self, grp):
+    def _get_particles(self, grp, props=None):
 
         particles = {}
         for name, prop_array in grp.items():
@@ -204,6 +229,8 @@ class HDFOutput(Output):
 
             for pname, h5obj in arrays_grp.items():
                 prop_name = _to_str(h5obj.attrs['name'])
+                if props is not None and prop_name not in props:
+                    continue
                 type_ = _to_str(h5obj.attrs['type'])
                 default = h5obj.attrs['default']
                 stride = h5obj.attrs.get('stride', 1)
@@ -232,7 +259,19 @@ class HDFOutput(Output):
             constants[_to_str(const_name)] = numpy.array(const_data)
         return constants
 
-    def _get_compress_options(self):
+    def _get_compress_options(self, prop=None):
+        if self.codec is not None:
+            # HDF5 filters are used instead of the codec.
+            options = get_hdf5_compression(self.codec.requested_compressor)
+            if options and self.codec.shuffle:
+                options['shuffle'] = True
+            tolerance = self.codec.tolerances.get(prop)
+            if tolerance is not None:
+                # Decimal digits kept by the scale-offset filter, at least
+                # one as the filter needs a positive scale factor.
+                digits = int(numpy.ceil(-numpy.log10(2.0*tolerance)))
+                options['scaleoffset'] = max(digits, 1)
+            return options
         if self.compress:
             return dict(compression="gzip",
                         compression_opts=COMPRESSION_LEVEL)
@@ -247,10 +286,12 @@ class HDFOutput(Output):
             constGroup.create_dataset(constName, data=constArray, **c_kw)
 
     def _set_properties(self, pdata, ptype_grp, data):
-        c_kw = self._get_compress_options()
         for propname, attributes in pdata['properties'].items():
             if propname in data:
                 array = data[propname]
+                c_kw = self._get_compress_options(propname)
+                if array.dtype.kind != 'f':
+                    c_kw.pop('scaleoffset', None)
                 prop = ptype_grp.create_dataset(propname, data=array, **c_kw)
                 prop.attrs['stored'] = True
             else:
@@ -267,7 +308,242 @@ class HDFOutput(Output):
             grp.attrs[name] = data
 
 
-def load(fname):
+def has_parallel_h5py():
+    """Return True if h5py is built with MPI support.
+    """
+    if not has_h5py():
+        return False
+    import h5py
+    return bool(h5py.get_config().mpi)
+
+
+class ParallelHDFOutput(HDFOutput):
+    """Write the data of all ranks of a parallel run to a single HDF5 file
+    without gathering it on the root.
+
+    The total number of particles of each array is computed and every rank
+    writes its particles into its slice of the shared datasets.  If h5py is
+    built with MPI support, the file is opened by all ranks with the `mpio`
+    driver and the ranks write their data concurrently.  Otherwise, the data
+    is aggregated on one I/O rank for every `ranks_per_writer` ranks and the
+    I/O ranks write their data one after another.  The file is the same as
+    that written by `HDFOutput` and is loaded in the same way.
+    """
+
+    # Number of ranks whose data is written by each I/O rank when h5py is
+    # not built with MPI support.
+    ranks_per_writer = 16
+
+    def dump(self, fname, particles, solver_data):
+        comm = self.mpi_comm
+        self.all_array_data = {}
+        counts = {}
+        for array in particles:
+            self.all_array_data[array.name] = array.get_property_arrays(
+                all=self.detailed_output,
+                only_real=self.only_real
+            )
+            counts[array.name] = array.get_number_of_particles(
+                self.only_real
+            )
+        # All ranks must create identical datasets.
+        self.particle_data, self.solver_data = comm.bcast(
+            (dict(get_particles_info(particles)), solver_data), root=0
+        )
+        self.counts = comm.allgather(counts)
+        if has_parallel_h5py():
+            self._dump_collective(fname)
+        else:
+            self._dump_aggregated(fname)
+
+    def _get_start(self, name, rank):
+        return sum(c[name] for c in self.counts[:rank])
+
+    def _create_datasets(self, f, compress=True):
+        f.create_group('solver_data')
+        self._set_solver_data(f['solver_data'])
+        particles_grp = f.create_group('particles')
+        for ptype, pdata in self.particle_data.items():
+            ptype_grp = particles_grp.create_group(ptype)
+            arrays_grp = ptype_grp.create_group('arrays')
+            const_grp = ptype_grp.create_group('constants')
+            c_kw = self._get_compress_options() if compress else {}
+            for const_name, const_array in pdata['constants'].items():
+                const_grp.create_dataset(const_name, data=const_array, **c_kw)
+            total = sum(c[ptype] for c in self.counts)
+            stored = self.all_array_data[ptype]
+            for propname, attributes in pdata['properties'].items():
+                if propname in stored:
+                    stride = attributes.get('stride', 1) or 1
+                    c_kw = self._get_compress_options(propname)
+                    dtype = stored[propname].dtype
+                    if not compress or total == 0:
+                        c_kw = {}
+                    elif dtype.kind != 'f':
+                        c_kw.pop('scaleoffset', None)
+                    prop = arrays_grp.create_dataset(
+                        propname, (total*stride,), dtype=dtype, **c_kw
+                    )
+                    prop.attrs['stored'] = True
+                else:
+                    prop = arrays_grp.create_dataset(propname, (0,))
+                    prop.attrs['stored'] = False
+                for attname, value in attributes.items():
+                    if value is None:
+                        value = 'None'
+                    prop.attrs[attname] = value
+
+    def _write_data(self, f, all_array_data, rank):
+        for ptype, data in all_array_data.items():
+            arrays_grp = f['particles'][ptype]['arrays']
+            start = self._get_start(ptype, rank)
+            n = self.counts[rank][ptype]
+            if n == 0:
+                continue
+            for propname, array in data.items():
+                stride = array.size//n
+                arrays_grp[propname][start*stride:(start + n)*stride] = array
+
+    def _dump_collective(self, fname):
+        import h5py
+        comm = self.mpi_comm
+        with h5py.File(fname, 'w', driver='mpio', comm=comm) as f:
+            # Compression requires collective writes which are not used.
+            self._create_datasets(f, compress=False)
+            self._write_data(f, self.all_array_data, comm.Get_rank())
+        comm.barrier()
+
+    def _dump_aggregated(self, fname):
+        import h5py
+        comm = self.mpi_comm
+        rank = comm.Get_rank()
+        size = comm.Get_size()
+        rpw = max(1, self.ranks_per_writer)
+        group = comm.Split(rank//rpw, rank)
+        group_data = group.gather(self.all_array_data, root=0)
+        group.Free()
+        if rank % rpw == 0:
+            if rank == 0:
+                mode = 'w'
+            else:
+                comm.recv(source=rank - rpw, tag=11)
+                mode = 'r+'
+            with h5py.File(fname, mode) as f:
+                if rank == 0:
+                    self._create_datasets(f)
+                for i, data in enumerate(group_data):
+                    self._write_data(f, data, rank + i)
+            if rank + rpw < size:
+                comm.send(True, dest=rank + rpw, tag=11)
+        comm.barrier()
+
+
+def get_hdf5_compression(compressor):
+    """Return the h5py dataset options that compress the data with the given
+    compressor of an :py:class:`pysph.solver.output_codec.OutputCodec`.
+
+    With 'auto' the lzf filter of h5py is used and 'zlib' uses the gzip
+    filter.  The 'zstd' and 'lz4' filters need the hdf5plugin package and a
+    ValueError is raised if it is not available.
+    """
+    if compressor == 'auto':
+        return dict(compression='lzf')
+    elif compressor == 'zlib':
+        return dict(compression='gzip', compression_opts=1)
+    elif compressor == 'none':
+        return {}
+    elif compressor in ('zstd', 'lz4'):
+        try:
+            import hdf5plugin
+        except ImportError:
+            raise ValueError(
+                'The %s compressor needs the hdf5plugin package with HDF5 '
+                'output, use another compressor or the npz output.' %
+                compressor
+            )
+        if compressor == 'zstd':
+            return dict(hdf5plugin.Zstd())
+        else:
+            return dict(hdf5plugin.LZ4())
+    else:
+        raise ValueError('Unknown compressor %s' % compressor)
+
+
+def get_decimated_indices(pa, cell_size, only_real=True):
+    """Return the sorted indices of one particle in each cell of a grid of
+    the given cell size, this is the first particle of each cell.
+
+    Parameters
+    ----------
+
+    pa: ParticleArray
+        The particle array to decimate.
+    cell_size: float
+        Size of the cells used to select the particles.
+    only_real: bool
+        Only consider the real particles.
+    """
+    if only_real:
+        n = pa.get_number_of_particles(real=True)
+    else:
+        n = pa.get_number_of_particles()
+    if n == 0:
+        return numpy.zeros(0, dtype=numpy.int64)
+    x, y, z = pa.get('x', 'y', 'z', only_real_particles=only_real)
+    cells = numpy.empty((n, 3), dtype=numpy.int64)
+    for i, coord in enumerate((x, y, z)):
+        cells[:, i] = numpy.floor(coord/cell_size)
+    unique, indices = numpy.unique(cells, axis=0, return_index=True)
+    indices.sort()
+    return indices
+
+
+def decimate(particles, cell_size=None, props=None, only_real=True):
+    """Return a spatially decimated copy of the given particle arrays.
+
+    One particle is retained in each cell of a grid with the given cell size
+    and only the given properties are copied.  This is used to write a
+    reduced, level of detail output that is quick to load and view.
+
+    Parameters
+    ----------
+
+    particles: sequence(ParticleArray)
+        Particle arrays to decimate.
+    cell_size: float or None
+        Size of the cells, if None twice the largest smoothing length of each
+        array is used and arrays without particles or smoothing lengths are
+        not decimated.
+    props: sequence or None
+        The properties to retain, if None the output arrays of each particle
+        array are used.  The positions are always retained.
+    only_real: bool
+        Only consider the real particles.
+    """
+    result = []
+    for pa in particles:
+        if props is None:
+            pa_props = list(pa.output_property_arrays)
+        else:
+            pa_props = [x for x in props if x in pa.properties]
+        pa_props = ['x', 'y', 'z'] + [
+            x for x in pa_props if x not in ('x', 'y', 'z')
+        ]
+        size = cell_size
+        n = pa.get_number_of_particles(real=only_real)
+        if size is None and 'h' in pa.properties and n > 0:
+            size = 2.0*pa.get('h', only_real_particles=only_real).max()
+        if size is None or size <= 0.0:
+            indices = numpy.arange(n)
+        else:
+            indices = get_decimated_indices(pa, size, only_real)
+        lod = pa.extract_particles(indices, props=pa_props)
+        lod.set_output_arrays(pa_props)
+        result.append(lod)
+    return result
+
+
+def load(fname, props=None):
     """
     Load the output data
 
@@ -275,6 +551,9 @@ def load(fname):
     ----------
     fname: str
         Name of the file or full path
+    props: sequence or None
+        Names of the only properties to load, all of them are loaded if None.
+        With HDF5 files the other properties are not read at all.
 
 
     Examples
@@ -297,14 +576,15 @@ def load(fname):
     elif fname.endswith('hdf5'):
         output = HDFOutput()
     if os.path.isfile(fname):
-        return output.load(fname)
+        return output.load(fname, props)
     else:
         msg = "File not present"
         raise RuntimeError(msg)
 
 
 def dump(filename, particles, solver_data, detailed_output=False,
-         only_real=True, mpi_comm=None, compress=False):
+         only_real=True, mpi_comm=None, compress=False, codec=None,
+         parallel_io=False):
 
     """
     Dump the given particles and solver data to the given filename.
@@ -333,8 +613,19 @@ def dump(filename, particles, solver_data, detailed_output=False,
     compress: bool
         Specify if the  file is to be compressed or not.
 
+    codec: pysph.solver.output_codec.OutputCodec
+        Encode the data with the given codec.  With HDF5 files, the shuffle
+        and compression filters of HDF5 are used instead, see
+        `get_hdf5_compression`, and quantized properties use the
+        scale-offset filter.
+
+    parallel_io: bool
+        With an `mpi_comm` and HDF5 output, write the data of all ranks to
+        the file without gathering it on the root, see `ParallelHDFOutput`.
+
     If `mpi_comm` is not passed or is set to None the local particles alone
-    are dumped, otherwise only rank 0 dumps the output.
+    are dumped, otherwise only rank 0 dumps the output unless `parallel_io`
+    is set.
 
     """
     if filename.endswith(output_formats):
@@ -344,9 +635,14 @@ def dump(filename, particles, solver_data, detailed_output=False,
         filename = fname + '.hdf5'
     if filename.endswith('hdf5') and has_h5py():
         file_format = 'hdf5'
-        output = HDFOutput(detailed_output, only_real, mpi_comm, compress)
+        if parallel_io and mpi_comm is not None:
+            klass = ParallelHDFOutput
+        else:
+            klass = HDFOutput
+        output = klass(detailed_output, only_real, mpi_comm, compress, codec)
     else:
-        output = NumpyOutput(detailed_output, only_real, mpi_comm, compress)
+        output = NumpyOutput(detailed_output, only_real, mpi_comm, compress,
+                             codec)
         file_format = 'npz'
     filename = fname + '.' + file_format
     output.dump(filename, particles, solver_data)
@@ -0,0 +1,347 @@
+"""Encode the particle data of output files compactly.
+
+The `OutputCodec` is used by the numpy output (see
+:py:func:`pysph.solver.output.dump`) to store each property as a byte
+shuffled buffer compressed with zstd or lz4 when these are installed and with
+zlib otherwise.  Floating point properties can be quantized to a given
+absolute tolerance and integer properties and constants are stored as a
+difference with the previous snapshot which is very compact for properties
+like the tag, gid or pid which rarely change.  Every `keyframe_interval`
+snapshots, the data is stored without reference to any other file.
+
+The files are decoded transparently by :py:func:`pysph.solver.output.load`.
+Note that a snapshot using delta encoding requires the previous snapshots
+back to the last keyframe to be present in the same directory.
+"""
+
+import os
+import time
+import zlib
+
+import numpy as np
+
+# Increment this if the encoding changes.
+CODEC_VERSION = 1
+
+# Cache of the last decoded reference snapshot, this makes loading a
+# sequence of files in order efficient.
+_reference_cache = {}
+
+
+def _get_compressor(name):
+    """Return the compress and decompress functions for the given name.
+    """
+    if name == 'zstd':
+        import zstandard
+        return (zstandard.ZstdCompressor(level=3).compress,
+                zstandard.ZstdDecompressor().decompress)
+    elif name == 'lz4':
+        import lz4.frame
+        return lz4.frame.compress, lz4.frame.decompress
+    elif name == 'zlib':
+        return (lambda data: zlib.compress(data, 1)), zlib.decompress
+    elif name == 'none':
+        return bytes, bytes
+    else:
+        raise ValueError('Unknown compressor %s' % name)
+
+
+def get_available_compressor():
+    """Return the fastest compressor that is available.
+    """
+    for name in ('zstd', 'lz4'):
+        try:
+            _get_compressor(name)
+        except ImportError:
+            continue
+        return name
+    return 'zlib'
+
+
+def shuffle(data):
+    """Return the bytes of the array with the bytes of each element grouped
+    together, the most significant bytes are then next to each other and
+    compress much better.
+    """
+    data = np.ascontiguousarray(data).ravel()
+    itemsize = data.dtype.itemsize
+    if itemsize == 1:
+        return data.tobytes()
+    return np.ascontiguousarray(
+        data.view(np.uint8).reshape(-1, itemsize).T
+    ).tobytes()
+
+
+def unshuffle(buf, dtype):
+    """Undo the :py:func:`shuffle` of the given bytes.
+    """
+    dtype = np.dtype(dtype)
+    data = np.frombuffer(buf, dtype=np.uint8)
+    if dtype.itemsize == 1:
+        return data.view(dtype).copy()
+    return np.ascontiguousarray(
+        data.reshape(dtype.itemsize, -1).T
+    ).view(dtype).ravel()
+
+
+def _get_uint_type(max_value):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+
+def quantize(data, tolerance):
+    """Quantize the data so that the absolute error is at most the tolerance.
+
+    Returns the quantized unsigned integers, the offset and the step.
+    """
+    step = 2.0*tolerance
+    offset = float(data.min()) if data.size > 0 else 0.0
+    q = np.rint((data.astype(np.float64) - offset)/step)
+    max_value = q.max() if q.size > 0 else 0
+    return q.astype(_get_uint_type(max_value)), offset, step
+
+
+def dequantize(q, offset, step, dtype):
+    return (offset + q*step).astype(dtype)
+
+
+class OutputCodec(object):
+    """Encodes and decodes the particle data of output files.
+
+    An instance keeps the last snapshot written for delta encoding and the
+    statistics of the data written, see :py:meth:`get_report`.
+    """
+
+    def __init__(self, compressor='auto', shuffle=True, tolerances=None,
+                 delta=True, keyframe_interval=10):
+        """
+        Parameters
+        ----------
+
+        compressor: str
+            One of 'auto', 'zstd', 'lz4', 'zlib' or 'none'.  With 'auto' the
+            fastest available one is used.
+        shuffle: bool
+            Shuffle the bytes before compressing.
+        tolerances: dict or None
+            Maximum absolute error for each floating point property that is
+            to be quantized, all other properties are stored exactly.
+        delta: bool
+            Store integer properties and constants as a difference with the
+            previous snapshot.
+        keyframe_interval: int
+            Number of snapshots after which the data is stored without any
+            reference.
+        """
+        tolerances = dict(tolerances) if tolerances else {}
+        for prop, tolerance in tolerances.items():
+            if not tolerance > 0.0:
+                raise ValueError(
+                    'Tolerance of %s must be positive, given %r.' % (
+                        prop, tolerance)
+                )
+        # The compressor asked for, the HDF5 output picks its own with 'auto'.
+        self.requested_compressor = compressor
+        if compressor == 'auto':
+            compressor = get_available_compressor()
+        # Fails early if the compressor is not available.
+        self._compress = _get_compressor(compressor)[0]
+        self.compressor = compressor
+        self.shuffle = shuffle
+        self.tolerances = tolerances
+        self.delta = delta
+        self.keyframe_interval = keyframe_interval
+        self._previous = None
+        self._since_keyframe = 0
+        self.reset_stats()
+
+    # ### Public protocol ###################################################
+    def reset_stats(self):
+        self.stats = dict(files=0, raw_bytes=0, encoded_bytes=0, time=0.0)
+
+    def get_report(self):
+        """Return a summary of the size and throughput of the data written.
+        """
+        s = self.stats
+        ratio = s['raw_bytes']/max(s['encoded_bytes'], 1)
+        rate = s['raw_bytes']/max(s['time'], 1e-12)/1e6
+        return (
+            'Output codec (%s): %d files, %.2f MB -> %.2f MB '
+            '(ratio %.2f), encoding at %.1f MB/s' % (
+                self.compressor, s['files'], s['raw_bytes']/1e6,
+                s['encoded_bytes']/1e6, ratio, rate)
+        )
+
+    def encode(self, data, tolerance=None, reference=None):
+        """Return a dictionary with the encoded data.
+        """
+        data = np.ascontiguousarray(data)
+        info = dict(dtype=data.dtype.str, shape=data.shape,
+                    compressor=self.compressor, shuffle=self.shuffle)
+        if (tolerance is not None and data.dtype.kind == 'f' and
+                np.all(np.isfinite(data))):
+            data, offset, step = quantize(data, tolerance)
+            info['quantize'] = (offset, step)
+        elif (reference is not None and data.dtype.kind in 'iub' and
+                reference.shape == data.shape and
+                reference.dtype == data.dtype):
+            if data.dtype.kind == 'b':
+                data = np.not_equal(data, reference)
+            else:
+                data = data - reference
+            info['delta'] = True
+        info['stored_dtype'] = data.dtype.str
+        buf = shuffle(data) if self.shuffle else data.tobytes()
+        info['data'] = self._compress(buf)
+        return info
+
+    def encode_particles(self, fname, particle_data, all_array_data):
+        """Encode the arrays of `all_array_data` and the constants in
+        `particle_data` (see `pysph.base.utils.get_particles_info`) in place.
+
+        `fname` is the name of the file being written, the next snapshot
+        refers to it.  Returns the information on the codec to be saved in
+        the file.
+        """
+        start = time.time()
+        reference, previous = self._get_reference()
+        current = {}
+        raw = 0
+        encoded = 0
+        for name, info in particle_data.items():
+            prev_arrays, prev_consts = previous.get(name, ({}, {}))
+            arrays = {}
+            int_arrays = {}
+            for prop, data in all_array_data[name].items():
+                data = np.asarray(data)
+                arrays[prop] = enc = self.encode(
+                    data, self.tolerances.get(prop), prev_arrays.get(prop)
+                )
+                raw += data.nbytes
+                encoded += len(enc['data'])
+                if data.dtype.kind in 'iub':
+                    int_arrays[prop] = data.copy()
+            constants = {}
+            raw_constants = {}
+            for const, data in info['constants'].items():
+                raw_constants[const] = data = np.array(data)
+                raw += data.nbytes
+                prev = prev_consts.get(const)
+                if (prev is not None and prev.dtype == data.dtype and
+                        prev.shape == data.shape and
+                        np.array_equal(prev, data)):
+                    constants[const] = dict(same=True)
+                else:
+                    constants[const] = enc = self.encode(data)
+                    encoded += len(enc['data'])
+            info['arrays'] = arrays
+            info['constants'] = constants
+            current[name] = (int_arrays, raw_constants)
+
+        self._previous = (os.path.basename(fname), current)
+        self.stats['files'] += 1
+        self.stats['raw_bytes'] += raw
+        self.stats['encoded_bytes'] += encoded
+        self.stats['time'] += time.time() - start
+        return dict(version=CODEC_VERSION, reference=reference)
+
+    # ### Private protocol ##################################################
+    def _get_reference(self):
+        """Return the name of the reference file and its data.
+        """
+        if (not self.delta or self._previous is None or
+                self._since_keyframe >= self.keyframe_interval - 1):
+            self._since_keyframe = 0
+            return None, {}
+        self._since_keyframe += 1
+        return self._previous
+
+
+def decode(info, reference=None):
+    """Decode the data encoded by :py:meth:`OutputCodec.encode`.
+    """
+    dtype = np.dtype(info['dtype'])
+    stored = np.dtype(info['stored_dtype'])
+    buf = _get_compressor(info['compressor'])[1](info['data'])
+    if info['shuffle']:
+        data = unshuffle(buf, stored)
+    else:
+        data = np.frombuffer(buf, dtype=stored).copy()
+    if 'quantize' in info:
+        offset, step = info['quantize']
+        data = dequantize(data, offset, step, dtype)
+    elif info.get('delta'):
+        if reference is None:
+            raise RuntimeError(
+                'The reference data required to decode the array is missing.'
+            )
+        if dtype.kind == 'b':
+            data = np.not_equal(reference.ravel(), data)
+        else:
+            data = data + reference.ravel()
+    return data.astype(dtype, copy=False).reshape(info['shape'])
+
+
+def _load_reference(fname):
+    """Return the integer arrays and constants of the given encoded file.
+    """
+    key = (os.path.abspath(fname), os.stat(fname).st_mtime)
+    if key in _reference_cache:
+        return _reference_cache[key]
+    data = np.load(fname, allow_pickle=True)
+    particles = data['particles'].item()
+    codec_info = data['codec'].item()
+    props = set()
+    for info in particles.values():
+        props.update(
+            prop for prop, enc in info['arrays'].items()
+            if np.dtype(enc['dtype']).kind in 'iub'
+        )
+    decode_particles(fname, particles, codec_info, props)
+    return _reference_cache[key]
+
+
+def decode_particles(fname, particles, codec_info, props=None):
+    """Decode the arrays and constants of the particles loaded from the given
+    file in place, only the given properties are decoded if `props` is not
+    None.
+    """
+    reference = codec_info.get('reference')
+    ref = {}
+    if reference is not None:
+        ref = _load_reference(
+            os.path.join(os.path.dirname(os.path.abspath(fname)), reference)
+        )
+    current = {}
+    # Only a decode with all the integer arrays may be used as a reference.
+    all_ints = True
+    for name, info in particles.items():
+        ref_arrays, ref_consts = ref.get(name, ({}, {}))
+        arrays = {}
+        int_arrays = {}
+        for prop, enc in info['arrays'].items():
+            if props is not None and prop not in props:
+                if np.dtype(enc['dtype']).kind in 'iub':
+                    all_ints = False
+                continue
+            arrays[prop] = data = decode(enc, ref_arrays.get(prop))
+            if data.dtype.kind in 'iub':
+                int_arrays[prop] = data
+        constants = {}
+        for const, enc in info['constants'].items():
+            if enc.get('same'):
+                constants[const] = ref_consts[const]
+            else:
+                constants[const] = decode(enc)
+        info['arrays'] = arrays
+        info['constants'] = constants
+        current[name] = (int_arrays, constants)
+
+    if all_ints:
+        # Keep the last two snapshots for the next ones to refer to.
+        key = (os.path.abspath(fname), os.stat(fname).st_mtime)
+        if len(_reference_cache) > 1:
+            _reference_cache.clear()
+        _reference_cache[key] = current
@@ -4,12 +4,19 @@ from __future__ import print_function
 import os
 import numpy
 
+from compyle.config import get_config
+
 # PySPH imports
+from pysph.base import numa
 from pysph.base.kernels import CubicSpline
 from pysph.sph.acceleration_eval import make_acceleration_evals
+from pysph.sph.equation_profiler import EquationProfiler
+from pysph.sph.openmp_tuner import OpenMPTuner
 from pysph.sph.sph_compiler import SPHCompiler
 
-from pysph.solver.utils import ProgressBar, load, dump
+from pysph.solver.utils import (
+    ProgressBar, load, dump, decimate, get_lod_directory, mkdir
+)
 
 import logging
 logger = logging.getLogger(__name__)
@@ -73,6 +80,10 @@ class Solver(object):
             The number of iterations after which particles should
             be re-ordered.  If zero, do not do this.
 
+        lod_freq : int
+            Decimated, level of detail, output files dumping frequency.  If
+            zero, these are not dumped.
+
         Example
         -------
 
@@ -110,6 +121,9 @@ class Solver(object):
         # List of functions to be called after each stage of the integrator.
         self.post_stage_callbacks = []
 
+        # List of functions to be called once the run is finished.
+        self.post_solve_callbacks = []
+
         # default output printing frequency
         self.pfreq = 100
 
@@ -141,6 +155,29 @@ class Solver(object):
         # flag to save Remote arrays
         self.output_only_real = True
 
+        # decimated (level of detail) output frequency, cell size and
+        # properties.
+        self.lod_freq = 0
+        self.lod_cell_size = None
+        self.lod_props = None
+
+        # codec used to encode the output, see set_output_codec.
+        self.output_codec = None
+
+        # profile the equations, see set_profile_equations.
+        self.profile_equations = False
+        self.equation_profiler = None
+
+        # tune the OpenMP threads and schedules, see set_openmp_tuning.
+        self.openmp_tuning = False
+        self.openmp_tuning_threads = None
+        self.openmp_tuner = None
+
+        # place the particle arrays on the NUMA nodes, see set_numa.
+        self.numa = False
+        self.numa_cpus = None
+        self.first_touch = None
+
         # output filename
         self.fname = self.__class__.__name__
 
@@ -200,8 +237,10 @@ class Solver(object):
             self.kernel = kernel
 
         mode = 'mpi' if self.in_parallel else 'serial'
+        tune_openmp = self.openmp_tuning and get_config().use_openmp
         self.acceleration_evals = make_acceleration_evals(
-            particles, equations, self.kernel, mode
+            particles, equations, self.kernel, mode,
+            profile=self.profile_equations, tune_openmp=tune_openmp
         )
 
         sph_compiler = SPHCompiler(
@@ -209,12 +248,28 @@ class Solver(object):
         )
         sph_compiler.compile()
 
+        profiled = [ae for ae in self.acceleration_evals if ae.profile]
+        if profiled:
+            self.equation_profiler = EquationProfiler()
+            for ae in profiled:
+                self.equation_profiler.add_acceleration_eval(ae)
+            self.equation_profiler.reset()
+            self.integrator.set_profiler(self.equation_profiler)
+        if tune_openmp:
+            self.openmp_tuner = OpenMPTuner(
+                self.equation_profiler, self.integrator,
+                thread_counts=self.openmp_tuning_threads
+            )
+
         # Set the nnps for all concerned objects.
         self.nnps = nnps
         for ae in self.acceleration_evals:
             ae.set_nnps(nnps)
         self.integrator.set_nnps(nnps)
 
+        if self.numa and get_config().use_openmp:
+            self._setup_numa()
+
         # set the parallel manager for the integrator
         self.integrator.set_parallel_manager(self.pm)
 
@@ -276,6 +331,22 @@ class Solver(object):
         """
         self.pre_step_callbacks.append(callback)
 
+    def add_post_solve_callback(self, callback):
+        """These callbacks are called once *after* the run is finished and
+        the final output is dumped.
+
+        The callbacks are passed the solver instance (i.e. self).
+
+        Example
+        -------
+
+        >>> def post_solve_callback_function(solver):
+        >>>     # This function is called at the end of the run.
+        >>>     print(solver.t, solver.count)
+        >>> solver.add_post_solve_callback(post_solve_callback_function)
+        """
+        self.post_solve_callbacks.append(callback)
+
     def append_particle_arrrays(self, arrays):
         """ Append the particle arrays to the existing particle arrays
         """
@@ -335,6 +406,52 @@ class Solver(object):
         """
         self.disable_output = value
 
+    def set_profile_equations(self, value):
+        """Profile the groups and equations of the acceleration evaluators.
+
+        The report is written to the output directory at the end of the
+        simulation, see `pysph.sph.equation_profiler.EquationProfiler`.  This
+        must be called before `setup`.
+        """
+        self.profile_equations = value
+
+    def set_openmp_tuning(self, value, thread_counts=None):
+        """Tune the number of threads and the OpenMP schedule of each loop
+        during the first time steps when OpenMP is used.
+
+        The thread counts to try may be given, the default is the powers of
+        two up to the number of threads available, see
+        `pysph.sph.openmp_tuner.OpenMPTuner`.  This must be called before
+        `setup`.
+        """
+        self.openmp_tuning = value
+        self.openmp_tuning_threads = thread_counts
+
+    def set_numa(self, value, cpus=None):
+        """Place the particle properties on the NUMA node of the OpenMP
+        threads that compute on them and pin the threads to the given CPUs
+        when OpenMP is used.
+
+        The CPUs default to those available to the process, see
+        `pysph.base.numa`.  This must be called before `setup`.
+        """
+        self.numa = value
+        self.numa_cpus = cpus
+
+    def _setup_numa(self):
+        cpus = numa.pin_threads(self.numa_cpus)
+        if cpus is not None:
+            logger.info('Pinned the OpenMP threads to the CPUs %s', cpus)
+        self.first_touch = numa.FirstTouch(self.particles)
+        self.first_touch.touch()
+        self.integrator.set_first_touch(self.first_touch)
+
+    def get_openmp_tuning(self):
+        """Return the configuration chosen by the OpenMP tuner or None."""
+        if self.openmp_tuner is None:
+            return None
+        return self.openmp_tuner.get_report()
+
     def set_arrays_to_print(self, array_names=None):
         """Only print the arrays with the given names.
         """
@@ -374,6 +491,25 @@ class Solver(object):
         """ Set a list of output times """
         self.output_at_times = numpy.asarray(output_at_times)
 
+    def set_output_codec(self, codec):
+        """Encode the output files with the given
+        :py:class:`pysph.solver.output_codec.OutputCodec`, if None the data
+        is saved as usual.
+        """
+        self.output_codec = codec
+
+    def set_lod_output(self, freq, cell_size=None, props=None):
+        """Dump a decimated, level of detail, output every `freq` iterations.
+
+        One particle in each cell of size `cell_size` is saved along with
+        the given properties, see :py:func:`pysph.solver.output.decimate`.
+        The files are saved in the `lod` sub-directory of the output
+        directory with the same names as the full output files.
+        """
+        self.lod_freq = freq
+        self.lod_cell_size = cell_size
+        self.lod_props = props
+
     def set_max_steps(self, max_steps):
         """Set the maximum number of iterations to perform.
         """
@@ -395,8 +531,13 @@ class Solver(object):
 
         distributed : Each processor dumps a file locally.
 
+        parallel : All processors write their data to a single HDF5 file
+                   without collecting it on root, see
+                   :py:class:`pysph.solver.output.ParallelHDFOutput`.  This
+                   is the same as collected for npz output.
+
         """
-        assert mode in ("collected", "distributed")
+        assert mode in ("collected", "distributed", "parallel")
         self.parallel_output_mode = mode
 
     def set_command_handler(self, callable, command_interval=1):
@@ -441,6 +582,7 @@ class Solver(object):
 
         # Initial solution
         self.dump_output()
+        self.dump_lod_output()
         self.barrier()  # everybody waits for this to complete
 
         reorder_freq = self.reorder_freq
@@ -469,7 +611,12 @@ class Solver(object):
                 )
             # perform the integration and update the time.
             # print('Solver Iteration', self.count, self.dt, self.t)
-            self.integrator.step(self.t, self.dt)
+            if self.openmp_tuner is not None:
+                self.openmp_tuner.begin_step()
+                self.integrator.step(self.t, self.dt)
+                self.openmp_tuner.end_step()
+            else:
+                self.integrator.step(self.t, self.dt)
 
             # perform any post step functions
             for callback in self.post_step_callbacks:
@@ -503,8 +650,29 @@ class Solver(object):
         # close the progress bar
         bar.finish()
 
+        if self.openmp_tuner is not None:
+            self.openmp_tuner.finish()
+
         # final output save
         self.dump_output()
+        self.dump_lod_output()
+        self.dump_equation_profile()
+
+        for callback in self.post_solve_callbacks:
+            callback(self)
+
+    def dump_equation_profile(self):
+        """Write the report of the equation profiler if the equations are
+        profiled.
+        """
+        if self.equation_profiler is None or not self.profile_equations:
+            return
+        mkdir(self.output_directory)
+        fname = os.path.join(self.output_directory,
+                             self.fname + '_equation_profile')
+        self.equation_profiler.write(fname)
+        logger.info(self.equation_profiler.get_summary())
+        logger.info('Equation profile written to %s.json', fname)
 
     def update_particle_time(self):
         for array in self.particles:
@@ -557,13 +725,39 @@ class Solver(object):
                              '%s_%05d' % (self.fname, self.count))
 
         comm = None
-        if self.parallel_output_mode == "collected" and self.in_parallel:
+        if self.parallel_output_mode != "distributed" and self.in_parallel:
             comm = self.comm
 
         dump(fname, self.particles, self._get_solver_data(),
              detailed_output=self.detailed_output,
              only_real=self.output_only_real, mpi_comm=comm,
-             compress=self.compress_output)
+             compress=self.compress_output, codec=self.output_codec,
+             parallel_io=self.parallel_output_mode == "parallel")
+
+    def dump_lod_output(self):
+        """Dump the decimated, level of detail, output if it is enabled.
+
+        See :py:meth:`set_lod_output`.
+        """
+        if self.disable_output or self.lod_freq <= 0:
+            return
+
+        dirname = get_lod_directory(self.output_directory)
+        mkdir(dirname)
+        fname = os.path.join(dirname, '%s_%05d' % (self.fname, self.count))
+
+        comm = None
+        if self.parallel_output_mode != "distributed" and self.in_parallel:
+            comm = self.comm
+
+        particles = decimate(
+            self.particles, self.lod_cell_size, self.lod_props,
+            only_real=self.output_only_real
+        )
+        dump(fname, particles, self._get_solver_data(),
+             only_real=self.output_only_real, mpi_comm=comm,
+             compress=self.compress_output,
+             parallel_io=self.parallel_output_mode == "parallel")
 
     def load_output(self, count):
         """Load particle data from dumped output file.
@@ -737,6 +931,9 @@ class Solver(object):
             self.dump_output()
             self.barrier()
 
+        if self.lod_freq > 0 and self.count % self.lod_freq == 0:
+            self.dump_lod_output()
+
     def _get_solver_data(self):
         if self._prev_dt is not None:
             dt = self._prev_dt/self._damping_factor
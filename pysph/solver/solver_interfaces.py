@@ -1,7 +1,10 @@
+import json
 import threading
 import os
 import socket
 import sys
+
+import numpy as np
 try:
     from SimpleXMLRPCServer import (SimpleXMLRPCServer,
                                     SimpleXMLRPCRequestHandler)
@@ -205,3 +208,232 @@ class CommandlineInterface(object):
     g | get <name>
     s | set <name> <value>
     q | quit -- quit commandline interface (solver keeps running)''')
+
+
+class SharedMemoryPublisher(object):
+    """ Publish selected particle properties of a running solver in shared
+    memory so other processes can read them without slowing the solver.
+
+    The data is written into one of two shared memory blocks alternately
+    and a small header block named `name` records the sequence number of
+    the last update and the block it is in.  Use a
+    :py:class:`SharedMemoryReader` with the same name to read the data.
+    The `publish` method is called with the solver and can be added to the
+    solver's command manager using `add_function`. """
+
+    HEADER_SIZE = 32
+    META_SIZE = 1 << 16
+
+    def __init__(self, particles, props=None, name='pysph'):
+        """
+        Parameters
+        ----------
+
+        particles: list
+            The particle arrays to publish.
+        props: list or None
+            The properties to publish, defaults to the output properties of
+            each array.  Properties missing in an array are skipped.
+        name: str
+            The name of the shared memory header block.
+        """
+        shared_memory = _get_shared_memory()
+        self.particles = particles
+        self.props = props
+        self.name = name
+        self._header_shm = shared_memory.SharedMemory(
+            name=name, create=True, size=self.HEADER_SIZE
+        )
+        # seq, active buffer, generation and capacity.
+        self._header = np.ndarray(
+            (4,), dtype=np.int64, buffer=self._header_shm.buf
+        )
+        self._header[:] = [0, 1, 0, 0]
+        self._blocks = []
+
+    def publish(self, solver=None):
+        """ Copy the properties into the inactive buffer and make it the
+        active one. """
+        t = dt = 0.0
+        count = 0
+        if solver is not None:
+            t, dt, count = solver.t, solver.dt, solver.count
+        layout = []
+        size = 0
+        for pa in self.particles:
+            props = self.props or pa.output_property_arrays or \
+                list(pa.properties.keys())
+            n = pa.get_number_of_particles(real=True)
+            entries = []
+            for prop in props:
+                if prop not in pa.properties:
+                    continue
+                stride = pa.stride.get(prop, 1)
+                dtype = pa.get_carray(prop).get_npy_array().dtype
+                nbytes = n*stride*dtype.itemsize
+                entries.append([prop, size, n*stride, dtype.str, stride])
+                size += (nbytes + 7)//8*8
+            layout.append(dict(name=pa.name, n=n, props=entries))
+        meta = json.dumps(
+            dict(t=t, dt=dt, count=count, arrays=layout)
+        ).encode('utf-8')
+        if len(meta) + 8 > self.META_SIZE:
+            raise ValueError('Too many properties to publish.')
+
+        if size > self._header[3]:
+            self._allocate(int(size*1.25) + 8)
+        buf = 1 - int(self._header[1])
+        block = self._blocks[buf]
+        np.ndarray((1,), dtype=np.int64, buffer=block.buf)[0] = len(meta)
+        block.buf[8:8 + len(meta)] = meta
+        for pa, info in zip(self.particles, layout):
+            for prop, offset, count, dtype, stride in info['props']:
+                dest = np.ndarray(
+                    (count,), dtype=dtype, buffer=block.buf,
+                    offset=self.META_SIZE + offset
+                )
+                dest[:] = pa.get_carray(prop).get_npy_array()[:count]
+        self._header[1] = buf
+        self._header[0] += 1
+
+    def stop(self):
+        """ Release and remove all the shared memory blocks. """
+        self._free_blocks()
+        if self._header_shm is not None:
+            del self._header
+            self._header_shm.close()
+            self._header_shm.unlink()
+            self._header_shm = None
+
+    # Private protocol.
+    def _allocate(self, capacity):
+        shared_memory = _get_shared_memory()
+        self._free_blocks()
+        generation = int(self._header[2]) + 1
+        self._blocks = [
+            shared_memory.SharedMemory(
+                name=_get_block_name(self.name, generation, i), create=True,
+                size=self.META_SIZE + capacity
+            )
+            for i in range(2)
+        ]
+        self._header[3] = capacity
+        self._header[2] = generation
+
+    def _free_blocks(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+def _get_shared_memory():
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        raise RuntimeError(
+            'Publishing data in shared memory needs Python 3.8 or above '
+            'for multiprocessing.shared_memory.'
+        )
+    return shared_memory
+
+
+def _get_block_name(name, generation, index):
+    return '%s_%d_%d' % (name, generation, index)
+
+
+class SharedMemoryReader(object):
+    """ Read the data published by a :py:class:`SharedMemoryPublisher`. """
+
+    def __init__(self, name='pysph'):
+        self.name = name
+        self._header_shm = self._attach(name)
+        self._header = np.ndarray(
+            (4,), dtype=np.int64, buffer=self._header_shm.buf
+        )
+        self._blocks = {}
+        self._generation = None
+
+    @property
+    def seq(self):
+        """ The sequence number of the latest published data. """
+        return int(self._header[0])
+
+    def read(self, copy=True, max_tries=100):
+        """ Return the solver data and a dictionary of the arrays.
+
+        The solver data is a dictionary with the `t`, `dt`, `count` and `seq`
+        of the published data and each array is a dictionary of the property
+        names and numpy arrays.
+
+        If `copy` is False, the arrays are views of the shared memory and are
+        only guaranteed to be valid until the next update is published.
+        """
+        for i in range(max_tries):
+            seq = self.seq
+            if seq == 0:
+                return None, {}
+            try:
+                solver_data, arrays = self._read_buffer(
+                    int(self._header[2]), int(self._header[1]), copy
+                )
+            except FileNotFoundError:
+                # The blocks were reallocated while reading.
+                continue
+            if not copy or self.seq == seq:
+                solver_data['seq'] = seq
+                return solver_data, arrays
+        raise RuntimeError('Data is being updated too frequently to read.')
+
+    def close(self):
+        """ Detach from the shared memory, this does not remove it.
+
+        Any views returned by `read` must be deleted before this is called.
+        """
+        self._close_blocks()
+        del self._header
+        self._header_shm.close()
+
+    # Private protocol.
+    def _attach(self, name):
+        shared_memory = _get_shared_memory()
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            # Only the publisher should remove the block when done.
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except (ImportError, AttributeError, KeyError):
+            pass
+        return shm
+
+    def _close_blocks(self):
+        for block in self._blocks.values():
+            block.close()
+        self._blocks = {}
+
+    def _read_buffer(self, generation, index, copy):
+        if generation != self._generation:
+            self._close_blocks()
+            self._generation = generation
+        if index not in self._blocks:
+            self._blocks[index] = self._attach(
+                _get_block_name(self.name, generation, index)
+            )
+        block = self._blocks[index]
+        size = int(np.ndarray((1,), dtype=np.int64, buffer=block.buf)[0])
+        meta = json.loads(bytes(block.buf[8:8 + size]).decode('utf-8'))
+        arrays = {}
+        for info in meta.pop('arrays'):
+            data = {}
+            for prop, offset, count, dtype, stride in info['props']:
+                arr = np.ndarray(
+                    (count,), dtype=dtype, buffer=block.buf,
+                    offset=SharedMemoryPublisher.META_SIZE + offset
+                )
+                if copy:
+                    arr = arr.copy()
+                if stride != 1:
+                    arr = arr.reshape(-1, stride)
+                data[prop] = arr
+            arrays[info['name']] = data
+        return meta, arrays
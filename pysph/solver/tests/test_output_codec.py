@@ -0,0 +1,193 @@
+import os
+import shutil
+from tempfile import mkdtemp
+from unittest import TestCase, main, skipUnless
+
+import numpy as np
+
+from pysph import has_h5py
+from pysph.base.utils import get_particle_array_wcsph
+from pysph.solver.output import dump, get_hdf5_compression, load
+from pysph.solver import output_codec
+from pysph.solver.output_codec import (
+    OutputCodec, decode, get_available_compressor, shuffle, unshuffle
+)
+
+
+class TestOutputCodec(TestCase):
+    def setUp(self):
+        self.root = mkdtemp()
+        output_codec._reference_cache.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _make_particles(self, n=1000):
+        np.random.seed(123)
+        x = np.random.random(n)
+        pa = get_particle_array_wcsph(name='fluid', x=x, u=np.sin(x), h=0.1)
+        pa.add_constant('c', [1.0, 2.0])
+        pa.gid[:] = np.arange(n)
+        pa.add_property('A', data=np.arange(2.0*n), stride=2)
+        pa.add_output_arrays(['A'])
+        return pa
+
+    def test_shuffle_roundtrip(self):
+        for dtype in (np.float64, np.float32, np.int32, np.uint8):
+            data = (np.random.random(17)*100).astype(dtype)
+            np.testing.assert_array_equal(
+                unshuffle(shuffle(data), dtype), data
+            )
+
+    def test_encode_decode_with_quantization_and_delta(self):
+        # Given
+        codec = OutputCodec(compressor='zlib')
+        data = np.random.random(100)
+        tag = np.zeros(100, dtype=np.int32)
+        tag[5] = 2
+
+        # When
+        enc = codec.encode(data, tolerance=1e-4)
+
+        # Then
+        self.assertTrue(np.abs(decode(enc) - data).max() <= 1e-4)
+        self.assertEqual(decode(enc).dtype, data.dtype)
+
+        # When
+        ref = tag.copy()
+        tag[7] = 1
+        enc = codec.encode(tag, reference=ref)
+
+        # Then
+        self.assertTrue(enc['delta'])
+        np.testing.assert_array_equal(decode(enc, ref), tag)
+
+    def test_dump_and_load_with_codec(self):
+        # Given
+        pa = self._make_particles()
+        codec = OutputCodec(tolerances={'u': 1e-6}, keyframe_interval=3)
+        files = [os.path.join(self.root, 'sim_%d.npz' % i) for i in range(5)]
+        expected = []
+
+        # When
+        for i, fname in enumerate(files):
+            pa.x[:] += 0.01
+            pa.pid[i] = 1
+            expected.append((pa.x.copy(), pa.u.copy(), pa.pid.copy()))
+            dump(fname, [pa], dict(t=i*0.1, dt=0.1, count=i), codec=codec)
+        output_codec._reference_cache.clear()
+
+        # Then
+        for fname, (x, u, pid) in reversed(list(zip(files, expected))):
+            data = load(fname)
+            pa1 = data['arrays']['fluid']
+            np.testing.assert_array_equal(pa1.x, x)
+            self.assertTrue(np.abs(pa1.u - u).max() <= 1e-6)
+            np.testing.assert_array_equal(pa1.pid, pid)
+            np.testing.assert_array_equal(pa1.gid, pa.gid)
+            np.testing.assert_array_equal(pa1.A, pa.A)
+            np.testing.assert_array_equal(pa1.c, [1.0, 2.0])
+            self.assertEqual(sorted(pa1.output_property_arrays),
+                             sorted(pa.output_property_arrays))
+
+        codecs = [np.load(f, allow_pickle=True)['codec'].item()
+                  for f in files]
+        self.assertEqual([c['reference'] for c in codecs],
+                         [None, 'sim_0.npz', 'sim_1.npz', None, 'sim_3.npz'])
+        self.assertEqual(codec.stats['files'], 5)
+        self.assertIn('5 files', codec.get_report())
+
+        # When only some properties are loaded.
+        data = load(files[-1], props=['x', 'pid'])
+
+        # Then
+        pa1 = data['arrays']['fluid']
+        self.assertNotIn('u', pa1.properties)
+        np.testing.assert_array_equal(pa1.pid, expected[-1][2])
+
+    def test_partial_load_is_not_used_as_reference(self):
+        # Given
+        pa = self._make_particles()
+        codec = OutputCodec()
+        files = [os.path.join(self.root, 'sim_%d.npz' % i) for i in range(3)]
+        for i, fname in enumerate(files):
+            pa.pid[i] = 1
+            dump(fname, [pa], dict(t=i*0.1, dt=0.1, count=i), codec=codec)
+        output_codec._reference_cache.clear()
+
+        # When
+        load(files[1], props=['x'])
+        data = load(files[2])
+
+        # Then
+        pa1 = data['arrays']['fluid']
+        np.testing.assert_array_equal(pa1.pid, pa.pid)
+        np.testing.assert_array_equal(pa1.gid, pa.gid)
+
+    def test_codec_output_is_smaller(self):
+        # Given
+        pa = self._make_particles(10000)
+        plain = os.path.join(self.root, 'plain_0.npz')
+        encoded = os.path.join(self.root, 'encoded_0.npz')
+        codec = OutputCodec(tolerances={'x': 1e-6, 'u': 1e-6})
+
+        # When
+        dump(plain, [pa], dict(t=0.0, dt=0.1, count=0), compress=True)
+        dump(encoded, [pa], dict(t=0.0, dt=0.1, count=0), codec=codec)
+
+        # Then
+        self.assertLess(os.path.getsize(encoded), os.path.getsize(plain))
+
+    def test_available_compressor(self):
+        self.assertIn(get_available_compressor(), ('zstd', 'lz4', 'zlib'))
+        for name in ('zstd', 'lz4'):
+            try:
+                codec = OutputCodec(compressor=name)
+            except ImportError:
+                continue
+            data = np.random.random(10)
+            np.testing.assert_array_equal(decode(codec.encode(data)), data)
+
+    def test_tolerance_must_be_positive(self):
+        for tol in (0.0, -1e-3):
+            with self.assertRaises(ValueError):
+                OutputCodec(tolerances={'x': tol})
+
+    def test_hdf5_compression(self):
+        self.assertEqual(get_hdf5_compression('auto'),
+                         dict(compression='lzf'))
+        self.assertEqual(get_hdf5_compression('zlib'),
+                         dict(compression='gzip', compression_opts=1))
+        self.assertEqual(get_hdf5_compression('none'), {})
+        with self.assertRaises(ValueError):
+            get_hdf5_compression('foo')
+        try:
+            import hdf5plugin  # noqa: 401
+        except ImportError:
+            with self.assertRaises(ValueError):
+                get_hdf5_compression('zstd')
+
+    @skipUnless(has_h5py(), "h5py module is not present")
+    def test_hdf5_dump_uses_codec_compressor_and_tolerance(self):
+        # Given
+        import h5py
+        pa = self._make_particles(1000)
+        pa.u[:] = np.random.random(1000)*100
+        codec = OutputCodec(compressor='zlib', tolerances={'u': 0.7})
+        fname = os.path.join(self.root, 'out_0.hdf5')
+
+        # When
+        dump(fname, [pa], dict(t=0.0, dt=0.1, count=0), codec=codec)
+
+        # Then
+        with h5py.File(fname, 'r') as f:
+            u = f['particles/fluid/arrays/u']
+            self.assertEqual(u.compression, 'gzip')
+            self.assertEqual(u.scaleoffset, 1)
+        pa1 = load(fname)['arrays']['fluid']
+        self.assertLessEqual(np.abs(pa1.u - pa.u).max(), 0.7)
+        np.testing.assert_array_equal(pa1.x, pa.x)
+
+
+if __name__ == '__main__':
+    main()
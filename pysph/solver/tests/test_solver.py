@@ -129,6 +129,29 @@ class TestSolver(TestCase):
             [0.1]*len(record_dt), record_dt, decimal=12
         )
 
+    def test_solver_dumps_lod_output_at_given_frequency(self):
+        # Given
+        dt = 0.1
+        self.integrator.compute_time_step.return_value = dt
+        solver = Solver(integrator=self.integrator, tf=1.0, dt=dt)
+        solver.set_print_freq(5)
+        solver.set_lod_output(2, cell_size=0.5, props=['rho'])
+        solver.acceleration_evals = [self.a_eval]
+        solver.particles = []
+        solver.dump_output = mock.Mock()
+
+        # When
+        record = []
+        solver.dump_lod_output = mock.Mock(
+            side_effect=lambda: record.append(solver.count)
+        )
+        solver.solve(show_progress=False)
+
+        # Then
+        self.assertEqual(record, [0, 2, 4, 6, 8, 10])
+        self.assertEqual(solver.lod_cell_size, 0.5)
+        self.assertEqual(solver.lod_props, ['rho'])
+
     def test_solver_honors_set_time_step(self):
         # Given
         dt = 0.1
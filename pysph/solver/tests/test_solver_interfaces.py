@@ -0,0 +1,72 @@
+import os
+import unittest
+
+import numpy as np
+
+from pysph import has_shared_memory
+from pysph.base.utils import get_particle_array
+from pysph.solver.solver_interfaces import (
+    SharedMemoryPublisher, SharedMemoryReader
+)
+
+
+class DummySolver(object):
+    t = 0.5
+    dt = 0.1
+    count = 5
+
+
+@unittest.skipUnless(has_shared_memory(),
+                     'multiprocessing.shared_memory is not available.')
+class TestSharedMemory(unittest.TestCase):
+    def setUp(self):
+        self.name = 'pysph_test_%d' % os.getpid()
+        self.pa = get_particle_array(
+            name='fluid', x=[1.0, 2.0, 3.0], u=[0.1, 0.2, 0.3]
+        )
+        self.pa.add_property('A', data=np.arange(6.0), stride=2)
+        self.pa.tag[-1] = 2
+        self.pa.align_particles()
+        self.publisher = SharedMemoryPublisher(
+            [self.pa], props=['x', 'u', 'A', 'tag', 'missing'],
+            name=self.name
+        )
+
+    def tearDown(self):
+        self.publisher.stop()
+
+    def test_publish_and_read(self):
+        # Given
+        reader = SharedMemoryReader(self.name)
+        self.assertEqual(reader.read(), (None, {}))
+
+        # When
+        self.publisher.publish(DummySolver())
+        solver_data, arrays = reader.read()
+
+        # Then
+        self.assertEqual(solver_data['seq'], 1)
+        self.assertEqual(solver_data['t'], 0.5)
+        self.assertEqual(solver_data['count'], 5)
+        fluid = arrays['fluid']
+        self.assertEqual(sorted(fluid.keys()), ['A', 'tag', 'u', 'x'])
+        np.testing.assert_array_equal(fluid['x'], [1.0, 2.0])
+        np.testing.assert_array_equal(fluid['A'], [[0, 1], [2, 3]])
+        self.assertEqual(fluid['tag'].dtype, self.pa.tag.dtype)
+
+        # When more particles are added and published again.
+        self.pa.add_particles(x=np.arange(100.0))
+        self.publisher.publish()
+        self.pa.x[0] = -1.0
+        self.publisher.publish()
+        solver_data, arrays = reader.read(copy=False)
+
+        # Then
+        self.assertEqual(solver_data['seq'], 3)
+        np.testing.assert_array_equal(arrays['fluid']['x'], self.pa.x)
+        del arrays
+        reader.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,8 +12,12 @@ try:
 except ImportError:
     from unittest import TestCase, main, skipUnless
 
+from pysph.base.particle_array import get_ghost_tag
 from pysph.base.utils import get_particle_array, get_particle_array_wcsph
 from pysph.solver.utils import dump, load, dump_v1, get_files, get_free_port
+from pysph.solver.utils import (
+    decimate, get_full_resolution_file, get_lod_directory, get_lod_files
+)
 
 
 class TestGetFiles(TestCase):
@@ -49,6 +53,86 @@ class TestGetFiles(TestCase):
         shutil.rmtree(self.root)
 
 
+class TestLevelOfDetail(TestCase):
+    def setUp(self):
+        self.root = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_decimate_keeps_one_particle_per_cell(self):
+        # Given
+        x, y = np.mgrid[0:1:0.05, 0:1:0.05]
+        pa = get_particle_array_wcsph(
+            name='fluid', x=x.ravel() + 0.025, y=y.ravel() + 0.025, h=0.05
+        )
+        pa.rho[:] = np.arange(pa.get_number_of_particles())
+
+        # When
+        lod, = decimate([pa], cell_size=0.2, props=['rho'])
+
+        # Then
+        self.assertEqual(lod.name, 'fluid')
+        self.assertEqual(lod.get_number_of_particles(), 25)
+        self.assertEqual(sorted(lod.properties.keys()),
+                         ['gid', 'pid', 'rho', 'tag', 'x', 'y', 'z'])
+        cells = np.floor(np.c_[lod.x, lod.y]/0.2)
+        self.assertEqual(len(np.unique(cells, axis=0)), 25)
+        np.testing.assert_array_equal(lod.rho, pa.rho[lod.rho.astype(int)])
+
+        # When the default cell size of twice the largest h is used.
+        lod, = decimate([pa])
+
+        # Then
+        self.assertEqual(lod.get_number_of_particles(), 100)
+        self.assertEqual(sorted(lod.output_property_arrays),
+                         sorted(set(pa.output_property_arrays) |
+                                set(['x', 'y', 'z'])))
+
+    def test_decimate_with_non_real_particles(self):
+        # Given
+        x = np.arange(20)*0.1 + 0.05
+        pa = get_particle_array_wcsph(name='fluid', x=x, h=0.05)
+        pa.tag[15:] = get_ghost_tag()
+        pa.align_particles()
+        self.assertEqual(pa.get_number_of_particles(real=True), 15)
+
+        # When
+        lod, = decimate([pa], cell_size=0.2, only_real=True)
+
+        # Then
+        self.assertEqual(lod.get_number_of_particles(), 8)
+        self.assertTrue(lod.x.max() < 1.5)
+
+        # When
+        lod, = decimate([pa], cell_size=0.2, only_real=False)
+
+        # Then
+        self.assertEqual(lod.get_number_of_particles(), 10)
+        x = lod.get('x', only_real_particles=False)
+        self.assertTrue(x.max() > 1.5)
+
+    def test_lod_files_map_to_full_resolution_files(self):
+        # Given
+        dirname = join(self.root, 'dam_break_2d_output')
+        lod_dir = get_lod_directory(dirname)
+        os.makedirs(lod_dir)
+        files = [join(dirname, 'dam_break_2d_%05d.npz' % i)
+                 for i in (0, 100, 200)]
+        lod_files = [join(lod_dir, 'dam_break_2d_%05d.npz' % i)
+                     for i in range(0, 201, 20)]
+        for name in files + lod_files:
+            with open(name, 'w') as fp:
+                fp.write('')
+
+        # When/Then
+        self.assertEqual(get_files(dirname), files)
+        self.assertEqual(get_lod_files(dirname), lod_files)
+        self.assertEqual(get_full_resolution_file(lod_files[5]), files[1])
+        self.assertEqual(get_full_resolution_file(lod_files[2]), files[0])
+        self.assertEqual(get_full_resolution_file(lod_files[8]), files[2])
+
+
 class TestOutputNumpy(TestCase):
     def setUp(self):
         self.root = mkdtemp()
@@ -153,6 +237,23 @@ class TestOutputNumpy(TestCase):
         self.assertEqual(set(pa.output_property_arrays), set(output_arrays))
         self.assertEqual(set(pa1.output_property_arrays), set(output_arrays))
 
+    def test_load_only_given_props(self):
+        # Given
+        x = np.linspace(0, 1.0, 10)
+        pa = get_particle_array(name='fluid', x=x, y=2*x, u=3*x)
+        pa.set_output_arrays(['x', 'y', 'u'])
+        fname = self._get_filename('simple')
+        dump(fname, [pa], solver_data={})
+
+        # When
+        data = load(fname, props=['x', 'u'])
+        pa1 = data['arrays']['fluid']
+
+        # Then
+        self.assertTrue('y' not in pa1.properties)
+        self.assertEqual(sorted(pa1.output_property_arrays), ['u', 'x'])
+        self.assertTrue(np.allclose(pa.u, pa1.u, atol=1e-14))
+
 
 class TestOutputHdf5(TestOutputNumpy):
     @skipUnless(has_h5py(), "h5py module is not present")
@@ -0,0 +1,105 @@
+import shutil
+from tempfile import mkdtemp
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import numpy as np
+
+from pysph.base.kernels import CubicSpline
+from pysph.base.nnps import LinkedListNNPS
+from pysph.base.utils import get_particle_array
+from pysph.solver.solver import Solver
+from pysph.solver.tools import Probe, load_probe
+
+
+class DummyApp(object):
+    def __init__(self, solver, output_dir):
+        self.output_dir = output_dir
+        self.solver = solver
+        self.num_procs = 1
+
+
+class TestProbe(unittest.TestCase):
+    def setUp(self):
+        self.root = mkdtemp()
+        x, y = np.mgrid[0:1:21j, 0:1:21j]
+        dx = 0.05
+        self.pa = get_particle_array(
+            name='fluid', x=x.ravel(), y=y.ravel(), h=1.2*dx, m=dx*dx,
+            rho=1.0, p=1.0, u=2.0
+        )
+        kernel = CubicSpline(dim=2)
+        integrator = mock.Mock()
+        integrator.compute_time_step.return_value = None
+        self.solver = Solver(
+            dim=2, integrator=integrator, kernel=kernel, tf=0.55, dt=0.1
+        )
+        self.solver.particles = [self.pa]
+        self.solver.acceleration_evals = []
+        self.solver.nnps = LinkedListNNPS(
+            dim=2, particles=[self.pa], radius_scale=kernel.radius_scale
+        )
+        self.solver.dump_output = mock.Mock()
+        self.solver.dump_lod_output = mock.Mock()
+        self.app = DummyApp(self.solver, self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_probe_saves_time_history_at_the_end_of_the_run(self):
+        # Given
+        xl = np.linspace(0.3, 0.7, 5)
+        probe = Probe(self.app, ['p', 'u'], x=xl, y=np.ones_like(xl)*0.5,
+                      freq=2, buffer_size=2)
+        solver = self.solver
+        solver.add_post_step_callback(probe.post_step)
+        solver.add_post_solve_callback(probe.post_solve)
+
+        def set_pressure(solver):
+            self.pa.p[:] = solver.count
+        solver.add_pre_step_callback(set_pressure)
+
+        # When
+        solver.solve(show_progress=False)
+        data = load_probe(self.root + '/probe')
+
+        # Then
+        np.testing.assert_allclose(data['t'], [0.1, 0.3, 0.5])
+        self.assertEqual(data['p'].shape, (3, 5))
+        np.testing.assert_allclose(data['p'][:, 2], [0.0, 2.0, 4.0])
+        np.testing.assert_allclose(data['u'], 2.0)
+
+    def test_probe_matches_interpolator(self):
+        # Given
+        from pysph.tools.interpolator import Interpolator
+        self.pa.p[:] = np.sin(np.pi*self.pa.x)*self.pa.y
+        x, y = np.mgrid[0.05:0.95:4j, 0.1:0.9:3j]
+        for method in ('shepard', 'sph'):
+            probe = Probe(self.app, ['p'], x=x, y=y, method=method,
+                          n_points=5000)
+            interp = Interpolator([self.pa], x=x, y=y, method=method,
+                                  kernel=self.solver.kernel)
+
+            # When
+            probe.sample(0.0)
+            probe.flush()
+            data = load_probe(self.root + '/probe')
+
+            # Then
+            self.assertEqual(data['p'].shape, (1, 4, 3))
+            np.testing.assert_allclose(
+                data['p'][0], interp.interpolate('p'), atol=1e-6
+            )
+
+    def test_probe_refuses_parallel_runs(self):
+        self.app.num_procs = 2
+        with self.assertRaises(NotImplementedError):
+            Probe(self.app, ['p'], x=[0.5])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import shutil
+from tempfile import mkdtemp
+from unittest import TestCase, main
+import xml.etree.ElementTree as ET
+import zlib
+
+import numpy as np
+
+from pysph.base.utils import get_particle_array
+from pysph.solver.utils import dump
+from pysph.solver.vtk_output import (
+    dump_vtk, main as vtk_main, write_vtu, BLOCK_SIZE, PyVisFileOutput,
+    TVTKOutput
+)
+
+
+def read_vtu(fname):
+    """Read the point data and points from an appended binary VTU file.
+    """
+    with open(fname, 'rb') as f:
+        content = f.read()
+    start = content.index(b'<AppendedData encoding="raw">')
+    raw_start = content.index(b'_', start) + 1
+    root = ET.fromstring(
+        content[:start].decode('ascii') + '</VTKFile>'
+    )
+    compressed = root.get('compressor') is not None
+    result = {}
+    for da in root.iter('DataArray'):
+        dtype = np.dtype(da.get('type').lower())
+        ncomp = int(da.get('NumberOfComponents'))
+        offset = raw_start + int(da.get('offset'))
+        if compressed:
+            nblocks = int(np.frombuffer(content, np.uint64, 1, offset)[0])
+            head = np.frombuffer(content, np.uint64, 3 + nblocks, offset)
+            pos = offset + head.nbytes
+            data = b''
+            for size in head[3:]:
+                data += zlib.decompress(content[pos:pos + int(size)])
+                pos += int(size)
+        else:
+            nbytes = int(np.frombuffer(content, np.uint64, 1, offset)[0])
+            data = content[offset + 8:offset + 8 + nbytes]
+        arr = np.frombuffer(data, dtype)
+        if ncomp > 1:
+            arr = arr.reshape(-1, ncomp)
+        result[da.get('Name', 'points')] = arr
+    return result
+
+
+class TestWriteVTU(TestCase):
+    def setUp(self):
+        self.root = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_write_vtu_with_and_without_compression(self):
+        # Given
+        n = BLOCK_SIZE//8 + 10
+        points = np.random.random((n, 3))
+        rho = np.random.random(n)
+        tag = np.arange(n, dtype=np.int32)
+        A = np.random.random((n, 2)).astype(np.float32)
+
+        for compress in (False, True):
+            # When
+            fname = os.path.join(self.root, 'test.vtu')
+            write_vtu(fname, points, [('rho', rho), ('tag', tag), ('A', A)],
+                      compress=compress)
+            data = read_vtu(fname)
+
+            # Then
+            np.testing.assert_array_equal(data['points'], points)
+            np.testing.assert_array_equal(data['rho'], rho)
+            np.testing.assert_array_equal(data['tag'], tag)
+            np.testing.assert_array_equal(data['A'], A)
+            np.testing.assert_array_equal(data['connectivity'], np.arange(n))
+            np.testing.assert_array_equal(data['types'], 1)
+
+    def test_dump_vtk_writes_strided_props_and_vectors(self):
+        # Given
+        pa = get_particle_array(name='fluid', x=[0.0, 1.0], u=[1.0, 2.0],
+                                rho=[3.0, 4.0])
+        pa.add_property('A', data=np.arange(4.0), stride=2)
+        pa.set_output_arrays(['x', 'y', 'z', 'u', 'v', 'w', 'rho', 'A'])
+
+        # When
+        dump_vtk(os.path.join(self.root, 'test_10'), [pa],
+                 scalars=['rho', 'A'], velocity=['u', 'v', 'w'])
+        data = read_vtu(os.path.join(self.root, 'test_fluid_10.vtu'))
+
+        # Then
+        np.testing.assert_array_equal(data['rho'], [3.0, 4.0])
+        np.testing.assert_array_equal(data['A'], [[0, 1], [2, 3]])
+        np.testing.assert_array_equal(data['velocity'],
+                                      [[1, 0, 0], [2, 0, 0]])
+        np.testing.assert_array_equal(data['points'][:, 0], [0.0, 1.0])
+
+    def test_main_merges_ranks_and_writes_pvtu_and_pvd(self):
+        # Given
+        dirname = os.path.join(self.root, 'sim_output')
+        os.mkdir(dirname)
+        for rank in range(2):
+            for count in (0, 10):
+                pa = get_particle_array(
+                    name='fluid', x=[rank, rank + 0.5], rho=[count]*2
+                )
+                pa.set_output_arrays(['x', 'y', 'z', 'rho'])
+                fname = os.path.join(
+                    dirname, 'sim_%d_%05d.npz' % (rank, count)
+                )
+                dump(fname, [pa], dict(t=count*0.1, dt=0.1, count=count))
+        outdir = os.path.join(self.root, 'vtk')
+
+        # When
+        vtk_main(['--merge', '--pvd', '-z', '-s', 'rho', '-d', outdir,
+                  dirname])
+
+        # Then
+        data = read_vtu(os.path.join(outdir, 'sim_fluid_00010.vtu'))
+        np.testing.assert_array_equal(data['points'][:, 0],
+                                      [0.0, 0.5, 1.0, 1.5])
+        np.testing.assert_array_equal(data['rho'], [10]*4)
+        pvd = ET.parse(os.path.join(outdir, 'sim_fluid.pvd')).getroot()
+        datasets = [(float(x.get('timestep')), x.get('file'))
+                    for x in pvd.iter('DataSet')]
+        self.assertEqual(datasets, [(0.0, 'sim_fluid_00000.vtu'),
+                                    (1.0, 'sim_fluid_00010.vtu')])
+
+        # When
+        vtk_main(['--pvtu', '-j', '2', '-s', 'rho', '-d', outdir,
+                  dirname])
+
+        # Then
+        pvtu = ET.parse(os.path.join(outdir, 'sim_fluid_00010.pvtu'))
+        pieces = [x.get('Source') for x in pvtu.getroot().iter('Piece')]
+        self.assertEqual(pieces, ['sim_0_fluid_00010.vtu',
+                                  'sim_1_fluid_00010.vtu'])
+        data = read_vtu(os.path.join(outdir, pieces[1]))
+        np.testing.assert_array_equal(data['points'][:, 0], [1.0, 1.5])
+
+    def test_old_writers_are_deprecated(self):
+        for cls in (PyVisFileOutput, TVTKOutput):
+            with self.assertWarns(DeprecationWarning):
+                output = cls(['rho'], velocity=['u', 'v', 'w'])
+            self.assertEqual(output.scalars, ['rho'])
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,8 @@
+import json
+import os
+
+import numpy
+
 
 class Tool(object):
     """A tool is typically an object that can be used to perform a
@@ -31,6 +36,12 @@ class Tool(object):
         """
         pass
 
+    def post_solve(self, solver):
+        """If overloaded, this is called automatically once the run is
+        finished.  The method is passed the solver instance.
+        """
+        pass
+
 
 class SimpleRemesher(Tool):
     """A simple tool to periodically remesh a given array of particles onto an
@@ -88,8 +99,7 @@ class SimpleRemesher(Tool):
         if solver.count % self.freq == 0 and solver.count > 0:
             self.interp.nnps.update()
             data = dict(x=self.xi, y=self.yi, z=self.zi)
-            for prop in self.props:
-                data[prop] = self.interp.interpolate(prop)
+            data.update(self.interp.interpolate_many(self.props))
             self.array.set(**data)
             self.interp.nnps.update_domain()
 
@@ -205,3 +215,172 @@ class DensityCorrection(Tool):
             self._sph_eval.update()
             self._sph_eval.evaluate()
         self.count += 1
+
+
+class Probe(Tool):
+    """Periodically interpolate properties onto a fixed set of points and
+    save their time history.
+
+    The points can be any array of points, for example a line or a plane.
+    The neighbors of the points are found with the solver's NNPS, so the
+    particles are not binned again, and the results are buffered in memory
+    and appended to a binary file in the output directory.  The remaining
+    samples are written when the run finishes.  This is much cheaper than
+    dumping all the particles at a high frequency.  Use :py:func:`load_probe`
+    to read the saved data.
+
+    The kernel is tabulated with `n_points` intervals and interpolated
+    linearly.  Parallel runs are not supported.
+    """
+
+    def __init__(self, app, props, x=None, y=None, z=None, freq=1,
+                 name='probe', buffer_size=100, kernel=None,
+                 method='shepard', n_points=1000):
+        """Constructor.
+
+        Parameters
+        ----------
+
+        app : pysph.solver.application.Application
+            The application instance.
+        props : list(str)
+            List of properties to interpolate.
+        x, y, z : ndarray
+            Positions of the probe points, these may have any shape and
+            the values are saved with this shape.  Unspecified coordinates
+            are taken as zero.
+        freq : int
+            Frequency (in iterations) at which the properties are sampled.
+        name : str
+            The data is saved in `name.bin` and `name.json` in the output
+            directory.
+        buffer_size : int
+            Number of samples buffered before they are written to the file.
+        kernel: any kernel from pysph.base.kernels
+            Defaults to the solver's kernel.
+        method : str
+            The interpolation method, one of 'shepard' or 'sph', see
+            :py:class:`pysph.tools.interpolator.Interpolator`.
+        n_points : int
+            Number of intervals used to tabulate the kernel.
+
+        """
+        if app.num_procs > 1:
+            raise NotImplementedError(
+                'Probe is not supported in parallel runs.'
+            )
+        if method not in ('shepard', 'sph'):
+            raise ValueError(
+                'Unknown method %s, use shepard or sph.' % method
+            )
+        coords = [c for c in (x, y, z) if c is not None]
+        if not coords:
+            raise ValueError('At least one of x, y and z must be given.')
+        self.shape = numpy.shape(coords[0])
+        self.x, self.y, self.z = [
+            numpy.ravel(numpy.zeros(self.shape) if c is None else
+                        numpy.asarray(c, dtype=numpy.float64))
+            for c in (x, y, z)
+        ]
+        self.npoints = self.x.size
+        self.props = list(props)
+        self.freq = freq
+        self.buffer_size = buffer_size
+        self.method = method
+        self.solver = app.solver
+        if kernel is None:
+            kernel = app.solver.kernel
+        self.dim = kernel.dim
+        self.radius_scale = kernel.radius_scale
+        # The kernel for a unit smoothing length, tabulated like the
+        # TabulatedKernel.
+        self._q = numpy.linspace(0.0, self.radius_scale, n_points + 1)
+        self._q[-1] = numpy.nextafter(self.radius_scale, 0.0)
+        self._w = numpy.array([kernel.kernel(rij=q, h=1.0) for q in self._q])
+
+        self.filename = os.path.join(app.output_dir, name + '.bin')
+        self._buffer = []
+        meta = dict(props=self.props, shape=list(self.shape))
+        with open(os.path.join(app.output_dir, name + '.json'), 'w') as f:
+            json.dump(meta, f)
+        # Truncate any existing data.
+        open(self.filename, 'wb').close()
+
+    def post_step(self, solver):
+        if solver.count % self.freq == 0:
+            self.sample(solver.t + solver.dt)
+
+    def post_solve(self, solver):
+        self.flush()
+
+    def sample(self, t):
+        """Interpolate the properties at the probe points for the time `t`.
+        """
+        nnps = self.solver.nnps
+        arrays = [(i, pa) for i, pa in enumerate(nnps.particles)
+                  if pa.get_number_of_particles() > 0]
+        hmax = max(pa.h.max() for i, pa in arrays)
+        wsum = numpy.zeros(self.npoints)
+        values = numpy.zeros((len(self.props), self.npoints))
+        for src_index, pa in arrays:
+            offsets, nbrs, rij = nnps.get_neighbors_of_points(
+                self.x, self.y, self.z, self.radius_scale*hmax,
+                src_index=src_index, distances=True
+            )
+            dst = numpy.repeat(numpy.arange(self.npoints), numpy.diff(offsets))
+            # The probe points have the largest smoothing length and h_ij
+            # is the average, as in the interpolator.
+            hij = 0.5*(hmax + pa.h[nbrs])
+            wij = numpy.interp(rij/hij, self._q, self._w, right=0.0)
+            wij /= hij**self.dim
+            if self.method == 'sph':
+                wij *= pa.m[nbrs]/pa.rho[nbrs]
+            wsum += numpy.bincount(dst, wij, minlength=self.npoints)
+            for i, prop in enumerate(self.props):
+                if prop in pa.properties:
+                    data = pa.get(prop, only_real_particles=False)
+                    values[i] += numpy.bincount(
+                        dst, wij*data[nbrs], minlength=self.npoints
+                    )
+        if self.method == 'shepard':
+            mask = wsum > 1e-12
+            values[:, mask] /= wsum[mask]
+        row = [numpy.asarray([t], dtype=numpy.float64)]
+        row.extend(values)
+        self._buffer.append(numpy.concatenate(row))
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Append the buffered samples to the file.
+        """
+        if self._buffer:
+            with open(self.filename, 'ab') as f:
+                numpy.asarray(self._buffer).tofile(f)
+            self._buffer = []
+
+
+def load_probe(fname):
+    """Load the data saved by a :py:class:`Probe`.
+
+    Parameters
+    ----------
+
+    fname : str
+        Path to the saved file without the extension, i.e.
+        `output_dir/probe`.
+
+    Returns a dictionary with the times as `t` and the properties as arrays
+    with the time along the first axis followed by the shape of the points.
+    """
+    with open(fname + '.json') as f:
+        meta = json.load(f)
+    shape = tuple(meta['shape'])
+    npoints = int(numpy.prod(shape))
+    data = numpy.fromfile(fname + '.bin', dtype=numpy.float64)
+    data.shape = (-1, 1 + npoints*len(meta['props']))
+    result = dict(t=data[:, 0].copy())
+    for i, prop in enumerate(meta['props']):
+        start = 1 + i*npoints
+        result[prop] = data[:, start:start + npoints].reshape((-1,) + shape)
+    return result
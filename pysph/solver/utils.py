@@ -14,6 +14,7 @@ import numpy
 
 import pysph
 from pysph.solver.output import load, dump, output_formats  # noqa: 401
+from pysph.solver.output import decimate  # noqa: 401
 from pysph.solver.output import gather_array_data as _gather_array_data
 
 ASCII_FMT = " 123456789#"
@@ -355,6 +356,50 @@ def get_files(dirname=None, fname=None, endswith=output_formats):
     return files
 
 
+def get_lod_directory(dirname):
+    """Return the directory with the decimated, level of detail, output
+    files of the given output directory.
+    """
+    return os.path.join(dirname, 'lod')
+
+
+def get_lod_files(dirname, fname=None, endswith=output_formats):
+    """Get the level of detail output files of a given output directory.
+
+    These are written by the solver when `Solver.set_lod_output` is used and
+    have the same names as the full output files.  The arguments are the
+    same as for :py:func:`get_files`.
+    """
+    if dirname is None:
+        return []
+    path = os.path.abspath(dirname)
+    if fname is None:
+        infos = glob(os.path.join(path, "*.info"))
+        if infos:
+            fname = os.path.splitext(os.path.basename(infos[0]))[0]
+        else:
+            fname = os.path.basename(path).split('_output')[0]
+    return get_files(get_lod_directory(path), fname, endswith)
+
+
+def get_full_resolution_file(lod_file, endswith=output_formats):
+    """Return the full output file for the given level of detail file.
+
+    The full output file with the same iteration count is returned if it
+    exists, otherwise the one with the closest iteration count is returned.
+    None is returned if there are no full output files.
+    """
+    lod_file = os.path.abspath(lod_file)
+    lod_dir, basename = os.path.split(lod_file)
+    dirname = os.path.dirname(lod_dir)
+    fname = basename[:basename.rfind('_')]
+    files = remove_irrelevant_files(get_files(dirname, fname, endswith))
+    if not files:
+        return None
+    count = _sort_key(lod_file)
+    return min(files, key=lambda f: abs(_sort_key(f) - count))
+
+
 def iter_output(files, *arrays):
     """Given an iterable of the solution files, this loads the files, and
     yields the solver data and the requested arrays.
@@ -1,15 +1,227 @@
 """ Dumps VTK output files.
 
-It takes a hdf or npz file as an input and output vtu file.
+It takes a hdf or npz file as an input and output vtu file.  The files are
+written in the appended binary VTU format without any external dependencies,
+optionally compressed with zlib.  The output of parallel runs can be merged
+into a single file or written as a PVTU file per snapshot and a PVD file can
+be written to index the files by time.
 """
-from pysph import has_tvtk, has_pyvisfile
 from pysph.solver.output import Output, load
-from pysph.solver.utils import get_files
+from pysph.solver.utils import get_files, _concatenate_arrays
 
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import argparse
+import re
 import sys
 import os
+import warnings
+import zlib
+
+# Size of the blocks that are compressed independently.
+BLOCK_SIZE = 1 << 20
+VTK_VERTEX = 1
+_BYTE_ORDER = 'LittleEndian' if sys.byteorder == 'little' else 'BigEndian'
+
+
+def _get_vtk_type(dtype):
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        kind = 'Float'
+    elif dtype.kind == 'u':
+        kind = 'UInt'
+    elif dtype.kind in 'ib':
+        kind = 'Int'
+    else:
+        raise TypeError('Unsupported data type %s' % dtype)
+    return '%s%d' % (kind, dtype.itemsize*8)
+
+
+def _as_vtk_array(data):
+    data = np.asarray(data)
+    if data.dtype.kind == 'b':
+        data = data.astype(np.int8)
+    return np.ascontiguousarray(data)
+
+
+def _compress_blocks(buffers, n_threads=None):
+    """Return a list with the compressed blocks of each buffer.
+    """
+    blocks = []
+    for buf in buffers:
+        view = memoryview(buf).cast('B')
+        blocks.append([view[i:i + BLOCK_SIZE]
+                       for i in range(0, max(len(view), 1), BLOCK_SIZE)])
+    flat = [b for bufs in blocks for b in bufs]
+    if len(flat) > 1 and n_threads != 1:
+        # zlib releases the GIL so the blocks are compressed in parallel.
+        with ThreadPoolExecutor(n_threads) as executor:
+            compressed = list(executor.map(zlib.compress, flat))
+    else:
+        compressed = [zlib.compress(b) for b in flat]
+    result = []
+    start = 0
+    for bufs in blocks:
+        result.append(compressed[start:start + len(bufs)])
+        start += len(bufs)
+    return result
+
+
+def write_vtu(filename, points, point_data, compress=False, n_threads=None):
+    """Write the points and point data to an appended binary VTU file.
+
+    Parameters
+    ----------
+
+    filename: str
+        The file to write to.
+    points: array
+        The coordinates of the points as an (n, 3) array.
+    point_data: sequence
+        Sequence of (name, array) pairs, the arrays have n entries or are
+        (n, k) arrays for k components.
+    compress: bool
+        Compress the data with zlib, blocks of the data are compressed in
+        parallel.
+    n_threads: int or None
+        Number of threads used to compress the data.
+    """
+    points = _as_vtk_array(points)
+    n = points.shape[0]
+    arrays = [(name, _as_vtk_array(data)) for name, data in point_data]
+    cells = [
+        ('connectivity', np.arange(n, dtype=np.int64)),
+        ('offsets', np.arange(1, n + 1, dtype=np.int64)),
+        ('types', np.full(n, VTK_VERTEX, dtype=np.uint8))
+    ]
+    buffers = [x[1] for x in arrays] + [points] + [x[1] for x in cells]
+
+    if compress:
+        payload = []
+        for buf, blocks in zip(buffers,
+                               _compress_blocks(buffers, n_threads)):
+            nbytes = buf.nbytes
+            last = nbytes % BLOCK_SIZE
+            header = np.array(
+                [len(blocks), BLOCK_SIZE, last] + [len(b) for b in blocks],
+                dtype=np.uint64
+            )
+            payload.append([header] + blocks)
+    else:
+        payload = [[np.array([buf.nbytes], dtype=np.uint64), buf]
+                   for buf in buffers]
+
+    offsets = []
+    offset = 0
+    for parts in payload:
+        offsets.append(offset)
+        offset += sum(memoryview(x).nbytes for x in parts)
+
+    def _data_array(name, data, offset, ncomp=None):
+        if ncomp is None:
+            ncomp = 1 if data.ndim == 1 else data.shape[1]
+        name = '' if name is None else 'Name="%s" ' % name
+        return (
+            '<DataArray type="%s" %sNumberOfComponents="%d" '
+            'format="appended" offset="%d"/>\n' % (
+                _get_vtk_type(data.dtype), name, ncomp, offset)
+        )
+
+    compressor = ' compressor="vtkZLibDataCompressor"' if compress else ''
+    header = [
+        '<?xml version="1.0"?>\n',
+        '<VTKFile type="UnstructuredGrid" version="1.0" byte_order="%s" '
+        'header_type="UInt64"%s>\n' % (_BYTE_ORDER, compressor),
+        '<UnstructuredGrid>\n',
+        '<Piece NumberOfPoints="%d" NumberOfCells="%d">\n' % (n, n),
+        '<PointData>\n'
+    ]
+    idx = 0
+    for name, data in arrays:
+        header.append(_data_array(name, data, offsets[idx]))
+        idx += 1
+    header.extend(['</PointData>\n', '<Points>\n'])
+    header.append(_data_array(None, points, offsets[idx], 3))
+    idx += 1
+    header.extend(['</Points>\n', '<Cells>\n'])
+    for name, data in cells:
+        header.append(_data_array(name, data, offsets[idx]))
+        idx += 1
+    header.extend([
+        '</Cells>\n', '</Piece>\n', '</UnstructuredGrid>\n',
+        '<AppendedData encoding="raw">\n_'
+    ])
+
+    with open(filename, 'wb') as f:
+        f.write(''.join(header).encode('ascii'))
+        for parts in payload:
+            for part in parts:
+                f.write(memoryview(part).cast('B'))
+        f.write(b'\n</AppendedData>\n</VTKFile>\n')
+
+
+def write_pvtu(filename, pieces, point_data):
+    """Write a PVTU file for the given VTU files.
+
+    Parameters
+    ----------
+
+    filename: str
+        The file to write to.
+    pieces: sequence
+        The names of the VTU files, relative to the PVTU file.
+    point_data: sequence
+        Sequence of (name, dtype, number of components) of the point data.
+    """
+    lines = [
+        '<?xml version="1.0"?>',
+        '<VTKFile type="PUnstructuredGrid" version="1.0" byte_order="%s" '
+        'header_type="UInt64">' % _BYTE_ORDER,
+        '<PUnstructuredGrid GhostLevel="0">',
+        '<PPointData>'
+    ]
+    for name, dtype, ncomp in point_data:
+        lines.append(
+            '<PDataArray type="%s" Name="%s" NumberOfComponents="%d"/>' % (
+                _get_vtk_type(dtype), name, ncomp)
+        )
+    lines.extend([
+        '</PPointData>', '<PPoints>',
+        '<PDataArray type="Float64" NumberOfComponents="3"/>', '</PPoints>'
+    ])
+    for piece in pieces:
+        lines.append('<Piece Source="%s"/>' % piece)
+    lines.extend(['</PUnstructuredGrid>', '</VTKFile>', ''])
+    with open(filename, 'w') as f:
+        f.write('\n'.join(lines))
+
+
+def write_pvd(filename, datasets):
+    """Write a PVD file indexing the given files by time.
+
+    Parameters
+    ----------
+
+    filename: str
+        The file to write to.
+    datasets: sequence
+        Sequence of (time, file name) pairs, the file names are relative to
+        the PVD file.
+    """
+    lines = [
+        '<?xml version="1.0"?>',
+        '<VTKFile type="Collection" version="0.1" byte_order="%s">' % (
+            _BYTE_ORDER),
+        '<Collection>'
+    ]
+    for t, fname in datasets:
+        lines.append(
+            '<DataSet timestep="%r" group="" part="0" file="%s"/>' % (
+                float(t), fname)
+        )
+    lines.extend(['</Collection>', '</VTKFile>', ''])
+    with open(filename, 'w') as f:
+        f.write('\n'.join(lines))
 
 
 class VTKOutput(Output):
@@ -33,7 +245,7 @@ class VTKOutput(Output):
 
         self.vectors = {}
         for name, vector in vectors.items():
-            assert (len(vector) is 3)
+            assert (len(vector) == 3)
             self.vectors[name] = vector
 
     def set_output_scalar(self, scalars=None):
@@ -69,13 +281,16 @@ class VTKOutput(Output):
         return vectors
 
     def _dump(self, filename):
+        self.written = {}
         for ptype, pdata in self.all_array_data.items():
             self._setup_data(pdata)
             try:
                 fname, seq = filename.rsplit('_', 1)
-                self._dump_arrays(fname + '_' + ptype + '_' + seq)
+                fname = fname + '_' + ptype + '_' + seq
             except ValueError:
-                self._dump_arrays(filename + '_' + ptype)
+                fname = filename + '_' + ptype
+            self._dump_arrays(fname)
+            self.written[ptype] = fname
 
     def _setup_data(self, arrays):
         self.numPoints = arrays['x'].size
@@ -86,7 +301,51 @@ class VTKOutput(Output):
         self.data.extend(self._get_vectors(arrays))
 
 
+class BinaryVTUOutput(VTKOutput):
+    """Write appended binary VTU files without any external dependencies.
+    """
+
+    def __init__(self, scalars=None, compress=False, n_threads=None,
+                 **vectors):
+        self.compress_data = compress
+        self.n_threads = n_threads
+        super(BinaryVTUOutput, self).__init__(scalars, **vectors)
+
+    def _dump(self, filename):
+        self.layout = {}
+        super(BinaryVTUOutput, self)._dump(filename)
+
+    def _dump_arrays(self, filename):
+        n = self.numPoints
+        point_data = []
+        for name, field in self.data:
+            if name in self.vectors:
+                field = field.T
+            elif field.size != n and n > 0:
+                field = field.reshape(n, -1)
+            point_data.append((name, field))
+        write_vtu(filename + '.vtu', self.points.T, point_data,
+                  compress=self.compress_data, n_threads=self.n_threads)
+        self.layout[os.path.basename(filename)] = [
+            (name, field.dtype, 1 if field.ndim == 1 else field.shape[1])
+            for name, field in point_data
+        ]
+
+
 class PyVisFileOutput(VTKOutput):
+    """Write VTU files with pyvisfile.
+
+    .. deprecated::
+        Use :py:class:`BinaryVTUOutput` which has no external dependencies,
+        this will be removed in the next release.
+    """
+
+    def __init__(self, scalars=None, **vectors):
+        warnings.warn(
+            'PyVisFileOutput is deprecated, use BinaryVTUOutput instead.',
+            DeprecationWarning, stacklevel=2
+        )
+        super(PyVisFileOutput, self).__init__(scalars, **vectors)
 
     def _dump_arrays(self, filename):
         from pyvisfile.vtk import (UnstructuredGrid, DataArray,
@@ -103,6 +362,20 @@ class PyVisFileOutput(VTKOutput):
 
 
 class TVTKOutput(VTKOutput):
+    """Write VTK files with TVTK.
+
+    .. deprecated::
+        Use :py:class:`BinaryVTUOutput` which has no external dependencies,
+        this will be removed in the next release.
+    """
+
+    def __init__(self, scalars=None, **vectors):
+        warnings.warn(
+            'TVTKOutput is deprecated, use BinaryVTUOutput instead.',
+            DeprecationWarning, stacklevel=2
+        )
+        super(TVTKOutput, self).__init__(scalars, **vectors)
+
     def _dump_arrays(self, filename):
         from tvtk.api import tvtk
         n = self.numPoints
@@ -120,7 +393,7 @@ class TVTKOutput(VTKOutput):
         write_data(ug, filename)
 
 
-def dump_vtk(filename, particles, scalars=None, **vectors):
+def dump_vtk(filename, particles, scalars=None, compress=False, **vectors):
     """
     Parameter
     ----------
@@ -134,39 +407,138 @@ def dump_vtk(filename, particles, scalars=None, **vectors):
     scalars: list
         list of scalars to dump.
 
+    compress: bool
+        Compress the data with zlib.
+
     vectors:
         Vectors to dump
         Example V=['u', 'v', 'z']
     """
 
-    if has_pyvisfile():
-        output = PyVisFileOutput(scalars, **vectors)
-    elif has_tvtk():
-        output = TVTKOutput(scalars, **vectors)
-    else:
-        msg = 'TVTK and pyvisfile Not present'
-        raise ImportError(msg)
+    output = BinaryVTUOutput(scalars, compress=compress, **vectors)
     output.dump(filename, particles, {})
 
 
+def _group_files(files, merge):
+    """Return a list of (output name, input files) for the given files.
+
+    If `merge` is True, files of the form `<name>_<rank>_<count>` from
+    different ranks are grouped together in the order of their ranks.
+    """
+    pattern = re.compile(r'(?P<prefix>.+)_(?P<rank>\d+)_(?P<count>\d+)$')
+    groups = {}
+    for fname in files:
+        stem = os.path.splitext(fname)[0]
+        match = pattern.match(stem) if merge else None
+        if match is None:
+            name, rank = stem, 0
+        else:
+            name = match.group('prefix') + '_' + match.group('count')
+            rank = int(match.group('rank'))
+        groups.setdefault(name, []).append((rank, fname))
+    return [(name, [f for rank, f in sorted(ranks)])
+            for name, ranks in groups.items()]
+
+
+def _convert(args):
+    """Convert the given input files to VTU files.
+
+    The files are either a single file or the files from different ranks of
+    a parallel run which are merged into a single file or, when `pvtu` is
+    True, written to separate files with a PVTU file referencing them.
+    Returns the time and a dictionary of the file written for each array.
+    """
+    filename, fnames, options = args
+    outdir = options['outdir']
+    if outdir is not None:
+        filename = os.path.join(outdir, os.path.basename(filename))
+    kw = dict(compress=options['compress'], n_threads=options['n_threads'],
+              velocity=['u', 'v', 'w'])
+    scalars = options['scalars']
+
+    if len(fnames) > 1 and options['pvtu']:
+        pieces = {}
+        for rank, fname in enumerate(fnames):
+            data = load(fname)
+            output = BinaryVTUOutput(scalars, **kw)
+            prefix, count = filename.rsplit('_', 1)
+            output.dump('%s_%d_%s' % (prefix, rank, count),
+                        list(data['arrays'].values()), {})
+            for ptype, written in output.written.items():
+                name = os.path.basename(written)
+                info = pieces.setdefault(ptype, [[], output.layout[name]])
+                info[0].append(name + '.vtu')
+        result = {}
+        for ptype, (names, layout) in pieces.items():
+            prefix, count = filename.rsplit('_', 1)
+            out = '%s_%s_%s.pvtu' % (prefix, ptype, count)
+            write_pvtu(out, names, layout)
+            result[ptype] = out
+        return float(data['solver_data'].get('t', 0.0)), result
+
+    if len(fnames) > 1:
+        arrays_by_rank = {}
+        for rank, fname in enumerate(fnames):
+            data = load(fname)
+            arrays_by_rank[rank] = data['arrays']
+        arrays = _concatenate_arrays(arrays_by_rank, len(fnames))
+    else:
+        data = load(fnames[0])
+        arrays = data['arrays']
+    output = BinaryVTUOutput(scalars, **kw)
+    output.dump(filename, list(arrays.values()), {})
+    result = dict(
+        (ptype, fname + '.vtu') for ptype, fname in output.written.items()
+    )
+    return float(data['solver_data'].get('t', 0.0)), result
+
+
 def run(options):
+    files = []
     for fname in options.inputfile:
         if os.path.isdir(fname):
-            files = get_files(fname)
-            options.inputfile.extend(files)
-            continue
-        data = load(fname)
-        particles = []
-        for ptype, pdata in data['arrays'].items():
-            particles.append(pdata)
-        filename = os.path.splitext(fname)[0]
-        outdir = options.outdir
-        if outdir is not None:
-            if not os.path.exists(outdir):
-                os.makedirs(outdir)
-            filename = os.path.join(outdir, os.path.basename(filename))
-        dump_vtk(filename, particles, scalars=options.scalars,
-                 velocity=['u', 'v', 'w'])
+            files.extend(get_files(fname))
+        else:
+            files.append(fname)
+
+    outdir = options.outdir
+    if outdir is not None and not os.path.exists(outdir):
+        os.makedirs(outdir)
+
+    conv_options = dict(
+        outdir=outdir, scalars=options.scalars, compress=options.compress,
+        n_threads=options.n_threads, pvtu=options.pvtu
+    )
+    groups = _group_files(files, options.merge or options.pvtu)
+    args = [(name, fnames, conv_options) for name, fnames in groups]
+    if options.jobs > 1 and len(args) > 1:
+        from multiprocessing import Pool
+        pool = Pool(min(options.jobs, len(args)))
+        try:
+            results = pool.map(_convert, args)
+        finally:
+            pool.terminate()
+    else:
+        results = [_convert(arg) for arg in args]
+
+    if options.pvd and results:
+        datasets = {}
+        for t, written in results:
+            for ptype, fname in written.items():
+                datasets.setdefault(ptype, []).append((t, fname))
+        name = os.path.basename(groups[0][0]).rsplit('_', 1)[0]
+        for ptype, data in datasets.items():
+            if outdir is not None:
+                pvd = os.path.join(outdir, '%s_%s.pvd' % (name, ptype))
+            else:
+                pvd = os.path.join(
+                    os.path.dirname(data[0][1]), '%s_%s.pvd' % (name, ptype)
+                )
+            pvd_dir = os.path.dirname(os.path.abspath(pvd))
+            write_pvd(pvd, [
+                (t, os.path.relpath(os.path.abspath(f), pvd_dir))
+                for t, f in sorted(data, key=lambda x: x[0])
+            ])
 
 
 def main(argv=None):
@@ -193,6 +565,39 @@ def main(argv=None):
         help="Directory to output VTK files"
     )
 
+    parser.add_argument(
+        "-z", "--compress", action="store_true", default=False,
+        dest="compress", help="Compress the data with zlib."
+    )
+
+    parser.add_argument(
+        "-j", "--jobs", metavar="jobs", type=int, default=1,
+        help="Number of processes used to convert the files."
+    )
+
+    parser.add_argument(
+        "--threads", metavar="threads", type=int, default=None,
+        dest="n_threads",
+        help="Number of threads used to compress the data of each file."
+    )
+
+    parser.add_argument(
+        "--merge", action="store_true", default=False, dest="merge",
+        help="Merge the files of the different ranks of a parallel run, "
+        "these are named <fname>_<rank>_<count>."
+    )
+
+    parser.add_argument(
+        "--pvtu", action="store_true", default=False, dest="pvtu",
+        help="Write the files of the different ranks of a parallel run "
+        "separately along with a PVTU file for each snapshot."
+    )
+
+    parser.add_argument(
+        "--pvd", action="store_true", default=False, dest="pvd",
+        help="Write a PVD file for each array with the times of the files."
+    )
+
     parser.add_argument(
         "inputfile",  type=str, nargs='+',
         help=" list of input files  or/and directories (hdf5 or npz format)"
@@ -29,12 +29,51 @@ def group_equations(equations):
 
 
 ###############################################################################
-def check_equation_array_properties(equation, particle_arrays):
+def get_work_arrays(equations):
+    """Return the work arrays of the given equations as a dictionary keyed on
+    the destination with values being a dictionary of the arrays keyed on
+    their name.
+
+    An equation may define a ``_get_work_arrays_`` method which returns a
+    dictionary of carrays keyed on their names.  These are used by the
+    generated code like the properties of the destination of the equation,
+    i.e. as ``d_<name>``, but are not stored in the particle array so they
+    are never written to the output files or sent to other processors.  The
+    owner of the arrays may resize them, typically in the ``reduce`` or
+    ``py_initialize`` methods, but must not replace them.
+    """
+    result = defaultdict(dict)
+    for equation in equations:
+        if not hasattr(equation, '_get_work_arrays_'):
+            continue
+        arrays = result[equation.dest]
+        for name, arr in equation._get_work_arrays_().items():
+            if arrays.get(name, arr) is not arr:
+                msg = ('Equations for %s use different work arrays named '
+                       '%s.' % (equation.dest, name))
+                raise ValueError(msg)
+            arrays[name] = arr
+    return dict(result)
+
+
+###############################################################################
+def check_equation_array_properties(equation, particle_arrays,
+                                    pairwise=False, work_arrays=None):
     """Given an equation and the particle arrays, check if the particle arrays
     have the necessary properties.
+
+    If `pairwise` is True, the destination is also checked for the
+    properties used by the `loop_pair` method of the equation.
+    `work_arrays` are the work arrays of each destination as returned by
+    :py:func:`get_work_arrays`, these are also available to the destination.
     """
     p_arrays = dict((x.name, x) for x in particle_arrays)
     _src, _dest = get_arrays_used_in_equation(equation)
+    if pairwise and hasattr(equation, 'loop_pair') and \
+       equation.sources is not None and equation.dest in equation.sources:
+        s, d = get_arrays_used_in_equation(equation, pairwise=True)
+        _dest.update(d)
+        _dest.update('d_' + x[2:] for x in s)
     if equation.dest not in p_arrays:
         msg = "ERROR: Equation {eq_name} has invalid dest: '{dest}'".format(
             eq_name=equation.name, dest=equation.dest
@@ -50,16 +89,25 @@ def check_equation_array_properties(equation, particle_arrays):
     eq_src = set([x[2:] for x in _src])
     eq_dest = set([x[2:] for x in _dest])
 
-    def _check_array(array, eq_props, errors):
+    def _check_array(array, eq_props, errors, extra=()):
         """Updates the `errors` with any errors.
         """
         props = set(list(array.properties.keys()) +
                     list(array.constants.keys()))
+        props.update(extra)
         if not eq_props < props:
             errors[array.name].update(eq_props - props)
 
+    dest = p_arrays[equation.dest]
+    work = {} if work_arrays is None else work_arrays.get(equation.dest, {})
+    for name in work:
+        if name in dest.properties or name in dest.constants:
+            msg = ("ERROR: Work array '%s' of equation %s is also a property "
+                   "of '%s'." % (name, equation.name, equation.dest))
+            raise RuntimeError(msg)
+
     errors = defaultdict(set)
-    _check_array(p_arrays[equation.dest], eq_dest, errors)
+    _check_array(dest, eq_dest, errors, work)
     if equation.sources is not None:
         for src in equation.sources:
             _check_array(p_arrays[src], eq_src, errors)
@@ -74,7 +122,8 @@ def check_equation_array_properties(equation, particle_arrays):
 
 
 def make_acceleration_evals(particle_arrays, equations, kernel,
-                            mode='serial', backend=None):
+                            mode='serial', backend=None, profile=False,
+                            tune_openmp=False):
     '''Returns a list of acceleration evaluators.
 
     If a MultiStageEquations object is given the resulting list will have
@@ -85,7 +134,8 @@ def make_acceleration_evals(particle_arrays, equations, kernel,
     else:
         groups = [equations]
     return [
-        AccelerationEval(particle_arrays, group, kernel, mode, backend)
+        AccelerationEval(particle_arrays, group, kernel, mode, backend,
+                         profile, tune_openmp)
         for group in groups
     ]
 
@@ -121,7 +171,8 @@ class MegaGroup(object):
     def _copy_props(self, group):
         for key in ('real', 'update_nnps', 'iterate', 'pre', 'post',
                     'max_iterations', 'min_iterations', 'has_subgroups',
-                    'condition', 'start_idx', 'stop_idx'):
+                    'condition', 'start_idx', 'stop_idx', 'pairwise',
+                    'cache_pair_data'):
             setattr(self, key, getattr(group, key))
 
     def _make_data(self, group):
@@ -165,7 +216,7 @@ class MegaGroup(object):
 ###############################################################################
 class AccelerationEval(object):
     def __init__(self, particle_arrays, equations, kernel, mode='serial',
-                 backend=None):
+                 backend=None, profile=False, tune_openmp=False):
         """
 
         Parameters
@@ -177,6 +228,14 @@ class AccelerationEval(object):
         mode: str: One of 'serial', 'mpi'.
         backend: str: indicates the backend to use.
             one of ('opencl', 'cython', 'cuda', '', None)
+        profile: bool: instrument the generated code to record the time
+            taken by each group and loop, see
+            `pysph.sph.equation_profiler.EquationProfiler`.  This is
+            ignored by the GPU backends.
+        tune_openmp: bool: use a thread count and OpenMP schedule for each
+            loop that can be changed at runtime, see
+            `pysph.sph.openmp_tuner.OpenMPTuner`.  This also enables the
+            profiling and is only used with OpenMP.
         """
         assert backend in ('opencl', 'cython', 'cuda', '', None)
         self.backend = self._get_backend(backend)
@@ -185,6 +244,11 @@ class AccelerationEval(object):
         self.kernel = kernel
         self.nnps = None
         self.mode = mode
+        self.tune_openmp = tune_openmp and self.backend == 'cython'
+        self.profile = (profile or tune_openmp) and self.backend == 'cython'
+        # Set by the code generator when profiling, a list of dicts with the
+        # path, kind and equations of each profiled region of the code.
+        self.profile_regions = []
         if self.backend == 'cython':
             self.Group = CythonGroup
         elif self.backend == 'opencl':
@@ -194,16 +258,24 @@ class AccelerationEval(object):
 
         all_equations = []
         for group in self.equation_groups:
-            if group.has_subgroups:
-                for g in group.equations:
-                    all_equations.extend(g.equations)
-            else:
-                all_equations.extend(group.equations)
+            groups = group.equations if group.has_subgroups else [group]
+            for g in groups:
+                all_equations.extend(g.equations)
+        self.work_arrays = get_work_arrays(all_equations)
+        if self.work_arrays and self.backend != 'cython':
+            raise NotImplementedError(
+                'Work arrays are only supported by the Cython backend.'
+            )
+        for group in self.equation_groups:
+            groups = group.equations if group.has_subgroups else [group]
+            for g in groups:
+                for equation in g.equations:
+                    check_equation_array_properties(
+                        equation, particle_arrays, pairwise=g.pairwise,
+                        work_arrays=self.work_arrays
+                    )
         self.all_group = self.Group(equations=all_equations)
 
-        for equation in all_equations:
-            check_equation_array_properties(equation, particle_arrays)
-
         self.mega_groups = [MegaGroup(g, self.Group)
                             for g in self.equation_groups]
         self.c_acceleration_eval = None
@@ -211,6 +283,12 @@ class AccelerationEval(object):
     ##########################################################################
     # Private interface.
     ##########################################################################
+    def _set_work_arrays(self):
+        for dest, arrays in self.work_arrays.items():
+            wrapper = getattr(self.c_acceleration_eval, dest)
+            for name, arr in arrays.items():
+                setattr(wrapper, name, arr)
+
     def _get_backend(self, backend):
         if not backend:
             cfg = get_config()
@@ -235,6 +313,7 @@ class AccelerationEval(object):
         """Set the high-performance compiled object to call internally.
         """
         self.c_acceleration_eval = c_acceleration_eval
+        self._set_work_arrays()
 
     def set_nnps(self, nnps):
         self.nnps = nnps
@@ -246,3 +325,4 @@ class AccelerationEval(object):
         segfault.
         """
         self.c_acceleration_eval.update_particle_arrays(particle_arrays)
+        self._set_work_arrays()
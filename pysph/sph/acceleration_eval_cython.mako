@@ -7,6 +7,83 @@ ${' '*4*level}${l}
 % endfor
 </%def>
 
+<%def name="source_loop(helper, group, eq_group, pairwise, mode)" buffered="True">
+${helper.get_parallel_block()}
+    thread_id = threadid()
+% if mode == 'plain':
+    ${indent(eq_group.get_variable_array_setup(), 1)}
+% else:
+    ${indent(eq_group.get_pair_cache_array_setup(), 1)}
+% endif
+% if pairwise:
+    ${indent(helper.get_pair_buffer_pointers(eq_group), 1)}
+% endif
+    for d_idx in ${helper.get_parallel_range(group, nogil=False)}:
+% if mode == 'read':
+        ###############################################################
+        ## Use the cached neighbors and pair data.
+        ###############################################################
+        NBRS = pair_cache.get_pairs(d_idx, &N_NBRS)
+        _pc_rij = pair_cache.get_rij(d_idx)
+        _pc_wij = pair_cache.get_wij(d_idx)
+        _pc_dwij = pair_cache.get_dwij(d_idx)
+% else:
+        ###############################################################
+        ## Find and iterate over neighbors.
+        ###############################################################
+        nnps.get_nearest_neighbors(d_idx, <UIntArray>self.nbrs[thread_id])
+        NBRS = (<UIntArray>self.nbrs[thread_id]).data
+        N_NBRS = (<UIntArray>self.nbrs[thread_id]).length
+% endif
+% if helper.object.profile:
+        ${indent(helper.get_profile_nbrs(), 2)}
+% endif
+% if mode == 'fill':
+        pair_cache.begin(d_idx, thread_id)
+% endif
+% if eq_group.has_loop_all():
+        ${indent(eq_group.get_loop_all_code(helper.object.kernel), 2)}
+% endif
+% if eq_group.has_loop():
+        for nbr_idx in range(N_NBRS):
+            s_idx = <long>(NBRS[nbr_idx])
+% if pairwise:
+            ###########################################################
+            ## Visit each pair only once, loop_pair updates both.
+            ###########################################################
+            if s_idx < d_idx:
+                continue
+            ${indent(eq_group.get_loop_pair_code(helper.object.kernel), 3)}
+% elif mode == 'fill':
+            ###########################################################
+            ## Store the pair data in the cache for later groups.
+            ###########################################################
+            ${indent(eq_group.get_pair_cache_precomputed_code(helper.object.kernel), 3)}
+            pair_cache.add(thread_id, NBRS[nbr_idx], RIJ, WIJ, DWIJ)
+            ${indent(eq_group.get_loop_code(helper.object.kernel, precomputed=False), 3)}
+% elif mode == 'read':
+            ###########################################################
+            ## Read the pair data from the cache.
+            ###########################################################
+            RIJ = _pc_rij[nbr_idx]
+            WIJ = _pc_wij[nbr_idx]
+            DWIJ[0] = _pc_dwij[3*nbr_idx]
+            DWIJ[1] = _pc_dwij[3*nbr_idx + 1]
+            DWIJ[2] = _pc_dwij[3*nbr_idx + 2]
+            ${indent(eq_group.get_pair_cache_precomputed_code(helper.object.kernel, fill=False), 3)}
+            ${indent(eq_group.get_loop_code(helper.object.kernel, precomputed=False), 3)}
+% else:
+            ###########################################################
+            ## Iterate over the equations for the same set of neighbors.
+            ###########################################################
+            ${indent(eq_group.get_loop_code(helper.object.kernel), 3)}
+% endif ## if pairwise
+% endif ## if has_loop
+% if mode == 'fill':
+        pair_cache.end(d_idx, thread_id)
+% endif
+</%def>
+
 <%def name="do_group(helper, group, level=0)" buffered="True">
 #######################################################################
 ## Call any `pre` functions
@@ -27,6 +104,7 @@ ${indent(helper.get_pre_call(group), 0)}
 dst = self.${dest}
 ${indent(helper.get_dest_array_setup(dest, eqs_with_no_source, sources, group), 0)}
 dst_array_index = dst.index
+${indent(helper.get_profile_dest_start(group, dest, all_eqs), 0)}
 
 #######################################################################
 ## Call py_initialize for all equations for this destination.
@@ -37,8 +115,10 @@ ${indent(all_eqs.get_py_initialize_code(), 0)}
 #######################################################################
 % if all_eqs.has_initialize():
 # Initialization for destination ${dest}.
+${indent(helper.get_profile_phase_start(group, dest, 'initialize', all_eqs), 0)}
 for d_idx in ${helper.get_parallel_range(group)}:
     ${indent(all_eqs.get_initialize_code(helper.object.kernel), 1)}
+${indent(helper.get_profile_stop(), 0)}
 % endif
 #######################################################################
 ## Handle all the equations that do not have a source.
@@ -46,8 +126,10 @@ for d_idx in ${helper.get_parallel_range(group)}:
 % if len(eqs_with_no_source.equations) > 0:
 % if eqs_with_no_source.has_loop():
 # SPH Equations with no sources.
+${indent(helper.get_profile_phase_start(group, dest, 'loop', eqs_with_no_source), 0)}
 for d_idx in ${helper.get_parallel_range(group)}:
     ${indent(eqs_with_no_source.get_loop_code(helper.object.kernel), 1)}
+${indent(helper.get_profile_stop(), 0)}
 % endif
 % endif
 #######################################################################
@@ -60,9 +142,13 @@ for d_idx in ${helper.get_parallel_range(group)}:
 ## Setup source array pointers.
 #######################################################################
 
+<%
+pairwise = helper.is_pairwise(group, dest, source, eq_group)
+%>
 src = self.${source}
-${indent(helper.get_src_array_setup(source, eq_group), 0)}
+${indent(helper.get_src_array_setup(source, eq_group, pairwise), 0)}
 src_array_index = src.index
+${indent(helper.get_profile_phase_start(group, dest, 'source', eq_group, source), 0)}
 
 % if eq_group.has_initialize_pair():
 for d_idx in ${helper.get_parallel_range(group)}:
@@ -74,29 +160,27 @@ for d_idx in ${helper.get_parallel_range(group)}:
 ## Iterate over destination particles.
 #######################################################################
 nnps.set_context(src_array_index, dst_array_index)
+% if pairwise:
+${indent(helper.get_pair_buffer_setup(eq_group), 0)}
+% endif
 
-${helper.get_parallel_block()}
-    thread_id = threadid()
-    ${indent(eq_group.get_variable_array_setup(), 1)}
-    for d_idx in ${helper.get_parallel_range(group, nogil=False)}:
-        ###############################################################
-        ## Find and iterate over neighbors.
-        ###############################################################
-        nnps.get_nearest_neighbors(d_idx, <UIntArray>self.nbrs[thread_id])
-        NBRS = (<UIntArray>self.nbrs[thread_id]).data
-        N_NBRS = (<UIntArray>self.nbrs[thread_id]).length
-% if eq_group.has_loop_all():
-        ${indent(eq_group.get_loop_all_code(helper.object.kernel), 2)}
+% if helper.uses_pair_cache(eq_group):
+${indent(helper.get_pair_cache_setup(), 0)}
+if pair_cache_mode == 2:
+    ${indent(source_loop(helper, group, eq_group, pairwise, 'read'), 1)}
+elif pair_cache_mode == 1:
+    ${indent(source_loop(helper, group, eq_group, pairwise, 'fill'), 1)}
+    pair_cache.valid = True
+else:
+    ${indent(source_loop(helper, group, eq_group, pairwise, 'plain'), 1)}
+% else:
+${source_loop(helper, group, eq_group, pairwise, 'plain')}
+% endif
+% if pairwise:
+${indent(helper.get_pair_reduction(eq_group), 0)}
 % endif
-% if eq_group.has_loop():
-        for nbr_idx in range(N_NBRS):
-            s_idx = <long>(NBRS[nbr_idx])
-            ###########################################################
-            ## Iterate over the equations for the same set of neighbors.
-            ###########################################################
-            ${indent(eq_group.get_loop_code(helper.object.kernel), 3)}
-% endif ## if has_loop
 % endif ## if eq_group.has_loop() or has_loop_all():
+${indent(helper.get_profile_stop(), 0)}
 # Source ${source} done.
 # --------------------------------------
 % endfor
@@ -105,16 +189,21 @@ ${helper.get_parallel_block()}
 ###################################################################
 % if all_eqs.has_post_loop():
 # Post loop for destination ${dest}.
+${indent(helper.get_profile_phase_start(group, dest, 'post_loop', all_eqs), 0)}
 for d_idx in ${helper.get_parallel_range(group)}:
     ${indent(all_eqs.get_post_loop_code(helper.object.kernel), 1)}
+${indent(helper.get_profile_stop(), 0)}
 % endif
 
 ###################################################################
 ## Do any reductions for the destination.
 ###################################################################
 % if all_eqs.has_reduce():
+${indent(helper.get_profile_phase_start(group, dest, 'reduce', all_eqs), 0)}
 ${indent(all_eqs.get_reduce_code(), 0)}
+${indent(helper.get_profile_stop(), 0)}
 % endif
+${indent(helper.get_profile_stop(), 0)}
 
 # Destination ${dest} done.
 # ---------------------------------------------------------------------
@@ -124,8 +213,16 @@ ${indent(all_eqs.get_reduce_code(), 0)}
 #######################################################################
 % if group.update_nnps:
 # Updating NNPS.
+${indent(helper.get_profile_phase_start(group, None, 'update_domain', None), 0)}
 nnps.update_domain()
+${indent(helper.get_profile_stop(), 0)}
+${indent(helper.get_profile_phase_start(group, None, 'update_nnps', None), 0)}
 nnps.update()
+${indent(helper.get_profile_stop(), 0)}
+% endif
+% if helper.invalidates_pair_cache(group):
+# The group may move the particles.
+nnps.invalidate_pair_cache()
 % endif
 
 % endfor
@@ -140,6 +237,7 @@ ${indent(helper.get_post_call(group), 0)}
 from libc.stdio cimport printf
 from libc.math cimport *
 from libc.math cimport fabs as abs
+from libc.string cimport memset
 cimport numpy
 import numpy
 from cython import address
@@ -149,9 +247,12 @@ prange = range
 % else:
 from cython.parallel import parallel, prange, threadid
 % endif
+% if helper.tunes_openmp():
+cimport openmp
+% endif
 
 from pysph.base.particle_array cimport ParticleArray
-from pysph.base.nnps_base cimport NNPS
+from pysph.base.nnps_base cimport NNPS, PairDataCache
 from pysph.base.reduce_array import serial_reduce_array
 % if helper.object.mode == 'serial':
 from pysph.base.reduce_array import dummy_reduce_array as parallel_reduce_array
@@ -160,11 +261,25 @@ from pysph.base.reduce_array import mpi_reduce_array as parallel_reduce_array
 % endif
 
 from pysph.base.nnps import get_number_of_threads
+% if helper.object.profile:
+from time import perf_counter
+% endif
 from cyarray.carray cimport (DoubleArray, FloatArray, IntArray, LongArray, UIntArray,
     aligned, aligned_free, aligned_malloc)
 
 ${helper.get_header()}
 
+% if helper.config.use_openmp:
+cdef void pair_reduce(double* dest, double* buf, long n,
+                      int n_threads) nogil:
+    # Add the per-thread contributions of a pairwise loop.
+    cdef long i
+    cdef int t
+    for i in prange(n, schedule='static'):
+        for t in range(n_threads):
+            dest[i] += buf[t*n + i]
+% endif
+
 # #############################################################################
 cdef class ParticleArrayWrapper:
     cdef public int index
@@ -198,11 +313,23 @@ cdef class AccelerationEval:
     cdef public NNPS nnps
     cdef public int n_threads
     cdef public list _nbr_refs
+    cdef dict _pair_buffers
     cdef void **nbrs
     # CFL time step conditions
     cdef public double dt_cfl, dt_force, dt_viscous
     cdef object groups
     cdef object all_equations
+% if helper.object.profile:
+    # Profiling counters, see pysph.sph.equation_profiler.
+    cdef public DoubleArray _prof_time
+    cdef public LongArray _prof_calls, _prof_dest, _prof_nbrs, _prof_max_nbrs
+    cdef public long _prof_stride
+% endif
+% if helper.tunes_openmp():
+    # Thread count, omp_sched_t and chunk size of each profiled region, see
+    # pysph.sph.openmp_tuner.
+    cdef public IntArray _omp_threads, _omp_kind, _omp_chunk
+% endif
     ${indent(helper.get_kernel_defs(), 1)}
     ${indent(helper.get_equation_defs(), 1)}
 
@@ -224,6 +351,8 @@ cdef class AccelerationEval:
             self.nbrs[i] = <void*>_arr
             self._nbr_refs.append(_arr)
 
+        self._pair_buffers = {}
+
         ${indent(helper.get_kernel_init(), 2)}
         ${indent(helper.get_equation_init(), 2)}
         all_equations = {}
@@ -234,6 +363,17 @@ cdef class AccelerationEval:
     def __dealloc__(self):
         aligned_free(self.nbrs)
 
+    cdef DoubleArray _get_pair_buffer(self, str name, long n):
+        # Return a zeroed buffer with n values for each thread.
+        cdef DoubleArray buf = self._pair_buffers.get(name)
+        if buf is None:
+            buf = DoubleArray(n*self.n_threads)
+            self._pair_buffers[name] = buf
+        elif buf.length < n*self.n_threads:
+            buf.resize(n*self.n_threads)
+        memset(buf.data, 0, n*self.n_threads*sizeof(double))
+        return buf
+
     def set_nnps(self, NNPS nnps):
         self.nnps = nnps
 
@@ -264,6 +404,13 @@ cdef class AccelerationEval:
 
         cdef int src_array_index, dst_array_index
         ${indent(helper.get_variable_declarations(), 2)}
+        ${indent(helper.get_pair_declarations(), 2)}
+        ${indent(helper.get_pair_cache_declarations(), 2)}
+        ${indent(helper.get_profile_declarations(), 2)}
+% if helper.has_pair_cache_groups():
+        # The particles may have moved since the last evaluation.
+        nnps.invalidate_pair_cache()
+% endif
         #######################################################################
         ## Iterate over groups:
         ## Groups are organized as {destination: (eqs_with_no_source, sources, all_eqs)}
@@ -271,6 +418,7 @@ cdef class AccelerationEval:
         ## sources are {source: Group([equations...])}
         ## all_eqs is a Group of all equations having this destination.
         #######################################################################
+        ${indent(helper.get_profile_start('_prof_tc', [], 'compute'), 2)}
         % for g_idx, group in enumerate(helper.object.mega_groups):
         % if len(group.data) > 0: # No equations in this group.
         # ---------------------------------------------------------------------
@@ -285,6 +433,7 @@ cdef class AccelerationEval:
         indent_lvl = 2
         %>
         % endif
+        ${indent(helper.get_profile_group_start(group), indent_lvl)}
         % if group.iterate:
         ${indent(helper.get_iteration_init(group), indent_lvl)}
         <%
@@ -302,7 +451,9 @@ cdef class AccelerationEval:
         indent_lvl += 1
         %>
         % endif
+        ${indent(helper.get_profile_group_start(sub_group), indent_lvl)}
         ${indent(do_group(helper, sub_group, indent_lvl), indent_lvl)}
+        ${indent(helper.get_profile_stop(), indent_lvl)}
         % if sub_group.condition is not None:
         <%
         indent_lvl -= 1
@@ -317,9 +468,14 @@ cdef class AccelerationEval:
         ## Check the iteration conditions
         % if group.iterate:
         ${indent(helper.get_iteration_check(group), indent_lvl)}
+        <%
+        indent_lvl -= 1
+        %>
         % endif
+        ${indent(helper.get_profile_stop(), indent_lvl)}
 
         # Group ${g_idx} done.
         # ---------------------------------------------------------------------
         % endif # (if len(group.data) > 0)
         % endfor
+        ${indent(helper.get_profile_stop(), 2)}
@@ -10,6 +10,15 @@ from compyle.cython_generator import (CythonGenerator, KnownType,
                                       get_parallel_range)
 from compyle.ext_module import ExtModule, get_platform_dir
 
+from pysph.sph.equation import Context
+
+# The phases of a destination that have parallel loops and whose thread
+# count and schedule may be tuned.
+TUNABLE_PHASES = ('initialize', 'loop', 'source', 'post_loop')
+
+# Values of omp_sched_t for the OpenMP schedules.
+OMP_SCHEDULES = dict(static=1, dynamic=2, guided=3, auto=4)
+
 
 ###############################################################################
 def get_cython_code(obj):
@@ -103,6 +112,11 @@ def get_known_types_for_arrays(array_names):
         c_type = getattr(carray, arr_type)().get_c_type()
         for arr in arrays:
             known_type = KnownType(c_type + '*')
+            if 'd_' + arr in result:
+                msg = ('Property %s has different types (%s, %s) in the '
+                       'particle arrays, use the same type in all arrays.' %
+                       (arr, result['d_' + arr].type, known_type.type))
+                raise ValueError(msg)
             result['s_' + arr] = known_type
             result['d_' + arr] = known_type
     return result
@@ -116,29 +130,77 @@ class AccelerationEvalCythonHelper(object):
         self.all_array_names = get_all_array_names(
             self.object.particle_arrays
         )
+        for arrays in self.object.work_arrays.values():
+            for name, arr in arrays.items():
+                self.all_array_names.setdefault(
+                    arr.__class__.__name__, set()
+                ).add(name)
         self.known_types = get_known_types_for_arrays(
             self.all_array_names
         )
         self._ext_mod = None
         self._module = None
         self._compute_group_map()
+        self._compute_pair_cache_groups()
+        self._profile_regions = []
+        self._profile_stack = []
 
     ##########################################################################
     # Private interface.
     ##########################################################################
+    def _get_all_groups(self):
+        for group in self.object.mega_groups:
+            if group.has_subgroups:
+                for sub_group in group.data:
+                    yield sub_group
+            else:
+                yield group
+
     def _compute_group_map(self):
         # Given all the groups, create a mapping from the group to an index of
         # sorts that can be used when adding the pre/post callback code.
         mapping = {}
+        paths = {}
         for g_idx, group in enumerate(self.object.mega_groups):
             mapping[group] = 'self.groups[%d]' % g_idx
+            paths[group] = ['group_%d' % g_idx]
             if group.has_subgroups:
                 for sg_idx, sub_group in enumerate(group.data):
                     code = 'self.groups[{gid}].data[{sgid}]'.format(
                         gid=g_idx, sgid=sg_idx
                     )
                     mapping[sub_group] = code
+                    paths[sub_group] = paths[group] + [
+                        'group_%d.%d' % (g_idx, sg_idx)
+                    ]
         self._group_map = mapping
+        self._group_paths = paths
+
+    def _compute_pair_cache_groups(self):
+        # Find the groups of equations for a source whose pair data is
+        # cached, i.e. those of groups with `cache_pair_data` that visit
+        # the same pairs as another such group.
+        visits = defaultdict(list)
+        for group in self._get_all_groups():
+            if not group.cache_pair_data:
+                continue
+            for dest, (eqs, sources, all_eqs) in group.data.items():
+                for source, eq_group in sources.items():
+                    if eq_group.has_loop() and \
+                       not self.is_pairwise(group, dest, source, eq_group):
+                        visits[(dest, source)].append(eq_group)
+        self._pair_cache_groups = set()
+        for eq_groups in visits.values():
+            if len(eq_groups) > 1:
+                self._pair_cache_groups.update(eq_groups)
+
+    def _get_pair_cache_array_names(self):
+        src, dest = set(), set()
+        for eq_group in self._pair_cache_groups:
+            for cb in eq_group.get_pair_cache_precomputed().values():
+                src.update(cb.src_arrays)
+                dest.update(cb.dest_arrays)
+        return src, dest
 
     ##########################################################################
     # Public interface.
@@ -146,7 +208,9 @@ class AccelerationEvalCythonHelper(object):
     def get_code(self):
         path = join(dirname(__file__), 'acceleration_eval_cython.mako')
         template = Template(filename=path)
+        self._profile_regions = []
         main = template.render(helper=self)
+        self.object.profile_regions = self._profile_regions
         return main
 
     def setup_compiled_module(self, module):
@@ -156,6 +220,27 @@ class AccelerationEvalCythonHelper(object):
             object.kernel, object.all_group.equations,
             object.particle_arrays, object.mega_groups
         )
+        if object.profile:
+            n = len(self._profile_regions)
+            # Keep the counters of each thread on separate cache lines.
+            stride = n + 8
+            n_threads = acceleration_eval.n_threads
+            acceleration_eval._prof_stride = stride
+            acceleration_eval._prof_time = carray.DoubleArray(n)
+            acceleration_eval._prof_calls = carray.LongArray(n)
+            acceleration_eval._prof_dest = carray.LongArray(n)
+            acceleration_eval._prof_nbrs = carray.LongArray(n_threads*stride)
+            acceleration_eval._prof_max_nbrs = carray.LongArray(
+                n_threads*stride
+            )
+        if self.tunes_openmp():
+            schedule, chunksize = self.config.omp_schedule
+            for name, value in (('_omp_threads', n_threads),
+                                ('_omp_kind', OMP_SCHEDULES[schedule]),
+                                ('_omp_chunk', chunksize or 0)):
+                arr = carray.IntArray(n)
+                arr.get_npy_array()[:] = value
+                setattr(acceleration_eval, name, arr)
         object.set_compiled_object(acceleration_eval)
 
     def compile(self, code):
@@ -241,20 +326,34 @@ class AccelerationEvalCythonHelper(object):
     def get_variable_declarations(self):
         group = self.object.all_group
         ctx = group.context
+        if self._pair_cache_groups:
+            ctx = Context(ctx)
+            for eq_group in self._pair_cache_groups:
+                ctx.update(eq_group.get_pair_cache_context())
         return group.get_variable_declarations(ctx)
 
     def get_array_declarations(self):
         group = self.object.all_group
         src, dest = group.get_array_names()
         src.update(dest)
+        for names in self._get_pair_cache_array_names():
+            src.update(names)
+        for names in group.get_pair_array_names():
+            src.update(names)
         return group.get_array_declarations(src, self.known_types)
 
     def get_dest_array_setup(self, dest_name, eqs_with_no_source, sources,
                              group):
         src, dest_arrays = eqs_with_no_source.get_array_names()
-        for g in sources.values():
+        for source, g in sources.items():
             s, d = g.get_array_names()
             dest_arrays.update(d)
+            if self.is_pairwise(group, dest_name, source, g):
+                s, d = g.get_pair_array_names()
+                dest_arrays.update(d)
+            if self.uses_pair_cache(g):
+                for cb in g.get_pair_cache_precomputed().values():
+                    dest_arrays.update(cb.dest_arrays)
         if isinstance(group.start_idx, str):
             lines = ['D_START_IDX = self.%s.%s[0]' %
                      (dest_name, group.start_idx)]
@@ -274,28 +373,247 @@ class AccelerationEvalCythonHelper(object):
                   for n in sorted(dest_arrays)]
         return '\n'.join(lines)
 
-    def get_src_array_setup(self, src_name, eq_group):
+    def get_src_array_setup(self, src_name, eq_group, pairwise=False):
         src_arrays, dest = eq_group.get_array_names()
+        if pairwise:
+            s, d = eq_group.get_pair_array_names()
+            src_arrays.update(s)
+        if self.uses_pair_cache(eq_group):
+            for cb in eq_group.get_pair_cache_precomputed().values():
+                src_arrays.update(cb.src_arrays)
         lines = ['NP_SRC = self.%s.size()' % src_name]
         lines += ['%s = src.%s.data' % (n, n[2:])
                   for n in sorted(src_arrays)]
         return '\n'.join(lines)
 
+    def is_pairwise(self, group, dest, source, eq_group):
+        """Returns True if the loop over the source should only visit each
+        pair of particles once, see the `pairwise` option of `Group`.
+        """
+        return (group.pairwise and dest == source and
+                eq_group.has_loop_pair())
+
+    def uses_pair_cache(self, eq_group):
+        """Returns True if the pair data of the given group of equations
+        for a source is stored in or read from the pair data cache of the
+        NNPS, see the `cache_pair_data` option of `Group`.
+        """
+        return eq_group in self._pair_cache_groups
+
+    def has_pair_cache_groups(self):
+        return len(self._pair_cache_groups) > 0
+
+    def invalidates_pair_cache(self, group):
+        """Returns True if the cached pair data should be invalidated after
+        the group as it may move the particles.
+        """
+        return self.has_pair_cache_groups() and not group.cache_pair_data
+
+    def get_pair_cache_declarations(self):
+        if not self._pair_cache_groups:
+            return ''
+        return dedent('''\
+            cdef PairDataCache pair_cache
+            cdef int pair_cache_mode
+            cdef double *_pc_rij
+            cdef double *_pc_wij
+            cdef double *_pc_dwij''')
+
+    def get_pair_cache_setup(self):
+        """Choose if the cached pair data for the current source and
+        destination are read (mode 2), filled (mode 1) or not used (mode 0).
+        """
+        return dedent('''\
+            pair_cache = nnps.get_pair_cache(src_array_index, dst_array_index)
+            if not nnps.use_pair_cache:
+                pair_cache_mode = 0
+            elif (pair_cache.valid and pair_cache.start_idx <= D_START_IDX
+                  and NP_DEST <= pair_cache.stop_idx):
+                pair_cache_mode = 2
+            else:
+                pair_cache_mode = 1
+                pair_cache.reset(D_START_IDX, NP_DEST)''')
+
+    def get_pair_accumulators(self, eq_group):
+        """Return the source properties accumulated by a pairwise loop that
+        need a private buffer for each thread.
+        """
+        if not self.config.use_openmp:
+            return []
+        props = eq_group.get_pair_accumulators()
+        for prop in props:
+            known = self.known_types.get('s_' + prop)
+            if known is not None and known.type != 'double*':
+                raise ValueError(
+                    'Only double properties can be accumulated in a pairwise'
+                    ' loop, s_%s is of type %s.' % (prop, known.type)
+                )
+        return props
+
+    def get_pair_declarations(self):
+        props = set()
+        for group in self._get_all_groups():
+            if not group.pairwise:
+                continue
+            for dest, (eqs, sources, all_eqs) in group.data.items():
+                for source, eq_group in sources.items():
+                    if self.is_pairwise(group, dest, source, eq_group):
+                        props.update(self.get_pair_accumulators(eq_group))
+        lines = []
+        for prop in sorted(props):
+            lines.append('cdef DoubleArray _pbuf_%s' % prop)
+            lines.append('cdef long _pn_%s' % prop)
+        return '\n'.join(lines)
+
+    def get_pair_buffer_setup(self, eq_group):
+        lines = []
+        for prop in self.get_pair_accumulators(eq_group):
+            lines.append('_pn_{p} = src.{p}.length'.format(p=prop))
+            lines.append(
+                "_pbuf_{p} = self._get_pair_buffer('{p}', _pn_{p})"
+                .format(p=prop)
+            )
+        return '\n'.join(lines)
+
+    def get_pair_buffer_pointers(self, eq_group):
+        lines = []
+        for prop in self.get_pair_accumulators(eq_group):
+            lines.append(
+                's_{p} = &_pbuf_{p}.data[thread_id*_pn_{p}]'.format(p=prop)
+            )
+        return '\n'.join(lines)
+
+    def get_pair_reduction(self, eq_group):
+        lines = []
+        for prop in self.get_pair_accumulators(eq_group):
+            lines.append(
+                'pair_reduce(src.{p}.data, _pbuf_{p}.data, _pn_{p}, '
+                'self.n_threads)'.format(p=prop)
+            )
+        return '\n'.join(lines)
+
+    def tunes_openmp(self):
+        """Return True if the thread count and schedule of the parallel
+        loops are set at runtime for each phase.
+        """
+        return self.object.tune_openmp and self.config.use_openmp
+
+    def get_profile_declarations(self):
+        if not self.object.profile:
+            return ''
+        code = dedent('''\
+            cdef double _prof_tc, _prof_tg, _prof_ts, _prof_td, _prof_t
+            cdef long _prof_idx
+            cdef long* _prof_nbrs = self._prof_nbrs.data
+            cdef long* _prof_max_nbrs = self._prof_max_nbrs.data''')
+        if self.tunes_openmp():
+            code += '\ncdef int _omp_nt'
+        return code
+
+    def get_profile_start(self, var, path, kind, equations=()):
+        """Start timing a region of the code, the `path` is a list of
+        names identifying the region and `kind` the type of the region.
+        """
+        if not self.object.profile:
+            return ''
+        self._profile_stack.append((var, len(self._profile_regions), kind))
+        self._profile_regions.append(dict(
+            path=list(path), kind=kind,
+            equations=[eq.__class__.__name__ for eq in equations],
+            tunable=self._is_tunable(kind)
+        ))
+        code = '%s = perf_counter()' % var
+        if self._is_tunable(kind):
+            code += dedent('''
+                _omp_nt = self._omp_threads.data[{idx}]
+                openmp.omp_set_schedule(
+                    <openmp.omp_sched_t>self._omp_kind.data[{idx}],
+                    self._omp_chunk.data[{idx}]
+                )''').format(idx=len(self._profile_regions) - 1)
+        return code
+
+    def get_profile_stop(self):
+        if not self.object.profile:
+            return ''
+        var, idx, kind = self._profile_stack.pop()
+        lines = [
+            'self._prof_time.data[{idx}] += perf_counter() - {var}',
+            'self._prof_calls.data[{idx}] += 1'
+        ]
+        if kind == 'source':
+            lines.append(
+                'self._prof_dest.data[{idx}] += NP_DEST - D_START_IDX'
+            )
+        return '\n'.join(lines).format(idx=idx, var=var)
+
+    def get_profile_group_start(self, group):
+        return self.get_profile_start(
+            '_prof_ts' if len(self._group_paths[group]) > 1 else '_prof_tg',
+            self._group_paths[group], 'group'
+        )
+
+    def get_profile_dest_start(self, group, dest, all_eqs):
+        return self.get_profile_start(
+            '_prof_td', self._group_paths[group] + ['dest:' + dest], 'dest',
+            all_eqs.equations
+        )
+
+    def get_profile_phase_start(self, group, dest, kind, eq_group,
+                                source=None):
+        path = self._group_paths[group]
+        if dest is not None:
+            path = path + ['dest:' + dest]
+        path = path + [kind if source is None else 'src:' + source]
+        equations = eq_group.equations if eq_group is not None else ()
+        return self.get_profile_start('_prof_t', path, kind, equations)
+
+    def get_profile_nbrs(self):
+        """Record the number of neighbors of a destination particle in
+        the per thread counters of the current source loop.
+        """
+        if not self.object.profile:
+            return ''
+        var, idx, kind = self._profile_stack[-1]
+        return dedent('''\
+            _prof_idx = thread_id*self._prof_stride + {idx}
+            _prof_nbrs[_prof_idx] += N_NBRS
+            if N_NBRS > _prof_max_nbrs[_prof_idx]:
+                _prof_max_nbrs[_prof_idx] = N_NBRS''').format(
+            idx=idx
+        )
+
+    def _is_tunable(self, kind):
+        return self.tunes_openmp() and kind in TUNABLE_PHASES
+
+    def _in_tuned_phase(self):
+        return (len(self._profile_stack) > 0 and
+                self._is_tunable(self._profile_stack[-1][2]))
+
     def get_parallel_block(self):
         if self.config.use_openmp:
+            if self._in_tuned_phase():
+                return "with nogil, parallel(num_threads=_omp_nt):"
             return "with nogil, parallel():"
         else:
             return "if True: # Placeholder used for OpenMP."
 
     def get_parallel_range(self, group, nogil=True):
         kwargs = {}
-        if (group.stop_idx is not None) or group.start_idx:
+        tuned = self._in_tuned_phase()
+        if tuned:
+            # The schedule is set with omp_set_schedule for the phase.
+            kwargs['schedule'] = 'runtime'
+            kwargs['chunksize'] = None
+        elif (group.stop_idx is not None) or group.start_idx:
             kwargs['schedule'] = 'dynamic'
             kwargs['chunksize'] = None
         if nogil:
             kwargs['nogil'] = True
 
-        return get_parallel_range("D_START_IDX", "NP_DEST", **kwargs)
+        code = get_parallel_range("D_START_IDX", "NP_DEST", **kwargs)
+        if tuned and nogil:
+            code = code[:-1] + ', num_threads=_omp_nt)'
+        return code
 
     def get_particle_array_names(self):
         parrays = [pa.name for pa in self.object.particle_arrays]
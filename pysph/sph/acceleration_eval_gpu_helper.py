@@ -821,8 +821,11 @@ class AccelerationEvalGPUHelper(object):
             grad = '%s_gradient(kern, ' % name
             grad_h = '%s_gradient_h(kern, ' % name
             deltap = '%s_get_deltap(kern)' % name
+            fused = '%s_kernel_and_gradient(kern, ' % name
 
-            code = code.replace('DELTAP', deltap).replace('GRADIENT(', grad)
+            code = code.replace('DELTAP', deltap).replace(
+                'KERNEL_AND_GRADIENT(', fused
+            ).replace('GRADIENT(', grad)
             return code.replace('KERNEL(', kern).replace('GRADH(', grad_h)
         else:
             return code
@@ -18,6 +18,10 @@ class SummationDensity(Equation):
     def loop(self, d_idx, d_rho, s_idx, s_m, WIJ):
         d_rho[d_idx] += s_m[s_idx]*WIJ
 
+    def loop_pair(self, d_idx, d_rho, d_m, s_idx, s_rho, s_m, WIJ):
+        d_rho[d_idx] += s_m[s_idx]*WIJ
+        s_rho[s_idx] += d_m[d_idx]*WIJ
+
 
 class BodyForce(Equation):
     r"""Add a body force to the particles:
@@ -181,6 +185,11 @@ class ContinuityEquation(Equation):
         vijdotdwij = DWIJ[0]*VIJ[0] + DWIJ[1]*VIJ[1] + DWIJ[2]*VIJ[2]
         d_arho[d_idx] += s_m[s_idx]*vijdotdwij
 
+    def loop_pair(self, d_idx, d_arho, d_m, s_idx, s_arho, s_m, DWIJ, VIJ):
+        vijdotdwij = DWIJ[0]*VIJ[0] + DWIJ[1]*VIJ[1] + DWIJ[2]*VIJ[2]
+        d_arho[d_idx] += s_m[s_idx]*vijdotdwij
+        s_arho[s_idx] += d_m[d_idx]*vijdotdwij
+
 
 class MonaghanArtificialViscosity(Equation):
     r"""Classical Monaghan style artificial viscosity [Monaghan2005]_
@@ -250,6 +259,28 @@ class MonaghanArtificialViscosity(Equation):
         d_av[d_idx] += -s_m[s_idx] * piij * DWIJ[1]
         d_aw[d_idx] += -s_m[s_idx] * piij * DWIJ[2]
 
+    def loop_pair(self, d_idx, s_idx, d_m, d_cs, d_au, d_av, d_aw, s_m,
+                  s_cs, s_au, s_av, s_aw, VIJ, XIJ, HIJ, R2IJ, RHOIJ1, EPS,
+                  DWIJ):
+
+        vijdotxij = VIJ[0]*XIJ[0] + VIJ[1]*XIJ[1] + VIJ[2]*XIJ[2]
+
+        if vijdotxij < 0:
+            cij = 0.5 * (d_cs[d_idx] + s_cs[s_idx])
+
+            muij = (HIJ * vijdotxij)/(R2IJ + EPS)
+
+            piij = -self.alpha*cij*muij + self.beta*muij*muij
+            piij = piij*RHOIJ1
+
+            d_au[d_idx] += -s_m[s_idx] * piij * DWIJ[0]
+            d_av[d_idx] += -s_m[s_idx] * piij * DWIJ[1]
+            d_aw[d_idx] += -s_m[s_idx] * piij * DWIJ[2]
+
+            s_au[s_idx] += d_m[d_idx] * piij * DWIJ[0]
+            s_av[s_idx] += d_m[d_idx] * piij * DWIJ[1]
+            s_aw[s_idx] += d_m[d_idx] * piij * DWIJ[2]
+
 
 class XSPHCorrection(Equation):
     r"""Position stepping with XSPH correction [Monaghan1992]_
@@ -292,6 +323,18 @@ class XSPHCorrection(Equation):
         d_ay[d_idx] += tmp * VIJ[1]
         d_az[d_idx] += tmp * VIJ[2]
 
+    def loop_pair(self, d_idx, s_idx, d_m, s_m, d_ax, d_ay, d_az, s_ax,
+                  s_ay, s_az, WIJ, RHOIJ1, VIJ):
+        tmp = -self.eps * WIJ*RHOIJ1
+
+        d_ax[d_idx] += tmp * s_m[s_idx] * VIJ[0]
+        d_ay[d_idx] += tmp * s_m[s_idx] * VIJ[1]
+        d_az[d_idx] += tmp * s_m[s_idx] * VIJ[2]
+
+        s_ax[s_idx] -= tmp * d_m[d_idx] * VIJ[0]
+        s_ay[s_idx] -= tmp * d_m[d_idx] * VIJ[1]
+        s_az[s_idx] -= tmp * d_m[d_idx] * VIJ[2]
+
     def post_loop(self, d_idx, d_ax, d_ay, d_az, d_u, d_v, d_w):
         d_ax[d_idx] += d_u[d_idx]
         d_ay[d_idx] += d_v[d_idx]
@@ -287,9 +287,56 @@ def precomputed_symbols():
 
     c.GHIJ = BasicCodeBlock(code="GHIJ = GRADH(XIJ, RIJ, HIJ)", GHIJ=0.0)
 
+    # Fused evaluation of the kernel and its derivatives, these are used
+    # instead of the above when a group needs more than one of them for the
+    # same h, see `FUSED_KERNEL_SYMBOLS`.
+    for suffix, h in (('IJ', 'HIJ'), ('I', 'd_h[d_idx]'),
+                      ('J', 's_h[s_idx]')):
+        code = dedent(
+            """
+            W{s} = KERNEL_AND_GRADIENT(XIJ, RIJ, {h}, DW{s}, WDERIV{s})
+            WDASH{s} = WDERIV{s}[0]
+            GH{s} = WDERIV{s}[1]
+            """.format(s=suffix, h=h)
+        )
+        kw = {'W' + suffix: 0.0, 'DW' + suffix: [0.0, 0.0, 0.0],
+              'WDASH' + suffix: 0.0, 'GH' + suffix: 0.0,
+              'WDERIV' + suffix: [0.0, 0.0]}
+        c['WDERIV' + suffix] = BasicCodeBlock(code=code, **kw)
+
     return c
 
 
+# The fused precomputed symbols and the symbols each of them computes.
+FUSED_KERNEL_SYMBOLS = OrderedDict([
+    ('WDERIVIJ', ('WIJ', 'DWIJ', 'WDASHIJ', 'GHIJ')),
+    ('WDERIVI', ('WI', 'DWI', 'WDASHI', 'GHI')),
+    ('WDERIVJ', ('WJ', 'DWJ', 'WDASHJ', 'GHJ')),
+])
+
+
+def fuse_kernel_symbols(precomputed, all_pre_comp):
+    """Replace the precomputed kernel symbols in the given dictionary by the
+    fused symbol when more than one of them is needed for the same h.
+
+    Returns the names of the fused symbols used.
+    """
+    fused = []
+    for name, symbols in FUSED_KERNEL_SYMBOLS.items():
+        found = [x for x in symbols if x in precomputed]
+        if len(found) > 1:
+            for x in found:
+                del precomputed[x]
+            precomputed[name] = all_pre_comp[name]
+            fused.append(name)
+    return fused
+
+
+# The precomputed symbols stored in the pair data cache of the NNPS, see the
+# `cache_pair_data` option of `Group`.
+PAIR_CACHE_SYMBOLS = ('RIJ', 'WIJ', 'DWIJ')
+
+
 def sort_precomputed(precomputed, all_pre_comp):
     """Sorts the precomputed equations in the given dictionary as per the
     dependencies of the symbols and returns an ordered dict.
@@ -300,10 +347,19 @@ def sort_precomputed(precomputed, all_pre_comp):
     """
     weights = dict((x, None) for x in precomputed)
     pre_comp = all_pre_comp
+    # A code block may compute more than one symbol, find the block that
+    # computes each symbol.  Symbols that are not computed by any of the
+    # blocks are assumed to be available already.
+    provider = {}
+    for pre, cb in precomputed.items():
+        for x in cb.context:
+            if x in pre_comp:
+                provider[x] = pre
     # Find the dependent pre-computed symbols for each in the precomputed.
     depends = dict((x, None) for x in precomputed)
     for pre, cb in precomputed.items():
-        depends[pre] = [x for x in cb.symbols if x in pre_comp and x != pre]
+        depends[pre] = set(provider[x] for x in cb.symbols
+                           if x in provider and x not in cb.context)
 
     # The basic algorithm is to assign weights to each of the precomputed
     # symbols based on the maximum weight of the dependencies of the
@@ -351,14 +407,20 @@ def get_predefined_types(precomp):
     return result
 
 
-def get_arrays_used_in_equation(equation):
+def get_arrays_used_in_equation(equation, pairwise=False):
     """Return two sets, the source and destination arrays used by the equation.
+
+    If `pairwise` is True, only the arrays used by the `loop_pair` method are
+    returned.
     """
     src_arrays = set()
     dest_arrays = set()
-    methods = (
-        'initialize', 'initialize_pair', 'loop', 'loop_all', 'post_loop'
-    )
+    if pairwise:
+        methods = ('loop_pair',)
+    else:
+        methods = (
+            'initialize', 'initialize_pair', 'loop', 'loop_all', 'post_loop'
+        )
     for meth_name in methods:
         meth = getattr(equation, meth_name, None)
         if meth is not None:
@@ -369,6 +431,37 @@ def get_arrays_used_in_equation(equation):
     return src_arrays, dest_arrays
 
 
+def get_pair_accumulators(equation):
+    """Return the names of the source properties accumulated (with ``+=`` or
+    ``-=``) in the `loop_pair` method of the given equation.
+
+    Raises a ValueError if the source properties are written to in any other
+    way as these writes cannot be safely combined across threads.
+    """
+    tree = ast.parse(dedent(inspect.getsource(equation.loop_pair)))
+    result = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.AugAssign):
+            targets = [node.target]
+            accumulate = isinstance(node.op, (ast.Add, ast.Sub))
+        elif isinstance(node, ast.Assign):
+            targets = node.targets
+            accumulate = False
+        else:
+            continue
+        for target in targets:
+            if isinstance(target, ast.Subscript) and \
+               isinstance(target.value, ast.Name) and \
+               target.value.id.startswith('s_'):
+                if not accumulate:
+                    raise ValueError(
+                        '%s.loop_pair may only accumulate into %s using '
+                        '"+=" or "-=".' % (equation.name, target.value.id)
+                    )
+                result.add(target.value.id[2:])
+    return result
+
+
 def get_init_args(obj, method, ignore=None):
     """Return the arguments for the method given, typically an __init__.
     """
@@ -447,9 +540,14 @@ class Group(object):
 
     pre_comp = precomputed_symbols()
 
+    # Compute the kernel and its derivatives with a single call when more
+    # than one of them is needed.
+    fuse_kernel_calls = True
+
     def __init__(self, equations, real=True, update_nnps=False, iterate=False,
                  max_iterations=1, min_iterations=0, pre=None, post=None,
-                 condition=None, start_idx=0, stop_idx=None):
+                 condition=None, start_idx=0, stop_idx=None, pairwise=False,
+                 cache_pair_data=False):
         """Constructor.
 
         Parameters
@@ -505,6 +603,31 @@ class Group(object):
             that this works like a range stop parameter so the last value is
             not included.
 
+        pairwise: bool
+            If True, equations that define a `loop_pair` method are evaluated
+            only once for each pair of particles of the same array.  The
+            `loop_pair` method should add the contribution of the pair to
+            both the destination, `d_idx`, and the source, `s_idx`, this
+            roughly halves the number of kernel evaluations.  The
+            interaction of a particle with itself is still done using the
+            `loop` method. This is only used when the source and destination
+            are the same, all equations for that source define `loop_pair`,
+            the Cython backend is in use and the group operates on all the
+            particles, i.e. start_idx and stop_idx are not set.
+
+        cache_pair_data: bool
+            If True, the group declares that its equations do not change
+            the positions (x, y, z) or the smoothing lengths (h) of any
+            particles.  The RIJ, WIJ and DWIJ of the pairs visited by the
+            group are then stored in a per-step cache of the NNPS and
+            later groups with this option read them from the cache instead
+            of evaluating the kernel again, as long as no group without
+            this option is evaluated in between.  This trades memory for
+            computation and is only done when the cache is enabled with the
+            `set_use_pair_cache` method of the NNPS.  This is only used by
+            the Cython backend, for non-pairwise loops and when more than
+            one group visits the same pairs.
+
         Notes
         -----
 
@@ -530,6 +653,12 @@ class Group(object):
         self.condition = condition
         self.start_idx = start_idx
         self.stop_idx = stop_idx
+        self.pairwise = pairwise
+        self.cache_pair_data = cache_pair_data
+        if pairwise and (start_idx != 0 or stop_idx is not None):
+            raise ValueError(
+                'A pairwise group cannot use start_idx or stop_idx.'
+            )
 
         only_groups = [x for x in equations if isinstance(x, Group)]
         if (len(only_groups) > 0) and (len(only_groups) != len(equations)):
@@ -554,6 +683,10 @@ class Group(object):
         ignore = ['equations']
         if self.start_idx != 0:
             ignore.append('start_idx')
+        if not self.pairwise:
+            ignore.append('pairwise')
+        if not self.cache_pair_data:
+            ignore.append('cache_pair_data')
         for prop in ['pre', 'post', 'condition', 'stop_idx']:
             if getattr(self, prop) is None:
                 ignore.append(prop)
@@ -565,25 +698,19 @@ class Group(object):
         )
 
     def _has_code(self, kind='loop'):
-        assert kind in ('initialize', 'initialize_pair', 'loop', 'loop_all',
-                        'post_loop', 'reduce')
+        assert kind in ('initialize', 'initialize_pair', 'loop', 'loop_pair',
+                        'loop_all', 'post_loop', 'reduce')
         for equation in self.equations:
             if hasattr(equation, kind):
                 return True
 
-    def _setup_precomputed(self):
-        """Get the precomputed symbols for this group of equations.
+    def _get_precomputed(self, all_args, provided=()):
+        """Return the sorted precomputed symbols needed for the given
+        arguments, the symbols in `provided` are assumed to be available.
         """
-        # Calculate the precomputed symbols for this equation.
-        all_args = set()
-        for equation in self.equations:
-            if hasattr(equation, 'loop'):
-                args = getfullargspec(equation.loop).args
-                all_args.update(args)
-        all_args.discard('self')
-
         pre = self.pre_comp
-        precomputed = dict((s, pre[s]) for s in all_args if s in pre)
+        precomputed = dict((s, pre[s]) for s in all_args
+                           if s in pre and s not in provided)
 
         # Now find the precomputed symbols in the pre-computed symbols.
         done = False
@@ -594,7 +721,8 @@ class Group(object):
             for sym in found_precomp:
                 code_block = pre[sym]
                 new = set([s for s in code_block.symbols
-                           if s in pre and s not in precomputed])
+                           if s in pre and s not in precomputed and
+                           s not in provided])
                 all_new.update(new)
             if len(all_new) > 0:
                 done = False
@@ -602,12 +730,37 @@ class Group(object):
                     precomputed[s] = pre[s]
             found_precomp = all_new
 
-        self.precomputed = sort_precomputed(precomputed, pre)
+        if self.fuse_kernel_calls:
+            fuse_kernel_symbols(precomputed, pre)
+
+        return sort_precomputed(precomputed, pre)
+
+    def _get_context(self, precomputed):
+        pre = self.pre_comp
+        context = Context()
+        for p, cb in precomputed.items():
+            for name, value in cb.context.items():
+                if name in pre:
+                    context[name] = value
+        return context
+
+    def _setup_precomputed(self):
+        """Get the precomputed symbols for this group of equations.
+        """
+        # Calculate the precomputed symbols for this equation.
+        all_args = set()
+        for equation in self.equations:
+            for kind in ('loop', 'loop_pair'):
+                if hasattr(equation, kind):
+                    args = getfullargspec(getattr(equation, kind)).args
+                    all_args.update(args)
+        all_args.discard('self')
+        self._loop_args = all_args
+
+        self.precomputed = self._get_precomputed(all_args)
 
         # Update the context.
-        context = self.context
-        for p, cb in self.precomputed.items():
-            context[p] = cb.context[p]
+        self.context.update(self._get_context(self.precomputed))
 
     ##########################################################################
     # Public interface.
@@ -638,6 +791,18 @@ class Group(object):
         self.dest_arrays = dest_arrays
         return src_arrays, dest_arrays
 
+    def get_pair_array_names(self):
+        """Returns the source and destination array names used by the
+        `loop_pair` methods of the equations.
+        """
+        src_arrays = set()
+        dest_arrays = set()
+        for equation in self.equations:
+            s, d = get_arrays_used_in_equation(equation, pairwise=True)
+            src_arrays.update(s)
+            dest_arrays.update(d)
+        return src_arrays, dest_arrays
+
     def get_converged_condition(self):
         if self.has_subgroups:
             code = [g.get_converged_condition() for g in self.equations]
@@ -661,7 +826,8 @@ class Group(object):
         filtered_vars = [x for x in all_vars
                          if not x.startswith(('s_', 'd_'))]
         # Filter other things.
-        ignore = ['KERNEL', 'GRADIENT', 's_idx', 'd_idx']
+        ignore = ['KERNEL', 'GRADIENT', 'GRADH', 'DWDQ',
+                  'KERNEL_AND_GRADIENT', 's_idx', 'd_idx']
         # Math functions.
         import math
         ignore += [x for x in dir(math) if not x.startswith('_')
@@ -688,6 +854,48 @@ class Group(object):
     def has_loop_all(self):
         return self._has_code('loop_all')
 
+    def has_loop_pair(self):
+        """Returns True if every equation with a `loop` also has a
+        `loop_pair` method.
+        """
+        return self.has_loop() and all(
+            hasattr(eq, 'loop_pair') for eq in self.equations
+            if hasattr(eq, 'loop')
+        )
+
+    def get_pair_accumulators(self):
+        """Return the sorted names of all the source properties accumulated
+        by the `loop_pair` methods of the equations.
+        """
+        props = set()
+        for equation in self.equations:
+            if hasattr(equation, 'loop_pair'):
+                props.update(get_pair_accumulators(equation))
+        return sorted(props)
+
+    def get_pair_cache_precomputed(self, fill=True):
+        """Return the precomputed symbols used when the pair data cache is
+        filled or, if `fill` is False, when the cached pair data is read.
+
+        When filling the cache, the `PAIR_CACHE_SYMBOLS` are computed along
+        with the symbols needed by the equations, when reading they are
+        not computed.
+        """
+        if fill:
+            return self._get_precomputed(
+                self._loop_args.union(PAIR_CACHE_SYMBOLS)
+            )
+        else:
+            return self._get_precomputed(
+                self._loop_args, provided=PAIR_CACHE_SYMBOLS
+            )
+
+    def get_pair_cache_context(self):
+        """Return the context of the symbols used to fill the pair data
+        cache.
+        """
+        return self._get_context(self.get_pair_cache_precomputed())
+
     def has_post_loop(self):
         return self._has_code('post_loop')
 
@@ -730,18 +938,25 @@ class CythonGroup(Group):
                     pass
         return '\n'.join(decl)
 
-    def _get_code(self, kernel=None, kind='loop'):
-        assert kind in ('initialize', 'initialize_pair', 'loop', 'loop_all',
-                        'post_loop', 'reduce')
+    def _get_precomputed_code(self, kernel=None, precomputed=None):
+        if precomputed is None:
+            precomputed = self.precomputed
+        pre = []
+        for p, cb in precomputed.items():
+            pre.append(cb.code.strip())
+        if len(pre) > 0:
+            pre.extend(['', ''])
+        return self._set_kernel('\n'.join(pre), kernel)
+
+    def _get_code(self, kernel=None, kind='loop', precomputed=True):
+        assert kind in ('initialize', 'initialize_pair', 'loop', 'loop_pair',
+                        'loop_all', 'post_loop', 'reduce')
         # We assume here that precomputed quantities are only relevant
         # for loops and not post_loops and initialization.
-        pre = []
-        if kind == 'loop':
-            for p, cb in self.precomputed.items():
-                pre.append(cb.code.strip())
-            if len(pre) > 0:
-                pre.extend(['', ''])
-        preamble = self._set_kernel('\n'.join(pre), kernel)
+        if kind in ('loop', 'loop_pair') and precomputed:
+            preamble = self._get_precomputed_code(kernel)
+        else:
+            preamble = ''
 
         code = []
         for eq in self.equations:
@@ -769,7 +984,9 @@ class CythonGroup(Group):
             g_func = 'self.kernel.gradient'
             h_func = 'self.kernel.gradient_h'
             deltap = 'self.kernel.get_deltap()'
-            code = code.replace('DELTAP', deltap)
+            code = code.replace('DELTAP', deltap).replace(
+                'KERNEL_AND_GRADIENT', 'self.kernel.kernel_and_gradient'
+            )
             return code.replace('GRADIENT', g_func).replace(
                 'KERNEL', k_func
             ).replace('GRADH', h_func).replace('DWDQ', w_func)
@@ -793,12 +1010,14 @@ class CythonGroup(Group):
     def get_variable_declarations(self, context):
         return self._get_variable_decl(context, mode='declare')
 
-    def get_variable_array_setup(self):
-        names = list(self.context.keys())
+    def get_variable_array_setup(self, context=None):
+        if context is None:
+            context = self.context
+        names = list(context.keys())
         names.sort()
         code = []
         for var in names:
-            value = self.context[var]
+            value = context[var]
             if isinstance(value, (list, tuple)):
                 code.append(
                     '{var} = &_{var}.data[thread_id*aligned({size}, 8)]'
@@ -812,12 +1031,35 @@ class CythonGroup(Group):
     def get_initialize_pair_code(self, kernel=None):
         return self._get_code(kernel, kind='initialize_pair')
 
-    def get_loop_code(self, kernel=None):
-        return self._get_code(kernel, kind='loop')
+    def get_loop_code(self, kernel=None, precomputed=True):
+        return self._get_code(kernel, kind='loop', precomputed=precomputed)
+
+    def get_pair_cache_array_setup(self):
+        return self.get_variable_array_setup(self.get_pair_cache_context())
+
+    def get_pair_cache_precomputed_code(self, kernel=None, fill=True):
+        """Code for the precomputed symbols when filling or reading the pair
+        data cache, see `get_pair_cache_precomputed`.
+        """
+        return self._get_precomputed_code(
+            kernel, self.get_pair_cache_precomputed(fill)
+        )
 
     def get_loop_all_code(self, kernel=None):
         return self._get_code(kernel, kind='loop_all')
 
+    def get_loop_pair_code(self, kernel=None):
+        """Code for a pair with s_idx >= d_idx, the `loop` is used for the
+        particle itself and `loop_pair` for all other pairs.
+        """
+        pre = self._get_precomputed_code(kernel)
+        loop = self._get_code(kernel, kind='loop', precomputed=False)
+        loop_pair = self._get_code(kernel, kind='loop_pair',
+                                   precomputed=False)
+        lines = [pre, 'if s_idx == d_idx:', indent(loop), 'else:',
+                 indent(loop_pair)]
+        return '\n'.join(lines)
+
     def get_post_loop_code(self, kernel=None):
         return self._get_code(kernel, kind='post_loop')
 
@@ -0,0 +1,184 @@
+"""Profiling of the groups and equations of the acceleration evaluators.
+
+When an :py:class:`pysph.sph.acceleration_eval.AccelerationEval` is created
+with ``profile=True`` the generated Cython code records the wall time and the
+number of calls of each group, of each destination and of the ``initialize``,
+source loops, ``post_loop`` and ``reduce`` for each destination along with the
+number of neighbors visited by the source loops.  The timers are only called
+outside the parallel loops and the neighbor counts are accumulated in
+separate counters for each thread so the overhead is small.
+
+The :py:class:`EquationProfiler` collects these counters along with the time
+taken to update the NNPS and the domain and writes a JSON report and a file
+with the "folded" stacks that can be used to draw a flame graph, for example
+with::
+
+    $ flamegraph.pl sim_profile.folded > sim_profile.svg
+
+This is enabled for a simulation with the ``--profile-equations`` command
+line option.
+"""
+
+from contextlib import contextmanager
+import json
+import time
+
+import numpy as np
+
+
+class EquationProfiler(object):
+    """Collect the profiling counters of the acceleration evaluators and
+    the time taken by other parts of the simulation.
+    """
+    def __init__(self):
+        self._evals = []
+        self._timers = {}
+
+    def add_acceleration_eval(self, a_eval, name=None):
+        """Add an acceleration evaluator created with ``profile=True``.
+
+        Parameters
+        ----------
+
+        a_eval: AccelerationEval: the evaluator, it must be compiled.
+        name: str: name of the evaluator in the report, defaults to
+            ``acceleration_eval_<index>``.
+        """
+        if not a_eval.profile:
+            raise ValueError(
+                'The acceleration evaluator is not profiled, create it with '
+                'profile=True.'
+            )
+        if name is None:
+            name = 'acceleration_eval_%d' % len(self._evals)
+        self._evals.append((name, a_eval))
+
+    def get_acceleration_evals(self):
+        """Return a list of the (name, acceleration evaluator) added."""
+        return list(self._evals)
+
+    def get_timer(self, name):
+        """Return the total time and the number of calls of the given
+        timer.
+        """
+        t, calls = self._timers.get(name, (0.0, 0))
+        return t, calls
+
+    @contextmanager
+    def timer(self, name):
+        """Context manager recording the time taken by the body under the
+        given name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            data = self._timers.setdefault(name, [0.0, 0])
+            data[0] += time.perf_counter() - start
+            data[1] += 1
+
+    def reset(self):
+        """Reset all the counters."""
+        self._timers = {}
+        for name, a_eval in self._evals:
+            c_eval = a_eval.c_acceleration_eval
+            for attr in ('_prof_time', '_prof_calls', '_prof_dest',
+                         '_prof_nbrs', '_prof_max_nbrs'):
+                getattr(c_eval, attr).get_npy_array()[:] = 0
+
+    def get_regions(self):
+        """Return a list of dicts, one for each profiled region.
+
+        Each has the ``name`` of the region (the names of the enclosing
+        regions joined by ``;``), its ``kind``, the total ``time`` and the
+        ``self_time`` excluding the enclosed regions in seconds, the number
+        of ``calls`` and the names of the ``equations`` evaluated.  The
+        source loops also have the number of destination particles visited,
+        ``n_dest``, and the total, mean and maximum number of neighbors,
+        ``n_nbrs``, ``mean_nbrs`` and ``max_nbrs``.
+        """
+        regions = []
+        for name, a_eval in self._evals:
+            c_eval = a_eval.c_acceleration_eval
+            times = c_eval._prof_time.get_npy_array()
+            calls = c_eval._prof_calls.get_npy_array()
+            n_dest = c_eval._prof_dest.get_npy_array()
+            stride = c_eval._prof_stride
+            nbrs = c_eval._prof_nbrs.get_npy_array().reshape(-1, stride)
+            max_nbrs = c_eval._prof_max_nbrs.get_npy_array().reshape(
+                -1, stride
+            )
+            for idx, info in enumerate(a_eval.profile_regions):
+                region = dict(
+                    name=';'.join([name] + info['path']),
+                    kind=info['kind'], time=float(times[idx]),
+                    calls=int(calls[idx]), equations=info['equations']
+                )
+                if info['kind'] == 'source':
+                    total = int(nbrs[:, idx].sum())
+                    region.update(
+                        n_dest=int(n_dest[idx]), n_nbrs=total,
+                        mean_nbrs=total/max(int(n_dest[idx]), 1),
+                        max_nbrs=int(max_nbrs[:, idx].max())
+                    )
+                regions.append(region)
+        for name in sorted(self._timers):
+            t, calls = self._timers[name]
+            regions.append(dict(name=name, kind='timer', time=t, calls=calls,
+                                equations=[]))
+
+        # Subtract the time of the enclosed regions.
+        self_time = dict((r['name'], r['time']) for r in regions)
+        for r in regions:
+            parent = r['name'].rpartition(';')[0]
+            if parent in self_time:
+                self_time[parent] -= r['time']
+        for r in regions:
+            r['self_time'] = max(self_time[r['name']], 0.0)
+        return regions
+
+    def get_report(self):
+        """Return the report as a dictionary that can be saved as JSON."""
+        regions = self.get_regions()
+        total = sum(r['time'] for r in regions if ';' not in r['name'])
+        return dict(total_time=total, regions=regions)
+
+    def get_summary(self, n=10):
+        """Return a string with the `n` regions with the largest self time.
+        """
+        report = self.get_report()
+        total = max(report['total_time'], 1e-300)
+        regions = sorted(report['regions'], key=lambda r: -r['self_time'])
+        lines = ['Equation profile, total time %.3f secs' % total]
+        for r in regions[:n]:
+            line = '%6.2f%% %10.4f s %8d calls  %s' % (
+                100*r['self_time']/total, r['self_time'], r['calls'],
+                r['name']
+            )
+            if 'n_nbrs' in r:
+                line += ' (%.1f nbrs/particle, max %d)' % (
+                    r['mean_nbrs'], r['max_nbrs']
+                )
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def write_json(self, fname):
+        with open(fname, 'w') as f:
+            json.dump(self.get_report(), f, indent=2)
+
+    def write_folded(self, fname):
+        """Write the self time of each region in microseconds in the folded
+        stack format used by flame graph tools.
+        """
+        with open(fname, 'w') as f:
+            for r in self.get_regions():
+                us = int(np.round(r['self_time']*1e6))
+                if us > 0:
+                    f.write('%s %d\n' % (r['name'], us))
+
+    def write(self, fname):
+        """Write the JSON report to `fname.json` and the folded stacks to
+        `fname.folded`.
+        """
+        self.write_json(fname + '.json')
+        self.write_folded(fname + '.folded')
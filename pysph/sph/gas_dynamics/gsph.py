@@ -1,8 +1,9 @@
-from math import exp
+from math import exp, sqrt
 from compyle.api import declare
 from pysph.sph.equation import Equation
-from pysph.sph.gas_dynamics.riemann_solver import (HELPERS, riemann_solve,
-                                                   printf)
+from pysph.sph.gas_dynamics.riemann_solver import (
+    HELPERS, printf, riemann_solve, riemann_solve_batch
+)
 from pysph.base.particle_array import get_ghost_tag
 
 # Constants
@@ -145,8 +146,9 @@ class GSPHUpdateGhostProps(Equation):
             d_cs[d_idx] = d_cs[idx]
 
 
-class GSPHAcceleration(Equation):
-    """Class to implement the GSPH acclerations.
+class GSPHAccelerationBase(Equation):
+    """Base class of the GSPH accelerations with the reconstruction of the
+    states of the Riemann problem of a pair of particles.
 
     We implement Inutsuka's original GSPH algorithm I02 defined in
     'Reformulation of Smoothed Particle Hydrodynamics with Riemann
@@ -211,7 +213,7 @@ class GSPHAcceleration(Equation):
         self.blend_alpha = blend_alpha
         self.tf = tf
 
-        super(GSPHAcceleration, self).__init__(dest, sources)
+        super(GSPHAccelerationBase, self).__init__(dest, sources)
 
     def _get_helpers_(self):
         return HELPERS + [monotonicity_min, sgn]
@@ -222,35 +224,27 @@ class GSPHAcceleration(Equation):
         d_aw[d_idx] = 0.0
         d_ae[d_idx] = 0.0
 
-    def loop(self, d_idx, d_m, d_h, d_rho, d_cs, d_div, d_p, d_e, d_grhox,
-             d_grhoy, d_grhoz, d_u, d_v, d_w, d_px, d_py, d_pz, d_ux, d_uy,
-             d_uz, d_vx, d_vy, d_vz, d_wx, d_wy, d_wz, d_au, d_av, d_aw, d_ae,
-             s_idx, s_rho, s_m, s_h, s_cs, s_div, s_p, s_e, s_grhox,
-             s_grhoy, s_grhoz, s_u, s_v, s_w, s_px, s_py, s_pz,
-             s_ux, s_uy, s_uz, s_vx, s_vy, s_vz, s_wx, s_wy, s_wz,
-             XIJ, DWIJ, DWI, DWJ, RIJ, RHOIJ, EPS, dt, t):
-        blending_factor = exp(-self.blend_alpha*t/self.tf)
-        g1 = self.g1
-        g2 = self.g2
+    def riemann_states(self, d_idx, d_h, d_rho, d_cs, d_p, d_grhox, d_grhoy,
+                       d_grhoz, d_u, d_v, d_w, d_px, d_py, d_pz, d_ux, d_uy,
+                       d_uz, d_vx, d_vy, d_vz, d_wx, d_wy, d_wz, s_idx, s_h,
+                       s_rho, s_cs, s_p, s_grhox, s_grhoy, s_grhoz, s_u, s_v,
+                       s_w, s_px, s_py, s_pz, s_ux, s_uy, s_uz, s_vx, s_vy,
+                       s_vz, s_wx, s_wy, s_wz, eij=[0.0, 0.0, 0.0], RIJ=0.0,
+                       sij=0.0, dt=0.0,
+                       result=[0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0,
+                               0.0]):
+        """Reconstruct the left (j) and right (i) states of the Riemann
+        problem along `eij` for the pair and set `result` to (rhol, rhor,
+        pl, pr, ul, ur, vl, vr, vij_i, vij_j) where vl, vr are the
+        velocities along `eij` and vij_i, vij_j the specific volume
+        integrals.
+        """
         hi = d_h[d_idx]
         hj = s_h[s_idx]
-        eij = declare('matrix(3)')
-        if RIJ < 1e-14:
-            eij[0] = 0.0
-            eij[1] = 0.0
-            eij[2] = 0.0
-            sij = 1.0/(RIJ + EPS)
-        else:
-            eij[0] = XIJ[0]/RIJ
-            eij[1] = XIJ[1]/RIJ
-            eij[2] = XIJ[2]/RIJ
-            sij = 1.0/RIJ
 
         vl = s_u[s_idx]*eij[0] + s_v[s_idx]*eij[1] + s_w[s_idx]*eij[2]
         vr = d_u[d_idx]*eij[0] + d_v[d_idx]*eij[1] + d_w[d_idx]*eij[2]
 
-        Hi = g1*hi*d_cs[d_idx] + g2*hi*hi*(abs(d_div[d_idx]) - d_div[d_idx])
-
         grhoi_dot_eij = (d_grhox[d_idx]*eij[0] + d_grhoy[d_idx]*eij[1]
                          + d_grhoz[d_idx]*eij[2])
         grhoj_dot_eij = (s_grhox[s_idx]*eij[0] + s_grhoy[s_idx]*eij[1]
@@ -375,56 +369,16 @@ class GSPHAcceleration(Equation):
         ul = vl + 0.5 * vsj * RIJ * (1.0 - csj*dt*sij + sstar)
         ur = vr - 0.5 * vsi * RIJ * (1.0 - csi*dt*sij + sstar)
 
-        # Intermediate state from the Riemann solver
-        result = declare('matrix(2)')
-        riemann_solve(
-            self.rsolver, rhol, rhor, pl, pr, ul, ur,
-            self.gamma, self.niter, self.tol, result
-        )
-        pstar = result[0]
-        ustar = result[1]
-
-        # blend of two intermediate states
-        if self.hybrid:
-            riemann_solve(
-                10, rhoj, rhoi, pl, pr, vl, vr, self.gamma,
-                self.niter, self.tol, result
-            )
-            pstar2 = result[0]
-            ustar2 = result[1]
-            ustar = ustar + blending_factor * (ustar2 - ustar)
-            pstar = pstar + blending_factor * (pstar2 - pstar)
-
-        # three dimensional velocity (70)
-        vstar = declare('matrix(3)')
-        vstar[0] = ustar*eij[0]
-        vstar[1] = ustar*eij[1]
-        vstar[2] = ustar*eij[2]
-
-        # velocity accelerations
-        mj = s_m[s_idx]
-        d_au[d_idx] += -mj * pstar * (vij_i * DWI[0] + vij_j * DWJ[0])
-        d_av[d_idx] += -mj * pstar * (vij_i * DWI[1] + vij_j * DWJ[1])
-        d_aw[d_idx] += -mj * pstar * (vij_i * DWI[2] + vij_j * DWJ[2])
-
-        # contribution to the thermal energy term
-        # (85). The contribution due to \dot{x}^*_i will
-        # be added in the integrator.
-        vstardotdwi = vstar[0]*DWI[0] + vstar[1]*DWI[1] + vstar[2]*DWI[2]
-        vstardotdwj = vstar[0]*DWJ[0] + vstar[1]*DWJ[1] + vstar[2]*DWJ[2]
-        d_ae[d_idx] += -mj * pstar * (vij_i * vstardotdwi +
-                                      vij_j * vstardotdwj)
-
-        # artificial thermal conduction terms
-        if self.thermal_conduction:
-            divj = s_div[s_idx]
-            Hj = g1 * hj * csj + g2 * hj*hj * (abs(divj) - divj)
-            Hij = (Hi + Hj) * (d_e[d_idx] - s_e[s_idx])
-
-            Hij /= (RHOIJ * (RIJ*RIJ + EPS))
-
-            d_ae[d_idx] += mj*Hij*(XIJ[0]*DWIJ[0] + XIJ[1]*DWIJ[1] +
-                                   XIJ[2]*DWIJ[2])
+        result[0] = rhol
+        result[1] = rhor
+        result[2] = pl
+        result[3] = pr
+        result[4] = ul
+        result[5] = ur
+        result[6] = vl
+        result[7] = vr
+        result[8] = vij_i
+        result[9] = vij_j
 
     def interpolate(self, hi=0.0, hj=0.0, rhoi=0.0, rhoj=0.0,
                     sij=0.0, gri_eij=0.0, grj_eij=0.0,
@@ -539,3 +493,228 @@ class GSPHAcceleration(Equation):
         result[0] = vij_i2
         result[1] = vij_j2
         result[2] = sstar
+
+
+class GSPHAcceleration(GSPHAccelerationBase):
+    """Class to implement the GSPH acclerations, a Riemann problem is solved
+    for each pair of particles.  See :py:class:`GSPHAccelerationBase` for
+    the parameters.
+    """
+    def loop(self, d_idx, d_m, d_h, d_rho, d_cs, d_div, d_p, d_e, d_grhox,
+             d_grhoy, d_grhoz, d_u, d_v, d_w, d_px, d_py, d_pz, d_ux, d_uy,
+             d_uz, d_vx, d_vy, d_vz, d_wx, d_wy, d_wz, d_au, d_av, d_aw, d_ae,
+             s_idx, s_rho, s_m, s_h, s_cs, s_div, s_p, s_e, s_grhox,
+             s_grhoy, s_grhoz, s_u, s_v, s_w, s_px, s_py, s_pz,
+             s_ux, s_uy, s_uz, s_vx, s_vy, s_vz, s_wx, s_wy, s_wz,
+             XIJ, DWIJ, DWI, DWJ, RIJ, RHOIJ, EPS, dt, t):
+        blending_factor = exp(-self.blend_alpha*t/self.tf)
+        g1 = self.g1
+        g2 = self.g2
+        hi = d_h[d_idx]
+        hj = s_h[s_idx]
+        eij = declare('matrix(3)')
+        if RIJ < 1e-14:
+            eij[0] = 0.0
+            eij[1] = 0.0
+            eij[2] = 0.0
+            sij = 1.0/(RIJ + EPS)
+        else:
+            eij[0] = XIJ[0]/RIJ
+            eij[1] = XIJ[1]/RIJ
+            eij[2] = XIJ[2]/RIJ
+            sij = 1.0/RIJ
+
+        Hi = g1*hi*d_cs[d_idx] + g2*hi*hi*(abs(d_div[d_idx]) - d_div[d_idx])
+
+        states = declare('matrix(10)')
+        self.riemann_states(
+            d_idx, d_h, d_rho, d_cs, d_p, d_grhox, d_grhoy, d_grhoz, d_u,
+            d_v, d_w, d_px, d_py, d_pz, d_ux, d_uy, d_uz, d_vx, d_vy, d_vz,
+            d_wx, d_wy, d_wz, s_idx, s_h, s_rho, s_cs, s_p, s_grhox, s_grhoy,
+            s_grhoz, s_u, s_v, s_w, s_px, s_py, s_pz, s_ux, s_uy, s_uz, s_vx,
+            s_vy, s_vz, s_wx, s_wy, s_wz, eij, RIJ, sij, dt, states
+        )
+        pl = states[2]
+        pr = states[3]
+        vl = states[6]
+        vr = states[7]
+        vij_i = states[8]
+        vij_j = states[9]
+
+        # Intermediate state from the Riemann solver
+        result = declare('matrix(2)')
+        riemann_solve(
+            self.rsolver, states[0], states[1], pl, pr, states[4], states[5],
+            self.gamma, self.niter, self.tol, result
+        )
+        pstar = result[0]
+        ustar = result[1]
+
+        # blend of two intermediate states
+        if self.hybrid:
+            riemann_solve(
+                10, s_rho[s_idx], d_rho[d_idx], pl, pr, vl, vr, self.gamma,
+                self.niter, self.tol, result
+            )
+            pstar2 = result[0]
+            ustar2 = result[1]
+            ustar = ustar + blending_factor * (ustar2 - ustar)
+            pstar = pstar + blending_factor * (pstar2 - pstar)
+
+        # three dimensional velocity (70)
+        vstar = declare('matrix(3)')
+        vstar[0] = ustar*eij[0]
+        vstar[1] = ustar*eij[1]
+        vstar[2] = ustar*eij[2]
+
+        # velocity accelerations
+        mj = s_m[s_idx]
+        d_au[d_idx] += -mj * pstar * (vij_i * DWI[0] + vij_j * DWJ[0])
+        d_av[d_idx] += -mj * pstar * (vij_i * DWI[1] + vij_j * DWJ[1])
+        d_aw[d_idx] += -mj * pstar * (vij_i * DWI[2] + vij_j * DWJ[2])
+
+        # contribution to the thermal energy term
+        # (85). The contribution due to \dot{x}^*_i will
+        # be added in the integrator.
+        vstardotdwi = vstar[0]*DWI[0] + vstar[1]*DWI[1] + vstar[2]*DWI[2]
+        vstardotdwj = vstar[0]*DWJ[0] + vstar[1]*DWJ[1] + vstar[2]*DWJ[2]
+        d_ae[d_idx] += -mj * pstar * (vij_i * vstardotdwi +
+                                      vij_j * vstardotdwj)
+
+        # artificial thermal conduction terms
+        if self.thermal_conduction:
+            divj = s_div[s_idx]
+            Hj = g1 * hj * s_cs[s_idx] + g2 * hj*hj * (abs(divj) - divj)
+            Hij = (Hi + Hj) * (d_e[d_idx] - s_e[s_idx])
+
+            Hij /= (RHOIJ * (RIJ*RIJ + EPS))
+
+            d_ae[d_idx] += mj*Hij*(XIJ[0]*DWIJ[0] + XIJ[1]*DWIJ[1] +
+                                   XIJ[2]*DWIJ[2])
+
+
+class GSPHAccelerationBatch(GSPHAccelerationBase):
+    """The GSPH accelerations of :py:class:`GSPHAcceleration` with the
+    Riemann problems solved in batches.
+
+    The neighbors of each particle are processed in tiles of
+    ``BATCH_SIZE`` pairs.  The states of the Riemann problems of a tile
+    are reconstructed and stored in arrays, the problems are solved together
+    with :py:func:`riemann_solver.riemann_solve_batch` and the results are
+    then added to the accelerations.  The results are the same as those of
+    :py:class:`GSPHAcceleration` but with the exact solver the problems in
+    smooth flow are solved in a single pass over the tile, see
+    :py:func:`riemann_solver.exact_batch`.  See
+    :py:class:`GSPHAccelerationBase` for the parameters.
+    """
+    def loop_all(self, d_idx, d_x, d_y, d_z, d_h, d_rho, d_cs, d_div, d_p,
+                 d_e, d_grhox, d_grhoy, d_grhoz, d_u, d_v, d_w, d_px, d_py,
+                 d_pz, d_ux, d_uy, d_uz, d_vx, d_vy, d_vz, d_wx, d_wy, d_wz,
+                 d_au, d_av, d_aw, d_ae, s_x, s_y, s_z, s_rho, s_m, s_h,
+                 s_cs, s_div, s_p, s_e, s_grhox, s_grhoy, s_grhoz, s_u, s_v,
+                 s_w, s_px, s_py, s_pz, s_ux, s_uy, s_uz, s_vx, s_vy, s_vz,
+                 s_wx, s_wy, s_wz, SPH_KERNEL, NBRS, N_NBRS, dt, t):
+        i, k, n, s_idx = declare('int', 4)
+        xij, dwi, dwj, dwij, eij = declare('matrix(3)', 5)
+        states = declare('matrix(10)')
+        # The tiles have riemann_solver.BATCH_SIZE pairs.
+        rhol, rhor, pl, pr, ul, ur = declare('matrix(64)', 6)
+        pstar, ustar, pstar2, ustar2 = declare('matrix(64)', 4)
+        rhoj, rhoi, vl, vr = declare('matrix(64)', 4)
+        ax, ay, az, ae = declare('matrix(64)', 4)
+
+        blending_factor = exp(-self.blend_alpha*t/self.tf)
+        g1 = self.g1
+        g2 = self.g2
+        hi = d_h[d_idx]
+        Hi = g1*hi*d_cs[d_idx] + g2*hi*hi*(abs(d_div[d_idx]) - d_div[d_idx])
+
+        i = 0
+        while i < N_NBRS:
+            n = min(N_NBRS - i, 64)
+            # Reconstruct the states of the Riemann problems of the tile.
+            for k in range(n):
+                s_idx = NBRS[i + k]
+                hj = s_h[s_idx]
+                xij[0] = d_x[d_idx] - s_x[s_idx]
+                xij[1] = d_y[d_idx] - s_y[s_idx]
+                xij[2] = d_z[d_idx] - s_z[s_idx]
+                rij = sqrt(xij[0]*xij[0] + xij[1]*xij[1] + xij[2]*xij[2])
+                hij = 0.5*(hi + hj)
+                eps = 0.01*hij*hij
+                SPH_KERNEL.gradient(xij, rij, hi, dwi)
+                SPH_KERNEL.gradient(xij, rij, hj, dwj)
+                if rij < 1e-14:
+                    eij[0] = 0.0
+                    eij[1] = 0.0
+                    eij[2] = 0.0
+                    sij = 1.0/(rij + eps)
+                else:
+                    eij[0] = xij[0]/rij
+                    eij[1] = xij[1]/rij
+                    eij[2] = xij[2]/rij
+                    sij = 1.0/rij
+
+                self.riemann_states(
+                    d_idx, d_h, d_rho, d_cs, d_p, d_grhox, d_grhoy, d_grhoz,
+                    d_u, d_v, d_w, d_px, d_py, d_pz, d_ux, d_uy, d_uz, d_vx,
+                    d_vy, d_vz, d_wx, d_wy, d_wz, s_idx, s_h, s_rho, s_cs,
+                    s_p, s_grhox, s_grhoy, s_grhoz, s_u, s_v, s_w, s_px,
+                    s_py, s_pz, s_ux, s_uy, s_uz, s_vx, s_vy, s_vz, s_wx,
+                    s_wy, s_wz, eij, rij, sij, dt, states
+                )
+                rhol[k] = states[0]
+                rhor[k] = states[1]
+                pl[k] = states[2]
+                pr[k] = states[3]
+                ul[k] = states[4]
+                ur[k] = states[5]
+                rhoj[k] = s_rho[s_idx]
+                rhoi[k] = d_rho[d_idx]
+                vl[k] = states[6]
+                vr[k] = states[7]
+
+                # The acceleration is -pstar*(ax, ay, az) and the thermal
+                # energy term -pstar*ustar*ae.
+                mj = s_m[s_idx]
+                ax[k] = mj*(states[8]*dwi[0] + states[9]*dwj[0])
+                ay[k] = mj*(states[8]*dwi[1] + states[9]*dwj[1])
+                az[k] = mj*(states[8]*dwi[2] + states[9]*dwj[2])
+                ae[k] = eij[0]*ax[k] + eij[1]*ay[k] + eij[2]*az[k]
+
+                # artificial thermal conduction terms
+                if self.thermal_conduction:
+                    SPH_KERNEL.gradient(xij, rij, hij, dwij)
+                    divj = s_div[s_idx]
+                    Hj = g1 * hj * s_cs[s_idx] + g2 * hj*hj * (abs(divj) -
+                                                               divj)
+                    Hij = (Hi + Hj) * (d_e[d_idx] - s_e[s_idx])
+
+                    Hij /= (0.5*(d_rho[d_idx] + s_rho[s_idx]) *
+                            (rij*rij + eps))
+
+                    d_ae[d_idx] += mj*Hij*(xij[0]*dwij[0] + xij[1]*dwij[1] +
+                                           xij[2]*dwij[2])
+
+            riemann_solve_batch(
+                self.rsolver, n, rhol, rhor, pl, pr, ul, ur, self.gamma,
+                self.niter, self.tol, pstar, ustar
+            )
+            # blend of two intermediate states
+            if self.hybrid:
+                riemann_solve_batch(
+                    10, n, rhoj, rhoi, pl, pr, vl, vr, self.gamma,
+                    self.niter, self.tol, pstar2, ustar2
+                )
+                for k in range(n):
+                    ustar[k] = ustar[k] + blending_factor*(ustar2[k] -
+                                                           ustar[k])
+                    pstar[k] = pstar[k] + blending_factor*(pstar2[k] -
+                                                           pstar[k])
+
+            for k in range(n):
+                d_au[d_idx] += -pstar[k]*ax[k]
+                d_av[d_idx] += -pstar[k]*ay[k]
+                d_aw[d_idx] += -pstar[k]*az[k]
+                d_ae[d_idx] += -pstar[k]*ustar[k]*ae[k]
+            i += 64
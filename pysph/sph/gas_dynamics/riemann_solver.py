@@ -5,6 +5,13 @@ from math import sqrt
 from compyle.api import declare
 
 
+# The largest batch passed to riemann_solve_batch.  The code generators need
+# the sizes of declared arrays to be literals, so the batch arrays in
+# `exact_batch` and `GSPHAccelerationBatch.loop_all` are declared as
+# ``matrix(64)`` and must be changed along with this.
+BATCH_SIZE = 64
+
+
 def printf(s):
     print(s)
 
@@ -972,9 +979,120 @@ def hllsy(rhol=0.0, rhor=1.0, pl=0.0, pr=1.0, ul=0.0, ur=1.0,
     return 0
 
 
+def exact_batch(n=0, rhol=[0.0], rhor=[0.0], pl=[0.0], pr=[0.0], ul=[0.0],
+                ur=[0.0], gamma=1.4, niter=20, tol=1e-6, pstar=[0.0],
+                ustar=[0.0]):
+    """Exact Riemann solver for a batch of problems.
+
+    The primitive variable (PVRS) solution, the initial guess of `exact` in
+    smooth flow, is computed for the whole batch and improved with one
+    Newton step.  As the Newton iterations converge quadratically the error
+    after this step is of the order of the square of the relative change,
+    the step is accepted when this is less than `tol` which is the case for
+    the small jumps of smooth flow.  Only the remaining problems, usually
+    those with strong shocks or rarefactions, are gathered and solved with
+    `exact`.  The velocity is computed with the pressure functions
+    linearized about the guess so that it is also second order accurate.
+    Problems where `exact` fails keep the PVRS solution.
+
+    The results agree with those of `exact` to within `tol` but are not
+    identical as `exact` stops when the change is less than `tol`.
+
+    Parameters
+    ----------
+    n: int: number of problems, at most BATCH_SIZE.
+    rhol, rhor, pl, pr, ul, ur: array: left and right states.
+    gamma: double: Ratio of specific heats.
+    niter: int: Max number of iterations of the exact solver.
+    tol: double: Error tolerance for convergence.
+    pstar, ustar: array: the computed intermediate states.
+
+    Returns
+    -------
+
+    Returns the number of problems solved with `exact`.
+
+    """
+    i, k, m, fast = declare('int', 4)
+    tmp1, tmp2, tmp3, g1, g2, g4, g5, g6 = declare('double', 8)
+    cl, cr, cup, ppv, p, change = declare('double', 6)
+    # The batch has at most BATCH_SIZE problems.
+    idx = declare('matrix(64, "int")')
+    fl, fr, result = declare('matrix(2)', 3)
+
+    # derived variables, computed as in exact
+    tmp1 = 1.0/(2*gamma)
+    tmp2 = 1.0/(gamma - 1.0)
+    tmp3 = 1.0/(gamma + 1.0)
+    g1 = (gamma - 1.0) * tmp1
+    g2 = (gamma + 1.0) * tmp1
+    g4 = 2 * tmp2
+    g5 = 2 * tmp3
+    g6 = tmp3/tmp2
+
+    m = 0
+    for k in range(n):
+        cl = sqrt(gamma*pl[k]/rhol[k])
+        cr = sqrt(gamma*pr[k]/rhor[k])
+        cup = 0.25*(rhol[k] + rhor[k])*(cl + cr)
+        ppv = max(0.0, 0.5*(pl[k] + pr[k]) + 0.5*(ul[k] - ur[k])*cup)
+        pstar[k] = ppv
+        ustar[k] = 0.5*(ul[k] + ur[k]) + 0.5*(pl[k] - pr[k])/cup
+
+        fast = (ppv > 0.0) and (g4*(cl + cr) > (ur[k] - ul[k]))
+        if fast:
+            # One Newton step from the PVRS solution.
+            prefun_exact(ppv, rhol[k], pl[k], cl, g1, g2, g4, g5, g6, fl)
+            prefun_exact(ppv, rhor[k], pr[k], cr, g1, g2, g4, g5, g6, fr)
+            p = ppv - (fl[0] + fr[0] + (ur[k] - ul[k]))/(fl[1] + fr[1])
+            change = 2.0*abs((p - ppv)/(p + ppv))
+            fast = change*change <= tol
+            pstar[k] = p
+            ustar[k] = 0.5*(ul[k] + ur[k] + fr[0] - fl[0] +
+                            (fr[1] - fl[1])*(p - ppv))
+        # Keep the indices of the problems needing the exact solver.
+        idx[m] = k
+        m += 1 - fast
+
+    for k in range(m):
+        i = idx[k]
+        cup = 0.25*(rhol[i] + rhor[i])*(sqrt(gamma*pl[i]/rhol[i]) +
+                                         sqrt(gamma*pr[i]/rhor[i]))
+        result[0] = max(0.0, 0.5*(pl[i] + pr[i]) + 0.5*(ul[i] - ur[i])*cup)
+        result[1] = 0.5*(ul[i] + ur[i]) + 0.5*(pl[i] - pr[i])/cup
+        exact(rhol[i], rhor[i], pl[i], pr[i], ul[i], ur[i], gamma, niter,
+              tol, result)
+        pstar[i] = result[0]
+        ustar[i] = result[1]
+    return m
+
+
+def riemann_solve_batch(method=2, n=0, rhol=[0.0], rhor=[0.0], pl=[0.0],
+                        pr=[0.0], ul=[0.0], ur=[0.0], gamma=1.4, niter=20,
+                        tol=1e-6, pstar=[0.0], ustar=[0.0]):
+    """Solve a batch of at most BATCH_SIZE Riemann problems stored as
+    arrays with the given method and write the intermediate states to
+    `pstar` and `ustar`.  See `exact_batch` for the exact solver, the other
+    solvers are called for each problem and give the same results as
+    `riemann_solve`.
+
+    Returns the number of problems solved with the exact solver.
+    """
+    k = declare('int')
+    result = declare('matrix(2)')
+    if method == 2:
+        return exact_batch(n, rhol, rhor, pl, pr, ul, ur, gamma, niter, tol,
+                           pstar, ustar)
+    for k in range(n):
+        riemann_solve(method, rhol[k], rhor[k], pl[k], pr[k], ul[k], ur[k],
+                      gamma, niter, tol, result)
+        pstar[k] = result[0]
+        ustar[k] = result[1]
+    return 0
+
 HELPERS = [
     SIGN, riemann_solve, non_diffusive,
     ducowicz, exact, hll_ball, hllc,
     hllc_ball, hlle, hllsy, llxf, roe,
-    van_leer, prefun_exact
+    van_leer, prefun_exact, exact_batch, riemann_solve_batch
 ]
@@ -10,6 +10,8 @@ from numpy import sqrt
 import numpy as np
 
 # Local imports.
+from pysph.base.nnps_base import (get_number_of_threads,
+                                  set_number_of_threads)
 from .integrator_step import IntegratorStep
 
 
@@ -45,6 +47,9 @@ class Integrator(object):
         self.c_integrator = None
         self._has_dt_adapt = None
         self.fixed_h = False
+        self.profiler = None
+        self.nnps_threads = None
+        self.first_touch = None
 
     def __repr__(self):
         name = self.__class__.__name__
@@ -243,6 +248,26 @@ class Integrator(object):
         self.parallel_manager = pm
         self.c_integrator.set_parallel_manager(pm)
 
+    def set_profiler(self, profiler):
+        """Set an `EquationProfiler` to record the time taken to update the
+        NNPS and the domain.
+        """
+        self.profiler = profiler
+
+    def set_nnps_threads(self, n):
+        """Set the number of OpenMP threads used to update the NNPS, all the
+        threads are used if this is None.  This is only honored when a
+        profiler is set.
+        """
+        self.nnps_threads = n
+
+    def set_first_touch(self, first_touch):
+        """Set a `pysph.base.numa.FirstTouch` to place the particle
+        properties that are reallocated when the NNPS is updated on the NUMA
+        node of the threads using them.
+        """
+        self.first_touch = first_touch
+
     def set_post_stage_callback(self, callback):
         """This callback is called when the particles are moved, i.e
         one stage of the integration is done.
@@ -267,9 +292,14 @@ class Integrator(object):
     def compute_accelerations(self, index=0, update_nnps=True):
         if update_nnps:
             # update NNPS since particles have moved
-            if self.parallel_manager:
-                self.parallel_manager.update()
-            self.nnps.update()
+            if self.profiler is not None:
+                self._profiled_nnps_update()
+            else:
+                if self.parallel_manager:
+                    self.parallel_manager.update()
+                self.nnps.update()
+            if self.first_touch is not None:
+                self.first_touch.update()
 
         # Evaluate
         c_integrator = self.c_integrator
@@ -299,7 +329,28 @@ class Integrator(object):
         The integrator should explicitly call this when needed in the
         `one_timestep` method.
         """
-        self.nnps.update_domain()
+        if self.profiler is not None:
+            with self.profiler.timer('update_domain'):
+                self.nnps.update_domain()
+        else:
+            self.nnps.update_domain()
+
+    def _profiled_nnps_update(self):
+        profiler = self.profiler
+        if self.parallel_manager:
+            with profiler.timer('parallel_update'):
+                self.parallel_manager.update()
+        if self.nnps_threads is None:
+            with profiler.timer('nnps_update'):
+                self.nnps.update()
+            return
+        n_threads = get_number_of_threads()
+        set_number_of_threads(self.nnps_threads)
+        try:
+            with profiler.timer('nnps_update'):
+                self.nnps.update()
+        finally:
+            set_number_of_threads(n_threads)
 
 
 ###############################################################################
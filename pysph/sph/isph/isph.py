@@ -12,6 +12,7 @@ from pysph.base.utils import get_particle_array
 from pysph.sph.integrator import Integrator
 from pysph.sph.integrator_step import IntegratorStep
 from pysph.sph.equation import Equation, Group, MultiStageEquations
+from pysph.sph.isph.ppe_solver import METHODS, PRECONDITIONERS, PPESolver
 
 
 def get_particle_array_isph(constants=None, **props):
@@ -33,9 +34,8 @@ def get_particle_array_isph(constants=None, **props):
         additional_props=isph_props, constants=consts, **props
     )
     pa.add_property('ctr', type='int')
-    pa.add_property('coeff', stride=100)
-    pa.add_property('col_idx', stride=100, type='int')
-    pa.add_property('row_idx', stride=100, type='int')
+    # Offset of the row of each particle in the CSR coefficients.
+    pa.add_property('ppe_start', type='int')
     pa.add_output_arrays(['p'])
     return pa
 
@@ -154,20 +154,64 @@ class DensityInvarianceDFDI(Equation):
         d_rhs[d_idx] = 2*(V0 - d_V[d_idx]) / (dt*dt*V0)
 
 
+class PressureCoeffRowLength(Equation):
+    """Count the entries of each row of the pressure coefficient matrix and
+    set the offsets of the rows so that `PressureCoeffMatrix` can write the
+    matrix in the CSR format to the arrays of the `PPESolver`.
+    """
+    def __init__(self, dest, sources, solver):
+        """
+        Parameters
+        ----------
+
+        solver: PPESolver: the solver whose arrays the matrix is written to.
+        """
+        self.solver = solver
+        super(PressureCoeffRowLength, self).__init__(dest, sources)
+
+    def _get_work_arrays_(self):
+        return self.solver.get_work_arrays()
+
+    def initialize(self, d_idx, d_ctr):
+        # One entry for the diagonal.
+        d_ctr[d_idx] = 1
+
+    def loop(self, d_idx, d_ctr):
+        d_ctr[d_idx] += 1
+
+    def reduce(self, dst, t, dt):
+        ctr = declare('object')
+        n = declare('long')
+        n = dst.np[0]
+        ctr = dst.ctr[:n]
+        dst.ppe_start[:n] = numpy.cumsum(ctr) - ctr
+        self.solver.reserve(ctr.sum())
+
+
 class PressureCoeffMatrix(Equation):
-    def initialize(self, d_idx, d_ctr, d_diag, d_col_idx):
-        # Make only the diagonals zero as the rest are not summed.
+    """Write the rows of the pressure coefficient matrix in the CSR format,
+    the diagonal is the first entry of each row.  The columns are the `gid`
+    of the sources.  This must be in a group after `PressureCoeffRowLength`.
+    """
+    def __init__(self, dest, sources, solver):
+        """
+        Parameters
+        ----------
+
+        solver: PPESolver: the solver whose arrays the matrix is written to.
+        """
+        self.solver = solver
+        super(PressureCoeffMatrix, self).__init__(dest, sources)
+
+    def _get_work_arrays_(self):
+        return self.solver.get_work_arrays()
+
+    def initialize(self, d_idx, d_ctr, d_diag):
         d_diag[d_idx] = 0.0
-        d_ctr[d_idx] = 0
-
-        # Initialize col_idx to -1 so as to use it in cond while constructing
-        # pressure coeff matrix.
-        i = declare('int')
-        for i in range(100):
-            d_col_idx[d_idx*100 + i] = -1
+        d_ctr[d_idx] = 1
 
-    def loop(self, d_idx, s_idx, s_m, d_rho, s_rho, d_gid, d_coeff, d_ctr,
-             d_col_idx, d_row_idx, d_diag, XIJ, DWIJ, R2IJ, EPS):
+    def loop(self, d_idx, s_idx, s_m, d_rho, s_rho, d_gid, s_gid, d_coeff,
+             d_ctr, d_col_idx, d_ppe_start, d_diag, XIJ, DWIJ, R2IJ, EPS):
         rhoij = (s_rho[s_idx] + d_rho[d_idx])
         rhoij2_1 = 1.0/(rhoij*rhoij)
 
@@ -175,46 +219,63 @@ class PressureCoeffMatrix(Equation):
 
         fac = 8.0 * s_m[s_idx] * rhoij2_1 * xdotdwij / (R2IJ + EPS)
 
-        j, k = declare('int', 3)
-        j = d_gid[s_idx]
-
+        k = declare('int')
         d_diag[d_idx] += fac
 
-        k = int(d_ctr[d_idx])
-        d_coeff[d_idx*100 + k] = -fac
-        d_col_idx[d_idx*100 + k] = j
-        d_row_idx[d_idx*100 + k] = d_idx
+        k = d_ppe_start[d_idx] + d_ctr[d_idx]
+        d_coeff[k] = -fac
+        d_col_idx[k] = s_gid[s_idx]
         d_ctr[d_idx] += 1
 
+    def post_loop(self, d_idx, d_coeff, d_col_idx, d_ppe_start, d_diag):
+        k = declare('int')
+        k = d_ppe_start[d_idx]
+        d_coeff[k] = d_diag[d_idx]
+        d_col_idx[k] = d_idx
+
 
 class PPESolve(Equation):
-    def py_initialize(self, dst, t, dt):
-        import scipy.sparse as sp
-        from scipy.sparse.linalg import bicgstab
+    """Solve the pressure Poisson equation with a `PPESolver`.
+
+    The matrix is written by `PressureCoeffMatrix` and the right hand side by
+    `VelocityDivergence`.
+    """
+    def __init__(self, dest, sources, solver=None, diag_shift=1e-3):
+        """
+        Parameters
+        ----------
+
+        solver: PPESolver: the linear solver, the default is BiCGStab with
+            a Jacobi preconditioner.
+        diag_shift: float: relative increase of the diagonal of the rows with
+            a non-zero right hand side so that the matrix is not singular.
+        """
+        if solver is None:
+            solver = PPESolver()
+        self.solver = solver
+        self.diag_shift = diag_shift
+        super(PPESolve, self).__init__(dest, sources)
 
-        coeff = declare('object')
-        cond = declare('object')
+    def py_initialize(self, dst, t, dt):
+        ctr, indptr, coeff, rhs, cond = declare('object', 5)
         n = declare('int')
         n = dst.np[0]
-
-        # Mask all indices which are not used in the construction.
-        cond = (dst.col_idx != -1)
-
-        coeff = sp.csr_matrix(
-            (dst.coeff[cond], (dst.row_idx[cond], dst.col_idx[cond])),
-            shape=(n, n)
+        ctr = dst.ctr[:n]
+        indptr = numpy.zeros(n + 1, dtype=numpy.int64)
+        numpy.cumsum(ctr, out=indptr[1:])
+        nnz = indptr[n]
+        coeff = self.solver.coeff.get_npy_array()[:nnz]
+
+        # Pseudo-Neumann boundary conditions.
+        rhs = dst.rhs[:n]
+        cond = abs(rhs) > 1e-9
+        coeff[indptr[:n][cond]] *= 1.0 + self.diag_shift
+        rhs[cond] -= rhs[cond].mean()
+
+        self.solver.assemble(
+            n, indptr, self.solver.col_idx.get_npy_array(), coeff
         )
-        # Add tiny random noise so the matrix is not singular.
-        cond = abs(dst.rhs) > 1e-9
-        dst.diag[cond] -= numpy.random.random(n)[cond]
-
-        coeff += sp.diags(dst.diag)
-
-        # Pseudo-Neumann boundary conditions
-        dst.rhs[cond] -= dst.rhs[cond].mean()
-
-        dst.p[:], ec = bicgstab(coeff, dst.rhs, x0=dst.p)
-        assert ec == 0, "Not converging!"
+        dst.p[:n] = self.solver.solve(rhs, x0=dst.p[:n])
 
 
 class MomentumEquationPressureGradient(Equation):
@@ -278,17 +339,32 @@ class CheckDensityError(Equation):
 
 
 class FreeSurfaceBoundaryCondition(Equation):
-    def initialize(self, d_rho, d_rho0, d_rhs, d_diag, d_idx, d_coeff, d_ctr,
-                   d_col_idx, d_row_idx):
-        i = declare('int')
+    """Set the pressure of the free surface particles to zero, this must be
+    in a group after `PressureCoeffMatrix`.
+    """
+    def __init__(self, dest, sources, solver):
+        """
+        Parameters
+        ----------
+
+        solver: PPESolver: the solver whose arrays the matrix is written to.
+        """
+        self.solver = solver
+        super(FreeSurfaceBoundaryCondition, self).__init__(dest, sources)
+
+    def _get_work_arrays_(self):
+        return self.solver.get_work_arrays()
+
+    def post_loop(self, d_rho, d_rho0, d_rhs, d_diag, d_idx, d_coeff, d_ctr,
+                  d_ppe_start):
+        i, k = declare('int', 2)
         if d_rho[d_idx]/d_rho0[d_idx] < 0.98:
             d_rhs[d_idx] = 0.0
             d_diag[d_idx] = 1.0
-            d_ctr[d_idx] = 1
-            for i in range(100):
-                d_coeff[d_idx*100 + i] = 0.0
-                d_col_idx[d_idx*100 + i] = -1
-                d_row_idx[d_idx*100 + i] = d_idx
+            k = d_ppe_start[d_idx]
+            d_coeff[k] = 1.0
+            for i in range(1, d_ctr[d_idx]):
+                d_coeff[k + i] = 0.0
 
 
 class MomentumEquationPressureGradientSymmetricMirror(Equation):
@@ -330,7 +406,9 @@ class MomentumEquationPressureGradientSymmetricMirror(Equation):
 
 class ISPHScheme(Scheme):
     def __init__(self, fluids, solids, dim, nu, rho0, c0, alpha, beta=0.0,
-                 gx=0.0, gy=0.0, gz=0.0, tolerance=0.01, symmetric=False):
+                 gx=0.0, gy=0.0, gz=0.0, tolerance=0.01, symmetric=False,
+                 ppe_solver='bicgstab', ppe_preconditioner='jacobi',
+                 ppe_tol=1e-8):
         self.fluids = fluids
         self.solver = None
         self.dim = dim
@@ -344,6 +422,10 @@ class ISPHScheme(Scheme):
         self.tolerance = tolerance
         self.rho0 = rho0
         self.symmetric = symmetric
+        self.ppe_solver = ppe_solver
+        self.ppe_preconditioner = ppe_preconditioner
+        self.ppe_tol = ppe_tol
+        self.ppe_solvers = {}
 
     def add_user_options(self, group):
         group.add_argument(
@@ -355,9 +437,25 @@ class ISPHScheme(Scheme):
             group, 'symmetric', dest='symmetric', default=None,
             help='Use symmetric form of pressure gradient.'
         )
+        group.add_argument(
+            '--ppe-solver', action='store', dest='ppe_solver',
+            default=None, choices=METHODS,
+            help='Krylov method used to solve the PPE.'
+        )
+        group.add_argument(
+            '--ppe-preconditioner', action='store',
+            dest='ppe_preconditioner', default=None, choices=PRECONDITIONERS,
+            help='Preconditioner of the PPE, amg requires pyamg.'
+        )
+        group.add_argument(
+            '--ppe-tol', action='store', type=float, dest='ppe_tol',
+            default=None,
+            help='Relative tolerance of the PPE solver.'
+        )
 
     def consume_user_options(self, options):
-        _vars = ['alpha', 'symmetric']
+        _vars = ['alpha', 'symmetric', 'ppe_solver', 'ppe_preconditioner',
+                 'ppe_tol']
         data = dict((var, self._smart_getattr(options, var))
                     for var in _vars)
         self.configure(**data)
@@ -418,18 +516,43 @@ class ISPHScheme(Scheme):
     def _get_ppe(self):
 
         all = self.fluids
+        self.ppe_solvers = {}
+        for fluid in self.fluids:
+            self.ppe_solvers[fluid] = PPESolver(
+                method=self.ppe_solver,
+                preconditioner=self.ppe_preconditioner, tol=self.ppe_tol
+            )
+
         eq2, stg = [], []
         for fluid in self.fluids:
             eq2.append(VelocityDivergence(dest=fluid, sources=all))
-            eq2.append(PressureCoeffMatrix(dest=fluid, sources=all))
+            eq2.append(PressureCoeffRowLength(
+                dest=fluid, sources=all, solver=self.ppe_solvers[fluid]
+            ))
         stg.append(Group(equations=eq2))
 
+        eq21 = []
+        for fluid in self.fluids:
+            eq21.append(PressureCoeffMatrix(
+                dest=fluid, sources=all, solver=self.ppe_solvers[fluid]
+            ))
+        stg.append(Group(equations=eq21))
+
         eq22 = []
         for fluid in self.fluids:
-            eq22.append(PPESolve(dest=fluid, sources=all))
+            eq22.append(PPESolve(
+                dest=fluid, sources=all, solver=self.ppe_solvers[fluid]
+            ))
         stg.append(Group(equations=eq22))
         return stg
 
+    def get_ppe_stats(self):
+        """Return the statistics of the PPE solver of each fluid, see
+        `PPESolver.get_stats`.
+        """
+        return dict((fluid, solver.get_stats())
+                    for fluid, solver in self.ppe_solvers.items())
+
     def get_equations(self):
         all = self.fluids
 
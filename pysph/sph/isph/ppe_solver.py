@@ -0,0 +1,250 @@
+"""Sparse linear solvers for the pressure Poisson equation (PPE) of ISPH.
+
+The coefficients of the PPE are written by
+:py:class:`pysph.sph.isph.isph.PressureCoeffMatrix` directly in the
+compressed sparse row (CSR) format: the number of neighbors of each particle
+is counted first so each row has exactly the entries it needs, the first of
+which is the diagonal.  The entries are written to the ``coeff`` and
+``col_idx`` arrays of the :py:class:`PPESolver`, the equations use these as
+work arrays so they are not part of the particle array and are never written
+to the output files.  The :py:class:`PPESolver` sums the entries of the
+same column (periodic ghosts map to the particle they copy) and keeps the
+resulting sparsity pattern so that it is only rebuilt when the neighbors
+change.  The system is solved with a preconditioned Krylov method of
+``scipy.sparse.linalg`` starting from the previous pressure.
+
+The preconditioners available are ``'none'``, ``'jacobi'``, ``'ilu'``
+(incomplete LU) and ``'amg'`` (smoothed aggregation algebraic multigrid),
+the latter requires the optional pyamg package.
+"""
+
+import inspect
+import logging
+import time
+
+import numpy as np
+from cyarray.carray import DoubleArray, IntArray
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('bicgstab', 'cg', 'gmres')
+PRECONDITIONERS = ('none', 'jacobi', 'ilu', 'amg')
+
+
+def has_pyamg():
+    try:
+        import pyamg  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _get_tol_kw(func, tol):
+    # SciPy 1.12 renamed the relative tolerance from tol to rtol.
+    if 'rtol' in inspect.signature(func).parameters:
+        return dict(rtol=tol, atol=0.0)
+    else:
+        return dict(tol=tol, atol=0.0)
+
+
+class PPESolver(object):
+    """Solve the sparse linear systems of the PPE and record the time and
+    the number of iterations taken.
+    """
+    def __init__(self, method='bicgstab', preconditioner='jacobi',
+                 tol=1e-8, maxiter=None, warm_start=True, ilu_drop_tol=1e-4,
+                 ilu_fill_factor=10.0):
+        """
+        Parameters
+        ----------
+
+        method: str: the Krylov method, one of 'bicgstab', 'cg' or 'gmres'.
+        preconditioner: str: one of 'none', 'jacobi', 'ilu' or 'amg'.
+        tol: float: the relative tolerance of the residual.
+        maxiter: int: maximum number of iterations, the default is that of
+            SciPy.
+        warm_start: bool: start from the given initial guess, usually the
+            previous pressure, instead of zero.
+        ilu_drop_tol: float: the drop tolerance of the ILU preconditioner.
+        ilu_fill_factor: float: the fill factor of the ILU preconditioner.
+        """
+        if method not in METHODS:
+            raise ValueError(
+                'Unknown PPE solver %r, use one of %s' % (method, METHODS)
+            )
+        if preconditioner not in PRECONDITIONERS:
+            raise ValueError(
+                'Unknown PPE preconditioner %r, use one of %s' %
+                (preconditioner, PRECONDITIONERS)
+            )
+        if preconditioner == 'amg' and not has_pyamg():
+            raise ImportError(
+                'The amg preconditioner requires pyamg, install it with '
+                '"pip install pyamg".'
+            )
+        self.method = method
+        self.preconditioner = preconditioner
+        self.tol = tol
+        self.maxiter = maxiter
+        self.warm_start = warm_start
+        self.ilu_drop_tol = ilu_drop_tol
+        self.ilu_fill_factor = ilu_fill_factor
+        self.matrix = None
+        # The CSR entries written by the equations.
+        self.coeff = DoubleArray(1)
+        self.col_idx = IntArray(1)
+        # The pattern of the entries as written and the map to the entries
+        # of the matrix with the duplicate columns summed.
+        self._indptr = None
+        self._indices = None
+        self._map = None
+        self.stats = dict(
+            solves=0, iterations=0, pattern_updates=0, assembly_time=0.0,
+            setup_time=0.0, solve_time=0.0
+        )
+        self.last = {}
+
+    def _update_pattern(self, n, indptr, indices):
+        rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr))
+        keys = rows*n + indices
+        order = np.argsort(keys, kind='mergesort')
+        sorted_keys = keys[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        self._map = np.empty(len(keys), dtype=np.int64)
+        self._map[order] = np.cumsum(first) - 1
+        unique = sorted_keys[first]
+        self._csr_indices = (unique % n).astype(np.int32)
+        self._csr_indptr = np.searchsorted(
+            unique, np.arange(n + 1, dtype=np.int64)*n
+        ).astype(np.int32)
+        self._indptr = indptr.copy()
+        self._indices = indices.copy()
+        self.stats['pattern_updates'] += 1
+
+    def reserve(self, nnz):
+        """Make sure that the `coeff` and `col_idx` arrays have at least
+        `nnz` entries, these only grow.
+        """
+        for arr in (self.coeff, self.col_idx):
+            if arr.length < nnz:
+                arr.resize(max(nnz, int(1.25*arr.length)))
+
+    def get_work_arrays(self):
+        """Return the arrays that the equations write the CSR entries to.
+        """
+        return dict(coeff=self.coeff, col_idx=self.col_idx)
+
+    def assemble(self, n, indptr, indices, data):
+        """Assemble the matrix from the CSR entries of each row, a column
+        may appear more than once in a row and these are summed.  The
+        pattern is reused if the `indptr` and `indices` are unchanged.
+        """
+        import scipy.sparse as sp
+        start = time.perf_counter()
+        nnz = indptr[n]
+        indices = indices[:nnz]
+        same = (
+            self._indptr is not None and len(self._indptr) == n + 1 and
+            np.array_equal(self._indptr, indptr) and
+            np.array_equal(self._indices, indices)
+        )
+        if not same:
+            self._update_pattern(n, indptr, indices)
+        values = np.bincount(self._map, weights=data[:nnz],
+                             minlength=len(self._csr_indices))
+        if same and self.matrix is not None:
+            self.matrix.data[:] = values
+        else:
+            self.matrix = sp.csr_matrix(
+                (values, self._csr_indices, self._csr_indptr), shape=(n, n)
+            )
+            self.matrix.has_sorted_indices = True
+        self.stats['assembly_time'] += time.perf_counter() - start
+        return self.matrix
+
+    def _get_preconditioner(self, A):
+        from scipy.sparse.linalg import LinearOperator, spilu
+        kind = self.preconditioner
+        if kind == 'none':
+            return None
+        elif kind == 'jacobi':
+            diag = A.diagonal()
+            inv_diag = np.zeros_like(diag)
+            nonzero = diag != 0.0
+            inv_diag[nonzero] = 1.0/diag[nonzero]
+            return LinearOperator(A.shape, matvec=lambda x: inv_diag*x)
+        elif kind == 'ilu':
+            ilu = spilu(A.tocsc(), drop_tol=self.ilu_drop_tol,
+                        fill_factor=self.ilu_fill_factor)
+            return LinearOperator(A.shape, matvec=ilu.solve)
+        else:
+            import pyamg
+            symmetry = 'hermitian' if self.method == 'cg' else 'nonsymmetric'
+            ml = pyamg.smoothed_aggregation_solver(A, symmetry=symmetry)
+            return ml.aspreconditioner(cycle='V')
+
+    def solve(self, b, x0=None):
+        """Solve the assembled system for the right hand side `b` and return
+        the solution.
+        """
+        from scipy.sparse import linalg
+        A = self.matrix
+        start = time.perf_counter()
+        M = self._get_preconditioner(A)
+        setup_time = time.perf_counter() - start
+
+        iterations = [0]
+
+        def _count(*args):
+            iterations[0] += 1
+
+        func = getattr(linalg, self.method)
+        kw = _get_tol_kw(func, self.tol)
+        if self.method == 'gmres':
+            kw['callback_type'] = 'pr_norm'
+        if not self.warm_start:
+            x0 = None
+        start = time.perf_counter()
+        x, info = func(A, b, x0=x0, M=M, maxiter=self.maxiter,
+                       callback=_count, **kw)
+        solve_time = time.perf_counter() - start
+        if info < 0:
+            raise RuntimeError(
+                'The PPE solver %s broke down (info=%d).' % (self.method, info)
+            )
+
+        norm_b = np.linalg.norm(b)
+        residual = np.linalg.norm(b - A.dot(x))/(norm_b if norm_b else 1.0)
+        if info > 0:
+            logger.warning(
+                'The PPE solver did not converge in %d iterations, '
+                'residual %g', iterations[0], residual
+            )
+        stats = self.stats
+        stats['solves'] += 1
+        stats['iterations'] += iterations[0]
+        stats['setup_time'] += setup_time
+        stats['solve_time'] += solve_time
+        self.last = dict(
+            n=A.shape[0], nnz=A.nnz, iterations=iterations[0],
+            residual=residual, setup_time=setup_time, solve_time=solve_time,
+            converged=info == 0
+        )
+        logger.debug(
+            'PPE %s/%s: n=%d, nnz=%d, %d iterations, residual %g, '
+            'setup %.3g s, solve %.3g s', self.method, self.preconditioner,
+            A.shape[0], A.nnz, iterations[0], residual, setup_time,
+            solve_time
+        )
+        return x
+
+    def get_stats(self):
+        """Return the total number of solves, iterations, pattern updates
+        and time taken to assemble, set up the preconditioner and solve.
+        """
+        stats = dict(self.stats)
+        stats['mean_iterations'] = (
+            stats['iterations']/max(stats['solves'], 1)
+        )
+        return stats
@@ -10,6 +10,9 @@ from pysph.base.utils import get_particle_array
 from pysph.sph.integrator import Integrator
 from pysph.sph.integrator_step import IntegratorStep
 from pysph.sph.equation import Equation, Group, MultiStageEquations
+from pysph.sph.krylov import (
+    KrylovState, add_krylov_properties, get_krylov_groups
+)
 
 
 def get_particle_array_sisph(constants=None, **props):
@@ -277,6 +280,91 @@ class UpdateGhostPressure(Equation):
             d_p[d_idx] = d_p[idx]
 
 
+class PressureKrylovSetup(Equation):
+    """Set the unknown, the right hand side and the product of the matrix
+    with the unknown for the Krylov solvers, see :py:mod:`pysph.sph.krylov`.
+
+    The coefficients are computed with `PressureCoeffMatrixIterative` in the
+    same group so the product includes the pressure of the solids.  The rows
+    of particles that are not solved for by `PPESolve` are the identity with
+    a zero right hand side.
+
+    Without a free surface the matrix is singular and the right hand side is
+    not exactly in its range so the diagonal is increased by the fraction
+    `diag_shift` of itself as done for the ISPH scheme.
+    """
+    def __init__(self, dest, sources, rho0, rho_cutoff=0.8, diag_shift=1e-2):
+        self.rho0 = rho0
+        self.rho_cutoff = rho_cutoff
+        self.diag_shift = diag_shift
+        super(PressureKrylovSetup, self).__init__(dest, sources)
+
+    def post_loop(self, d_idx, d_pk, d_rhs, d_diag, d_odiag, d_rho, d_kx,
+                  d_kq, d_kb, d_kaq):
+        rho = d_rho[d_idx] / self.rho0
+        diag = d_diag[d_idx]
+        if abs(diag) < 1e-12 or rho < self.rho_cutoff:
+            d_kx[d_idx] = 0.0
+            d_kb[d_idx] = 0.0
+            d_kaq[d_idx] = 0.0
+        else:
+            d_kx[d_idx] = d_pk[d_idx]
+            d_kb[d_idx] = d_rhs[d_idx]
+            d_kaq[d_idx] = ((1.0 + self.diag_shift) * diag * d_pk[d_idx] +
+                            d_odiag[d_idx])
+        d_kq[d_idx] = d_kx[d_idx]
+
+
+class PressureMatVec(Equation):
+    """The product of the matrix of `PPESolve` with ``kq`` using the
+    diagonal computed by `PressureCoeffMatrixIterative`, see
+    `PressureKrylovSetup` for the `diag_shift`.
+    """
+    def __init__(self, dest, sources, rho0, rho_cutoff=0.8, diag_shift=1e-2):
+        self.rho0 = rho0
+        self.rho_cutoff = rho_cutoff
+        self.diag_shift = diag_shift
+        super(PressureMatVec, self).__init__(dest, sources)
+
+    def initialize(self, d_idx, d_kaq):
+        d_kaq[d_idx] = 0.0
+
+    def loop(self, d_idx, s_idx, s_m, d_rho, s_rho, d_kaq, s_kq, XIJ, DWIJ,
+             R2IJ, EPS):
+        rhoij = (s_rho[s_idx] + d_rho[d_idx])
+        rhoij2_1 = 1.0/(d_rho[d_idx]*rhoij)
+
+        xdotdwij = XIJ[0]*DWIJ[0] + XIJ[1]*DWIJ[1] + XIJ[2]*DWIJ[2]
+
+        fac = 4.0 * s_m[s_idx] * rhoij2_1 * xdotdwij / (R2IJ + EPS)
+
+        d_kaq[d_idx] += -fac * s_kq[s_idx]
+
+    def post_loop(self, d_idx, d_kaq, d_kq, d_diag, d_rho):
+        rho = d_rho[d_idx] / self.rho0
+        diag = d_diag[d_idx]
+        if abs(diag) < 1e-12 or rho < self.rho_cutoff:
+            d_kaq[d_idx] = d_kq[d_idx]
+        else:
+            d_kaq[d_idx] += (1.0 + self.diag_shift) * diag * d_kq[d_idx]
+
+
+class PressureKrylovFinish(Equation):
+    def post_loop(self, d_idx, d_p, d_pk, d_kx, d_pabs, d_pmax):
+        d_p[d_idx] = d_kx[d_idx]
+        d_pk[d_idx] = d_kx[d_idx]
+        d_pabs[d_idx] = abs(d_kx[d_idx])
+        d_pmax[0] = max(abs(d_pmax[0]), d_p[d_idx])
+
+
+class UpdateGhostKrylov(Equation):
+    def initialize(self, d_idx, d_tag, d_gid, d_kq):
+        idx = declare('int')
+        if d_tag[d_idx] == 2:
+            idx = d_gid[d_idx]
+            d_kq[d_idx] = d_kq[idx]
+
+
 class MomentumEquationPressureGradient(Equation):
     def initialize(self, d_idx, d_au, d_av, d_aw):
         d_au[d_idx] = 0.0
@@ -361,6 +449,23 @@ class SetPressureSolid(Equation):
         d_pk[d_idx] = d_p[d_idx]
 
 
+class SetKrylovSolid(Equation):
+    """Extrapolate ``kq`` to the solids as `SetPressureSolid` does for the
+    pressure, the body force term does not depend on the pressure and is not
+    part of the matrix.  The number density is computed by
+    `EvaluateNumberDensity` before.
+    """
+    def initialize(self, d_idx, d_kq):
+        d_kq[d_idx] = 0.0
+
+    def loop(self, d_idx, s_idx, d_kq, s_kq, WIJ):
+        d_kq[d_idx] += s_kq[s_idx]*WIJ
+
+    def post_loop(self, d_idx, d_wij, d_kq):
+        if d_wij[d_idx] > 1e-14:
+            d_kq[d_idx] /= d_wij[d_idx]
+
+
 class GTVFAcceleration(Equation):
     def __init__(self, dest, sources, pref, internal_flow=False,
                  use_pref=False):
@@ -451,7 +556,8 @@ class SISPHScheme(Scheme):
                  omega=0.5, hg_correction=False, has_ghosts=False,
                  pref=None, gtvf=False, symmetric=False, rho_cutoff=0.8,
                  max_iterations=1000, internal_flow=False,
-                 use_pref=False):
+                 use_pref=False, pressure_solver='jacobi',
+                 krylov_tolerance=1e-3):
         self.fluids = fluids
         self.solids = solids
         self.solver = None
@@ -475,6 +581,9 @@ class SISPHScheme(Scheme):
         self.max_iterations = max_iterations
         self.internal_flow = internal_flow
         self.use_pref = use_pref
+        self.pressure_solver = pressure_solver
+        self.krylov_tolerance = krylov_tolerance
+        self.krylov_state = None
 
     def add_user_options(self, group):
         group.add_argument(
@@ -487,6 +596,18 @@ class SISPHScheme(Scheme):
             type=float,
             help="Omega for convergence."
         )
+        group.add_argument(
+            "--pressure-solver", action="store", dest="pressure_solver",
+            choices=['jacobi', 'bicgstab', 'cg'], default=None,
+            help="Solver for the pressure: the relaxed Jacobi iterations or "
+            "the matrix-free BiCGStab or CG methods."
+        )
+        group.add_argument(
+            "--krylov-tol", action="store", dest="krylov_tolerance",
+            type=float, default=None,
+            help="Tolerance of the residual of the BiCGStab and CG solvers "
+            "relative to the right hand side."
+        )
         group.add_argument(
             '--alpha', action='store', type=float, dest='alpha',
             default=None,
@@ -507,7 +628,7 @@ class SISPHScheme(Scheme):
 
     def consume_user_options(self, options):
         _vars = ['tolerance', 'omega', 'alpha', 'gtvf', 'symmetric',
-                 'internal_flow']
+                 'internal_flow', 'pressure_solver', 'krylov_tolerance']
         data = dict((var, self._smart_getattr(options, var))
                     for var in _vars)
         self.configure(**data)
@@ -674,6 +795,11 @@ class SISPHScheme(Scheme):
             g3 = self._get_pressure_bc()
             solver_eqns.append(g3)
 
+        if self.pressure_solver != 'jacobi':
+            stg.extend(solver_eqns)
+            stg.extend(self._get_krylov_ppe())
+            return stg
+
         eq3 = []
         for fluid in self.fluids:
             if not fluid == 'outlet':
@@ -707,6 +833,62 @@ class SISPHScheme(Scheme):
             stg.append(ghost_eqns)
         return stg
 
+    def _get_krylov_ppe(self):
+        all = self.fluids + self.solids
+        fluids = [x for x in self.fluids if x != 'outlet']
+        self.krylov_state = state = KrylovState(
+            fluids, method=self.pressure_solver,
+            tolerance=self.krylov_tolerance,
+            max_iterations=self.max_iterations
+        )
+
+        def start(extra):
+            eq = []
+            for fluid in fluids:
+                eq.append(
+                    PressureCoeffMatrixIterative(dest=fluid, sources=all)
+                )
+                eq.append(
+                    PressureKrylovSetup(dest=fluid, sources=None,
+                                        rho0=self.rho0,
+                                        rho_cutoff=self.rho_cutoff)
+                )
+            return [Group(equations=eq + extra)]
+
+        def matvec(extra):
+            groups = []
+            if self.has_ghosts:
+                groups.append(Group(
+                    equations=[UpdateGhostKrylov(dest=fluid, sources=None)
+                               for fluid in fluids],
+                    real=False
+                ))
+            if self.solids:
+                groups.append(Group(
+                    equations=[SetKrylovSolid(dest=solid, sources=fluids)
+                               for solid in self.solids]
+                ))
+            eq = [PressureMatVec(dest=fluid, sources=all, rho0=self.rho0,
+                                 rho_cutoff=self.rho_cutoff)
+                  for fluid in fluids]
+            groups.append(Group(equations=eq + extra))
+            return groups
+
+        stg = get_krylov_groups(state, start, matvec)
+        stg.append(Group(
+            equations=[PressureKrylovFinish(dest=fluid, sources=None)
+                       for fluid in fluids]
+        ))
+        return stg
+
+    def get_ppe_stats(self):
+        """Return the statistics of the BiCGStab or CG pressure solver, see
+        :py:meth:`pysph.sph.krylov.KrylovState.get_stats`.
+        """
+        if self.krylov_state is None:
+            return {}
+        return self.krylov_state.get_stats()
+
     def get_equations(self):
         all = self.fluids + self.solids
         all_solids = self.solids
@@ -767,6 +949,8 @@ class SISPHScheme(Scheme):
             pa.set_output_arrays(output_props)
             for const in constants:
                 pa.add_constant(**const)
+            if self.pressure_solver != 'jacobi':
+                add_krylov_properties(pa)
 
         solid_props = ['wij', 'ug', 'vg', 'wg', 'uf', 'vf', 'wf', 'pk', 'V']
         all_solids = self.solids
@@ -774,5 +958,7 @@ class SISPHScheme(Scheme):
             pa = particle_arrays[solid]
             for prop in solid_props:
                 pa.add_property(prop)
+            if self.pressure_solver != 'jacobi':
+                pa.add_property('kq')
             self._get_normals(pa)
             pa.add_output_arrays(['p', 'ug', 'vg', 'wg', 'normal'])
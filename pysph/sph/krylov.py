@@ -0,0 +1,363 @@
+"""Matrix-free Krylov solvers for the pressure equations.
+
+The pressure of the iterative incompressible schemes, like SISPH, is the
+solution of a sparse linear system whose matrix is never stored, its product
+with a vector is a sum over the neighbors.  The relaxed Jacobi iterations
+used by these schemes need hundreds of iterations for large problems, the
+conjugate gradient (CG) and BiCGStab methods here need far fewer for the
+same residual.
+
+A solver is a sequence of groups built by :py:func:`get_krylov_groups`:
+the matrix-vector products are neighbor loops supplied by the scheme and
+the vector updates are post loops of the equations here.  The dot products
+needed at each step are computed together in the ``reduce`` of an equation
+of the group that computes the matrix-vector product or updates the
+residual, so an iteration of CG has two reductions and BiCGStab three
+instead of the five separate dot products.  The partial sums of all the
+destination arrays are added and reduced over the processors with
+``parallel_reduce_array`` so this works in serial, with OpenMP and with MPI.
+The scalars of the method are stored in the ``krylov`` constant of the
+destination arrays, see :py:class:`KrylovState`.
+
+The properties used are, for an unknown ``x`` with right hand side ``b``:
+
+- ``kx``, ``kb``: the unknown and the right hand side set by the scheme.
+- ``kq``, ``kaq``: the vector to multiply and the product computed by the
+  neighbor loop of the scheme, ``kaq = A kq``.
+- ``kr``, ``kr0``, ``kp``, ``kv``, ``ks``, ``kt``: the work vectors.
+
+The solvers run with the Cython backend.
+"""
+
+import logging
+from math import sqrt
+
+import numpy
+
+from pysph.base.reduce_array import parallel_reduce_array
+from pysph.sph.equation import Equation, Group
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('bicgstab', 'cg')
+
+KRYLOV_PROPS = ['kx', 'kb', 'kq', 'kaq', 'kr', 'kr0', 'kp', 'kv', 'ks', 'kt']
+
+# The stages at which the state is reduced.
+START, AFTER_V, AFTER_T, AFTER_UPDATE = 0, 1, 2, 3
+
+
+def add_krylov_properties(pa):
+    """Add the properties and constant used by the Krylov solvers to the
+    particle array.
+    """
+    for prop in KRYLOV_PROPS:
+        if prop not in pa.properties:
+            pa.add_property(prop)
+    if 'krylov' not in pa.constants:
+        pa.add_constant('krylov', [0.0, 0.0, 0.0])
+
+
+class KrylovState(object):
+    """The scalars of a Krylov solver shared by its equations.
+
+    The dot products of the destination arrays are accumulated as each of
+    them is reduced, once all the destinations are done the sums are reduced
+    over the processors and the new ``alpha``, ``omega`` and ``beta`` are
+    written to the ``krylov`` constant of the arrays.
+    """
+    def __init__(self, dests, method='bicgstab', tolerance=1e-4,
+                 max_iterations=1000):
+        """
+        Parameters
+        ----------
+
+        dests: list: names of the destination particle arrays.
+        method: str: 'bicgstab' or 'cg', CG requires a symmetric matrix.
+        tolerance: float: tolerance of the residual relative to the right
+            hand side.
+        max_iterations: int: maximum number of iterations of a solve.
+        """
+        if method not in METHODS:
+            raise ValueError(
+                'Unknown Krylov method %r, use one of %s' % (method, METHODS)
+            )
+        self.dests = list(dests)
+        self.method = method
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.stats = dict(solves=0, iterations=0, not_converged=0)
+        self.last = {}
+        self._arrays = {}
+        self._partial = None
+        self._active = False
+        self.done = True
+        self.iterations = 0
+        self.rho = 0.0
+        self.norm_b = 1.0
+        self.residual = 0.0
+        self.alpha = self.omega = self.beta = 0.0
+        self._breakdown = False
+
+    def _dot(self, dst, a, b):
+        n = dst.num_real_particles
+        return numpy.dot(getattr(dst, a)[:n], getattr(dst, b)[:n])
+
+    def _local_sums(self, stage, dst):
+        dot = self._dot
+        if stage == START:
+            return [dot(dst, 'kr', 'kr'), dot(dst, 'kb', 'kb')]
+        elif stage == AFTER_V:
+            if self.method == 'cg':
+                return [dot(dst, 'kp', 'kv')]
+            else:
+                return [dot(dst, 'kr0', 'kv')]
+        elif stage == AFTER_T:
+            return [dot(dst, 'kt', 'ks'), dot(dst, 'kt', 'kt'),
+                    dot(dst, 'ks', 'ks')]
+        else:
+            return [dot(dst, 'kr', 'kr'), dot(dst, 'kr0', 'kr')]
+
+    def reduce(self, stage, dst, reduce_func=parallel_reduce_array):
+        """Add the dot products of the array `dst` for the given stage and
+        update the scalars once all the destinations are reduced.
+        `reduce_func` reduces the sums over the processors.
+        """
+        sums = numpy.asarray(self._local_sums(stage, dst))
+        if self._partial is None:
+            self._partial = sums
+        else:
+            self._partial += sums
+        self._arrays[dst.name] = dst
+        if len(self._arrays) < len(self.dests):
+            return
+        sums = reduce_func(self._partial, 'sum')
+        self._partial = None
+        if stage == START:
+            self._start(sums)
+        elif stage == AFTER_V:
+            self._after_v(sums)
+        elif stage == AFTER_T:
+            self._after_t(sums)
+        else:
+            self._after_update(sums)
+        for arr in self._arrays.values():
+            arr.krylov[:] = self.alpha, self.omega, self.beta
+        self._arrays = {}
+
+    def _is_small(self, norm2):
+        return sqrt(max(norm2, 0.0)) <= self.tolerance*self.norm_b
+
+    def _finish(self, converged=True):
+        self.done = True
+        if not self._active:
+            return
+        self._active = False
+        self.stats['solves'] += 1
+        self.stats['iterations'] += self.iterations
+        if not converged:
+            self.stats['not_converged'] += 1
+            logger.warning(
+                'The %s pressure solver did not converge in %d iterations, '
+                'residual %g', self.method, self.iterations,
+                self.residual/self.norm_b
+            )
+        self.last = dict(
+            iterations=self.iterations, converged=converged,
+            residual=self.residual/self.norm_b
+        )
+
+    def _start(self, sums):
+        rr, bb = sums
+        if self._active:
+            # The previous solve was stopped by the group.
+            self._finish(converged=False)
+        self._active = True
+        self.iterations = 0
+        self.norm_b = sqrt(bb) if bb > 0.0 else 1.0
+        self.rho = rr
+        self.residual = sqrt(rr)
+        self.alpha = self.omega = self.beta = 0.0
+        self.done = False
+        self._breakdown = False
+        if self._is_small(rr):
+            self._finish()
+
+    def _after_v(self, sums):
+        self.omega = 0.0
+        if self.done:
+            self.alpha = 0.0
+            return
+        self.iterations += 1
+        if sums[0] == 0.0:
+            self.alpha = 0.0
+            self._breakdown = True
+        else:
+            self.alpha = self.rho/sums[0]
+
+    def _after_t(self, sums):
+        ts, tt, ss = sums
+        if self.done or tt == 0.0 or self._is_small(ss):
+            # With a small s the update is x + alpha p and r = s.
+            self.omega = 0.0
+        else:
+            self.omega = ts/tt
+
+    def _after_update(self, sums):
+        rr, r0r = sums
+        if self.done:
+            return
+        self.residual = sqrt(rr)
+        if self._is_small(rr):
+            self._finish()
+            return
+        if self.method == 'cg':
+            rho, fac = rr, 1.0
+        else:
+            rho = r0r
+            fac = self.alpha/self.omega if self.omega != 0.0 else 0.0
+        if (self._breakdown or rho == 0.0 or fac == 0.0 or
+                self.iterations >= self.max_iterations):
+            self._finish(converged=False)
+        else:
+            self.beta = (rho/self.rho)*fac
+            self.rho = rho
+
+    def converged(self):
+        return 1.0 if self.done else -1.0
+
+    def get_stats(self):
+        """Return the total number of solves and iterations and the number
+        of solves that did not converge.
+        """
+        stats = dict(self.stats)
+        stats['mean_iterations'] = (
+            stats['iterations']/max(stats['solves'], 1)
+        )
+        return stats
+
+
+class KrylovStart(Equation):
+    """Start the solve from the product ``kaq = A kx`` computed in the
+    post loop of a previous equation of the group.
+    """
+    def __init__(self, dest, sources, state):
+        self.state = state
+        super(KrylovStart, self).__init__(dest, sources)
+
+    def post_loop(self, d_idx, d_kb, d_kaq, d_kr, d_kr0, d_kp, d_kv, d_ks,
+                  d_kt):
+        d_kr[d_idx] = d_kb[d_idx] - d_kaq[d_idx]
+        d_kr0[d_idx] = d_kr[d_idx]
+        d_kp[d_idx] = 0.0
+        d_kv[d_idx] = 0.0
+        d_ks[d_idx] = 0.0
+        d_kt[d_idx] = 0.0
+
+    def reduce(self, dst, t, dt):
+        self.state.reduce(0, dst, parallel_reduce_array)
+
+
+class KrylovDirection(Equation):
+    """The new search direction, ``p = r + beta (p - omega v)``, which is
+    also the next vector to multiply.
+    """
+    def post_loop(self, d_idx, d_kr, d_kp, d_kv, d_kq, d_krylov):
+        d_kp[d_idx] = d_kr[d_idx] + d_krylov[2]*(
+            d_kp[d_idx] - d_krylov[1]*d_kv[d_idx]
+        )
+        d_kq[d_idx] = d_kp[d_idx]
+
+
+class KrylovReduceV(Equation):
+    """Store ``v = A p`` and reduce its dot products."""
+    def __init__(self, dest, sources, state):
+        self.state = state
+        super(KrylovReduceV, self).__init__(dest, sources)
+
+    def post_loop(self, d_idx, d_kaq, d_kv):
+        d_kv[d_idx] = d_kaq[d_idx]
+
+    def reduce(self, dst, t, dt):
+        self.state.reduce(1, dst, parallel_reduce_array)
+
+
+class KrylovStep(Equation):
+    """The intermediate residual, ``s = r - alpha v``, which is also the
+    next vector to multiply.
+    """
+    def post_loop(self, d_idx, d_kr, d_kv, d_ks, d_kq, d_krylov):
+        d_ks[d_idx] = d_kr[d_idx] - d_krylov[0]*d_kv[d_idx]
+        d_kq[d_idx] = d_ks[d_idx]
+
+
+class KrylovReduceT(Equation):
+    """Store ``t = A s`` and reduce its dot products."""
+    def __init__(self, dest, sources, state):
+        self.state = state
+        super(KrylovReduceT, self).__init__(dest, sources)
+
+    def post_loop(self, d_idx, d_kaq, d_kt):
+        d_kt[d_idx] = d_kaq[d_idx]
+
+    def reduce(self, dst, t, dt):
+        self.state.reduce(2, dst, parallel_reduce_array)
+
+
+class KrylovUpdate(Equation):
+    """Update the unknown, ``x += alpha p + omega s``, and the residual,
+    ``r = s - omega t``.
+    """
+    def __init__(self, dest, sources, state):
+        self.state = state
+        super(KrylovUpdate, self).__init__(dest, sources)
+
+    def post_loop(self, d_idx, d_kx, d_kr, d_kp, d_ks, d_kt, d_krylov):
+        d_kx[d_idx] += d_krylov[0]*d_kp[d_idx] + d_krylov[1]*d_ks[d_idx]
+        d_kr[d_idx] = d_ks[d_idx] - d_krylov[1]*d_kt[d_idx]
+
+    def reduce(self, dst, t, dt):
+        self.state.reduce(3, dst, parallel_reduce_array)
+
+    def converged(self):
+        return self.state.converged()
+
+
+def get_krylov_groups(state, start, matvec):
+    """Return the groups solving the linear system with the method of the
+    `state`.
+
+    Parameters
+    ----------
+
+    state: KrylovState: the state of the solver.
+    start: callable: called with a list of equations returns the groups that
+        set ``kx``, ``kb`` and ``kaq = A kx`` of the destinations, the
+        equations must be added at the end of the last group.
+    matvec: callable: called with a list of equations returns the groups
+        computing ``kaq = A kq``, the equations must be added at the end of
+        the last group.
+    """
+    dests = state.dests
+
+    def _eqs(cls, **kw):
+        return [cls(dest=d, sources=None, **kw) for d in dests]
+
+    solver = [Group(equations=_eqs(KrylovDirection))]
+    solver.extend(matvec(_eqs(KrylovReduceV, state=state)))
+    if state.method == 'cg':
+        # With omega zero the update is that of CG.
+        solver.append(Group(
+            equations=_eqs(KrylovStep) + _eqs(KrylovUpdate, state=state)
+        ))
+    else:
+        solver.append(Group(equations=_eqs(KrylovStep)))
+        solver.extend(matvec(_eqs(KrylovReduceT, state=state)))
+        solver.append(Group(equations=_eqs(KrylovUpdate, state=state)))
+
+    groups = list(start(_eqs(KrylovStart, state=state)))
+    groups.append(
+        Group(equations=solver, iterate=True,
+              max_iterations=state.max_iterations, min_iterations=1)
+    )
+    return groups
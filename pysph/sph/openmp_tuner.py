@@ -0,0 +1,276 @@
+"""Choose the number of OpenMP threads and the schedule of each loop.
+
+Small particle arrays (boundaries, probes) are often processed faster by a
+few threads than by all of them and the best schedule depends on how uneven
+the work per particle is.  When an
+:py:class:`pysph.sph.acceleration_eval.AccelerationEval` is created with
+``tune_openmp=True`` the parallel loops of each destination phase
+(``initialize``, ``loop``, the source loops and ``post_loop``) read their
+thread count and OpenMP schedule from arrays that can be changed at runtime.
+
+The :py:class:`OpenMPTuner` uses the timers of the
+:py:class:`pysph.sph.equation_profiler.EquationProfiler` to time the first
+few time steps.  It first tries each thread count with the default schedule
+and then each schedule with the best thread count of each phase, after
+which the fastest configuration of each phase is kept.  The number of
+threads used to update the NNPS is tuned along with the thread counts.
+
+This is enabled for a simulation with the ``--openmp-tune`` command line
+option and the chosen configuration is saved in the ``.info`` file.
+"""
+
+import logging
+
+from pysph.base.nnps import get_number_of_threads
+from pysph.sph.acceleration_eval_cython_helper import OMP_SCHEDULES
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_NAMES = dict((v, k) for k, v in OMP_SCHEDULES.items())
+
+DEFAULT_SCHEDULES = [
+    ('static', 0), ('dynamic', 16), ('dynamic', 64), ('dynamic', 256),
+    ('guided', 0)
+]
+
+
+def get_default_thread_counts(max_threads=None):
+    """Return the powers of two up to and including the maximum number of
+    threads.
+    """
+    if max_threads is None:
+        max_threads = get_number_of_threads()
+    counts = set([max_threads])
+    n = 1
+    while n < max_threads:
+        counts.add(n)
+        n *= 2
+    return sorted(counts)
+
+
+class _Loop(object):
+    """A tunable region of an acceleration evaluator."""
+    def __init__(self, name, c_eval, index, size):
+        self.name = name
+        self.c_eval = c_eval
+        self.index = index
+        self.size = size
+        # Time per call for each (threads, schedule, chunksize) tried.
+        self.times = {}
+        self.threads = None
+
+    def set_config(self, threads, schedule, chunksize):
+        c_eval = self.c_eval
+        c_eval._omp_threads[self.index] = threads
+        c_eval._omp_kind[self.index] = OMP_SCHEDULES[schedule]
+        c_eval._omp_chunk[self.index] = chunksize
+
+    def get_config(self):
+        c_eval = self.c_eval
+        return (
+            c_eval._omp_threads[self.index],
+            SCHEDULE_NAMES[c_eval._omp_kind[self.index]],
+            c_eval._omp_chunk[self.index]
+        )
+
+    def get_counters(self):
+        c_eval = self.c_eval
+        return (c_eval._prof_time[self.index],
+                c_eval._prof_calls[self.index])
+
+
+def _get_fastest(times, default):
+    if not times:
+        return default
+    return min(times, key=times.get)
+
+
+class OpenMPTuner(object):
+    """Tune the thread counts and schedules of the parallel loops of the
+    acceleration evaluators during the first time steps.
+
+    Call :py:meth:`begin_step` and :py:meth:`end_step` around each time
+    step, the tuning is complete once :py:attr:`done` is True.
+    """
+    def __init__(self, profiler, integrator=None, thread_counts=None,
+                 schedules=None, steps_per_config=2, warmup_steps=1):
+        """
+        Parameters
+        ----------
+
+        profiler: EquationProfiler: the profiler of the acceleration
+            evaluators, these must have been created with `tune_openmp`.
+        integrator: Integrator: the integrator, if given the number of
+            threads used to update the NNPS is also tuned.
+        thread_counts: list: the thread counts to try, the default is the
+            powers of two up to the maximum number of threads.
+        schedules: list: the (schedule, chunksize) pairs to try.
+        steps_per_config: int: number of time steps for each configuration.
+        warmup_steps: int: number of time steps before timing.
+        """
+        self.profiler = profiler
+        self.integrator = integrator
+        self.max_threads = get_number_of_threads()
+        if thread_counts is None:
+            thread_counts = get_default_thread_counts(self.max_threads)
+        self.thread_counts = sorted(
+            set(min(max(int(n), 1), self.max_threads) for n in thread_counts)
+        )
+        self.schedules = list(
+            DEFAULT_SCHEDULES if schedules is None else schedules
+        )
+        self.steps_per_config = steps_per_config
+        self.warmup_steps = warmup_steps
+        self.loops = self._get_loops()
+        self.nnps_times = {}
+        self.nnps_threads = None
+        self.done = len(self.loops) == 0
+        if self.loops:
+            schedule = self.loops[0].get_config()[1:]
+        else:
+            schedule = self.schedules[0]
+        # First each thread count with the default schedule and then each
+        # schedule with the fastest thread count of each loop.
+        self._stage = 'threads'
+        self._configs = [(n, ) + schedule for n in self.thread_counts]
+        self._config_idx = -1
+        self._step = 0
+        self._start = None
+
+    def _get_loops(self):
+        loops = []
+        for name, a_eval in self.profiler.get_acceleration_evals():
+            if not a_eval.tune_openmp:
+                continue
+            c_eval = a_eval.c_acceleration_eval
+            if not hasattr(c_eval, '_omp_threads'):
+                # The code was generated without OpenMP.
+                continue
+            arrays = dict((pa.name, pa) for pa in a_eval.particle_arrays)
+            for idx, info in enumerate(a_eval.profile_regions):
+                if not info['tunable']:
+                    continue
+                dest = [p[5:] for p in info['path'] if p.startswith('dest:')]
+                size = arrays[dest[0]].get_number_of_particles()
+                loops.append(_Loop(
+                    ';'.join([name] + info['path']), c_eval, idx, size
+                ))
+        return loops
+
+    def _apply(self, config):
+        threads, schedule, chunksize = config
+        for loop in self.loops:
+            n = loop.threads if threads is None else threads
+            loop.set_config(n, schedule, chunksize)
+        if self._stage == 'threads' and self.integrator is not None:
+            self.integrator.set_nnps_threads(threads)
+
+    def _snapshot(self):
+        nnps = self.profiler.get_timer('nnps_update')
+        return [loop.get_counters() for loop in self.loops], nnps
+
+    def _record(self):
+        counters, nnps = self._snapshot()
+        start, nnps_start = self._start
+        for loop, (t, calls), (t0, calls0) in zip(self.loops, counters,
+                                                 start):
+            if calls > calls0:
+                loop.times[loop.get_config()] = (t - t0)/(calls - calls0)
+        if self._stage == 'threads' and nnps[1] > nnps_start[1]:
+            threads = self._configs[self._config_idx][0]
+            self.nnps_times[threads] = (
+                (nnps[0] - nnps_start[0])/(nnps[1] - nnps_start[1])
+            )
+
+    def _choose_threads(self):
+        for loop in self.loops:
+            loop.threads = _get_fastest(loop.times, loop.get_config())[0]
+        if self.nnps_times:
+            self.nnps_threads = _get_fastest(self.nnps_times, None)
+
+    def _next_config(self):
+        self._config_idx += 1
+        if self._config_idx == len(self._configs):
+            if self._stage == 'threads':
+                self._choose_threads()
+                self._stage = 'schedules'
+                self._configs = [(None, ) + tuple(schedule)
+                                 for schedule in self.schedules]
+                self._config_idx = 0
+            else:
+                self.finish()
+                return
+        self._apply(self._configs[self._config_idx])
+
+    def begin_step(self):
+        """Call before each time step."""
+        if self.done or self._step < self.warmup_steps:
+            return
+        if (self._step - self.warmup_steps) % self.steps_per_config == 0:
+            if self._config_idx < 0:
+                self._next_config()
+            self._start = self._snapshot()
+
+    def end_step(self):
+        """Call after each time step."""
+        if self.done:
+            return
+        self._step += 1
+        if self._step <= self.warmup_steps:
+            return
+        if (self._step - self.warmup_steps) % self.steps_per_config == 0:
+            self._record()
+            self._next_config()
+
+    def finish(self):
+        """Set the fastest configuration of each loop found with the
+        timings collected so far.
+        """
+        if self.done:
+            return
+        if self._stage == 'threads':
+            self._choose_threads()
+        for loop in self.loops:
+            times = dict(
+                (config, t) for config, t in loop.times.items()
+                if config[0] == loop.threads
+            )
+            loop.set_config(*_get_fastest(times, loop.get_config()))
+        if self.integrator is not None:
+            self.integrator.set_nnps_threads(self.nnps_threads)
+        self.done = True
+        logger.info(self.get_summary())
+
+    def get_report(self):
+        """Return the configuration of each loop and the times measured as
+        a dictionary that can be saved as JSON.
+        """
+        loops = []
+        for loop in self.loops:
+            threads, schedule, chunksize = loop.get_config()
+            times = [
+                dict(threads=int(k[0]), schedule=k[1], chunksize=int(k[2]),
+                     time=t) for k, t in sorted(loop.times.items())
+            ]
+            loops.append(dict(
+                name=loop.name, size=loop.size, threads=int(threads),
+                schedule=schedule, chunksize=int(chunksize), times=times
+            ))
+        nnps_threads = self.nnps_threads
+        return dict(
+            done=self.done, max_threads=self.max_threads,
+            nnps_threads=None if nnps_threads is None else int(nnps_threads),
+            loops=loops
+        )
+
+    def get_summary(self):
+        lines = ['OpenMP configuration (max %d threads):' % self.max_threads]
+        if self.nnps_threads is not None:
+            lines.append('  %-60s %3d threads' % ('nnps_update',
+                                                  self.nnps_threads))
+        for loop in self.loops:
+            threads, schedule, chunksize = loop.get_config()
+            lines.append('  %-60s %3d threads %s,%d (%d particles)' % (
+                loop.name, threads, schedule, chunksize, loop.size
+            ))
+        return '\n'.join(lines)
@@ -2,6 +2,7 @@
 one can define a scheme and thereafter one simply instantiates a suitable
 scheme, gives it a bunch of particles and runs the application.
 """
+from pysph.base.utils import set_single_precision
 
 
 class Scheme(object):
@@ -9,6 +10,11 @@ class Scheme(object):
     """An API for an SPH scheme.
     """
 
+    #: Properties stored in single precision by `setup_properties`, see
+    #: :py:func:`pysph.base.utils.set_single_precision`.  This may be set
+    #: using `configure`.
+    single_precision_props = ()
+
     def __init__(self, fluids, solids, dim):
         """
         Parameters
@@ -130,6 +136,9 @@ class Scheme(object):
         for prop in to_add:
             pa.add_property(**all_props[prop])
 
+        if self.single_precision_props:
+            set_single_precision([pa], self.single_precision_props)
+
     def _smart_getattr(self, obj, var):
         res = getattr(obj, var)
         if res is None:
@@ -219,7 +228,8 @@ class WCSPHScheme(Scheme):
     def __init__(self, fluids, solids, dim, rho0, c0, h0, hdx, gamma=7.0,
                  gx=0.0, gy=0.0, gz=0.0, alpha=0.1, beta=0.0, delta=0.1,
                  nu=0.0, tensile_correction=False, hg_correction=False,
-                 update_h=False, delta_sph=False, summation_density=False):
+                 update_h=False, delta_sph=False, summation_density=False,
+                 pairwise=False):
         """Parameters
         ----------
 
@@ -259,6 +269,11 @@ class WCSPHScheme(Scheme):
             Use the delta-SPH correction terms.
         summation_density: bool
             Use summation density instead of continuity.
+        pairwise: bool
+            Visit each pair of fluid particles only once in the summation
+            density and the acceleration groups, see the `pairwise` option
+            of :py:class:`pysph.sph.equation.Group`.  The delta-SPH terms
+            do not support this and use the usual loop.
 
         References
         ----------
@@ -297,6 +312,7 @@ class WCSPHScheme(Scheme):
         self.update_h = update_h
         self.delta_sph = delta_sph
         self.summation_density = summation_density
+        self.pairwise = pairwise
 
     def add_user_options(self, group):
         group.add_argument(
@@ -344,11 +360,16 @@ class WCSPHScheme(Scheme):
             help="Use summation density instead of continuity.",
             default=None
         )
+        add_bool_argument(
+            group, "pairwise", dest="pairwise",
+            help="Visit each pair of fluid particles only once.",
+            default=None
+        )
 
     def consume_user_options(self, options):
         vars = ['gamma', 'tensile_correction', 'hg_correction',
                 'update_h', 'delta_sph', 'alpha', 'beta',
-                'summation_density']
+                'summation_density', 'pairwise']
 
         data = dict((var, self._smart_getattr(options, var))
                     for var in vars)
@@ -409,7 +430,9 @@ class WCSPHScheme(Scheme):
             g0 = []
             for name in self.fluids:
                 g0.append(SummationDensity(dest=name, sources=all))
-            equations.append(Group(equations=g0, real=False))
+            equations.append(
+                Group(equations=g0, real=False, pairwise=self.pairwise)
+            )
 
         for name in self.fluids:
             g1.append(TaitEOS(
@@ -493,7 +516,7 @@ class WCSPHScheme(Scheme):
                         dest=name, sources=all, nu=self.nu
                     )
                 g2.insert(-1, eq)
-        equations.append(Group(equations=g2))
+        equations.append(Group(equations=g2, pairwise=self.pairwise))
 
         if self.update_h:
             g3 = [
@@ -524,7 +547,8 @@ class WCSPHScheme(Scheme):
 
 class TVFScheme(Scheme):
     def __init__(self, fluids, solids, dim, rho0, c0, nu, p0, pb, h0,
-                 gx=0.0, gy=0.0, gz=0.0, alpha=0.0, tdamp=0.0):
+                 gx=0.0, gy=0.0, gz=0.0, alpha=0.0, tdamp=0.0,
+                 pairwise=False):
         self.fluids = fluids
         self.solids = solids
         self.solver = None
@@ -540,6 +564,7 @@ class TVFScheme(Scheme):
         self.gz = gz
         self.alpha = alpha
         self.tdamp = 0.0
+        self.pairwise = pairwise
 
     def add_user_options(self, group):
         group.add_argument(
@@ -552,9 +577,14 @@ class TVFScheme(Scheme):
             default=None,
             help="Time for which the accelerations are damped."
         )
+        add_bool_argument(
+            group, "pairwise", dest="pairwise",
+            help="Visit each pair of fluid particles only once.",
+            default=None
+        )
 
     def consume_user_options(self, options):
-        vars = ['alpha', 'tdamp']
+        vars = ['alpha', 'tdamp', 'pairwise']
         data = dict((var, self._smart_getattr(options, var))
                     for var in vars)
         self.configure(**data)
@@ -622,7 +652,10 @@ class TVFScheme(Scheme):
         for fluid in self.fluids:
             g1.append(SummationDensity(dest=fluid, sources=all))
 
-        equations.append(Group(equations=g1, real=False))
+        equations.append(Group(
+            equations=g1, real=False, cache_pair_data=True,
+            pairwise=self.pairwise
+        ))
 
         g2 = []
         for fluid in self.fluids:
@@ -633,7 +666,9 @@ class TVFScheme(Scheme):
             g2.append(SetWallVelocity(dest=solid, sources=self.fluids))
 
         if len(g2) > 0:
-            equations.append(Group(equations=g2, real=False))
+            equations.append(Group(
+                equations=g2, real=False, cache_pair_data=True
+            ))
 
         g3 = []
         for solid in self.solids:
@@ -643,7 +678,9 @@ class TVFScheme(Scheme):
             ))
 
         if len(g3) > 0:
-            equations.append(Group(equations=g3, real=False))
+            equations.append(Group(
+                equations=g3, real=False, cache_pair_data=True
+            ))
 
         g4 = []
         for fluid in self.fluids:
@@ -678,7 +715,9 @@ class TVFScheme(Scheme):
                     dest=fluid, sources=self.fluids)
             )
 
-        equations.append(Group(equations=g4))
+        equations.append(Group(
+            equations=g4, cache_pair_data=True, pairwise=self.pairwise
+        ))
         return equations
 
     def setup_properties(self, particles, clean=True):
@@ -715,7 +754,7 @@ class AdamiHuAdamsScheme(TVFScheme):
     """
     def __init__(self, fluids, solids, dim, rho0, c0, nu, h0,
                  gx=0.0, gy=0.0, gz=0.0, p0=0.0, gamma=7.0,
-                 tdamp=0.0, alpha=0.0):
+                 tdamp=0.0, alpha=0.0, pairwise=False):
         self.fluids = fluids
         self.solids = solids
         self.solver = None
@@ -731,6 +770,7 @@ class AdamiHuAdamsScheme(TVFScheme):
         self.alpha = alpha
         self.gamma = float(gamma)
         self.tdamp = tdamp
+        self.pairwise = pairwise
         self.attributes_changed()
 
     def add_user_options(self, group):
@@ -745,7 +785,7 @@ class AdamiHuAdamsScheme(TVFScheme):
         self.B = self.c0*self.c0*self.rho0/self.gamma
 
     def consume_user_options(self, options):
-        vars = ['alpha', 'tdamp', 'gamma']
+        vars = ['alpha', 'tdamp', 'gamma', 'pairwise']
         data = dict((var, self._smart_getattr(options, var))
                     for var in vars)
         self.configure(**data)
@@ -815,7 +855,7 @@ class AdamiHuAdamsScheme(TVFScheme):
             g2.append(VolumeSummation(dest=solid, sources=all))
             g2.append(SetWallVelocity(dest=solid, sources=self.fluids))
 
-        equations.append(Group(equations=g2, real=False))
+        equations.append(Group(equations=g2, real=False, cache_pair_data=True))
 
         g3 = []
         for solid in self.solids:
@@ -824,7 +864,7 @@ class AdamiHuAdamsScheme(TVFScheme):
                 p0=self.B, gx=self.gx, gy=self.gy, gz=self.gz
             ))
 
-        equations.append(Group(equations=g3, real=False))
+        equations.append(Group(equations=g3, real=False, cache_pair_data=True))
 
         g4 = []
         for fluid in self.fluids:
@@ -862,7 +902,9 @@ class AdamiHuAdamsScheme(TVFScheme):
                     )
             g4.append(XSPHCorrection(dest=fluid, sources=[fluid]))
 
-        equations.append(Group(equations=g4))
+        equations.append(Group(
+            equations=g4, cache_pair_data=True, pairwise=self.pairwise
+        ))
         return equations
 
     def setup_properties(self, particles, clean=True):
@@ -1140,7 +1182,7 @@ class GSPHScheme(Scheme):
     def __init__(self, fluids, solids, dim, gamma, kernel_factor, g1=0.0,
                  g2=0.0, rsolver=2, interpolation=1, monotonicity=1,
                  interface_zero=True, hybrid=False, blend_alpha=5.0, tf=1.0,
-                 niter=20, tol=1e-6, has_ghosts=False):
+                 niter=20, tol=1e-6, has_ghosts=False, riemann_batch=False):
         """
         Parameters
         ----------
@@ -1180,6 +1222,10 @@ class GSPHScheme(Scheme):
             Tolerance for iterative Riemann solvers.
         has_ghosts: bool
             if ghost particles (either mirror or periodic) is used
+        riemann_batch: bool
+            Solve the Riemann problems of the neighbors of a particle in
+            batches, see
+            :py:class:`pysph.sph.gas_dynamics.gsph.GSPHAccelerationBatch`.
         """
         self.fluids = fluids
         self.solids = solids
@@ -1199,6 +1245,7 @@ class GSPHScheme(Scheme):
         self.niter = niter
         self.tol = tol
         self.has_ghosts = has_ghosts
+        self.riemann_batch = riemann_batch
 
     def add_user_options(self, group):
         group.add_argument(
@@ -1246,11 +1293,16 @@ class GSPHScheme(Scheme):
             help="Use the hybrid scheme.",
             default=None
         )
+        add_bool_argument(
+            group, "riemann-batch", dest="riemann_batch",
+            help="Solve the Riemann problems of each particle in batches.",
+            default=None
+        )
 
     def consume_user_options(self, options):
         vars = ['gamma', 'g1', 'g2', 'rsolver', 'interpolation',
                 'monotonicity', 'interface_zero', 'hybrid',
-                'blend_alpha']
+                'blend_alpha', 'riemann_batch']
         data = dict((var, self._smart_getattr(options, var))
                     for var in vars)
         self.configure(**data)
@@ -1306,7 +1358,8 @@ class GSPHScheme(Scheme):
         )
         from pysph.sph.gas_dynamics.boundary_equations import WallBoundary
         from pysph.sph.gas_dynamics.gsph import (
-            GSPHGradients, GSPHAcceleration, GSPHUpdateGhostProps
+            GSPHGradients, GSPHAcceleration, GSPHAccelerationBatch,
+            GSPHUpdateGhostProps
         )
         equations = []
         # Find the optimal 'h'
@@ -1382,9 +1435,13 @@ class GSPHScheme(Scheme):
                 equations=g3, update_nnps=False, real=False
                 ))
 
+        if self.riemann_batch:
+            acceleration = GSPHAccelerationBatch
+        else:
+            acceleration = GSPHAcceleration
         g4 = []
         for fluid in self.fluids:
-            g4.append(GSPHAcceleration(
+            g4.append(acceleration(
                 dest=fluid, sources=all_pa, g1=self.g1,
                 g2=self.g2, monotonicity=self.monotonicity,
                 rsolver=self.rsolver, interpolation=self.interpolation,
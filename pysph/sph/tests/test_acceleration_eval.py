@@ -11,19 +11,22 @@ import numpy as np
 
 # Local imports.
 from pysph.base.utils import get_particle_array
-from compyle.config import get_config
+from compyle.config import get_config, set_config
 from compyle.api import declare
 from pysph.sph.equation import Equation, Group
 from pysph.sph.acceleration_eval import (
     AccelerationEval, MegaGroup, CythonGroup,
-    check_equation_array_properties
+    check_equation_array_properties, get_work_arrays
+)
+from pysph.sph.basic_equations import (
+    ContinuityEquation, MonaghanArtificialViscosity, SummationDensity
 )
-from pysph.sph.basic_equations import SummationDensity
 from pysph.base.kernels import CubicSpline
 from pysph.base.nnps import LinkedListNNPS as NNPS
 from pysph.sph.sph_compiler import SPHCompiler
 
 from pysph.base.reduce_array import serial_reduce_array
+from cyarray.carray import DoubleArray
 
 
 class DummyEquation(Equation):
@@ -47,6 +50,18 @@ class FindTotalMass(Equation):
         d_total_mass[0] += d_m[d_idx]
 
 
+class WorkArrayEquation(Equation):
+    def __init__(self, dest, sources):
+        self.work = DoubleArray(4)
+        super(WorkArrayEquation, self).__init__(dest, sources)
+
+    def _get_work_arrays_(self):
+        return dict(work=self.work)
+
+    def post_loop(self, d_idx, d_V, d_work):
+        d_work[d_idx] = d_V[d_idx]
+
+
 class TestCheckEquationArrayProps(unittest.TestCase):
     def test_should_raise_runtime_error_when_invalid_dest_source(self):
         # Given
@@ -136,6 +151,34 @@ class TestCheckEquationArrayProps(unittest.TestCase):
         # Then.
         check_equation_array_properties(eq, [f])
 
+    def test_should_check_work_arrays(self):
+        # Given
+        f = get_particle_array(name='f')
+        f.add_property('V')
+        eq = WorkArrayEquation(dest='f', sources=['f'])
+
+        # When
+        work_arrays = get_work_arrays([eq])
+
+        # Then
+        self.assertEqual(list(work_arrays['f']), ['work'])
+        check_equation_array_properties(eq, [f], work_arrays=work_arrays)
+        self.assertRaises(RuntimeError,
+                          check_equation_array_properties, eq, [f])
+
+        # When
+        other = WorkArrayEquation(dest='f', sources=['f'])
+
+        # Then
+        self.assertRaises(ValueError, get_work_arrays, [eq, other])
+
+        # When
+        f.add_constant('work', [0.0])
+
+        # Then
+        self.assertRaises(RuntimeError, check_equation_array_properties,
+                          eq, [f], work_arrays=work_arrays)
+
 
 class SimpleEquation(Equation):
     def __init__(self, dest, sources):
@@ -280,7 +323,7 @@ class TestMegaGroup(unittest.TestCase):
         g = Group(
             equations=[], real=False, update_nnps=True, iterate=True,
             max_iterations=20, min_iterations=2, pre=nothing, post=nothing,
-            start_idx=1, stop_idx=2
+            start_idx=1, stop_idx=2, cache_pair_data=True
         )
 
         # When
@@ -288,7 +331,8 @@ class TestMegaGroup(unittest.TestCase):
 
         # Then
         props = ('real update_nnps iterate max_iterations condition '
-                 'min_iterations pre post start_idx stop_idx').split()
+                 'min_iterations pre post start_idx stop_idx '
+                 'pairwise cache_pair_data').split()
         for prop in props:
             self.assertEqual(getattr(mg, prop), getattr(g, prop))
 
@@ -639,6 +683,330 @@ class TestAccelerationEval1D(unittest.TestCase):
         self.assertListEqual(list(pa.au), list(expect))
 
 
+class BadLoopPair(Equation):
+    def loop(self, d_idx, d_au, s_idx, s_m):
+        d_au[d_idx] += s_m[s_idx]
+
+    def loop_pair(self, d_idx, d_au, s_idx, s_au, s_m):
+        d_au[d_idx] += s_m[s_idx]
+        s_au[s_idx] = 1.0
+
+
+class TestPairwiseGroup(unittest.TestCase):
+    def setUp(self):
+        self.orig_openmp = get_config().use_openmp
+
+    def tearDown(self):
+        set_config(None)
+        get_config().use_openmp = self.orig_openmp
+
+    def _make_particles(self):
+        np.random.seed(123)
+        n = 400
+        x, y = np.random.random((2, n))
+        u, v = np.random.random((2, n)) - 0.5
+        h = 0.06 + 0.02*np.random.random(n)
+        m = 1.0 + np.random.random(n)
+        pa = get_particle_array(
+            name='fluid', x=x, y=y, u=u, v=v, h=h, m=m, rho=1.0, cs=1.0
+        )
+        pa.add_property('arho')
+        return pa
+
+    def _compute(self, pairwise):
+        pa = self._make_particles()
+        equations = [
+            Group(equations=[
+                SummationDensity(dest='fluid', sources=['fluid']),
+            ], pairwise=pairwise),
+            Group(equations=[
+                ContinuityEquation(dest='fluid', sources=['fluid']),
+                MonaghanArtificialViscosity(dest='fluid', sources=['fluid'])
+            ], pairwise=pairwise)
+        ]
+        kernel = CubicSpline(dim=2)
+        a_eval = AccelerationEval(
+            particle_arrays=[pa], equations=equations, kernel=kernel
+        )
+        comp = SPHCompiler(a_eval, integrator=None)
+        comp.compile()
+        nnps = NNPS(dim=kernel.dim, particles=[pa])
+        a_eval.set_nnps(nnps)
+        a_eval.compute(0.0, 0.1)
+        return pa
+
+    def _check_pairwise_matches_full_loop(self):
+        # Given
+        expect = self._compute(pairwise=False)
+
+        # When
+        pa = self._compute(pairwise=True)
+
+        # Then
+        for prop in ('rho', 'arho', 'au', 'av'):
+            np.testing.assert_allclose(
+                getattr(pa, prop), getattr(expect, prop), atol=1e-12,
+                rtol=1e-10
+            )
+
+    def test_pairwise_group_matches_full_loop(self):
+        get_config().use_openmp = False
+        self._check_pairwise_matches_full_loop()
+
+    def test_pairwise_group_matches_full_loop_with_openmp(self):
+        get_config().use_openmp = True
+        self._check_pairwise_matches_full_loop()
+
+    def test_pairwise_group_does_not_allow_start_stop_idx(self):
+        eq = SummationDensity(dest='fluid', sources=['fluid'])
+        self.assertRaises(
+            ValueError, Group, equations=[eq], pairwise=True, stop_idx=10
+        )
+        self.assertRaises(
+            ValueError, Group, equations=[eq], pairwise=True, start_idx=1
+        )
+
+    def test_loop_pair_should_only_accumulate_into_source(self):
+        # Given
+        g = Group(
+            equations=[BadLoopPair(dest='fluid', sources=['fluid'])],
+            pairwise=True
+        )
+
+        # When/Then
+        self.assertRaises(ValueError, g.get_pair_accumulators)
+
+    def test_pair_accumulators(self):
+        # Given
+        g = Group(equations=[
+            SummationDensity(dest='fluid', sources=['fluid']),
+            MonaghanArtificialViscosity(dest='fluid', sources=['fluid'])
+        ], pairwise=True)
+
+        # When
+        props = g.get_pair_accumulators()
+
+        # Then
+        self.assertTrue(g.has_loop_pair())
+        self.assertEqual(props, ['au', 'av', 'aw', 'rho'])
+
+
+class KernelDerivatives(Equation):
+    def initialize(self, d_idx, d_au, d_av, d_aw, d_arho):
+        d_au[d_idx] = 0.0
+        d_av[d_idx] = 0.0
+        d_aw[d_idx] = 0.0
+        d_arho[d_idx] = 0.0
+
+    def loop(self, d_idx, s_idx, s_m, d_au, d_av, d_aw, d_arho, WIJ, DWIJ,
+             WDASHIJ, GHI):
+        d_au[d_idx] += s_m[s_idx] * DWIJ[0]
+        d_av[d_idx] += s_m[s_idx] * DWIJ[1]
+        d_aw[d_idx] += s_m[s_idx] * (WDASHIJ + GHI)
+        d_arho[d_idx] += s_m[s_idx] * WIJ
+
+
+class TestFusedKernelCalls(unittest.TestCase):
+    def tearDown(self):
+        Group.fuse_kernel_calls = True
+
+    def _compute(self, fuse):
+        Group.fuse_kernel_calls = fuse
+        np.random.seed(123)
+        n = 200
+        x, y = np.random.random((2, n))
+        h = 0.06 + 0.02*np.random.random(n)
+        pa = get_particle_array(name='fluid', x=x, y=y, h=h, m=1.0)
+        pa.add_property('arho')
+        equations = [KernelDerivatives(dest='fluid', sources=['fluid'])]
+        kernel = CubicSpline(dim=2)
+        a_eval = AccelerationEval(
+            particle_arrays=[pa], equations=equations, kernel=kernel
+        )
+        comp = SPHCompiler(a_eval, integrator=None)
+        comp.compile()
+        nnps = NNPS(dim=kernel.dim, particles=[pa])
+        a_eval.set_nnps(nnps)
+        a_eval.compute(0.0, 0.1)
+        group = a_eval.mega_groups[0].data['fluid'][1]['fluid']
+        return pa, list(group.precomputed.keys())
+
+    def test_fused_kernel_calls_match_separate_calls(self):
+        # Given
+        expect, pre = self._compute(fuse=False)
+        self.assertIn('WIJ', pre)
+        self.assertIn('DWIJ', pre)
+
+        # When
+        pa, pre = self._compute(fuse=True)
+
+        # Then
+        self.assertIn('WDERIVIJ', pre)
+        self.assertNotIn('WIJ', pre)
+        self.assertNotIn('DWIJ', pre)
+        # Only one symbol for d_h is needed so it is not fused.
+        self.assertIn('GHI', pre)
+        self.assertNotIn('WDERIVI', pre)
+        for prop in ('au', 'av', 'aw', 'arho'):
+            np.testing.assert_allclose(
+                getattr(pa, prop), getattr(expect, prop), rtol=1e-14
+            )
+
+
+class MoveParticles(Equation):
+    def post_loop(self, d_idx, d_x, d_u):
+        d_x[d_idx] += 0.01*d_u[d_idx]
+
+
+class TestPairDataCache(unittest.TestCase):
+    def setUp(self):
+        self.orig_openmp = get_config().use_openmp
+
+    def tearDown(self):
+        set_config(None)
+        get_config().use_openmp = self.orig_openmp
+
+    def _make_equations(self, cache, move=False):
+        equations = [
+            Group(equations=[
+                SummationDensity(dest='fluid', sources=['fluid']),
+            ], cache_pair_data=cache),
+            Group(equations=[
+                ContinuityEquation(dest='fluid', sources=['fluid']),
+                MonaghanArtificialViscosity(dest='fluid', sources=['fluid'])
+            ], cache_pair_data=cache),
+            Group(equations=[
+                KernelDerivatives(dest='fluid', sources=['fluid'])
+            ], cache_pair_data=cache)
+        ]
+        if move:
+            equations.insert(
+                2, Group(equations=[MoveParticles(dest='fluid', sources=None)])
+            )
+        return equations
+
+    def _compute(self, cache, move=False, use_pair_cache=True):
+        np.random.seed(123)
+        n = 400
+        x, y = np.random.random((2, n))
+        u, v = np.random.random((2, n)) - 0.5
+        h = 0.06 + 0.02*np.random.random(n)
+        pa = get_particle_array(
+            name='fluid', x=x, y=y, u=u, v=v, h=h, m=1.0, rho=1.0, cs=1.0
+        )
+        pa.add_property('arho')
+        kernel = CubicSpline(dim=2)
+        a_eval = AccelerationEval(
+            particle_arrays=[pa], equations=self._make_equations(cache, move),
+            kernel=kernel
+        )
+        comp = SPHCompiler(a_eval, integrator=None)
+        comp.compile()
+        nnps = NNPS(dim=kernel.dim, particles=[pa])
+        nnps.set_use_pair_cache(use_pair_cache)
+        a_eval.set_nnps(nnps)
+        a_eval.compute(0.0, 0.1)
+        return pa, nnps
+
+    def _check_cache_matches_no_cache(self, move=False):
+        # Given
+        expect, nnps = self._compute(cache=False, move=move)
+        empty = nnps.get_pair_cache(0, 0).get_memory_usage()
+
+        # When
+        pa, nnps = self._compute(cache=True, move=move)
+
+        # Then
+        pair_cache = nnps.get_pair_cache(0, 0)
+        self.assertTrue(pair_cache.valid)
+        self.assertTrue(pair_cache.get_memory_usage() > empty)
+        for prop in ('x', 'rho', 'arho', 'au', 'av', 'aw'):
+            np.testing.assert_allclose(
+                getattr(pa, prop), getattr(expect, prop), atol=1e-12,
+                rtol=1e-12
+            )
+
+    def test_cached_pair_data_matches_no_cache(self):
+        get_config().use_openmp = False
+        self._check_cache_matches_no_cache()
+
+    def test_cached_pair_data_matches_no_cache_with_openmp(self):
+        get_config().use_openmp = True
+        self._check_cache_matches_no_cache()
+
+    def test_cache_is_invalidated_by_groups_moving_particles(self):
+        get_config().use_openmp = False
+        self._check_cache_matches_no_cache(move=True)
+
+    def test_cached_pair_data(self):
+        # Given
+        get_config().use_openmp = False
+        pa, nnps = self._compute(cache=True)
+        kernel = CubicSpline(dim=2)
+
+        # When
+        nbrs, rij, wij, dwij = nnps.get_pair_cache(0, 0).get_pair_data(10)
+
+        # Then
+        xij = np.array([pa.x[10] - pa.x[nbrs], pa.y[10] - pa.y[nbrs],
+                        np.zeros(len(nbrs))]).T
+        np.testing.assert_allclose(rij, np.linalg.norm(xij, axis=1))
+        hij = 0.5*(pa.h[10] + pa.h[nbrs])
+        expect = [kernel.kernel(xij[i], rij[i], hij[i])
+                  for i in range(len(nbrs))]
+        np.testing.assert_allclose(wij, expect)
+        for i in range(len(nbrs)):
+            grad = [0.0, 0.0, 0.0]
+            kernel.gradient(xij[i], rij[i], hij[i], grad)
+            np.testing.assert_allclose(dwij[i], grad, atol=1e-14)
+
+    def test_pair_cache_is_disabled_by_default(self):
+        # Given
+        pa = get_particle_array(name='fluid', x=[0.0, 0.1], h=0.1)
+
+        # When
+        nnps = NNPS(dim=1, particles=[pa])
+
+        # Then
+        self.assertFalse(nnps.use_pair_cache)
+
+    def test_pair_cache_can_be_disabled(self):
+        # Given
+        get_config().use_openmp = False
+        expect, nnps = self._compute(cache=False)
+        empty = nnps.get_pair_cache(0, 0).get_memory_usage()
+
+        # When
+        pa, nnps = self._compute(cache=True, use_pair_cache=False)
+
+        # Then
+        pair_cache = nnps.get_pair_cache(0, 0)
+        self.assertFalse(pair_cache.valid)
+        self.assertEqual(pair_cache.get_memory_usage(), empty)
+        for prop in ('rho', 'arho', 'au', 'av', 'aw'):
+            np.testing.assert_allclose(
+                getattr(pa, prop), getattr(expect, prop), atol=1e-12,
+                rtol=1e-12
+            )
+
+    def test_cached_symbols_are_not_computed_when_reading(self):
+        # Given
+        g = CythonGroup(equations=[
+            ContinuityEquation(dest='fluid', sources=['fluid'])
+        ])
+
+        # When
+        fill = g.get_pair_cache_precomputed(fill=True)
+        read = g.get_pair_cache_precomputed(fill=False)
+
+        # Then
+        self.assertEqual(set(g.precomputed.keys()),
+                         set(['DWIJ', 'HIJ', 'R2IJ', 'RIJ', 'VIJ', 'XIJ']))
+        self.assertEqual(set(fill.keys()),
+                         set(['HIJ', 'R2IJ', 'RIJ', 'VIJ', 'WDERIVIJ', 'XIJ']))
+        self.assertEqual(list(read.keys()), ['VIJ'])
+
+
 class EqWithTime(Equation):
     def initialize(self, d_idx, d_au, t, dt):
         d_au[d_idx] = t + dt
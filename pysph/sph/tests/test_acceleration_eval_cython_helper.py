@@ -58,6 +58,15 @@ class TestGetKnownTypesForAllArrays(unittest.TestCase):
             self.assertEqual(repr(result[key]), repr(expect[key]))
 
 
+    def test_that_conflicting_types_raise_error(self):
+        x = np.linspace(0, 1, 10)
+        pa1 = ParticleArray(name='f', x=x, au=x)
+        pa2 = ParticleArray(name='b', x=x, au=x)
+        pa2.set_property_type('au', 'float')
+        info = get_all_array_names([pa1, pa2])
+        self.assertRaises(ValueError, get_known_types_for_arrays, info)
+
+
 class TestAccelerationHelperCython(unittest.TestCase):
     def setUp(self):
         cfg = get_config()
@@ -0,0 +1,191 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from compyle.config import get_config, set_config
+from cyarray.carray import UIntArray
+
+from pysph.base.kernels import CubicSpline
+from pysph.base.nnps import LinkedListNNPS as NNPS
+from pysph.base.utils import get_particle_array
+from pysph.sph.acceleration_eval import AccelerationEval
+from pysph.sph.acceleration_eval_cython_helper import (
+    AccelerationEvalCythonHelper
+)
+from pysph.sph.basic_equations import SummationDensity
+from pysph.sph.equation import Group
+from pysph.sph.equation_profiler import EquationProfiler
+from pysph.sph.sph_compiler import SPHCompiler
+from pysph.sph.wc.basic import TaitEOS
+
+
+class TestEquationProfiler(unittest.TestCase):
+    def setUp(self):
+        self.orig_openmp = get_config().use_openmp
+
+    def tearDown(self):
+        set_config(None)
+        get_config().use_openmp = self.orig_openmp
+
+    def _make_arrays(self):
+        np.random.seed(123)
+        x, y = np.random.random((2, 200))
+        fluid = get_particle_array(
+            name='fluid', x=x, y=y, h=0.08, m=1.0, rho=1.0, cs=1.0
+        )
+        solid = get_particle_array(
+            name='solid', x=x + 0.9, y=y, h=0.08, m=1.0, rho=1.0
+        )
+        return [fluid, solid]
+
+    def _make_equations(self):
+        return [
+            Group(equations=[
+                SummationDensity(dest='fluid', sources=['fluid', 'solid']),
+            ]),
+            Group(equations=[
+                Group(equations=[
+                    TaitEOS(dest='fluid', sources=None, rho0=1.0, c0=1.0,
+                            gamma=7.0)
+                ]),
+            ], iterate=True, min_iterations=2, max_iterations=2),
+        ]
+
+    def _make_eval(self, profile=True):
+        arrays = self._make_arrays()
+        kernel = CubicSpline(dim=2)
+        a_eval = AccelerationEval(
+            arrays, self._make_equations(), kernel, profile=profile
+        )
+        SPHCompiler(a_eval, integrator=None).compile()
+        nnps = NNPS(dim=2, particles=arrays)
+        a_eval.set_nnps(nnps)
+        return a_eval, nnps
+
+    def _get_regions(self, profiler):
+        return dict((r['name'], r) for r in profiler.get_regions())
+
+    def _check_regions(self):
+        # Given
+        a_eval, nnps = self._make_eval()
+        profiler = EquationProfiler()
+        profiler.add_acceleration_eval(a_eval)
+        profiler.reset()
+
+        # When
+        a_eval.compute(0.0, 0.1)
+        a_eval.compute(0.0, 0.1)
+
+        # Then
+        regions = self._get_regions(profiler)
+        prefix = 'acceleration_eval_0;'
+        self.assertEqual(regions['acceleration_eval_0']['calls'], 2)
+        self.assertEqual(regions[prefix + 'group_0']['calls'], 2)
+        self.assertEqual(regions[prefix + 'group_1']['calls'], 2)
+        # The sub-group is iterated twice.
+        self.assertEqual(regions[prefix + 'group_1;group_1.0']['calls'], 4)
+        loop = regions[prefix + 'group_1;group_1.0;dest:fluid;loop']
+        self.assertEqual(loop['equations'], ['TaitEOS'])
+        self.assertEqual(loop['calls'], 4)
+
+        nbrs = UIntArray()
+        for i, src in enumerate(('fluid', 'solid')):
+            counts = []
+            for d_idx in range(200):
+                nnps.get_nearest_particles(i, 0, d_idx, nbrs)
+                counts.append(nbrs.length)
+            src_loop = regions[prefix + 'group_0;dest:fluid;src:' + src]
+            self.assertEqual(src_loop['kind'], 'source')
+            self.assertEqual(src_loop['equations'], ['SummationDensity'])
+            self.assertEqual(src_loop['calls'], 2)
+            self.assertEqual(src_loop['n_dest'], 400)
+            self.assertEqual(src_loop['n_nbrs'], 2*sum(counts))
+            self.assertEqual(src_loop['max_nbrs'], max(counts))
+            self.assertAlmostEqual(src_loop['mean_nbrs'], np.mean(counts))
+
+        for r in regions.values():
+            self.assertTrue(r['time'] > 0.0)
+            self.assertTrue(r['self_time'] >= 0.0)
+            self.assertTrue(r['self_time'] <= r['time'])
+
+        # When
+        profiler.reset()
+
+        # Then
+        for r in profiler.get_regions():
+            self.assertEqual(r['time'], 0.0)
+            self.assertEqual(r['calls'], 0)
+
+    def test_regions_and_neighbor_counts(self):
+        self._check_regions()
+
+    def test_regions_and_neighbor_counts_with_openmp(self):
+        get_config().use_openmp = True
+        self._check_regions()
+
+    def test_timer_and_report(self):
+        # Given
+        a_eval, nnps = self._make_eval()
+        profiler = EquationProfiler()
+        profiler.add_acceleration_eval(a_eval, name='stage1')
+        profiler.reset()
+        a_eval.compute(0.0, 0.1)
+
+        # When
+        with profiler.timer('nnps_update'):
+            nnps.update()
+        report = profiler.get_report()
+
+        # Then
+        names = [r['name'] for r in report['regions']]
+        self.assertIn('nnps_update', names)
+        self.assertIn('stage1;group_0', names)
+        total = sum(r['time'] for r in report['regions']
+                    if r['name'] in ('stage1', 'nnps_update'))
+        self.assertAlmostEqual(report['total_time'], total)
+        self.assertIn('stage1;group_0;dest:fluid;src:fluid',
+                      profiler.get_summary(n=100))
+
+        # When
+        dirname = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(dirname, 'sim_equation_profile')
+            profiler.write(fname)
+
+            # Then
+            with open(fname + '.json') as f:
+                data = json.load(f)
+            self.assertEqual(len(data['regions']), len(names))
+            with open(fname + '.folded') as f:
+                lines = f.read().splitlines()
+            self.assertTrue(len(lines) > 0)
+            for line in lines:
+                stack, count = line.rsplit(' ', 1)
+                self.assertIn(stack, names)
+                self.assertTrue(int(count) > 0)
+        finally:
+            shutil.rmtree(dirname)
+
+    def test_unprofiled_eval_is_not_instrumented(self):
+        # Given
+        a_eval = AccelerationEval(
+            self._make_arrays(), self._make_equations(), CubicSpline(dim=2)
+        )
+
+        # When
+        code = AccelerationEvalCythonHelper(a_eval).get_code()
+
+        # Then
+        self.assertNotIn('perf_counter', code)
+        self.assertNotIn('_prof_', code)
+        self.assertEqual(a_eval.profile_regions, [])
+        self.assertRaises(
+            ValueError, EquationProfiler().add_acceleration_eval, a_eval
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+
+from pysph.base.kernels import CubicSpline
+from pysph.base.utils import get_particle_array_gasd
+from pysph.sph.equation import Group
+from pysph.sph.gas_dynamics.gsph import (
+    Exact, GSPHAcceleration, GSPHAccelerationBatch, GSPHGradients, HLLC
+)
+from pysph.sph.scheme import GSPHScheme
+from pysph.tools.sph_evaluator import SPHEvaluator
+
+
+def _make_shock(nx, seed=123):
+    # A perturbed block with a jump in density and pressure at x = 0.5.
+    np.random.seed(seed)
+    dx = 1.0/nx
+    x, y = np.mgrid[dx/2:1:dx, dx/2:1:dx]
+    x = x.ravel() + np.random.uniform(-0.1, 0.1, nx*nx)*dx
+    y = y.ravel() + np.random.uniform(-0.1, 0.1, nx*nx)*dx
+    n = len(x)
+    rho = np.where(x < 0.5, 1.0, 0.125)*(1.0 + 0.05*np.random.random(n))
+    p = np.where(x < 0.5, 1.0, 0.1)*(1.0 + 0.05*np.random.random(n))
+    pa = get_particle_array_gasd(
+        name='fluid', x=x, y=y, m=rho*dx*dx, rho=rho, p=p, h=1.5*dx,
+        u=0.1*np.random.random(n), v=0.1*np.random.random(n),
+        cs=np.sqrt(1.4*p/rho), e=p/(0.4*rho)
+    )
+    scheme = GSPHScheme(['fluid'], [], dim=2, gamma=1.4, kernel_factor=1.5)
+    scheme.setup_properties([pa])
+    return pa
+
+
+class TestGSPHAccelerationBatch(unittest.TestCase):
+    def _evaluate(self, cls, **kw):
+        pa = _make_shock(24)
+        equations = [
+            Group(equations=[GSPHGradients('fluid', ['fluid'])]),
+            Group(equations=[cls('fluid', ['fluid'], **kw)]),
+        ]
+        sph_eval = SPHEvaluator([pa], equations, dim=2,
+                                kernel=CubicSpline(dim=2))
+        sph_eval.evaluate(t=0.1, dt=1e-3)
+        return pa
+
+    def test_accelerations_match_the_pairwise_solves(self):
+        configs = [
+            dict(rsolver=Exact, monotonicity=1),
+            dict(rsolver=Exact, monotonicity=2, g1=0.5, g2=0.5),
+            dict(rsolver=HLLC, monotonicity=1, hybrid=True),
+        ]
+        for kw in configs:
+            # Given
+            expect = self._evaluate(GSPHAcceleration, **kw)
+
+            # When
+            pa = self._evaluate(GSPHAccelerationBatch, **kw)
+
+            # Then
+            # The batched exact solver agrees to the tolerance, others
+            # to round off.
+            rtol = 1e-6 if kw['rsolver'] == Exact else 1e-12
+            for prop in ('au', 'av', 'ae'):
+                a, b = getattr(expect, prop), getattr(pa, prop)
+                np.testing.assert_allclose(
+                    b, a, rtol=0, atol=rtol*np.abs(a).max(),
+                    err_msg='%s %s' % (kw, prop)
+                )
+
+
+if __name__ == '__main__':
+    unittest.main()
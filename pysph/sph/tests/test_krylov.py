@@ -0,0 +1,105 @@
+import unittest
+
+import numpy as np
+
+from pysph.base.kernels import QuinticSpline
+from pysph.sph.isph.sisph import SISPHScheme, get_particle_array_sisph
+from pysph.sph.krylov import KrylovState, add_krylov_properties
+from pysph.tools.sph_evaluator import SPHEvaluator
+
+
+def _make_block(nx, seed=123):
+    np.random.seed(seed)
+    dx = 1.0/nx
+    x, y = np.mgrid[dx/2:1:dx, dx/2:1:dx]
+    x = x.ravel() + np.random.uniform(-0.1, 0.1, nx*nx)*dx
+    y = y.ravel() + np.random.uniform(-0.1, 0.1, nx*nx)*dx
+    return x, y, dx
+
+
+class TestKrylovState(unittest.TestCase):
+    def test_invalid_method(self):
+        self.assertRaises(ValueError, KrylovState, ['fluid'], method='gmres')
+
+    def test_no_iterations_when_converged(self):
+        # Given
+        pa = get_particle_array_sisph(name='fluid', x=[0.0, 1.0])
+        add_krylov_properties(pa)
+        state = KrylovState(['fluid'])
+
+        # When
+        state.reduce(0, pa, lambda x, op: x)
+
+        # Then
+        self.assertEqual(state.converged(), 1.0)
+        self.assertEqual(state.get_stats()['solves'], 1)
+        self.assertEqual(state.last['iterations'], 0)
+
+
+class TestSISPHKrylov(unittest.TestCase):
+    def _get_matrix(self, x, y, rho, dx, kernel, active, diag_shift):
+        n = len(x)
+        h = 1.2*dx
+        A = np.zeros((n, n))
+        dwij = np.zeros(3)
+        for i in range(n):
+            for j in range(n):
+                xij = np.array([x[i] - x[j], y[i] - y[j], 0.0])
+                rij = np.sqrt(np.dot(xij, xij))
+                if i == j or rij >= kernel.radius_scale*h:
+                    continue
+                kernel.gradient(xij, rij, h, dwij)
+                fac = (4.0*dx*dx/(rho[i]*(rho[i] + rho[j])) *
+                       np.dot(xij, dwij)/(rij*rij + 0.01*h*h))
+                A[i, j] -= fac
+                A[i, i] += fac*(1.0 + diag_shift)
+        A[~active] = 0.0
+        A[~active, ~active] = 1.0
+        return A
+
+    def test_solution_of_the_pressure_equation(self):
+        for method in ('bicgstab', 'cg'):
+            # Given
+            nx = 12
+            x, y, dx = _make_block(nx)
+            n = len(x)
+            i, j = np.mgrid[0:nx, 0:nx]
+            border = ((i == 0) | (j == 0) | (i == nx - 1) |
+                      (j == nx - 1)).ravel()
+            # CG needs a symmetric matrix.
+            rho = np.ones(n)
+            if method == 'bicgstab':
+                rho += 0.05*np.random.random(n)
+            rho[border] = 0.5
+            pa = get_particle_array_sisph(
+                name='fluid', x=x, y=y, m=dx*dx, rho=rho, h=1.2*dx
+            )
+            add_krylov_properties(pa)
+            pa.rhs[:] = np.random.random(n) - 0.5
+            pa.pk[:] = np.where(border, 0.0, np.random.random(n))
+            scheme = SISPHScheme(
+                ['fluid'], [], dim=2, nu=0.0, rho0=1.0, c0=10.0,
+                pressure_solver=method, krylov_tolerance=1e-8
+            )
+            kernel = QuinticSpline(dim=2)
+            sph_eval = SPHEvaluator([pa], scheme._get_krylov_ppe(), dim=2,
+                                    kernel=kernel)
+
+            # When
+            sph_eval.evaluate(dt=1.0)
+
+            # Then
+            stats = scheme.get_ppe_stats()
+            self.assertEqual(stats['solves'], 1)
+            self.assertEqual(stats['not_converged'], 0)
+            self.assertTrue(stats['iterations'] < 50)
+            A = self._get_matrix(x, y, rho, dx, kernel, ~border, 1e-2)
+            b = np.where(border, 0.0, pa.rhs)
+            residual = np.linalg.norm(A.dot(pa.p) - b)/np.linalg.norm(b)
+            self.assertTrue(residual < 1e-7, (method, residual))
+            np.testing.assert_array_equal(pa.p[border], 0.0)
+            np.testing.assert_array_equal(pa.pk, pa.p)
+
+
+if __name__ == '__main__':
+    unittest.main()
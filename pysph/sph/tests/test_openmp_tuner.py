@@ -0,0 +1,130 @@
+import json
+import unittest
+
+import numpy as np
+from compyle.config import get_config, set_config
+
+from pysph.base.kernels import CubicSpline
+from pysph.base.nnps import LinkedListNNPS as NNPS
+from pysph.base.nnps_base import get_number_of_threads, set_number_of_threads
+from pysph.base.utils import get_particle_array
+from pysph.sph.acceleration_eval import AccelerationEval
+from pysph.sph.basic_equations import ContinuityEquation, SummationDensity
+from pysph.sph.equation import Group
+from pysph.sph.equation_profiler import EquationProfiler
+from pysph.sph.openmp_tuner import OpenMPTuner, get_default_thread_counts
+from pysph.sph.sph_compiler import SPHCompiler
+
+
+class TestOpenMPTuner(unittest.TestCase):
+    def setUp(self):
+        self.orig_openmp = get_config().use_openmp
+        self.orig_threads = get_number_of_threads()
+
+    def tearDown(self):
+        set_config(None)
+        get_config().use_openmp = self.orig_openmp
+        set_number_of_threads(self.orig_threads)
+
+    def _make_eval(self, tune_openmp):
+        np.random.seed(123)
+        x, y = np.random.random((2, 400))
+        u, v = np.random.random((2, 400)) - 0.5
+        fluid = get_particle_array(
+            name='fluid', x=x, y=y, u=u, v=v, h=0.08, m=1.0, rho=1.0
+        )
+        fluid.add_property('arho')
+        solid = get_particle_array(
+            name='solid', x=x[:50] + 0.9, y=y[:50], h=0.08, m=1.0
+        )
+        equations = [
+            Group(equations=[
+                SummationDensity(dest='fluid', sources=['fluid', 'solid']),
+            ]),
+            Group(equations=[
+                ContinuityEquation(dest='fluid', sources=['fluid']),
+            ], pairwise=True),
+        ]
+        a_eval = AccelerationEval(
+            [fluid, solid], equations, CubicSpline(dim=2),
+            tune_openmp=tune_openmp
+        )
+        SPHCompiler(a_eval, integrator=None).compile()
+        a_eval.set_nnps(NNPS(dim=2, particles=[fluid, solid]))
+        return a_eval, fluid
+
+    def test_default_thread_counts(self):
+        self.assertEqual(get_default_thread_counts(1), [1])
+        self.assertEqual(get_default_thread_counts(8), [1, 2, 4, 8])
+        self.assertEqual(get_default_thread_counts(12), [1, 2, 4, 8, 12])
+
+    def test_tuner_chooses_a_configuration_for_each_loop(self):
+        # Given
+        get_config().use_openmp = True
+        set_number_of_threads(2)
+        expect, expect_fluid = self._make_eval(tune_openmp=False)
+        expect.compute(0.0, 0.1)
+        a_eval, fluid = self._make_eval(tune_openmp=True)
+        profiler = EquationProfiler()
+        profiler.add_acceleration_eval(a_eval)
+        profiler.reset()
+        schedules = [('static', 0), ('dynamic', 16), ('guided', 0)]
+        tuner = OpenMPTuner(
+            profiler, thread_counts=[1, 2, 4], schedules=schedules,
+            steps_per_config=1, warmup_steps=1
+        )
+
+        # When
+        steps = 0
+        while not tuner.done:
+            tuner.begin_step()
+            a_eval.compute(0.0, 0.1)
+            tuner.end_step()
+            steps += 1
+
+        # Then
+        # The thread counts are limited to the available threads.
+        self.assertEqual(tuner.thread_counts, [1, 2])
+        # One warmup step, two thread counts and three schedules.
+        self.assertEqual(steps, 6)
+        names = [loop.name for loop in tuner.loops]
+        self.assertIn('acceleration_eval_0;group_0;dest:fluid;src:solid',
+                      names)
+        self.assertIn('acceleration_eval_0;group_1;dest:fluid;initialize',
+                      names)
+        report = tuner.get_report()
+        self.assertTrue(report['done'])
+        self.assertEqual(json.loads(json.dumps(report)), report)
+        for loop, data in zip(tuner.loops, report['loops']):
+            self.assertEqual(data['size'], 400)
+            config = loop.get_config()
+            self.assertIn(config, loop.times)
+            # The fastest schedule with the chosen thread count is used.
+            times = dict((k, t) for k, t in loop.times.items()
+                         if k[0] == config[0])
+            self.assertEqual(config, min(times, key=times.get))
+            self.assertEqual(len(data['times']), len(loop.times))
+
+        # The results do not depend on the configuration.
+        np.testing.assert_allclose(fluid.rho, expect_fluid.rho)
+        np.testing.assert_allclose(fluid.arho, expect_fluid.arho,
+                                   atol=1e-12)
+
+    def test_tuner_does_nothing_without_openmp(self):
+        # Given
+        get_config().use_openmp = False
+        a_eval, fluid = self._make_eval(tune_openmp=True)
+        profiler = EquationProfiler()
+        profiler.add_acceleration_eval(a_eval)
+
+        # When
+        tuner = OpenMPTuner(profiler)
+
+        # Then
+        self.assertTrue(tuner.done)
+        self.assertEqual(tuner.loops, [])
+        self.assertFalse(hasattr(a_eval.c_acceleration_eval, '_omp_threads'))
+
+
+if __name__ == '__main__':
+    unittest.main()
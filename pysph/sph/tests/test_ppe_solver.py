@@ -0,0 +1,180 @@
+import unittest
+
+import numpy as np
+import pytest
+
+pytest.importorskip('scipy')
+
+from pysph.base.kernels import QuinticSpline
+from pysph.sph.equation import Group
+from pysph.sph.isph.isph import (
+    PressureCoeffMatrix, PressureCoeffRowLength, get_particle_array_isph
+)
+from pysph.sph.isph.ppe_solver import PPESolver, has_pyamg
+from pysph.tools.sph_evaluator import SPHEvaluator
+
+
+def _make_poisson_rows(nx):
+    """Return the CSR rows of a 2D Poisson matrix with the diagonal first
+    and some entries split in two to check that duplicates are summed.
+    """
+    n = nx*nx
+    indptr, indices, data = [0], [], []
+    for i in range(nx):
+        for j in range(nx):
+            row = i*nx + j
+            cols, vals = [row], [4.0]
+            for di, dj in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+                if 0 <= i + di < nx and 0 <= j + dj < nx:
+                    cols += [(i + di)*nx + j + dj]*2
+                    vals += [-0.5, -0.5]
+            indices += cols
+            data += vals
+            indptr.append(len(indices))
+    return (n, np.array(indptr), np.array(indices, dtype=np.int32),
+            np.array(data))
+
+
+class TestPPESolver(unittest.TestCase):
+    def test_assembly_sums_duplicates_and_reuses_the_pattern(self):
+        # Given
+        n, indptr, indices, data = _make_poisson_rows(5)
+        solver = PPESolver()
+
+        # When
+        A = solver.assemble(n, indptr, indices, data).toarray()
+
+        # Then
+        expect = np.zeros((n, n))
+        for row in range(n):
+            for k in range(indptr[row], indptr[row + 1]):
+                expect[row, indices[k]] += data[k]
+        np.testing.assert_allclose(A, expect)
+        self.assertEqual(solver.stats['pattern_updates'], 1)
+
+        # When
+        matrix = solver.matrix
+        A = solver.assemble(n, indptr, indices.copy(), 2.0*data).toarray()
+
+        # Then
+        self.assertIs(solver.matrix, matrix)
+        self.assertEqual(solver.stats['pattern_updates'], 1)
+        np.testing.assert_allclose(A, 2.0*expect)
+
+    def test_solvers_and_preconditioners(self):
+        n, indptr, indices, data = _make_poisson_rows(12)
+        x = np.sin(np.arange(n))
+        configs = [('bicgstab', 'none'), ('bicgstab', 'jacobi'),
+                   ('cg', 'jacobi'), ('gmres', 'ilu'), ('bicgstab', 'ilu')]
+        if has_pyamg():
+            configs.append(('cg', 'amg'))
+        iterations = {}
+        for method, preconditioner in configs:
+            # Given
+            solver = PPESolver(method=method, preconditioner=preconditioner,
+                               tol=1e-10)
+            A = solver.assemble(n, indptr, indices, data)
+            b = A.dot(x)
+
+            # When
+            result = solver.solve(b, x0=np.zeros(n))
+
+            # Then
+            np.testing.assert_allclose(result, x, atol=1e-7)
+            self.assertTrue(solver.last['converged'])
+            self.assertTrue(solver.last['residual'] < 1e-9)
+            iterations[(method, preconditioner)] = solver.last['iterations']
+            stats = solver.get_stats()
+            self.assertEqual(stats['solves'], 1)
+            self.assertEqual(stats['iterations'], solver.last['iterations'])
+        self.assertTrue(
+            iterations[('bicgstab', 'ilu')] < iterations[('bicgstab', 'none')]
+        )
+
+    def test_warm_start(self):
+        # Given
+        n, indptr, indices, data = _make_poisson_rows(12)
+        solver = PPESolver(tol=1e-8)
+        A = solver.assemble(n, indptr, indices, data)
+        x = np.sin(np.arange(n))
+
+        # When
+        solver.solve(A.dot(x), x0=x)
+
+        # Then
+        self.assertEqual(solver.last['iterations'], 0)
+
+    def test_invalid_options(self):
+        self.assertRaises(ValueError, PPESolver, method='lgmres')
+        self.assertRaises(ValueError, PPESolver, preconditioner='ssor')
+        if not has_pyamg():
+            self.assertRaises(ImportError, PPESolver, preconditioner='amg')
+
+
+class TestPressureCoeffMatrix(unittest.TestCase):
+    def test_rows_match_the_pairwise_coefficients(self):
+        # Given
+        np.random.seed(123)
+        nx = 10
+        dx = 1.0/nx
+        x, y = np.mgrid[dx/2:1:dx, dx/2:1:dx]
+        x = x.ravel() + np.random.uniform(-0.1, 0.1, nx*nx)*dx
+        y = y.ravel() + np.random.uniform(-0.1, 0.1, nx*nx)*dx
+        n = len(x)
+        rho = 1.0 + 0.1*np.random.random(n)
+        pa = get_particle_array_isph(
+            name='fluid', x=x, y=y, m=dx*dx, rho=rho, h=1.2*dx,
+            gid=np.arange(n)
+        )
+        kernel = QuinticSpline(dim=2)
+        solver = PPESolver()
+        equations = [
+            Group(equations=[
+                PressureCoeffRowLength(
+                    dest='fluid', sources=['fluid'], solver=solver
+                )
+            ]),
+            Group(equations=[
+                PressureCoeffMatrix(
+                    dest='fluid', sources=['fluid'], solver=solver
+                )
+            ]),
+        ]
+        sph_eval = SPHEvaluator([pa], equations, dim=2, kernel=kernel)
+
+        # When
+        sph_eval.evaluate()
+
+        # Then
+        indptr = np.zeros(n + 1, dtype=int)
+        np.cumsum(pa.ctr, out=indptr[1:])
+        np.testing.assert_array_equal(pa.ppe_start, indptr[:-1])
+        A = PPESolver().assemble(
+            n, indptr, solver.col_idx.get_npy_array(),
+            solver.coeff.get_npy_array()
+        ).toarray()
+        # The matrix is not stored in the particle array.
+        self.assertNotIn('coeff', pa.constants)
+        self.assertNotIn('col_idx', pa.constants)
+
+        expect = np.zeros((n, n))
+        dwij = np.zeros(3)
+        for i in range(n):
+            for j in range(n):
+                xij = np.array([x[i] - x[j], y[i] - y[j], 0.0])
+                rij = np.sqrt(np.dot(xij, xij))
+                hij = 1.2*dx
+                if i == j or rij >= kernel.radius_scale*hij:
+                    continue
+                kernel.gradient(xij, rij, hij, dwij)
+                rhoij = rho[i] + rho[j]
+                fac = (8.0*dx*dx/(rhoij*rhoij)*np.dot(xij, dwij) /
+                       (rij*rij + 0.01*hij*hij))
+                expect[i, j] -= fac
+                expect[i, i] += fac
+        np.testing.assert_allclose(A, expect, rtol=1e-10, atol=1e-10)
+        np.testing.assert_allclose(pa.diag, np.diag(expect))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,12 @@
+import inspect
+import re
+
+import numpy as np
 import pytest
 from pytest import approx
 
 import pysph.sph.gas_dynamics.riemann_solver as R
+from pysph.sph.gas_dynamics.gsph import GSPHAccelerationBatch
 
 solvers = [
     R.ducowicz, R.exact, R.hll_ball, R.hllc,
@@ -104,3 +109,77 @@ def test_all_solver_api(solver):
     else:
         rel = 1.0
     _check_shock_tube(solver, rel=rel)
+
+
+def _make_batch(n_smooth=40):
+    # The four problems above followed by some with small jumps.
+    np.random.seed(123)
+    rhol = [1.0, 1.0, 1.0, 1.0]
+    rhor = [0.125, 1.0, 1.0, 1.0]
+    pl = [1.0, 1000.0, 0.4, 0.01]
+    pr = [0.1, 0.01, 0.4, 100.0]
+    ul = [0.0, 0.0, -2.0, 0.0]
+    ur = [0.0, 0.0, 2.0, 0.0]
+    states = [np.array(x + list(1.0 + 0.02*np.random.random(n_smooth)))
+              for x in (rhol, rhor, pl, pr, ul, ur)]
+    states[4][4:] -= 1.0
+    states[5][4:] -= 1.0
+    return states
+
+
+def test_exact_batch():
+    # Given
+    states = _make_batch()
+    n = len(states[0])
+    pstar = np.zeros(n)
+    ustar = np.zeros(n)
+
+    # When
+    count = R.exact_batch(n, *states, gamma=1.4, niter=20, tol=1e-6,
+                          pstar=pstar, ustar=ustar)
+
+    # Then
+    # Only the problems with strong shocks or rarefactions are iterated.
+    assert count == 4
+    result = [0.0, 0.0]
+    for i in range(n):
+        R.exact(*[x[i] for x in states], gamma=1.4, niter=20, tol=1e-6,
+                result=result)
+        assert pstar[i] == approx(result[0], rel=1e-6)
+        assert ustar[i] == approx(result[1], rel=1e-6, abs=1e-6)
+
+
+@pytest.mark.parametrize("method", [1, 3, 4, 5, 6, 7, 8, 9, 10])
+def test_riemann_solve_batch(method):
+    # Given
+    states = _make_batch()
+    n = len(states[0])
+    pstar = np.zeros(n)
+    ustar = np.zeros(n)
+
+    # When
+    R.riemann_solve_batch(method, n, *states, gamma=1.4, niter=20, tol=1e-6,
+                          pstar=pstar, ustar=ustar)
+
+    # Then
+    result = [0.0, 0.0]
+    for i in range(n):
+        R.riemann_solve(method, *[x[i] for x in states], gamma=1.4,
+                        niter=20, tol=1e-6, result=result)
+        assert (pstar[i], ustar[i]) == (result[0], result[1])
+
+
+def test_batch_arrays_match_batch_size():
+    # Given
+    loop_all = inspect.getsource(GSPHAccelerationBatch.loop_all)
+    sources = [inspect.getsource(R.exact_batch), loop_all]
+
+    # When
+    sizes = [set(int(x) for x in re.findall(r"matrix\((\d+)", src))
+             for src in sources]
+
+    # Then
+    for size in sizes:
+        assert max(size) == R.BATCH_SIZE
+    assert 'min(N_NBRS - i, %d)' % R.BATCH_SIZE in loop_all
+    assert 'i += %d' % R.BATCH_SIZE in loop_all
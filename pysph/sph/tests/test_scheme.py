@@ -1,6 +1,15 @@
 from argparse import ArgumentParser
 
-from pysph.sph.scheme import SchemeChooser, WCSPHScheme
+import numpy as np
+import pytest
+
+from compyle.config import get_config
+from pysph.base.nnps import LinkedListNNPS
+from pysph.base.utils import get_particle_array
+from pysph.sph.equation import Group
+from pysph.sph.scheme import (
+    AdamiHuAdamsScheme, SchemeChooser, TVFScheme, WCSPHScheme
+)
 from pysph.sph.wc.edac import EDACScheme
 
 
@@ -34,3 +43,118 @@ def test_scheme_chooser_does_not_clobber_default():
     # Then
     assert s.scheme.alpha == 0.3
     assert s.scheme.beta == 0.4
+
+
+def test_scheme_stores_single_precision_props():
+    # Given
+    wcsph = WCSPHScheme(
+        ['f'], ['b'], dim=2, rho0=1.0, c0=10.0,
+        h0=0.1, hdx=1.3, alpha=0.2, beta=0.1,
+    )
+    wcsph.configure(single_precision_props=['au', 'av', 'aw', 'arho'])
+    f = get_particle_array(name='f', x=[0.0, 1.0])
+    b = get_particle_array(name='b', x=[2.0])
+
+    # When
+    wcsph.setup_properties([f, b])
+
+    # Then
+    for pa in (f, b):
+        assert pa.arho.dtype == np.float32
+        assert pa.au.dtype == np.float32
+        assert pa.x.dtype == np.float64
+        assert pa.h.dtype == np.float64
+
+
+def _make_particles(dx=0.1, hdx=1.2):
+    np.random.seed(123)
+    x, y = np.mgrid[dx/2:1:dx, dx/2:1:dx]
+    x, y = x.ravel(), y.ravel()
+    x += 0.1*dx*(np.random.random(x.size) - 0.5)
+    y += 0.1*dx*(np.random.random(y.size) - 0.5)
+    u, v = 0.2*(np.random.random((2, x.size)) - 0.5)
+    fluid = get_particle_array(
+        name='fluid', x=x, y=y, u=u, v=v, h=hdx*dx, m=dx*dx, rho=1.0
+    )
+    xs, ys = np.mgrid[-dx/2:1:dx, -5*dx/2:0:dx]
+    solid = get_particle_array(
+        name='solid', x=xs.ravel(), y=ys.ravel(), h=hdx*dx, m=dx*dx,
+        rho=1.0, V=1.0/(dx*dx)
+    )
+    return [fluid, solid]
+
+
+def _make_scheme(name, pairwise):
+    if name == 'wcsph':
+        return WCSPHScheme(
+            ['fluid'], ['solid'], dim=2, rho0=1.0, c0=10.0, h0=0.12,
+            hdx=1.2, gy=-1.0, alpha=0.1, beta=0.1, nu=0.01,
+            tensile_correction=True, pairwise=pairwise
+        )
+    elif name == 'wcsph_sd':
+        return WCSPHScheme(
+            ['fluid'], ['solid'], dim=2, rho0=1.0, c0=10.0, h0=0.12,
+            hdx=1.2, gy=-1.0, alpha=0.1, summation_density=True,
+            pairwise=pairwise
+        )
+    elif name == 'tvf':
+        return TVFScheme(
+            ['fluid'], ['solid'], dim=2, rho0=1.0, c0=10.0, nu=0.01,
+            p0=100.0, pb=100.0, h0=0.12, gy=-1.0, alpha=0.1,
+            pairwise=pairwise
+        )
+    else:
+        return AdamiHuAdamsScheme(
+            ['fluid'], ['solid'], dim=2, rho0=1.0, c0=10.0, nu=0.01,
+            h0=0.12, gy=-1.0, alpha=0.1, pairwise=pairwise
+        )
+
+
+def _run_scheme(name, pairwise, tmpdir):
+    particles = _make_particles()
+    scheme = _make_scheme(name, pairwise)
+    scheme.setup_properties(particles)
+    scheme.configure_solver(dt=1e-3, tf=5e-3, pfreq=1000)
+    solver = scheme.get_solver()
+    solver.set_disable_output(True)
+    solver.set_parallel_manager(None)
+    solver.set_output_directory(str(tmpdir.join(str(pairwise))))
+    nnps = LinkedListNNPS(dim=2, particles=particles)
+    solver.setup(particles, scheme.get_equations(), nnps)
+    solver.solve(show_progress=False)
+    return particles[0]
+
+
+@pytest.fixture
+def use_openmp(request):
+    config = get_config()
+    orig = config.use_openmp
+    config.use_openmp = request.param
+    yield request.param
+    config.use_openmp = orig
+
+
+@pytest.mark.parametrize('use_openmp', [False, True], indirect=True)
+@pytest.mark.parametrize('name', ['wcsph', 'wcsph_sd', 'tvf', 'aha'])
+def test_pairwise_scheme_matches_full_loop(name, use_openmp, tmpdir):
+    # Given
+    scheme = _make_scheme(name, pairwise=True)
+    for group in scheme.get_equations():
+        if not group.pairwise:
+            continue
+        eqs = [eq for eq in group.equations
+               if eq.dest == 'fluid' and 'fluid' in (eq.sources or [])]
+        # All the fluid-fluid interactions are visited once.
+        assert Group(equations=eqs).has_loop_pair()
+    expect = _run_scheme(name, False, tmpdir)
+
+    # When
+    fluid = _run_scheme(name, True, tmpdir)
+
+    # Then
+    for prop in ('x', 'y', 'u', 'v', 'rho', 'p'):
+        assert np.all(np.isfinite(expect.get(prop))), prop
+        np.testing.assert_allclose(
+            fluid.get(prop), expect.get(prop), rtol=1e-9, atol=1e-12,
+            err_msg=prop
+        )
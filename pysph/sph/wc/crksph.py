@@ -990,19 +990,23 @@ class CRKSPHScheme(Scheme):
             eq00.append(
                 SpeedOfSound(dest=fluid, sources=None, gamma=self.gamma)
             )
-        equations_stage1.append(Group(equations=eq00))
+        equations_stage1.append(Group(equations=eq00, cache_pair_data=True))
 
         gh = []
         for fluid in self.fluids:
             gh.append(
                 CRKSPHUpdateGhostProps(dest=fluid, sources=None, dim=self.dim)
             )
-        equations_stage1.append(Group(equations=gh, real=False))
+        equations_stage1.append(Group(
+            equations=gh, real=False, cache_pair_data=True
+        ))
 
         eq0 = []
         for fluid in self.fluids:
             eq0.append(NumberDensity(dest=fluid, sources=all))
-        equations_stage1.append(Group(equations=eq0, real=False))
+        equations_stage1.append(Group(
+            equations=eq0, real=False, cache_pair_data=True
+        ))
 
         if self.has_ghosts:
             gh = []
@@ -1012,12 +1016,16 @@ class CRKSPHScheme(Scheme):
                         dest=fluid, sources=None, dim=self.dim
                         )
                 )
-            equations_stage1.append(Group(equations=gh, real=False))
+            equations_stage1.append(Group(
+                equations=gh, real=False, cache_pair_data=True
+            ))
 
         eq1 = []
         for fluid in self.fluids:
             eq1.append(CRKSPHPreStep(dest=fluid, sources=all, dim=self.dim))
-        equations_stage1.append(Group(equations=eq1, real=False))
+        equations_stage1.append(Group(
+            equations=eq1, real=False, cache_pair_data=True
+        ))
 
         if self.has_ghosts:
             gh = []
@@ -1027,7 +1035,9 @@ class CRKSPHScheme(Scheme):
                         dest=fluid, sources=None, dim=self.dim
                         )
                 )
-            equations_stage1.append(Group(equations=gh, real=False))
+            equations_stage1.append(Group(
+                equations=gh, real=False, cache_pair_data=True
+            ))
 
         eq2 = []
         for fluid in self.fluids:
@@ -1037,7 +1047,9 @@ class CRKSPHScheme(Scheme):
                     ),
                 SummationDensityCRKSPH(dest=fluid, sources=all)
             ])
-        equations_stage1.append(Group(equations=eq2, real=False))
+        equations_stage1.append(Group(
+            equations=eq2, real=False, cache_pair_data=True
+        ))
 
         eq3 = []
         for fluid in self.fluids:
@@ -1047,7 +1059,7 @@ class CRKSPHScheme(Scheme):
             eq3.append(
                 SpeedOfSound(dest=fluid, sources=None, gamma=self.gamma)
             )
-        equations_stage1.append(Group(equations=eq3))
+        equations_stage1.append(Group(equations=eq3, cache_pair_data=True))
 
         if self.has_ghosts:
             gh = []
@@ -1057,7 +1069,9 @@ class CRKSPHScheme(Scheme):
                         dest=fluid, sources=None, dim=self.dim
                         )
                 )
-            equations_stage1.append(Group(equations=gh, real=False))
+            equations_stage1.append(Group(
+                equations=gh, real=False, cache_pair_data=True
+            ))
 
         eq4 = []
         for fluid in self.fluids:
@@ -1067,7 +1081,7 @@ class CRKSPHScheme(Scheme):
                     ),
                 VelocityGradient(dest=fluid, sources=all, dim=self.dim)
             ])
-        equations_stage1.append(Group(equations=eq4))
+        equations_stage1.append(Group(equations=eq4, cache_pair_data=True))
 
         if self.has_ghosts:
             gh = []
@@ -1077,7 +1091,9 @@ class CRKSPHScheme(Scheme):
                         dest=fluid, sources=None, dim=self.dim
                         )
                 )
-            equations_stage1.append(Group(equations=gh, real=False))
+            equations_stage1.append(Group(
+                equations=gh, real=False, cache_pair_data=True
+            ))
 
         eq5 = []
         for fluid in self.fluids:
@@ -1097,7 +1113,7 @@ class CRKSPHScheme(Scheme):
                 eq5.append(LaminarViscosity(
                     dest=fluid, sources=self.fluids, nu=self.nu
                 ))
-        equations_stage1.append(Group(equations=eq5))
+        equations_stage1.append(Group(equations=eq5, cache_pair_data=True))
 
         if self.has_ghosts:
             gh = []
@@ -1107,7 +1123,9 @@ class CRKSPHScheme(Scheme):
                         dest=fluid, sources=None, dim=self.dim
                         )
                 )
-            equations_stage2.append(Group(equations=gh, real=False))
+            equations_stage2.append(Group(
+                equations=gh, real=False, cache_pair_data=True
+            ))
 
         eq6 = []
         for fluid in self.fluids:
@@ -1121,7 +1139,7 @@ class CRKSPHScheme(Scheme):
                     dest=fluid, sources=all, dim=self.dim, gamma=self.gamma
                     )
             )
-        equations_stage2.append(Group(equations=eq6))
+        equations_stage2.append(Group(equations=eq6, cache_pair_data=True))
 
         return MultiStageEquations([equations_stage1, equations_stage2])
 
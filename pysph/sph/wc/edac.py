@@ -826,11 +826,15 @@ class EDACScheme(Scheme):
                                     gx=self.gx, gy=self.gy, gz=self.gz)
                 ])
 
-        equations.append(Group(equations=group1, real=False))
+        equations.append(Group(
+            equations=group1, real=False, cache_pair_data=True
+        ))
 
         # Compute average pressure *after* the wall pressure is setup.
         if self.bql and has_solids:
-            equations.append(Group(equations=avg_p_group, real=True))
+            equations.append(Group(
+                equations=avg_p_group, real=True, cache_pair_data=True
+            ))
 
         group2 = []
         for fluid in self.fluids:
@@ -869,7 +873,7 @@ class EDACScheme(Scheme):
                     rho0=self.rho0
                 ),
             ])
-        equations.append(Group(equations=group2))
+        equations.append(Group(equations=group2, cache_pair_data=True))
 
         # inlet-outlet
         if iom is not None:
@@ -929,7 +933,9 @@ class EDACScheme(Scheme):
                                     gx=self.gx, gy=self.gy, gz=self.gz)
                 ])
 
-        equations.append(Group(equations=group1, real=False))
+        equations.append(Group(
+            equations=group1, real=False, cache_pair_data=True
+        ))
 
         group2 = []
         for fluid in self.fluids:
@@ -967,7 +973,7 @@ class EDACScheme(Scheme):
                 XSPHCorrection(dest=fluid, sources=[fluid],
                                eps=self.eps)
             ])
-        equations.append(Group(equations=group2))
+        equations.append(Group(equations=group2, cache_pair_data=True))
 
         # inlet-outlet
         if iom is not None:
@@ -595,7 +595,9 @@ class GTVFScheme(Scheme):
             eq0 = []
             for solid in self.solids:
                 eq0.append(SetWallVelocity(dest=solid, sources=self.fluids))
-            stage1.append(Group(equations=eq0, real=False))
+            stage1.append(Group(
+                equations=eq0, real=False, cache_pair_data=True
+            ))
 
         eq1 = []
         for fluid in self.fluids:
@@ -604,12 +606,12 @@ class GTVFScheme(Scheme):
                 eq1.append(
                     ContinuitySolid(dest=fluid, sources=self.solids)
                 )
-        stage1.append(Group(equations=eq1, real=False))
+        stage1.append(Group(equations=eq1, real=False, cache_pair_data=True))
 
         eq2, stage2 = [], []
         for fluid in self.fluids:
             eq2.append(CorrectDensity(dest=fluid, sources=all))
-        stage2.append(Group(equations=eq2, real=False))
+        stage2.append(Group(equations=eq2, real=False, cache_pair_data=True))
 
         eq3 = []
         for fluid in self.fluids:
@@ -617,7 +619,7 @@ class GTVFScheme(Scheme):
                 StateEquation(dest=fluid, sources=None, p0=self.pref,
                               rho0=self.rho0, b=1.0)
             )
-        stage2.append(Group(equations=eq3, real=False))
+        stage2.append(Group(equations=eq3, real=False, cache_pair_data=True))
 
         g2_s = []
         for solid in self.solids:
@@ -627,7 +629,9 @@ class GTVFScheme(Scheme):
                 p0=self.pref, gx=self.gx, gy=self.gy, gz=self.gz
             ))
         if g2_s:
-            stage2.append(Group(equations=g2_s, real=False))
+            stage2.append(Group(
+                equations=g2_s, real=False, cache_pair_data=True
+            ))
 
         eq4 = []
         for fluid in self.fluids:
@@ -656,7 +660,7 @@ class GTVFScheme(Scheme):
                 MomentumEquationArtificialStress(
                     dest=fluid, sources=self.fluids, dim=self.dim
                 ))
-        stage2.append(Group(equations=eq4, real=True))
+        stage2.append(Group(equations=eq4, real=True, cache_pair_data=True))
 
         return MultiStageEquations([stage1, stage2])
 
@@ -57,6 +57,13 @@ class SummationDensity(Equation):
         d_V[d_idx] += WIJ
         d_rho[d_idx] += d_m[d_idx]*WIJ
 
+    def loop_pair(self, d_idx, s_idx, d_V, d_rho, d_m, s_V, s_rho, s_m, WIJ):
+        d_V[d_idx] += WIJ
+        d_rho[d_idx] += d_m[d_idx]*WIJ
+
+        s_V[s_idx] += WIJ
+        s_rho[s_idx] += s_m[s_idx]*WIJ
+
 
 class VolumeSummation(Equation):
     r"""**Number density for volume computation**
@@ -153,6 +160,13 @@ class ContinuityEquation(Equation):
         vijdotdwij = VIJ[0] * DWIJ[0] + VIJ[1] * DWIJ[1] + VIJ[2] * DWIJ[2]
         d_arho[d_idx] += d_rho[d_idx] * vijdotdwij * s_m[s_idx] / s_rho[s_idx]
 
+    def loop_pair(self, d_idx, s_idx, d_arho, d_m, d_rho, s_arho, s_m, s_rho,
+                  VIJ, DWIJ):
+        # VJI and DWJI are -VIJ and -DWIJ, so the product is unchanged.
+        vijdotdwij = VIJ[0] * DWIJ[0] + VIJ[1] * DWIJ[1] + VIJ[2] * DWIJ[2]
+        d_arho[d_idx] += d_rho[d_idx] * vijdotdwij * s_m[s_idx] / s_rho[s_idx]
+        s_arho[s_idx] += s_rho[s_idx] * vijdotdwij * d_m[d_idx] / d_rho[d_idx]
+
 
 class ContinuitySolid(Equation):
     """Continuity equation for the solid's ghost particles.
@@ -314,6 +328,43 @@ class MomentumEquationPressureGradient(Equation):
         d_avhat[d_idx] += tmp * DWIJ[1]
         d_awhat[d_idx] += tmp * DWIJ[2]
 
+    def loop_pair(self, d_idx, s_idx, d_m, s_m, d_rho, s_rho,
+                  d_au, d_av, d_aw, s_au, s_av, s_aw, d_p, s_p,
+                  d_auhat, d_avhat, d_awhat, s_auhat, s_avhat, s_awhat,
+                  d_V, s_V, DWIJ):
+
+        rhoi = d_rho[d_idx]
+        rhoj = s_rho[s_idx]
+
+        pij = rhoj * d_p[d_idx] + rhoi * s_p[s_idx]
+        pij /= (rhoj + rhoi)
+
+        Vi = 1./d_V[d_idx]
+        Vj = 1./s_V[s_idx]
+        Vij2 = Vi * Vi + Vj * Vj
+
+        mi1 = 1.0/d_m[d_idx]
+        mj1 = 1.0/s_m[s_idx]
+
+        # The gradient for the source is -DWIJ.
+        tmp = -pij * Vij2
+        d_au[d_idx] += tmp * mi1 * DWIJ[0]
+        d_av[d_idx] += tmp * mi1 * DWIJ[1]
+        d_aw[d_idx] += tmp * mi1 * DWIJ[2]
+
+        s_au[s_idx] -= tmp * mj1 * DWIJ[0]
+        s_av[s_idx] -= tmp * mj1 * DWIJ[1]
+        s_aw[s_idx] -= tmp * mj1 * DWIJ[2]
+
+        tmp = -self.pb * Vij2
+        d_auhat[d_idx] += tmp * mi1 * DWIJ[0]
+        d_avhat[d_idx] += tmp * mi1 * DWIJ[1]
+        d_awhat[d_idx] += tmp * mi1 * DWIJ[2]
+
+        s_auhat[s_idx] -= tmp * mj1 * DWIJ[0]
+        s_avhat[s_idx] -= tmp * mj1 * DWIJ[1]
+        s_awhat[s_idx] -= tmp * mj1 * DWIJ[2]
+
     def post_loop(self, d_idx, d_au, d_av, d_aw, t):
         # damped accelerations due to body or external force
         damping_factor = 1.0
@@ -385,6 +436,38 @@ class MomentumEquationViscosity(Equation):
         d_av[d_idx] += tmp * VIJ[1]
         d_aw[d_idx] += tmp * VIJ[2]
 
+    def loop_pair(self, d_idx, s_idx, d_rho, s_rho, d_m, s_m, d_V, s_V,
+                  d_au, d_av, d_aw, s_au, s_av, s_aw,
+                  R2IJ, EPS, DWIJ, VIJ, XIJ):
+
+        # averaged shear viscosity Eq. (6)
+        etai = self.nu * d_rho[d_idx]
+        etaj = self.nu * s_rho[s_idx]
+
+        etaij = 2 * (etai * etaj)/(etai + etaj)
+
+        # scalar part of the kernel gradient, the same for both particles
+        Fij = DWIJ[0]*XIJ[0] + DWIJ[1]*XIJ[1] + DWIJ[2]*XIJ[2]
+
+        # particle volumes, d_V is inverse volume.
+        Vi = 1./d_V[d_idx]
+        Vj = 1./s_V[s_idx]
+        Vi2 = Vi * Vi
+        Vj2 = Vj * Vj
+
+        # accelerations 3rd term in Eq. (8), VJI is -VIJ.
+        tmp = (Vi2 + Vj2) * etaij * Fij/(R2IJ + EPS)
+        tmpi = tmp/d_m[d_idx]
+        tmpj = tmp/s_m[s_idx]
+
+        d_au[d_idx] += tmpi * VIJ[0]
+        d_av[d_idx] += tmpi * VIJ[1]
+        d_aw[d_idx] += tmpi * VIJ[2]
+
+        s_au[s_idx] -= tmpj * VIJ[0]
+        s_av[s_idx] -= tmpj * VIJ[1]
+        s_aw[s_idx] -= tmpj * VIJ[2]
+
 
 class MomentumEquationArtificialViscosity(Equation):
     r"""**Artificial viscosity for the momentum equation**
@@ -447,6 +530,28 @@ class MomentumEquationArtificialViscosity(Equation):
         d_av[d_idx] += -piij * DWIJ[1]
         d_aw[d_idx] += -piij * DWIJ[2]
 
+    def loop_pair(self, d_idx, s_idx, d_m, s_m, d_au, d_av, d_aw,
+                  s_au, s_av, s_aw, RHOIJ1, R2IJ, EPS, DWIJ, VIJ, XIJ, HIJ):
+
+        # v_{ab} \cdot r_{ab}
+        vijdotrij = VIJ[0]*XIJ[0] + VIJ[1]*XIJ[1] + VIJ[2]*XIJ[2]
+
+        # scalar part of the accelerations Eq. (11), the gradient for the
+        # source is -DWIJ.
+        if vijdotrij < 0:
+            muij = (HIJ * vijdotrij)/(R2IJ + EPS)
+
+            piij = -self.alpha*self.c0*muij
+            piij = piij*RHOIJ1
+
+            d_au[d_idx] += -s_m[s_idx] * piij * DWIJ[0]
+            d_av[d_idx] += -s_m[s_idx] * piij * DWIJ[1]
+            d_aw[d_idx] += -s_m[s_idx] * piij * DWIJ[2]
+
+            s_au[s_idx] += d_m[d_idx] * piij * DWIJ[0]
+            s_av[s_idx] += d_m[d_idx] * piij * DWIJ[1]
+            s_aw[s_idx] += d_m[d_idx] * piij * DWIJ[2]
+
 
 class MomentumEquationArtificialStress(Equation):
     r"""**Artificial stress contribution to the Momentum Equation**
@@ -544,6 +649,88 @@ class MomentumEquationArtificialStress(Equation):
         d_av[d_idx] += tmp * Ay
         d_aw[d_idx] += tmp * Az
 
+    def loop_pair(self, d_idx, s_idx, d_rho, d_u, d_v, d_w, d_V,
+                  d_uhat, d_vhat, d_what, d_au, d_av, d_aw, d_m,
+                  s_rho, s_u, s_v, s_w, s_V, s_uhat, s_vhat, s_what,
+                  s_au, s_av, s_aw, s_m, DWIJ):
+        rhoi = d_rho[d_idx]
+        rhoj = s_rho[s_idx]
+
+        # physical and advection velocities
+        ui = d_u[d_idx]
+        uhati = d_uhat[d_idx]
+        vi = d_v[d_idx]
+        vhati = d_vhat[d_idx]
+        wi = d_w[d_idx]
+        whati = d_what[d_idx]
+
+        uj = s_u[s_idx]
+        uhatj = s_uhat[s_idx]
+        vj = s_v[s_idx]
+        vhatj = s_vhat[s_idx]
+        wj = s_w[s_idx]
+        whatj = s_what[s_idx]
+
+        # particle volumes; d_V is inverse volume.
+        Vi = 1./d_V[d_idx]
+        Vj = 1./s_V[s_idx]
+        Vi2 = Vi * Vi
+        Vj2 = Vj * Vj
+
+        # artificial stress tensor
+        Axxi = rhoi*ui*(uhati - ui)
+        Axyi = rhoi*ui*(vhati - vi)
+        Axzi = rhoi*ui*(whati - wi)
+        Ayxi = rhoi*vi*(uhati - ui)
+        Ayyi = rhoi*vi*(vhati - vi)
+        Ayzi = rhoi*vi*(whati - wi)
+        Azxi = rhoi*wi*(uhati - ui)
+        Azyi = rhoi*wi*(vhati - vi)
+        Azzi = rhoi*wi*(whati - wi)
+
+        Axxj = rhoj*uj*(uhatj - uj)
+        Axyj = rhoj*uj*(vhatj - vj)
+        Axzj = rhoj*uj*(whatj - wj)
+        Ayxj = rhoj*vj*(uhatj - uj)
+        Ayyj = rhoj*vj*(vhatj - vj)
+        Ayzj = rhoj*vj*(whatj - wj)
+        Azxj = rhoj*wj*(uhatj - uj)
+        Azyj = rhoj*wj*(vhatj - vj)
+        Azzj = rhoj*wj*(whatj - wj)
+
+        # contraction of stress tensor with kernel gradient
+        Ax = 0.5*(
+            (Axxi + Axxj)*DWIJ[0] +
+            (Axyi + Axyj)*DWIJ[1] +
+            (Axzi + Axzj)*DWIJ[2]
+        )
+
+        Ay = 0.5*(
+            (Ayxi + Ayxj)*DWIJ[0] +
+            (Ayyi + Ayyj)*DWIJ[1] +
+            (Ayzi + Ayzj)*DWIJ[2]
+        )
+
+        Az = 0.5*(
+            (Azxi + Azxj)*DWIJ[0] +
+            (Azyi + Azyj)*DWIJ[1] +
+            (Azzi + Azzj)*DWIJ[2]
+        )
+
+        # accelerations 2nd part of Eq. (8), the contraction for the
+        # source is with -DWIJ.
+        tmp = Vi2 + Vj2
+        tmpi = tmp/d_m[d_idx]
+        tmpj = tmp/s_m[s_idx]
+
+        d_au[d_idx] += tmpi * Ax
+        d_av[d_idx] += tmpi * Ay
+        d_aw[d_idx] += tmpi * Az
+
+        s_au[s_idx] -= tmpj * Ax
+        s_av[s_idx] -= tmpj * Ay
+        s_aw[s_idx] -= tmpj * Az
+
 
 class SolidWallNoSlipBC(Equation):
     r"""**Solid wall boundary condition** [Adami2012]_
@@ -26,6 +26,25 @@ class LaminarViscosity(Equation):
         d_av[d_idx] += tmp * VIJ[1]
         d_aw[d_idx] += tmp * VIJ[2]
 
+    def loop_pair(self, d_idx, s_idx, d_m, s_m, d_rho, s_rho, d_au, d_av,
+                  d_aw, s_au, s_av, s_aw, DWIJ, XIJ, VIJ, R2IJ, HIJ):
+        rhoa = d_rho[d_idx]
+        rhob = s_rho[s_idx]
+
+        # scalar part of the kernel gradient, the same for both particles
+        Fij = DWIJ[0] * XIJ[0] + DWIJ[1] * XIJ[1] + DWIJ[2] * XIJ[2]
+
+        tmp = 4 * self.nu * Fij/((rhoa + rhob)*(R2IJ + self.eta*HIJ*HIJ))
+
+        # accelerations, VJI is -VIJ.
+        d_au[d_idx] += s_m[s_idx] * tmp * VIJ[0]
+        d_av[d_idx] += s_m[s_idx] * tmp * VIJ[1]
+        d_aw[d_idx] += s_m[s_idx] * tmp * VIJ[2]
+
+        s_au[s_idx] -= d_m[d_idx] * tmp * VIJ[0]
+        s_av[s_idx] -= d_m[d_idx] * tmp * VIJ[1]
+        s_aw[s_idx] -= d_m[d_idx] * tmp * VIJ[2]
+
 
 class MonaghanSignalViscosityFluids(Equation):
     def __init__(self, dest, sources, alpha, h):
@@ -35,6 +35,11 @@ def run_tests(args):
     cmdline.main(args=argv)
 
 
+def run_benchmarks(args):
+    from pysph.benchmarks.suite import main
+    main(args)
+
+
 def make_binder(args):
     from pysph.tools.binder import main
     main(args)
@@ -77,6 +82,12 @@ def main():
     )
     tests.set_defaults(func=run_tests)
 
+    bench = subparsers.add_parser(
+        'bench', help='Run the PySPH benchmark suite',
+        add_help=False
+    )
+    bench.set_defaults(func=run_benchmarks)
+
     binder = subparsers.add_parser(
         'binder',
         help='Make a mybinder.org compatible directory for upload to a ' +
@@ -3,7 +3,6 @@ import numpy as np
 import copy
 from pysph.base.nnps import LinkedListNNPS
 from pysph.base.utils import get_particle_array, get_particle_array_wcsph
-from cyarray.api import UIntArray
 from numpy.linalg import norm, matrix_power
 
 
@@ -674,32 +673,16 @@ def find_overlap_particles(fluid_parray, solid_parray, dx_solid, dim=3):
     list of particle indices to remove from the first array.
 
     """
-
-    x = fluid_parray.x
-    x1 = solid_parray.x
-    y = fluid_parray.y
-    y1 = solid_parray.y
-    z = fluid_parray.z
-    z1 = solid_parray.z
+    fluid = np.c_[fluid_parray.x, fluid_parray.y, fluid_parray.z]
+    solid = np.c_[solid_parray.x, solid_parray.y, solid_parray.z]
     if dim == 2:
-        z = np.zeros_like(x)
-        z1 = np.zeros_like(x1)
-    to_remove = []
+        fluid[:, 2] = 0.0
+        solid[:, 2] = 0.0
     ll_nnps = LinkedListNNPS(dim, [fluid_parray, solid_parray])
-    for i in range(len(x)):
-        nbrs = UIntArray()
-        ll_nnps.get_nearest_particles(1, 0, i, nbrs)
-        point_i = np.array([x[i], y[i], z[i]])
-        near_points = nbrs.get_npy_array()
-        distances = []
-        for ind in near_points:
-            dest = [x1[ind], y1[ind], z1[ind]]
-            distances.append(distance(point_i, dest))
-        if len(distances) == 0:
-            continue
-        elif min(distances) < (dx_solid * (1.0 - 1.0e-07)):
-            to_remove.append(i)
-    return to_remove
+    offsets, indices = ll_nnps.get_all_neighbors(1, 0)
+    rows = np.repeat(np.arange(len(fluid)), np.diff(offsets))
+    dist = norm(fluid[rows] - solid[indices], axis=1)
+    return list(np.unique(rows[dist < dx_solid * (1.0 - 1.0e-07)]))
 
 
 def remove_overlap_particles(fluid_parray, solid_parray, dx_solid, dim=3):
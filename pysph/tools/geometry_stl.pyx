@@ -1,9 +1,8 @@
 from pysph.base.particle_array import ParticleArray
-from pysph.base import nnps
+from pysph.base.nnps import LinkedListNNPS, find_neighbors_of_points
 import numpy as np
 from stl import mesh
 from numpy.linalg import norm
-from cyarray.api import UIntArray
 cimport cython
 cimport numpy as np
 
@@ -118,23 +117,14 @@ def _get_stl_mesh(stl_fname, dx_triangle, uniform = False):
 
 
 def remove_repeated_points(x, y, z, dx_triangle):
+    """Remove the points which are within machine epsilon of a point with a
+    smaller index.
+    """
     EPS = np.finfo(float).eps
-    pa_mesh = ParticleArray(name="mesh", x=x, y=y, z=z, h=EPS)
-    pa_grid = ParticleArray(name="grid", x=x, y=y, z=z, h=EPS)
-    pa_list = [pa_mesh, pa_grid]
-    nps = nnps.LinkedListNNPS(dim=3, particles=pa_list, radius_scale=1)
-    cdef int src_index = 1, dst_index = 0
-    nps.set_context(src_index=1, dst_index=0)
-    nbrs = UIntArray()
-    cdef list idx = []
-    cdef int i = 0
-    for i in range(len(x)):
-        nps.get_nearest_particles(src_index, dst_index, i, nbrs)
-        neighbours = nbrs.get_npy_array()
-        idx.append(neighbours.min())
-    idx_set = set(idx)
-    idx = list(idx_set)
-    return pa_mesh.x[idx], pa_mesh.y[idx], pa_mesh.z[idx]
+    offsets, indices = find_neighbors_of_points(x, y, z, x, y, z, EPS)
+    # Every point is its own neighbor so no row is empty.
+    idx = np.unique(np.minimum.reduceat(indices, offsets[:-1]))
+    return np.asarray(x)[idx], np.asarray(y)[idx], np.asarray(z)[idx]
 
 
 def prism(tri_normal, tri_points, dx_sph):
@@ -226,11 +216,8 @@ def get_points_from_mgrid(pa_grid, pa_mesh, x_list, y_list, z_list,
     x_list, y_list, z_list : Coordinates of surface points for each triangle
     """
     pa_list = [pa_mesh, pa_grid]
-    nps = nnps.LinkedListNNPS(dim=3, particles=pa_list,
-                              radius_scale=radius_scale)
-    cdef int src_index = 1, dst_index = 0
-    nps.set_context(src_index=1, dst_index=0)
-    nbrs = UIntArray()
+    nps = LinkedListNNPS(dim=3, particles=pa_list, radius_scale=radius_scale)
+    offsets, nbr_indices = nps.get_all_neighbors(1, 0)
     cdef np.ndarray prism_normals = np.zeros((5, 3), dtype=DTYPE)
     cdef np.ndarray prism_face_centres = np.zeros((5, 3), dtype=DTYPE)
     cdef np.ndarray prism_points = np.zeros((6, 3), dtype=DTYPE)
@@ -244,8 +231,7 @@ def get_points_from_mgrid(pa_grid, pa_mesh, x_list, y_list, z_list,
         # Iterating over surface points in triangle to find nearest
         # neighbour on grid.
         for j in range(len(x_list[i])):
-            nps.get_nearest_particles(src_index, dst_index, counter, nbrs)
-            neighbours = nbrs.get_npy_array()
+            neighbours = nbr_indices[offsets[counter]:offsets[counter + 1]]
             l = len(neighbours)
             for t in range(l):
                 point = np.array([pa_grid.x[neighbours[t]],
@@ -38,6 +38,61 @@ class InterpolateSPH(Equation):
         d_prop[d_idx] += s_m[s_idx]/s_rho[s_idx]*WIJ*s_temp_prop[s_idx]
 
 
+class InterpolateFunctionMany(Equation):
+    """Shepard interpolation of `nprops` properties at once.
+
+    The properties are stored interleaved in the strided `temp_props` of the
+    sources and `props` of the destination.
+    """
+    def __init__(self, dest, sources, nprops=1):
+        self.nprops = nprops
+        super(InterpolateFunctionMany, self).__init__(dest, sources)
+
+    def initialize(self, d_idx, d_props, d_number_density):
+        i = declare('int')
+        for i in range(self.nprops):
+            d_props[self.nprops*d_idx + i] = 0.0
+        d_number_density[d_idx] = 0.0
+
+    def loop(self, s_idx, d_idx, s_temp_props, d_props, d_number_density,
+             WIJ):
+        i, didx, sidx = declare('int', 3)
+        didx = self.nprops*d_idx
+        sidx = self.nprops*s_idx
+        d_number_density[d_idx] += WIJ
+        for i in range(self.nprops):
+            d_props[didx + i] += WIJ*s_temp_props[sidx + i]
+
+    def post_loop(self, d_idx, d_props, d_number_density):
+        i = declare('int')
+        if d_number_density[d_idx] > 1e-12:
+            inv = 1.0/d_number_density[d_idx]
+            for i in range(self.nprops):
+                d_props[self.nprops*d_idx + i] *= inv
+
+
+class InterpolateSPHMany(Equation):
+    """SPH interpolation of `nprops` properties at once, see
+    `InterpolateFunctionMany`.
+    """
+    def __init__(self, dest, sources, nprops=1):
+        self.nprops = nprops
+        super(InterpolateSPHMany, self).__init__(dest, sources)
+
+    def initialize(self, d_idx, d_props):
+        i = declare('int')
+        for i in range(self.nprops):
+            d_props[self.nprops*d_idx + i] = 0.0
+
+    def loop(self, d_idx, s_idx, s_rho, s_m, s_temp_props, d_props, WIJ):
+        i, didx, sidx = declare('int', 3)
+        didx = self.nprops*d_idx
+        sidx = self.nprops*s_idx
+        wj = s_m[s_idx]/s_rho[s_idx]*WIJ
+        for i in range(self.nprops):
+            d_props[didx + i] += wj*s_temp_props[sidx + i]
+
+
 class SPHFirstOrderApproximationPreStep(Equation):
     def __init__(self, dest, sources, dim=1):
         self.dim = dim
@@ -251,6 +306,8 @@ class Interpolator(object):
         self.nnps = None
         self.equations = equations
         self.func_eval = None
+        self._many_eval = None
+        self._nprops = 0
         self.domain_manager = domain_manager
         self.method = method
         if method not in ['sph', 'shepard', 'order1']:
@@ -355,6 +412,53 @@ class Interpolator(object):
         result.shape = self.shape
         return result.squeeze()
 
+    def interpolate_many(self, props):
+        """Interpolate several properties with a single neighbor traversal.
+
+        This is only done for the 'shepard' and 'sph' methods with the default
+        equations, in the other cases each property is interpolated
+        separately with `interpolate`.  The Shepard normalization is computed
+        only once for all the properties.
+
+        Parameters
+        ----------
+
+        props: list
+            The names of the properties to interpolate.
+
+        Returns
+        -------
+        A dictionary of the property names mapped to numpy arrays suitably
+        shaped with the interpolated values.
+        """
+        props = list(props)
+        if (self.equations is not None or self.method == 'order1' or
+                len(props) < 2):
+            return dict((prop, self.interpolate(prop)) for prop in props)
+
+        nprops = len(props)
+        if nprops != self._nprops:
+            self._compile_many_eval(nprops)
+
+        for array in self.particle_arrays:
+            data = array.get(
+                'temp_props', only_real_particles=False
+            ).reshape(-1, nprops)
+            for i, prop in enumerate(props):
+                if prop not in array.properties:
+                    data[:, i] = 0.0
+                else:
+                    data[:, i] = array.get(prop, only_real_particles=False)
+
+        self._many_eval.compute(0.0, 0.1)  # These are junk arguments.
+        values = self.pa.props.reshape(-1, nprops)
+        result = {}
+        for i, prop in enumerate(props):
+            value = values[:, i].copy()
+            value.shape = self.shape
+            result[prop] = value.squeeze()
+        return result
+
     def update(self, update_domain=True):
         """Update the NNPS when particles have moved.
 
@@ -380,6 +484,10 @@ class Interpolator(object):
         arrays = self.particle_arrays + [self.pa]
         self._create_nnps(arrays)
         self.func_eval.update_particle_arrays(arrays)
+        if self._many_eval is not None:
+            self._add_many_props(arrays, self._nprops)
+            self._many_eval.update_particle_arrays(arrays)
+            self._many_eval.set_nnps(self.nnps)
 
     # ### Private protocol ###################################################
 
@@ -414,6 +522,8 @@ class Interpolator(object):
             x=xr, y=yr, z=zr, h=h,
             number_density=np.zeros_like(xr)
         )
+        # Used by interpolate_many, the stride is set when it is called.
+        pa.add_property('props')
         if self.method in ['sph', 'shepard']:
             pa.add_property('prop')
         else:
@@ -459,6 +569,29 @@ class Interpolator(object):
         compiler = SPHCompiler(self.func_eval, None)
         compiler.compile()
 
+    def _add_many_props(self, arrays, nprops):
+        for array in arrays:
+            name = 'props' if array is self.pa else 'temp_props'
+            if array.stride.get(name, 1) != nprops:
+                if name in array.properties:
+                    array.remove_property(name)
+                array.add_property(name, stride=nprops)
+
+    def _compile_many_eval(self, nprops):
+        arrays = self.particle_arrays + [self.pa]
+        self._add_many_props(arrays, nprops)
+        names = [x.name for x in self.particle_arrays]
+        if self.method == 'shepard':
+            cls = InterpolateFunctionMany
+        else:
+            cls = InterpolateSPHMany
+        equations = [cls(dest='interpolate', sources=names, nprops=nprops)]
+        self._many_eval = AccelerationEval(arrays, equations, self.kernel)
+        compiler = SPHCompiler(self._many_eval, None)
+        compiler.compile()
+        self._many_eval.set_nnps(self.nnps)
+        self._nprops = nprops
+
     def _get_max_h_in_arrays(self):
         hmax = -1.0
         for array in self.particle_arrays:
@@ -470,6 +603,8 @@ class Interpolator(object):
         for array in self.particle_arrays:
             if 'temp_prop' not in array.properties:
                 array.add_property('temp_prop')
+            if 'temp_props' not in array.properties:
+                array.add_property('temp_props')
 
 
 def main(fname, prop, npoint):
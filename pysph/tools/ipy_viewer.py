@@ -1,6 +1,7 @@
 import json
 import glob
 from pysph.solver.utils import load, get_files, mkdir
+from pysph.solver.utils import get_lod_files, get_full_resolution_file
 from IPython.display import display, Image, clear_output, HTML
 import ipywidgets as widgets
 import numpy as np
@@ -20,12 +21,20 @@ class Viewer(object):
 
     '''
     Base class for viewers.
+
+    If `lod` is True, the decimated, level of detail, files saved with the
+    `--lod-freq` option are viewed.  These are quick to load and the full
+    resolution data for a frame is available with `get_full_frame`.
     '''
 
-    def __init__(self, path, cache=True):
+    def __init__(self, path, cache=True, lod=False):
 
         self.path = path
-        self.paths_list = get_files(path)
+        self.lod = lod
+        if lod:
+            self.paths_list = get_lod_files(path)
+        else:
+            self.paths_list = get_files(path)
 
         # Caching #
         # Note : Caching is only used by get_frame and widget handlers.
@@ -75,6 +84,21 @@ class Viewer(object):
 
         return temp_data
 
+    def get_full_frame(self, frame):
+        '''Return the full resolution data for a given frame number.
+
+        This is the same as `get_frame` unless level of detail files are
+        viewed, in which case the full output file with the closest
+        iteration count is loaded.  These are not cached.
+        '''
+
+        fname = self.paths_list[frame]
+        if self.lod:
+            full = get_full_resolution_file(fname)
+            if full is not None:
+                fname = full
+        return load(fname)
+
     def show_log(self):
         '''
         Prints the content of log file.
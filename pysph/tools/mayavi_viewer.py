@@ -37,6 +37,8 @@ from pysph.base.particle_array import ParticleArray  # noqa: E402
 from pysph.solver.solver_interfaces import MultiprocessingClient  # noqa: E402
 from pysph.solver.utils import load, dump, output_formats  # noqa: E402
 from pysph.solver.utils import remove_irrelevant_files, _sort_key  # noqa: E402
+from pysph.solver.utils import (
+    get_full_resolution_file, get_lod_directory)  # noqa: E402
 from pysph.tools.interpolator import (
         get_bounding_box, get_nx_ny_nz, Interpolator)  # noqa: E402
 
@@ -692,6 +694,11 @@ class MayaviViewer(HasTraits):
     play_step = Int(1, enter_set=True, auto_set=False,
                     desc='steps between files played')
     loop = Bool(False, desc='if the animation is looped')
+    lod = Bool(False, desc='if the decimated, level of detail, files are '
+                           'viewed')
+    load_full = Button('Full resolution',
+                       desc='load the full resolution file for the current '
+                            'level of detail file')
     # This is len(files) - 1.
     _n_files = Int(0)
     _low = Int(0)
@@ -749,6 +756,12 @@ class MayaviViewer(HasTraits):
                                      show_label=False),
                                 padding=0,
                             ),
+                            HGroup(
+                                Item(name='lod', label='Level of detail'),
+                                Item(name='load_full', show_label=False,
+                                     enabled_when='lod'),
+                                padding=0,
+                            ),
                             padding=0,
                             label='Saved Data',
                             selected=True,
@@ -1075,6 +1088,9 @@ class MayaviViewer(HasTraits):
         if not os.path.exists(fname):
             print("File %s is missing, ignoring!" % fname)
             return
+        self._show_file(fname)
+
+    def _show_file(self, fname):
         self._file_name = fname
         self.current_file = os.path.basename(fname)
         # Code to read the file, create particle array and setup the helper.
@@ -1110,6 +1126,31 @@ class MayaviViewer(HasTraits):
         if self.record:
             self._do_snap()
 
+    def _lod_changed(self, value):
+        d = self.directory
+        if not d:
+            return
+        if os.path.basename(os.path.normpath(d)) == 'lod':
+            d = os.path.dirname(os.path.normpath(d))
+        if value:
+            d = get_lod_directory(d)
+        files = get_files_in_dir(d)
+        if len(files) == 0:
+            print("No files in %s, ignoring!" % d)
+            return
+        sort_file_list(files)
+        self.files = files
+
+    def _load_full_fired(self):
+        if not self._file_name:
+            return
+        fname = get_full_resolution_file(self._file_name)
+        if fname is None:
+            print("No full resolution file for %s!" % self._file_name)
+            return
+        self._handle_particle_array_updates()
+        self._show_file(fname)
+
     def _loop_changed(self, value):
         if value and self.play:
             self._play_changed(self.play)
@@ -1191,7 +1232,11 @@ class MayaviViewer(HasTraits):
                     mlab=self.scene.mlab)
 
     def _directory_changed(self, d):
-        files = get_files_in_dir(d)
+        lod_dir = get_lod_directory(d)
+        if self.lod and os.path.isdir(lod_dir):
+            files = get_files_in_dir(lod_dir)
+        else:
+            files = get_files_in_dir(d)
         if len(files) > 0:
             self._clear()
             sort_file_list(files)
@@ -1274,6 +1319,8 @@ etc.  The following traits are available:
 
   play          -- True/False: Play all stored data files.
   loop          -- True/False: Loop over data files.
+  lod           -- True/False: View the decimated, level of detail, files
+                   saved with the --lod-freq option.
 
 If a Python script is supplied, the code is executed in the same namespace as
 provided by the embedded Python shell, i.e. the following names are available
@@ -1299,6 +1346,7 @@ Examples::
 ----------
 
   $ pysph view scalar=u play=True loop=True elliptical_drop_output/
+  $ pysph view lod=True elliptical_drop_output/
   $ pysph view ellptical_drop_100.npz
   $ pysph view interval=10 host=localhost port=8900
 
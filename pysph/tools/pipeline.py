@@ -0,0 +1,187 @@
+"""Process a time series of output files in parallel.
+
+A `Pipeline` maps a user function over the output files of a simulation
+using a pool of processes.  The results are returned in the order of the
+files as they become available.  Each file is loaded with only the properties
+needed and the results can be cached on disk so that rerunning the pipeline
+only processes new or modified files.
+
+For example, to compute the kinetic energy history of a simulation::
+
+    def kinetic_energy(data):
+        fluid = data['arrays']['fluid']
+        m, u, v = fluid.get('m', 'u', 'v')
+        return data['solver_data']['t'], 0.5*np.sum(m*(u*u + v*v))
+
+    files = get_files('dam_break_2d_output')
+    pipe = Pipeline(kinetic_energy, props=['m', 'u', 'v'], n_jobs=4,
+                    cache_dir='dam_break_2d_output/cache')
+    t, ke = np.asarray(pipe.collect(files)).T
+
+Expensive objects like an `Interpolator` can be created once per worker with
+the `setup` function, the object it returns is passed to the function along
+with the data::
+
+    def setup():
+        data = load(files[0])
+        return Interpolator(list(data['arrays'].values()), num_points=10000)
+
+    def interpolate_p(data, interp):
+        interp.update_particle_arrays(list(data['arrays'].values()))
+        return interp.interpolate('p')
+
+    pipe = Pipeline(interpolate_p, setup=setup, n_jobs=4)
+
+With more than one job the functions are sent to the worker processes and
+must therefore be defined at the module level.
+
+"""
+
+from functools import partial
+import hashlib
+import os
+import pickle
+
+from pysph.solver.utils import load, mkdir
+
+# The state returned by the setup function in each worker process.
+_worker_state = None
+
+
+def _init_worker(setup):
+    global _worker_state
+    _worker_state = setup() if setup is not None else None
+
+
+def _process(args):
+    func, fname, props, use_state = args
+    data = load(fname, props=props)
+    if use_state:
+        return func(data, _worker_state)
+    else:
+        return func(data)
+
+
+def _get_function_name(func):
+    if isinstance(func, partial):
+        return '%s%r%r' % (
+            _get_function_name(func.func), func.args,
+            sorted(func.keywords.items())
+        )
+    return '%s.%s' % (
+        getattr(func, '__module__', ''),
+        getattr(func, '__qualname__', getattr(func, '__name__', repr(func)))
+    )
+
+
+class Pipeline(object):
+    """Map a function over a sequence of output files.
+
+    The function is called as `func(data)` where `data` is the dictionary
+    returned by `pysph.solver.utils.load`, or as `func(data, state)` if a
+    `setup` function is given.
+    """
+
+    def __init__(self, func, props=None, setup=None, n_jobs=1,
+                 cache_dir=None, version=0):
+        """
+        Parameters
+        ----------
+
+        func: callable
+            The function to call for each file.
+        props: sequence or None
+            Names of the only properties to load, all are loaded if None.
+        setup: callable or None
+            Called once in each worker, the result is passed to `func`.
+        n_jobs: int
+            Number of processes to use, the files are processed in this
+            process when this is 1.
+        cache_dir: str or None
+            Directory to cache the results of each file in.  A cached result
+            is used if the file has not been modified since and the function
+            name and `version` are the same.
+        version: int or str
+            Version of the function, change this when the function changes
+            to invalidate the cached results.
+        """
+        self.func = func
+        self.props = list(props) if props is not None else None
+        self.setup = setup
+        self.n_jobs = n_jobs
+        self.cache_dir = cache_dir
+        self.version = version
+        if cache_dir is not None:
+            mkdir(cache_dir)
+
+    # ### Public protocol ###################################################
+    def run(self, files):
+        """Process the given files and yield `(fname, result)` in the order
+        of the files, the results are yielded as soon as they are available.
+        """
+        files = list(files)
+        results = [self._get_cached(f) for f in files]
+        todo = [f for f, r in zip(files, results) if r is None]
+        computed = self._map(todo)
+        for fname, cached in zip(files, results):
+            if cached is None:
+                result = next(computed)
+                self._set_cached(fname, result)
+            else:
+                result = cached[0]
+            yield fname, result
+
+    def collect(self, files):
+        """Return a list of the results for the given files.
+        """
+        return [result for fname, result in self.run(files)]
+
+    # ### Private protocol ###################################################
+    def _map(self, files):
+        use_state = self.setup is not None
+        args = [(self.func, f, self.props, use_state) for f in files]
+        if self.n_jobs == 1 or len(files) < 2:
+            _init_worker(self.setup)
+            for arg in args:
+                yield _process(arg)
+        else:
+            from multiprocessing import Pool
+            pool = Pool(
+                min(self.n_jobs, len(files)), initializer=_init_worker,
+                initargs=(self.setup,)
+            )
+            try:
+                for result in pool.imap(_process, args):
+                    yield result
+            finally:
+                pool.terminate()
+
+    def _get_cache_file(self, fname):
+        key = '%s:%s:%s:%s' % (
+            os.path.abspath(fname), _get_function_name(self.func),
+            self.version, self.props
+        )
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest + '.pkl')
+
+    def _get_cached(self, fname):
+        """Return a tuple with the cached result or None if there is none.
+        """
+        if self.cache_dir is None:
+            return None
+        cache = self._get_cache_file(fname)
+        if not os.path.exists(cache):
+            return None
+        with open(cache, 'rb') as f:
+            mtime, result = pickle.load(f)
+        if mtime != os.stat(fname).st_mtime:
+            return None
+        return (result,)
+
+    def _set_cached(self, fname, result):
+        if self.cache_dir is None:
+            return
+        cache = self._get_cache_file(fname)
+        with open(cache, 'wb') as f:
+            pickle.dump((os.stat(fname).st_mtime, result), f,
+                        pickle.HIGHEST_PROTOCOL)
@@ -9,18 +9,32 @@ except (ImportError, SystemExit):
 if TVTK:
     from tvtk.array_handler import array2vtk
 
+from functools import partial
 from os import path
 import numpy as np
 import pysph.solver.utils as utils
+from pysph.tools.pipeline import Pipeline
 
 
-def get_ke_history(files, array_name):
-    t, ke = [], []
-    for sd, array in utils.iter_output(files, array_name):
-        t.append(sd['t'])
-        m, u, v, w = array.get('m', 'u', 'v', 'w')
-        _ke = 0.5 * np.sum( m * (u**2 + v**2 + w**2) )
-        ke.append(_ke)
+def _get_ke(data, array_name):
+    array = data['arrays'][array_name]
+    m, u, v, w = array.get('m', 'u', 'v', 'w')
+    return data['solver_data']['t'], 0.5 * np.sum( m * (u**2 + v**2 + w**2) )
+
+
+def get_ke_history(files, array_name, n_jobs=1, cache_dir=None):
+    """Return the time and kinetic energy of the given array for the files.
+
+    The files are processed with `n_jobs` processes and the results are
+    cached in `cache_dir` if it is given, see `pysph.tools.pipeline`.
+    """
+    pipe = Pipeline(
+        partial(_get_ke, array_name=array_name), props=['m', 'u', 'v', 'w'],
+        n_jobs=n_jobs, cache_dir=cache_dir
+    )
+    result = pipe.collect(files)
+    t = [x[0] for x in result]
+    ke = [x[1] for x in result]
     return np.asarray(t), np.asarray(ke)
 
 
@@ -1,10 +1,16 @@
-''' convert pysph .npz output to vtk file format '''
+''' convert pysph .npz output to vtk file format
+
+.. deprecated::
+    This reads the output of old versions of PySPH, use ``pysph dump_vtk``
+    (:py:mod:`pysph.solver.vtk_output`) to convert the current output files.
+'''
 from __future__ import print_function
 import os
 import re
+import warnings
 
 from enthought.tvtk.api import tvtk, write_data
-from numpy import array, c_, ravel, load, zeros_like
+from numpy import array, c_, concatenate, ravel, load, zeros_like
 
 
 def write_vtk(data, filename, scalars=None, vectors={'V':('u','v','w')}, tensors={},
@@ -179,6 +185,19 @@ def get_output_details(path):
     return solvers
 
 
+def _load_arrays(filenames):
+    ''' load the arrays of the given .npz files, the arrays with the same name
+    are concatenated in the order of the files '''
+    arrs = {}
+    for filename in filenames:
+        d = load(filename)
+        for nam,val in d.items():
+            if val.ndim > 0:
+                arrs.setdefault(nam, []).append(val)
+        d.close()
+    return dict((nam, concatenate(vals)) for nam, vals in arrs.items())
+
+
 def pysph_to_vtk(path, merge_procs=False, skip_existing=True, binary=True):
     ''' convert pysph output .npz files into vtk format
 
@@ -188,7 +207,6 @@ def pysph_to_vtk(path, merge_procs=False, skip_existing=True, binary=True):
         directory where .npz files are located
     merge_procs : bool
         whether to merge the data from different procs into a single file
-        (not yet implemented)
     skip_existing : bool
         skip files where corresponding vtk already exist
         this is useful if you've converted vtk files while a solver is running
@@ -198,16 +216,19 @@ def pysph_to_vtk(path, merge_procs=False, skip_existing=True, binary=True):
     The output vtk files are stored in a directory `solver_name` _vtk within
     the `path` directory
 
+    .. deprecated::
+        Use ``pysph dump_vtk`` instead, its ``--merge`` option merges the
+        files of the different procs.
     '''
+    warnings.warn(
+        'pysph_to_vtk is deprecated, use "pysph dump_vtk" instead.',
+        DeprecationWarning, stacklevel=2
+    )
     if binary:
         data_mode = 'binary'
     else:
         data_mode = 'ascii'
 
-    if merge_procs is True:
-        # FIXME: implement
-        raise NotImplementedError('merge_procs=True not implemented yet')
-
     solvers = get_output_details(path)
     for solver, (procs, entities, times) in solvers.items():
         print('converting solver:', solver)
@@ -219,24 +240,29 @@ def pysph_to_vtk(path, merge_procs=False, skip_existing=True, binary=True):
         times = sorted(times, key=float)
         times_file = open(os.path.join(dir,'times'), 'w')
 
+        if merge_procs:
+            proc_groups = [procs]
+        else:
+            proc_groups = [[proc] for proc in procs]
+
         for entity in entities:
             print('    entity:', entity)
-            for proc in procs:
-                print('        proc:', proc)
+            for group in proc_groups:
+                print('        procs:', ', '.join(group))
                 print('        timesteps:', len(times))
-                f = '%s_%s_%s_'%(solver,proc,entity)
-                of = os.path.join(dir,f)
+                fs = ['%s_%s_%s_'%(solver,proc,entity) for proc in group]
+                if merge_procs:
+                    of = os.path.join(dir, '%s_%s_'%(solver,entity))
+                else:
+                    of = os.path.join(dir, fs[0])
 
                 for i, time in enumerate(times):
                     print('\r',i,)
-                    if skip_existing and os.path.exists(f+str(i)):
+                    if skip_existing and os.path.exists(of+str(i)):
                         continue
-                    d = load(os.path.join(path, f+time+'.npz'))
-                    arrs = {}
-                    for nam,val in d.items():
-                        if val.ndim > 0:
-                            arrs[nam] = val
-                    d.close()
+                    arrs = _load_arrays(
+                        [os.path.join(path, f+time+'.npz') for f in fs]
+                    )
 
                     scalars, vectors, tensors = detect_vectors_tensors(arrs)
                     vectors['V'] = ['u','v','w']
@@ -294,6 +294,31 @@ class TestGeometry(unittest.TestCase):
                 count += 1
         assert count == 0
 
+    def test_find_overlap_particles_with_far_away_particles(self):
+        # Given
+        fluid = get_particle_array(name='fluid', x=[0.0, 0.05, 5.0, -5.0],
+                                   y=[0.0, 0.0, 0.0, 0.0], h=0.1)
+        solid = get_particle_array(name='solid', x=[0.1], y=[0.0], h=0.1)
+
+        # When
+        idx = G.find_overlap_particles(fluid, solid, 0.1, dim=2)
+
+        # Then
+        self.assertEqual(list(idx), [1])
+
+    def test_find_overlap_particles_is_limited_to_the_nnps_radius(self):
+        # Given
+        fluid = get_particle_array(name='fluid', x=[0.0, 0.05],
+                                   y=[0.0, 0.0], h=0.02)
+        solid = get_particle_array(name='solid', x=[0.08], y=[0.0], h=0.02)
+
+        # When
+        idx = G.find_overlap_particles(fluid, solid, 0.1, dim=2)
+
+        # Then
+        # Only the fluid particle within 2h of the solid is found.
+        self.assertEqual(list(idx), [1])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -295,6 +295,39 @@ class TestInterpolator(unittest.TestCase):
         expect = np.sin(ip.x * np.pi)
         np.testing.assert_allclose(p, expect, rtol=5e-3)
 
+    def test_interpolate_many_matches_interpolate(self):
+        # Given
+        pa1 = self._make_2d_grid()
+        pa2 = self._make_2d_grid('solid')
+        pa2.p[:] = 4.0
+
+        for method in ('shepard', 'sph'):
+            # When.
+            ip = Interpolator([pa1, pa2], num_points=1000, method=method,
+                              domain_manager=self._domain)
+            result = ip.interpolate_many(['p', 'u', 'rho'])
+
+            # Then.
+            self.assertEqual(sorted(result.keys()), ['p', 'rho', 'u'])
+            for prop in ('p', 'u', 'rho'):
+                self.assertEqual(result[prop].shape, ip.x.shape)
+                np.testing.assert_allclose(
+                    result[prop], ip.interpolate(prop), rtol=1e-12
+                )
+
+            # When the number of properties and the points change.
+            x, y = np.random.random((2, 5, 5))
+            ip.set_interpolation_points(x=x, y=y)
+            result = ip.interpolate_many(['u', 'p'])
+
+            # Then.
+            np.testing.assert_allclose(
+                result['u'], ip.interpolate('u'), rtol=1e-12
+            )
+            np.testing.assert_allclose(
+                result['p'], ip.interpolate('p'), rtol=1e-12
+            )
+
     def test_gradient_calculation_2d(self):
         # Given
         pa = self._make_2d_grid()
@@ -0,0 +1,101 @@
+import os
+import shutil
+from tempfile import mkdtemp
+import unittest
+
+import numpy as np
+
+from pysph.base.utils import get_particle_array
+from pysph.solver.utils import dump
+from pysph.tools.pipeline import Pipeline
+from pysph.tools.pprocess import get_ke_history
+
+
+def get_time_and_props(data):
+    fluid = data['arrays']['fluid']
+    return data['solver_data']['t'], 'v' in fluid.properties
+
+
+def setup_state():
+    return [0]
+
+
+def count_calls(data, state):
+    state[0] += 1
+    return state[0]
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.root = mkdtemp()
+        self.files = []
+        for i in range(4):
+            x = np.linspace(0, 1, 5)
+            pa = get_particle_array(name='fluid', x=x, m=1.0, u=float(i))
+            pa.set_output_arrays(['x', 'm', 'u', 'v', 'w'])
+            fname = os.path.join(self.root, 'sim_%d.npz' % i)
+            dump(fname, [pa], solver_data={'t': 0.1*i})
+            self.files.append(fname)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_results_are_in_order_with_only_given_props(self):
+        for n_jobs in (1, 2):
+            # Given
+            pipe = Pipeline(get_time_and_props, props=['x', 'u'],
+                            n_jobs=n_jobs)
+
+            # When
+            result = list(pipe.run(self.files))
+
+            # Then
+            self.assertEqual([r[0] for r in result], self.files)
+            for i, (fname, (t, has_v)) in enumerate(result):
+                self.assertAlmostEqual(t, 0.1*i)
+                self.assertFalse(has_v)
+
+    def test_setup_state_is_reused(self):
+        # Given
+        pipe = Pipeline(count_calls, setup=setup_state)
+
+        # When
+        result = pipe.collect(self.files)
+
+        # Then
+        self.assertEqual(result, [1, 2, 3, 4])
+
+    def test_results_are_cached(self):
+        # Given
+        cache = os.path.join(self.root, 'cache')
+        pipe = Pipeline(count_calls, setup=setup_state, cache_dir=cache)
+        self.assertEqual(pipe.collect(self.files[:2]), [1, 2])
+
+        # When
+        result = pipe.collect(self.files)
+
+        # Then
+        self.assertEqual(result, [1, 2, 1, 2])
+
+        # When the file changes or the version changes.
+        st = os.stat(self.files[0])
+        os.utime(self.files[0], (st.st_atime, st.st_mtime + 10))
+        result = pipe.collect(self.files)
+
+        # Then
+        self.assertEqual(result, [1, 2, 1, 2])
+        self.assertEqual(pipe.collect(self.files), [1, 2, 1, 2])
+        pipe.version = 1
+        self.assertEqual(pipe.collect(self.files), [1, 2, 3, 4])
+
+    def test_get_ke_history(self):
+        # When
+        t, ke = get_ke_history(self.files, 'fluid', n_jobs=2)
+
+        # Then
+        np.testing.assert_allclose(t, [0.0, 0.1, 0.2, 0.3])
+        np.testing.assert_allclose(ke, [0.0, 2.5, 10.0, 22.5])
+
+
+if __name__ == '__main__':
+    unittest.main()